@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+replan_core - qwen3-4b-fp8 与 smollm3 共享的坐标无关重排规划核心
+
+轻量模块（无 torch / embedding 依赖）在此直接导出；
+RAG 检索与模型推理请显式导入：
+    from replan_core.rag_system import ReplanRAGSystem
+    from replan_core.planner import generate_replan
+"""
+
+from .config import BUFFER_SLOTS, EMBEDDING_MODEL, KNOWLEDGE_BASE_DIR, MAX_STACK_HEIGHT, STACKING_RELATIONSHIPS, SUPPORTED_RELATIONSHIPS, TOP_K_RETRIEVAL
+from .embedding_cache import QueryEmbeddingCache
+from .knowledge_base import KnowledgeBaseSnapshot, KnowledgeBaseWatcher
+from .profiles import ModelProfile, PROFILES, DEFAULT_PROFILE, QWEN3_4B_FP8, SMOLLM3_3B, QWEN3_4B_CPU, SMOLLM3_3B_CPU, get_profile
+from .relationships import RELATIONSHIPS, RelationshipSpec
+from .router import ModelRouter, RouterConfig
+from .scene import Scene, SceneDiff
+from .stack_layers import layer_index, layer_labels
+from .structures import build_position_object_map, collect_objects_list, extract_object_value, format_placements_for_query
+from .validation import (
+    ValidationError,
+    enforce_plan_consistency,
+    parse_and_validate,
+    validate_target_consistency,
+    validate_target_structure_payload,
+)
+
+__all__ = [
+    "BUFFER_SLOTS",
+    "EMBEDDING_MODEL",
+    "KNOWLEDGE_BASE_DIR",
+    "MAX_STACK_HEIGHT",
+    "STACKING_RELATIONSHIPS",
+    "SUPPORTED_RELATIONSHIPS",
+    "TOP_K_RETRIEVAL",
+    "QueryEmbeddingCache",
+    "KnowledgeBaseSnapshot",
+    "KnowledgeBaseWatcher",
+    "ModelProfile",
+    "PROFILES",
+    "DEFAULT_PROFILE",
+    "QWEN3_4B_FP8",
+    "SMOLLM3_3B",
+    "QWEN3_4B_CPU",
+    "SMOLLM3_3B_CPU",
+    "get_profile",
+    "RELATIONSHIPS",
+    "RelationshipSpec",
+    "ModelRouter",
+    "RouterConfig",
+    "Scene",
+    "SceneDiff",
+    "layer_index",
+    "layer_labels",
+    "build_position_object_map",
+    "collect_objects_list",
+    "extract_object_value",
+    "format_placements_for_query",
+    "ValidationError",
+    "enforce_plan_consistency",
+    "parse_and_validate",
+    "validate_target_consistency",
+    "validate_target_structure_payload",
+]
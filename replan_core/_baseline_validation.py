@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+基线验证器：引入关系注册表（relationships.py）之前 validation.py 中的验证函数，原样冻结
+只供 validation_bench 对比计时与判定使用，不要修改；遇到第一处错误即抛出 ValueError（不汇总全部错误）。
+"""
+
+from typing import Dict, List, Any
+
+from .config import BUFFER_SLOTS
+from .structures import extract_object_value
+
+
+def enforce_plan_consistency(plan: List[Dict[str, Any]]) -> None:
+    """Enhanced plan consistency validation with support for stacking extensions."""
+    stack_positions: Dict[str, str] = {}
+    arrangement_positions: Dict[str, str] = {}
+    object_stack_targets: Dict[str, str] = {}
+    object_arrangement_targets: Dict[str, str] = {}
+
+    # Track "top" position actions for extension validation
+    top_placements = []
+
+    for action in plan:
+        if not isinstance(action, dict):
+            raise ValueError("Each action must be an object")
+
+        obj = action.get("object")
+        to = action.get("to")
+        fr = action.get("from")
+
+        if isinstance(fr, dict) and isinstance(to, dict) and fr.get("type") == to.get("type") and fr.get("position") == to.get("position") and fr.get("slot") == to.get("slot"):
+            raise ValueError("Action has identical 'from' and 'to', which is redundant")
+
+        if isinstance(to, dict) and to.get("type") == "stack":
+            pos = to.get("position")
+            if not pos:
+                raise ValueError("Stack placement action missing target position")
+            if obj in object_stack_targets and object_stack_targets[obj] != pos:
+                raise ValueError(f"Object '{obj}' placed into multiple stack positions within the same plan")
+            object_stack_targets[obj] = pos
+
+            # Special handling for "top" position - allow multiple objects for stacking extension
+            if pos == "top":
+                top_placements.append(obj)
+            else:
+                # For bottom/middle, maintain strict uniqueness
+                prev = stack_positions.get(pos)
+                if prev and prev != obj:
+                    raise ValueError(f"Stack position '{pos}' assigned to multiple objects ({prev} vs {obj})")
+                stack_positions[pos] = obj
+
+        if isinstance(to, dict) and to.get("type") == "arrangement":
+            pos = to.get("position")
+            if not pos:
+                raise ValueError("Arrangement placement action missing target position")
+            if obj in object_arrangement_targets and object_arrangement_targets[obj] != pos:
+                raise ValueError(f"Object '{obj}' placed into multiple arrangement positions within the same plan")
+            object_arrangement_targets[obj] = pos
+
+            prev = arrangement_positions.get(pos)
+            if prev and prev != obj:
+                raise ValueError(f"Arrangement position '{pos}' assigned to multiple objects ({prev} vs {obj})")
+            arrangement_positions[pos] = obj
+
+    # Validate top placements: allow multiple for stacking extension, but no duplicate objects
+    if len(top_placements) != len(set(top_placements)):
+        duplicates = [obj for obj in set(top_placements) if top_placements.count(obj) > 1]
+        raise ValueError(f"Same object(s) placed to top position multiple times: {duplicates}")
+
+
+def validate_target_structure_payload(structure: Dict[str, Any]) -> None:
+    """验证 target_structure / final_expected.target_structure 的字段是否符合新格式。"""
+    if not isinstance(structure, dict):
+        raise ValueError("target_structure must be an object")
+
+    relationship = structure.get("relationship")
+    placements = structure.get("placements")
+
+    if not relationship:
+        raise ValueError("Missing 'relationship' key in target_structure")
+    if not isinstance(placements, list) or not placements:
+        raise ValueError("'placements' must be a non-empty list")
+
+    # 验证每个 placement 至少有 object 信息
+    for placement in placements:
+        obj = extract_object_value(placement)
+        if not obj:
+            raise ValueError("Each placement must include an object description (object/object 1/2/3)")
+
+    # 关系特定的位置信息要求
+    def ensure_positions(expected: List[str]) -> None:
+        positions = [p.get("position") for p in placements]
+        missing = set(expected) - set(positions)
+        extra = set(pos for pos in positions if pos) - set(expected)
+        if missing or extra:
+            raise ValueError(f"Relationship '{relationship}' requires positions {expected}, found {positions}")
+
+    if relationship in {"stacked_left", "stacked_middle", "stacked_right"}:
+        if len(placements) != 1:
+            raise ValueError(f"{relationship} requires exactly 1 placement")
+        # 单物体通常不包含 position；如存在也允许
+    elif relationship == "stacked":
+        positions = [p.get("position") for p in placements]
+        expected_two = ["bottom", "top"]
+        expected_three = ["bottom", "middle", "top"]
+        if len(placements) == 2:
+            ensure_positions(expected_two)
+        elif len(placements) == 3:
+            ensure_positions(expected_three)
+        else:
+            raise ValueError("Stacked relationship requires 2 or 3 placements")
+    elif relationship == "separated_left_right":
+        ensure_positions(["left", "right"])
+    elif relationship == "separated_front_back":
+        ensure_positions(["front", "back"])
+    elif relationship == "separate_horizontal":
+        ensure_positions(["left", "middle", "right"])
+    elif relationship == "separate_vertical":
+        ensure_positions(["bottom", "middle", "top"])
+    elif relationship == "pyramid":
+        ensure_positions(["bottom left", "bottom right", "top"])
+    elif relationship == "stacked_and_separated_left":
+        ensure_positions(["bottom", "top", "left"])
+    elif relationship == "stacked_and_separated_right":
+        ensure_positions(["bottom", "top", "right"])
+    else:
+        # 若出现未识别的关系，仍允许但至少确保有 position/对象信息
+        pass
+
+
+def validate_output_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """验证已解析的输出对象（完整格式），原地规范化动作字段后返回。"""
+    if not isinstance(data, dict):
+        raise ValueError("Output must be a JSON object")
+
+    # 基础验证
+    # 检查是否为纯关系型输出（只有target_structure）
+    if "target_structure" in data and "status" not in data:
+        # 纯关系型输出验证
+        target_structure = data["target_structure"]
+        validate_target_structure_payload(target_structure)
+
+    # 检查是否为动作计划输出（包含status和plan）
+    elif "status" in data:
+        status = data["status"]
+        if status not in ["success", "blocked"]:
+            raise ValueError(f"Invalid status: {status}")
+
+        if status == "success":
+            if "plan" not in data:
+                raise ValueError("Missing 'plan' key for success status")
+
+            # 验证plan中的动作
+            plan = data["plan"]
+            if not isinstance(plan, list):
+                raise ValueError("Plan must be a list of actions")
+
+            # 先对动作进行容错规范化（将别名/错误放置的字段提升/修正）
+            for action in plan:
+                if "step" not in action or "action" not in action:
+                    raise ValueError("Each action must have 'step' and 'action' keys")
+
+                # 1) 规范化 from/to 的 scattered 表达：禁止 position: scattered，统一为 type: scattered
+                for endpoint_key in ("from", "to"):
+                    if endpoint_key in action and isinstance(action[endpoint_key], dict):
+                        ep = action[endpoint_key]
+                        if ep.get("position") == "scattered" and "type" not in ep:
+                            ep["type"] = "scattered"
+                            del ep["position"]
+
+                # 2) 提升 object 字段：允许从 color 或 from.color/from.object 提升至顶层
+                if "object" not in action:
+                    obj = None
+                    if "color" in action and action["color"]:
+                        # 缺省物体类型按领域设定为 cube
+                        obj = f"{action['color']} cube"
+                    else:
+                        fr = action.get("from", {}) or {}
+                        to = action.get("to", {}) or {}
+                        if isinstance(fr, dict):
+                            obj = fr.get("object") or (f"{fr.get('color')} cube" if fr.get('color') else None)
+                        if obj is None and isinstance(to, dict):
+                            obj = to.get("object") or (f"{to.get('color')} cube" if to.get('color') else None)
+
+                    if obj:
+                        action["object"] = obj
+                        # 清理冗余 color 字段，避免二义性
+                        action.pop("color", None)
+                        if isinstance(action.get("from"), dict):
+                            action["from"].pop("color", None)
+                            action["from"].pop("object", None)
+                        if isinstance(action.get("to"), dict):
+                            action["to"].pop("color", None)
+                            action["to"].pop("object", None)
+
+                # 3) 最终强制要求 object 存在
+                if "object" not in action or not action["object"]:
+                    raise ValueError("Each action must specify an 'object'")
+
+                # 检查buffer slot引用
+                action_type = action["action"]
+                if action_type in ["move_to_buffer", "move_from_buffer"]:
+                    if action_type == "move_to_buffer":
+                        if "to" not in action or "slot" not in action["to"]:
+                            raise ValueError("move_to_buffer action must specify target buffer slot")
+                        slot = action["to"]["slot"]
+                        if slot not in BUFFER_SLOTS:
+                            raise ValueError(f"Invalid buffer slot: {slot}. Must be one of {list(BUFFER_SLOTS.keys())}")
+                    elif action_type == "move_from_buffer":
+                        if "from" not in action or "slot" not in action["from"]:
+                            raise ValueError("move_from_buffer action must specify source buffer slot")
+                        slot = action["from"]["slot"]
+                        if slot not in BUFFER_SLOTS:
+                            raise ValueError(f"Invalid buffer slot: {slot}. Must be one of {list(BUFFER_SLOTS.keys())}")
+
+            enforce_plan_consistency(plan)
+
+            if "final_expected" not in data:
+                raise ValueError("Success status requires 'final_expected' field")
+
+            # 验证final_expected
+            if "final_expected" in data:
+                final_expected = data["final_expected"]
+                if "target_structure" in final_expected:
+                    validate_target_structure_payload(final_expected["target_structure"])
+                elif "relationship" in final_expected and "placements" in final_expected:
+                    # 兼容旧格式
+                    validate_target_structure_payload({
+                        "relationship": final_expected["relationship"],
+                        "placements": final_expected["placements"]
+                    })
+        elif status == "blocked":
+            if "reason" not in data:
+                raise ValueError("Missing 'reason' key for blocked status")
+    else:
+        raise ValueError("JSON must contain either 'target_structure' (for relationship output) or 'status' (for action plan output)")
+
+    return data
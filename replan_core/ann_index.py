@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则向量索引（余弦相似度）
+- ExactIndex：暴力矩阵乘法，结果与 cosine_similarity + argsort 一致
+- IVFIndex：本地实现的倒排文件索引（球面 k-means 粗量化 + nprobe 个簇内精确打分），
+  支持增量插入与 .npz 持久化，只依赖 numpy
+- HnswIndex：可选，安装 hnswlib 时可用
+三者接口相同：add(vectors) / search(query, k) -> (ids, scores) / save(path) / load(path)
+
+基准（合成聚簇向量，在仓库根目录）：
+  python -m replan_core.ann_index --sizes 1000 10000 100000
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """按分数降序返回前 k 个位置。"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class ExactIndex:
+    """暴力余弦检索（基准与小知识库）。"""
+    kind = "exact"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def add(self, vectors: np.ndarray) -> None:
+        self.vectors = np.vstack([self.vectors, _normalize(vectors)])
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.vectors @ _normalize(query)[0]
+        ids = _top_k(scores, k)
+        return ids, scores[ids]
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, vectors=self.vectors)
+
+    @classmethod
+    def load(cls, path: Path) -> "ExactIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data["vectors"].shape[1])
+            index.vectors = data["vectors"]
+        return index
+
+
+class IVFIndex:
+    """倒排文件索引：向量按最近质心分簇，查询时只对最近的 nprobe 个簇精确打分。"""
+    kind = "ivf"
+
+    def __init__(self, dim: int, nlist: Optional[int] = None, nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.assign = np.zeros(0, dtype=np.int32)
+        self._lists: Optional[List[np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @staticmethod
+    def default_nlist(count: int) -> int:
+        return max(1, int(round(2 * np.sqrt(count))))
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, sample: int = 32) -> None:
+        """球面 k-means；每个簇最多取 sample 个训练点以限制耗时。"""
+        vectors = _normalize(vectors)
+        nlist = min(self.nlist or self.default_nlist(len(vectors)), len(vectors))
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > nlist * sample:
+            vectors = vectors[rng.choice(len(vectors), nlist * sample, replace=False)]
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._nearest(vectors, centroids)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums[~empty] = np.add.reduceat(vectors[order], starts[~empty], axis=0)
+            # 空簇重新随机取点
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = _normalize(sums)
+        self.nlist = nlist
+        self.centroids = centroids
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return labels
+
+    def add(self, vectors: np.ndarray) -> None:
+        """增量插入；首次插入时用这批向量训练质心。"""
+        vectors = _normalize(vectors)
+        if self.centroids is None:
+            self.train(vectors)
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.assign = np.concatenate([self.assign, self._nearest(vectors, self.centroids)])
+        self._lists = None
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            bounds = np.searchsorted(self.assign[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        return self._lists
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = _normalize(query)[0]
+        lists = self._inverted_lists()
+        probes = _top_k(self.centroids @ query, nprobe or self.nprobe)
+        candidates = np.concatenate([lists[p] for p in probes])
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: Path) -> None:
+        np.savez(path, kind=self.kind, centroids=self.centroids, vectors=self.vectors,
+                 assign=self.assign, nprobe=self.nprobe)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data["centroids"]
+            index = cls(centroids.shape[1], nlist=centroids.shape[0], nprobe=int(data["nprobe"]))
+            index.centroids = centroids
+            index.vectors = data["vectors"]
+            index.assign = data["assign"]
+        return index
+
+
+class HnswIndex:
+    """hnswlib 封装（可选依赖）。"""
+    kind = "hnsw"
+
+    def __init__(self, dim: int, max_elements: int = 1024, ef_construction: int = 200, M: int = 16, ef: int = 64):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("HnswIndex requires hnswlib (pip install hnswlib); use IVFIndex otherwise") from e
+        self.dim = dim
+        self.ef = ef
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=max_elements, ef_construction=ef_construction, M=M)
+        self._index.set_ef(ef)
+
+    def __len__(self) -> int:
+        return self._index.get_current_count()
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = _normalize(vectors)
+        needed = len(self) + len(vectors)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, np.arange(len(self), needed))
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        self._index.set_ef(max(self.ef, k))
+        labels, distances = self._index.knn_query(_normalize(query), k=k)
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def save(self, path: Path) -> None:
+        self._index.save_index(str(path))
+
+    @classmethod
+    def load(cls, path: Path, dim: int) -> "HnswIndex":
+        import hnswlib
+        index = cls.__new__(cls)
+        index.dim = dim
+        index.ef = 64
+        index._index = hnswlib.Index(space="cosine", dim=dim)
+        index._index.load_index(str(path))
+        index._index.set_ef(index.ef)
+        return index
+
+
+INDEX_TYPES = {"exact": ExactIndex, "ivf": IVFIndex, "hnsw": HnswIndex}
+
+
+def build_index(kind: str, vectors: np.ndarray, **kwargs):
+    """按类型构建并填充索引。"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}. Must be one of {list(INDEX_TYPES.keys())}")
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == "hnsw":
+        kwargs.setdefault("max_elements", max(1, len(vectors)))
+    index = INDEX_TYPES[kind](vectors.shape[1], **kwargs)
+    index.add(vectors)
+    return index
+
+
+def recall_at_k(index, exact: ExactIndex, queries: np.ndarray, k: int) -> float:
+    """ANN 结果与精确检索前 k 个结果的平均重合率。"""
+    hits = 0
+    for query in queries:
+        expected = set(exact.search(query, k)[0].tolist())
+        hits += len(expected & set(index.search(query, k)[0].tolist()))
+    return hits / (k * len(queries))
+
+
+def synthetic_chunks(count: int, dim: int, clusters: int = 200, noise: float = 1.0, seed: int = 0) -> np.ndarray:
+    """围绕随机主题中心的聚簇向量，近似真实规则分块的分布。"""
+    rng = np.random.default_rng(seed)
+    centers = _normalize(np.random.default_rng(12345).standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, count)
+    offsets = rng.standard_normal((count, dim)).astype(np.float32) * (noise / np.sqrt(dim))
+    return _normalize(centers[labels] + offsets)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ANN rule indexes against exact cosine search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--k", type=int, default=7, help="results per query (retrieval uses top_k + 2)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--hnsw", action="store_true", help="also benchmark hnswlib (must be installed)")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        vectors = synthetic_chunks(size, args.dim)
+        queries = synthetic_chunks(args.queries, args.dim, seed=1)
+
+        start = time.perf_counter()
+        exact = build_index("exact", vectors)
+        exact_build = (time.perf_counter() - start) * 1000.0
+        start = time.perf_counter()
+        for query in queries:
+            exact.search(query, args.k)
+        exact_us = (time.perf_counter() - start) / len(queries) * 1e6
+        print(f"[ANN] n={size:>6} exact           build {exact_build:>8.1f} ms  query {exact_us:>8.1f} us  recall@{args.k} 1.000")
+
+        start = time.perf_counter()
+        ivf = build_index("ivf", vectors)
+        ivf_build = (time.perf_counter() - start) * 1000.0
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            start = time.perf_counter()
+            for query in queries:
+                ivf.search(query, args.k)
+            ivf_us = (time.perf_counter() - start) / len(queries) * 1e6
+            recall = recall_at_k(ivf, exact, queries, args.k)
+            print(f"[ANN] n={size:>6} ivf nlist={ivf.nlist:<4} nprobe={nprobe:<3} build {ivf_build:>8.1f} ms  "
+                  f"query {ivf_us:>8.1f} us  recall@{args.k} {recall:.3f}")
+
+        if args.hnsw:
+            start = time.perf_counter()
+            hnsw = build_index("hnsw", vectors)
+            hnsw_build = (time.perf_counter() - start) * 1000.0
+            start = time.perf_counter()
+            for query in queries:
+                hnsw.search(query, args.k)
+            hnsw_us = (time.perf_counter() - start) / len(queries) * 1e6
+            recall = recall_at_k(hnsw, exact, queries, args.k)
+            print(f"[ANN] n={size:>6} hnsw            build {hnsw_build:>8.1f} ms  query {hnsw_us:>8.1f} us  recall@{args.k} {recall:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
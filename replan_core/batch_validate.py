@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+replan-validate：离线批量重新验证已记录的模型输出
+规则或验证器变化后，对积累的 JSONL 日志逐条重新判定：
+  输入每行 {target_spec, current_state, raw_output, id?, output_format?}
+  （raw_output 也可写作 output；output_format 缺省为 --output-format）
+- 按 chunk 分发到 ProcessPoolExecutor，同时在途的 chunk 数有上限，结果按输入顺序写出：
+  内存占用只与 chunk 大小和进程数有关，与文件大小无关
+- 每条记录的判定写入 --output（JSONL）：parsed / valid / consistent / executable 与全部错误
+- 错误直方图写入 --histogram（JSONL，每行 {stage, error, count}）；错误文本中的对象名与数字被归一化
+
+用法（在仓库根目录）：
+  python -m replan_core.batch_validate outputs.jsonl --output verdicts.jsonl --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Any, Optional, TextIO, Tuple
+
+from .compact_output import parse_compact, expand_compact
+from .json_extract import extract_json
+from .plan_simulator import simulate_plan
+from .validation import output_errors, validate_target_consistency
+
+_STEP_PREFIX = re.compile(r"^(step|action) \S+: ")
+_QUOTED = re.compile(r"'[^']*'")
+_NUMBER = re.compile(r"\d+")
+_LIST = re.compile(r"\[[^\]]*\]|\{[^}]*\}")
+
+
+def error_kind(message: str) -> str:
+    """错误文本归一化为直方图键：去掉步骤前缀，对象名/位置/数字/列表替换为占位符。"""
+    text = _STEP_PREFIX.sub("", message)
+    text = _LIST.sub("[…]", text)
+    text = _QUOTED.sub("'…'", text)
+    return _NUMBER.sub("N", text)
+
+
+def check_record(record: Dict[str, Any], default_format: str = "full") -> Dict[str, Any]:
+    """判定一条记录，返回 {id, parsed, valid, consistent, executable, errors: [{stage, message}]}。"""
+    verdict: Dict[str, Any] = {"id": record.get("id", record.get("case_id")), "parsed": False, "valid": False,
+                               "consistent": None, "executable": None, "errors": []}
+    raw = record.get("raw_output", record.get("output"))
+    target_spec = record.get("target_spec")
+    current_state = record.get("current_state")
+    if not isinstance(raw, str) or not isinstance(target_spec, dict) or not isinstance(current_state, dict):
+        verdict["errors"].append({"stage": "input", "message": "record needs raw_output, target_spec and current_state"})
+        return verdict
+
+    try:
+        if record.get("output_format", default_format) == "compact":
+            data = expand_compact(parse_compact(raw), current_state, target_spec)
+        else:
+            data = extract_json(raw)
+    except ValueError as e:
+        verdict["errors"].append({"stage": "parse", "message": str(e)})
+        return verdict
+    verdict["parsed"] = True
+
+    errors = output_errors(data)
+    verdict["errors"].extend({"stage": "validate", "message": message} for message in errors)
+    verdict["valid"] = not errors
+    if errors or data.get("status") != "success":
+        return verdict
+
+    captured = io.StringIO()
+    with contextlib.redirect_stdout(captured):
+        verdict["consistent"] = bool(validate_target_consistency(data, target_spec))
+    if not verdict["consistent"]:
+        reasons = [line[len("[CONSISTENCY] "):] for line in captured.getvalue().splitlines()
+                   if line.startswith("[CONSISTENCY] ")]
+        verdict["errors"].append({"stage": "consistency", "message": reasons[-1] if reasons else "inconsistent"})
+
+    simulation = simulate_plan(data.get("plan", []), current_state, target_spec)
+    verdict["executable"] = simulation["ok"]
+    verdict["errors"].extend({"stage": "simulate", "message": message} for message in simulation["errors"])
+    return verdict
+
+
+def validate_chunk(lines: List[Tuple[int, str]], default_format: str = "full") -> List[Dict[str, Any]]:
+    """worker：逐行解析记录并判定（JSON 解码也在 worker 中进行）。"""
+    verdicts = []
+    for line_no, line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            verdict = {"id": None, "parsed": False, "valid": False, "consistent": None, "executable": None,
+                       "errors": [{"stage": "input", "message": f"invalid JSONL record: {e}"}]}
+        else:
+            verdict = check_record(record if isinstance(record, dict) else {}, default_format)
+        verdict["line"] = line_no
+        verdicts.append(verdict)
+    return verdicts
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[List[Tuple[int, str]]]:
+    numbered = ((line_no, line) for line_no, line in enumerate(lines, start=1) if line.strip())
+    while True:
+        chunk = list(itertools.islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(lines: Iterable[str], out: TextIO, workers: int = 0, chunk_size: int = 256,
+        default_format: str = "full", max_in_flight: Optional[int] = None) -> Dict[str, Any]:
+    """流式判定 lines，按输入顺序把每条判定写入 out，返回 {records, parsed, valid, consistent, executable, histogram}。"""
+    totals = Counter()
+    histogram: Counter = Counter()
+
+    def consume(verdicts: List[Dict[str, Any]]) -> None:
+        for verdict in verdicts:
+            totals["records"] += 1
+            for key in ("parsed", "valid", "consistent", "executable"):
+                totals[key] += bool(verdict[key])
+            for error in verdict["errors"]:
+                histogram[(error["stage"], error_kind(error["message"]))] += 1
+            out.write(json.dumps(verdict, ensure_ascii=False) + "\n")
+
+    chunks = _chunks(lines, chunk_size)
+    if workers <= 0:
+        for chunk in chunks:
+            consume(validate_chunk(chunk, default_format))
+    else:
+        # 以模块路径引用任务函数：作为 python -m 运行时本文件是 __main__，其中的函数无法按名称 pickle
+        from .batch_validate import validate_chunk as task
+
+        limit = max_in_flight or 2 * workers
+        with ProcessPoolExecutor(workers) as executor:
+            pending: deque = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(task, chunk, default_format))
+                # 在途 chunk 达到上限时先写出最早的结果（背压）
+                if len(pending) >= limit:
+                    consume(pending.popleft().result())
+            while pending:
+                consume(pending.popleft().result())
+
+    summary = {key: totals[key] for key in ("records", "parsed", "valid", "consistent", "executable")}
+    summary["histogram"] = [
+        {"stage": stage, "error": kind, "count": count} for (stage, kind), count in histogram.most_common()
+    ]
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="replan-validate",
+                                     description="Re-validate logged model outputs (JSONL) in bulk")
+    parser.add_argument("input", help="JSONL of {target_spec, current_state, raw_output} records ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="per-record verdicts JSONL (default: stdout)")
+    parser.add_argument("--histogram", help="error histogram JSONL (default: <output>.errors.jsonl, stderr for stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (0: in-process)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="records per task sent to a worker")
+    parser.add_argument("--output-format", choices=["full", "compact"], default="full",
+                        help="format of raw_output when a record does not say")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        source = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, "r", encoding="utf-8"))
+        out = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+        summary = run(source, out, args.workers, args.chunk_size, args.output_format)
+    elapsed = time.perf_counter() - start
+
+    histogram_path = args.histogram or (None if args.output == "-" else re.sub(r"\.jsonl$", "", args.output) + ".errors.jsonl")
+    with (open(histogram_path, "w", encoding="utf-8") if histogram_path else contextlib.nullcontext(sys.stderr)) as f:
+        for row in summary["histogram"]:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    records = summary["records"] or 1
+    print(f"[VALIDATE] {summary['records']} records in {elapsed:.2f} s ({summary['records'] / elapsed:.0f}/s, "
+          f"{args.workers} workers): parsed {summary['parsed'] / records:.1%}  valid {summary['valid'] / records:.1%}  "
+          f"consistent {summary['consistent'] / records:.1%}  executable {summary['executable'] / records:.1%}",
+          file=sys.stderr)
+    for row in summary["histogram"][:10]:
+        print(f"[VALIDATE] {row['count']:>8d}  {row['stage']:<11s} {row['error']}", file=sys.stderr)
+    if histogram_path:
+        print(f"[VALIDATE] Error histogram written to {histogram_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planner Benchmark - 整条规划流水线的离线基准测试
+- 语料：scenario_corpus 生成（或 --corpus 指定 JSONL）
+- 后端：ReplayLLMBackend 回放参考输出 / 录制输出，无需 GPU 或网络
+  （embedding 模型需已在本地缓存，可设置 HF_HUB_OFFLINE=1）；--backend transformers 使用真实模型
+- 配置档：--profile 可重复指定，多个模型共享同一 ReplanRAGSystem 并排对比
+- 计时：按阶段统计自身耗时（不含子阶段），输出机器可读 JSON，可用 --compare 与旧结果对比
+
+用法（在仓库根目录）：
+  python -m replan_core.benchmark --output bench_results.json
+  python -m replan_core.benchmark --output new.json --compare bench_results.json
+  python -m replan_core.benchmark --profile qwen3-4b-fp8 --profile smollm3 --backend transformers
+  python -m replan_core.benchmark --profile qwen3-4b-fp8 --profile qwen3-4b-cpu --backend transformers  # CPU 对比 tokens/s
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import functools
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Callable
+
+from .compact_output import compact_from_output, parse_model_output
+from .config import EMBEDDING_MODEL
+from .llm_backends import ReplayLLMBackend, prompt_key
+from .plan_simulator import simulate_plan
+from .profiles import PROFILES, DEFAULT_PROFILE, ModelProfile, get_profile
+from .rag_system import ReplanRAGSystem, build_user_prompt
+from .scenario_corpus import generate_corpus, load_corpus
+from .validation import validate_target_consistency
+
+# 被计时的 ReplanRAGSystem 方法 -> 阶段名
+INSTRUMENTED_METHODS = {
+    "build_rag_prompt": "build_prompt",
+    "retrieve_and_filter_rules": "retrieve",
+    "classify_scenario_by_embedding": "classify",
+    "retrieve_relevant_rules": "rule_search",
+    "_analyze_replacement_complexity": "complexity",
+}
+
+
+class StageProfiler:
+    """按阶段累计自身耗时（嵌套调用时从父阶段扣除子阶段耗时）。"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self._children: List[float] = []
+
+    def reset(self) -> None:
+        self.totals = defaultdict(float)
+        self._children = []
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = self._children.pop()
+                self.totals[stage] += elapsed - child_time
+                if self._children:
+                    self._children[-1] += elapsed
+        return wrapper
+
+    def instrument(self, obj: Any, methods: Dict[str, str]) -> None:
+        for attr, stage in methods.items():
+            setattr(obj, attr, self.wrap(stage, getattr(obj, attr)))
+
+    def snapshot_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000.0, 4) for stage, seconds in self.totals.items()}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_case(rag_system: ReplanRAGSystem, backend, profiler: StageProfiler, case: Dict[str, Any],
+             profile: ModelProfile = DEFAULT_PROFILE) -> Dict[str, Any]:
+    """运行单个用例（与 generate_replan 相同的阶段），返回计时与正确性指标。"""
+    target_spec = case["target_spec"]
+    current_state = case["current_state"]
+    record: Dict[str, Any] = {"case_id": case["case_id"], "category": case.get("category"), "profile": profile.name}
+
+    generate = profiler.wrap("generate", backend.generate)
+    parse = profiler.wrap("parse", parse_model_output)
+    consistency = profiler.wrap("consistency", validate_target_consistency)
+    simulate = profiler.wrap("simulate", simulate_plan)
+
+    profiler.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        record["replacement_type"] = rag_system._analyze_replacement_complexity(target_spec, current_state)
+        system_prompt, user_prompt = rag_system.build_rag_prompt(target_spec, current_state, profile=profile)
+        budget = rag_system.last_prompt_report
+        record["prompt_budget"] = budget
+        record["scenario"] = budget["scenario"]
+        record["rule_count"] = budget["rules_retrieved"]
+        raw = generate(system_prompt, user_prompt, budget["max_new_tokens"])
+        last_generation = getattr(backend, "last_generation", None)
+        if last_generation and last_generation["seconds"] > 0:
+            record["generated_tokens"] = last_generation["new_tokens"]
+            record["tokens_per_s"] = round(last_generation["new_tokens"] / last_generation["seconds"], 4)
+        record["output_chars"] = len(raw)
+        try:
+            result = parse(raw, target_spec, current_state, profile.output_format)
+            record["parsed"] = True
+        except Exception as e:
+            result = None
+            record["parsed"] = False
+            record["parse_error"] = str(e)
+
+        if result is not None:
+            record["consistent"] = bool(consistency(result, target_spec))
+            plan = result.get("plan") or []
+            sim = simulate(plan, current_state, target_spec)
+            record["executable"] = sim["ok"]
+            record["action_count"] = len(plan)
+            if not sim["ok"]:
+                record["simulation_errors"] = sim["errors"]
+    record["total_ms"] = round((time.perf_counter() - start) * 1000.0, 4)
+    record["stages_ms"] = profiler.snapshot_ms()
+    record["system_prompt_chars"] = len(system_prompt)
+    record["user_prompt_chars"] = len(user_prompt)
+    return record
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """聚合每个阶段的 mean/p50/p95 以及正确性比率。"""
+    stage_values: Dict[str, List[float]] = defaultdict(list)
+    for record in records:
+        for stage, ms in record["stages_ms"].items():
+            stage_values[stage].append(ms)
+        stage_values["total"].append(record["total_ms"])
+
+    stages = {}
+    for stage, values in stage_values.items():
+        stages[stage] = {
+            "mean_ms": round(statistics.mean(values), 4),
+            "p50_ms": round(_percentile(values, 50), 4),
+            "p95_ms": round(_percentile(values, 95), 4),
+            "sum_ms": round(sum(values), 4),
+        }
+
+    def rate(key: str) -> float:
+        return round(sum(1 for r in records if r.get(key)) / len(records), 4) if records else 0.0
+
+    histogram: Dict[str, Dict[str, int]] = {"scenario": defaultdict(int), "replacement_type": defaultdict(int)}
+    for record in records:
+        histogram["scenario"][record.get("scenario", "unknown")] += 1
+        histogram["replacement_type"][record.get("replacement_type", "unknown")] += 1
+
+    throughput = [r["tokens_per_s"] for r in records if "tokens_per_s" in r]
+    budgets = [r["prompt_budget"] for r in records if r.get("prompt_budget")]
+    output_chars = [r["output_chars"] for r in records if "output_chars" in r]
+
+    return {
+        "cases": len(records),
+        "stages": stages,
+        "tokens_per_s": round(statistics.mean(throughput), 4) if throughput else None,
+        "prompt_tokens": {
+            "system_mean": round(statistics.mean(b["system_tokens"] for b in budgets), 1),
+            "system_max": max(b["system_tokens"] for b in budgets),
+            "max_new_tokens_mean": round(statistics.mean(b["max_new_tokens"] for b in budgets), 1),
+            "rules_dropped": sum(len(b["rules_dropped"]) for b in budgets),
+            "over_budget": sum(1 for b in budgets if b["over_budget"]),
+        } if budgets else None,
+        "output_chars_mean": round(statistics.mean(output_chars), 1) if output_chars else None,
+        "parse_rate": rate("parsed"),
+        "consistency_rate": rate("consistent"),
+        "executable_rate": rate("executable"),
+        "scenario_histogram": dict(histogram["scenario"]),
+        "replacement_type_histogram": dict(histogram["replacement_type"]),
+    }
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """对比两次基准结果：阶段耗时变化与逐用例的标签/正确性变化。"""
+    lines = [f"Comparing {old['meta'].get('commit')} -> {new['meta'].get('commit')}"]
+    old_stages = old["summary"]["stages"]
+    for stage, stats in sorted(new["summary"]["stages"].items()):
+        before = old_stages.get(stage, {}).get("mean_ms")
+        if before:
+            delta = (stats["mean_ms"] - before) / before * 100.0
+            lines.append(f"  {stage:<14} {before:>10.3f} ms -> {stats['mean_ms']:>10.3f} ms ({delta:+.1f}%)")
+        else:
+            lines.append(f"  {stage:<14} {'new':>10} -> {stats['mean_ms']:>10.3f} ms")
+
+    for key in ("parse_rate", "consistency_rate", "executable_rate", "tokens_per_s"):
+        if old["summary"].get(key) != new["summary"].get(key):
+            lines.append(f"  {key}: {old['summary'].get(key)} -> {new['summary'].get(key)}")
+
+    old_cases = {(r.get("profile"), r["case_id"]): r for r in old["cases"]}
+    for record in new["cases"]:
+        before = old_cases.get((record.get("profile"), record["case_id"]))
+        if not before:
+            continue
+        for key in ("scenario", "replacement_type", "parsed", "consistent", "executable", "rule_count"):
+            if before.get(key) != record.get(key):
+                lines.append(f"  [{record.get('profile')}:{record['case_id']}] {key}: {before.get(key)} -> {record.get(key)}")
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the replan RAG planner")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    parser.add_argument("--replay", help="recorded outputs JSONL from RecordingBackend (default: corpus reference outputs)")
+    parser.add_argument("--output", help="write machine-readable results JSON to this path")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--filter", help="only run cases whose case_id contains this substring")
+    parser.add_argument("--repeat", type=int, default=1, help="run the corpus N times (timings are per run)")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="model profile(s) to benchmark side by side")
+    parser.add_argument("--backend", choices=["replay", "transformers"], default="replay", help="LLM backend")
+    parser.add_argument("--torch-dtype", choices=["float32", "bfloat16", "float16"],
+                        help="override the profile's torch dtype (int8 quantization only applies to float32)")
+    parser.add_argument("--output-format", choices=["full", "compact"],
+                        help="override the profiles' output format (compact replays compacted reference outputs)")
+    parser.add_argument("--router", nargs="?", const="", help="also run the corpus through ModelRouter (optional config JSON path)")
+    args = parser.parse_args()
+    profiles = [get_profile(name) for name in (args.profile or [DEFAULT_PROFILE.name])]
+    if args.torch_dtype:
+        profiles = [dataclasses.replace(p, torch_dtype=args.torch_dtype) for p in profiles]
+    if args.output_format:
+        profiles = [dataclasses.replace(p, output_format=args.output_format) for p in profiles]
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    if args.filter:
+        cases = [c for c in cases if args.filter in c["case_id"]]
+
+    def make_backend(profile: ModelProfile):
+        if args.backend == "transformers":
+            from .transformers_backend import TransformersChatBackend
+            return TransformersChatBackend(profile)
+        if args.replay:
+            return ReplayLLMBackend.from_jsonl(args.replay)
+        if profile.output_format == "compact":
+            return ReplayLLMBackend({
+                prompt_key(build_user_prompt(c["target_spec"], c["current_state"])):
+                    json.dumps(compact_from_output(json.loads(c["reference_output"])), ensure_ascii=False)
+                for c in cases
+            })
+        return ReplayLLMBackend({
+            prompt_key(build_user_prompt(c["target_spec"], c["current_state"])): c["reference_output"]
+            for c in cases
+        })
+
+    init_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag_system = ReplanRAGSystem(profiles[0])
+    init_ms = (time.perf_counter() - init_start) * 1000.0
+
+    profiler = StageProfiler()
+    profiler.instrument(rag_system, INSTRUMENTED_METHODS)
+
+    records: List[Dict[str, Any]] = []
+    backend_names = {}
+    for profile in profiles:
+        backend = make_backend(profile)
+        backend_names[profile.name] = backend.name
+        for run in range(args.repeat):
+            for case in cases:
+                record = run_case(rag_system, backend, profiler, case, profile)
+                record["run"] = run
+                records.append(record)
+
+    router_stats = None
+    if args.router is not None:
+        from .router import ModelRouter, RouterConfig
+        config = RouterConfig.load(args.router or None)
+        router = ModelRouter(rag_system, {
+            name: make_backend(get_profile(name)) for name in (config.small_profile, config.large_profile)
+        }, config)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for case in cases:
+                router.plan(case["target_spec"], case["current_state"])
+        router_stats = router.stats()
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "profiles": {p.name: p.model_name for p in profiles},
+            "torch_dtypes": {p.name: p.torch_dtype for p in profiles},
+            "output_formats": {p.name: p.output_format for p in profiles},
+            "embedding_model": EMBEDDING_MODEL,
+            "retrieval_mode": rag_system.retrieval_mode,
+            "backends": backend_names,
+            "init_ms": round(init_ms, 4),
+            "embedding_model_loaded": rag_system._embedding_model is not None,
+            "query_cache": rag_system.query_cache.stats(),
+            "repeat": args.repeat,
+        },
+        "summary": summarize(records),
+        "profile_summaries": {
+            p.name: summarize([r for r in records if r["profile"] == p.name]) for p in profiles
+        },
+        "cases": records,
+    }
+    if router_stats is not None:
+        results["router"] = router_stats
+
+    summary = results["summary"]
+    print(f"[BENCH] {summary['cases']} runs, init {init_ms:.1f} ms, "
+          f"query cache hit rate {results['meta']['query_cache']['hit_rate']:.1%}")
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["sum_ms"]):
+        print(f"  {stage:<14} mean {stats['mean_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms")
+    for name, profile_summary in results["profile_summaries"].items():
+        print(f"[BENCH] {name}: parse {profile_summary['parse_rate']:.1%}  "
+              f"consistent {profile_summary['consistency_rate']:.1%}  "
+              f"executable {profile_summary['executable_rate']:.1%}  "
+              f"mean total {profile_summary['stages']['total']['mean_ms']:.3f} ms"
+              + (f"  {profile_summary['tokens_per_s']:.1f} tok/s" if profile_summary["tokens_per_s"] else ""))
+
+    if router_stats is not None:
+        for route, stats in router_stats["routes"].items():
+            print(f"[ROUTER] {route}: {stats['attempts']} attempts  success {stats['success_rate']:.1%}  "
+                  f"mean {stats['mean_ms']:.3f} ms")
+        print(f"[ROUTER] escalations: {router_stats['escalations']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"[BENCH] Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare_results(baseline, results)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
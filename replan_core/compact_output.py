@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑输出格式（可选，ModelProfile.output_format = "compact"）
+完整格式中每个动作都要重复 step/action/from/to 键名与 reason 文本，success 输出还要在
+final_expected 中再写一遍目标结构；解码时间与输出 token 数成正比。
+紧凑格式中模型只输出动作列表，服务端展开为完整格式：
+  [["B", "red cube", "stack:top", "B1"], ["M", "blue cube", "scattered", "stack:top"]]
+- 操作码：M = move_to_position，B = move_to_buffer，U = move_from_buffer
+- 端点："scattered"、"stack:<position>"、"arr:<position>"、缓冲槽（config.BUFFER_SLOTS，默认 "B1"/"B2"/"B3"）
+- 无法完成时输出 {"blocked": "<reason>"}
+- final_expected 由 CubeWorld 执行计划后的世界状态推导（不再由模型声明），计划不可执行时展开失败
+展开结果与完整格式一样经过 validate_output_data 验证。
+
+输出 token 数与解码时间对比（在仓库根目录）：
+  python -m replan_core.compact_output
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from typing import Dict, List, Any, Union
+
+from .config import BUFFER_SLOTS
+from .json_extract import extract_json
+from .plan_simulator import CubeWorld, SimulationError, split_structure
+from .validation import parse_and_validate, validate_output_data
+
+OPCODES = {"M": "move_to_position", "B": "move_to_buffer", "U": "move_from_buffer"}
+ACTION_CODES = {name: code for code, name in OPCODES.items()}
+ENDPOINT_PREFIXES = {"stack": "stack", "arr": "arrangement"}
+
+DEFAULT_REASONS = {
+    "move_to_position": "Place object at target position",
+    "move_to_buffer": "Temporarily store object needed later",
+    "move_from_buffer": "Retrieve object from buffer",
+}
+REMOVE_REASON = "Remove object not in target"
+
+# 追加在系统提示词末尾（规则之后），覆盖前文的完整输出模板
+COMPACT_OUTPUT_PROMPT = [
+    "",
+    "🔴 === OUTPUT FORMAT: COMPACT (overrides every output template above) === 🔴",
+    "Output ONLY a JSON array of actions. No status, no reason text, no final_expected.",
+    'Each action is [op, object, from, to]:',
+    '- op: "M" = move_to_position, "B" = move_to_buffer, "U" = move_from_buffer',
+    '- from/to: "scattered", "stack:<position>", "arr:<position>", or a buffer slot ' + "/".join(f'"{slot}"' for slot in BUFFER_SLOTS),
+    '- stack positions: bottom/middle/top (pyramid: bottom left/bottom right/top); arr positions: left/right/front/back/middle',
+    'Example: [["B", "red cube", "stack:top", "B1"], ["M", "green cube", "scattered", "stack:top"]]',
+    'If the task cannot be done output {"blocked": "<reason>"}.',
+]
+
+
+def encode_endpoint(endpoint: Dict[str, Any]) -> str:
+    """完整格式端点 -> 紧凑字符串。"""
+    kind = (endpoint or {}).get("type")
+    if kind == "scattered":
+        return "scattered"
+    if kind == "buffer":
+        return endpoint["slot"]
+    if kind == "stack":
+        return f"stack:{endpoint['position']}"
+    if kind == "arrangement":
+        return f"arr:{endpoint['position']}"
+    raise ValueError(f"Cannot encode endpoint: {endpoint}")
+
+
+def decode_endpoint(text: Any) -> Dict[str, Any]:
+    """紧凑字符串 -> 完整格式端点。"""
+    if not isinstance(text, str):
+        raise ValueError(f"Endpoint must be a string, got {text!r}")
+    value = text.strip()
+    if value.lower() == "scattered":
+        return {"type": "scattered"}
+    if value.upper() in BUFFER_SLOTS:
+        return {"type": "buffer", "slot": value.upper()}
+    prefix, sep, position = value.partition(":")
+    if sep and prefix.strip().lower() in ENDPOINT_PREFIXES and position.strip():
+        return {"type": ENDPOINT_PREFIXES[prefix.strip().lower()], "position": position.strip()}
+    raise ValueError(f"Invalid endpoint {text!r}: expected scattered, stack:<pos>, arr:<pos> or {list(BUFFER_SLOTS)}")
+
+
+def compact_from_output(output: Dict[str, Any]) -> Union[List[List[str]], Dict[str, Any]]:
+    """完整格式输出 -> 紧凑格式（用于回放参考输出与对比输出长度）。"""
+    if output.get("status") == "blocked":
+        return {"blocked": output.get("reason", "")}
+    return [
+        [ACTION_CODES[action["action"]], action["object"], encode_endpoint(action["from"]), encode_endpoint(action["to"])]
+        for action in output.get("plan", [])
+    ]
+
+
+def parse_compact(text: str) -> Union[List[Any], Dict[str, Any]]:
+    """解析模型的紧凑输出：第一个完整的 JSON 数组或对象（跳过 <think>、代码块与说明文字）。"""
+    return extract_json(text, allow_array=True)
+
+
+def expand_compact(data: Union[List[Any], Dict[str, Any]], current_state: Dict[str, Any],
+                   target_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """紧凑格式 -> 完整格式；逐步执行计划，final_expected 取执行后的世界状态。"""
+    if isinstance(data, dict):
+        if "blocked" in data:
+            return {"status": "blocked", "reason": str(data["blocked"])}
+        if isinstance(data.get("plan"), list):
+            data = data["plan"]
+    if not isinstance(data, list):
+        raise ValueError("Compact output must be a JSON array of actions or {\"blocked\": reason}")
+
+    target_structure = (target_spec or {}).get("target_structure", {}) or {}
+    target = split_structure(target_structure)
+    pyramid_mode = target["relationship"] == "pyramid"
+    world = CubeWorld(current_state, target_site=target["site"])
+
+    plan: List[Dict[str, Any]] = []
+    for step, entry in enumerate(data, start=1):
+        if not isinstance(entry, list) or len(entry) != 4:
+            raise ValueError(f"Compact action {step} must be [op, object, from, to], got {entry!r}")
+        op, obj, source, destination = entry
+        name = OPCODES.get(str(op).strip().upper())
+        if name is None:
+            raise ValueError(f"Compact action {step}: unknown op {op!r}, expected one of {list(OPCODES)}")
+        if not isinstance(obj, str) or not obj.strip():
+            raise ValueError(f"Compact action {step} must name an object")
+        action = {"step": step, "action": name, "object": obj.strip(),
+                  "from": decode_endpoint(source), "to": decode_endpoint(destination)}
+        if (name == "move_to_buffer") != (action["to"]["type"] == "buffer") or \
+                (name == "move_from_buffer") != (action["from"]["type"] == "buffer"):
+            raise ValueError(f"Compact action {step}: op {op!r} does not match endpoints {source!r} -> {destination!r}")
+        action["reason"] = REMOVE_REASON if action["to"]["type"] == "scattered" else DEFAULT_REASONS[name]
+        try:
+            world.apply(action, pyramid_mode=pyramid_mode)
+        except SimulationError as e:
+            raise ValueError(f"Compact plan not executable at step {step}: {e}") from e
+        plan.append(action)
+
+    return {
+        "status": "success",
+        "plan": plan,
+        "final_expected": {"target_structure": world.to_structure(target["relationship"])},
+    }
+
+
+def parse_model_output(raw: str, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                       output_format: str = "full") -> Dict[str, Any]:
+    """按配置档的输出格式解析并验证模型输出，返回完整格式。"""
+    if output_format == "compact":
+        return validate_output_data(expand_compact(parse_compact(raw), current_state, target_spec))
+    return parse_and_validate(raw)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Output tokens and decode time: full JSON vs compact action lists")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    parser.add_argument("--ms-per-token", type=float, default=25.0,
+                        help="decode time per output token used to estimate latency")
+    parser.add_argument("--rounds", type=int, default=20, help="timed parse/expand rounds per case")
+    args = parser.parse_args()
+
+    from .profiles import DEFAULT_PROFILE
+    from .prompt_budget import TokenCounter
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    with contextlib.redirect_stdout(io.StringIO()):
+        counter = TokenCounter.for_model(DEFAULT_PROFILE.model_name)
+
+    full_tokens, compact_tokens, full_us, compact_us = [], [], [], []
+    for case in cases:
+        full_raw = case["reference_output"]
+        compact_raw = json.dumps(compact_from_output(json.loads(full_raw)), ensure_ascii=False)
+        full_tokens.append(counter.count(full_raw))
+        compact_tokens.append(counter.count(compact_raw))
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            parse_model_output(full_raw, case["target_spec"], case["current_state"])
+        full_us.append((time.perf_counter() - start) / args.rounds * 1e6)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            parse_model_output(compact_raw, case["target_spec"], case["current_state"], "compact")
+        compact_us.append((time.perf_counter() - start) / args.rounds * 1e6)
+
+    full_mean = statistics.mean(full_tokens)
+    compact_mean = statistics.mean(compact_tokens)
+    tokenizer = counter.name if counter.exact else "estimated from characters"
+    print(f"[COMPACT] {len(cases)} reference outputs, tokens {tokenizer}")
+    print(f"[COMPACT] output tokens  full {full_mean:7.1f} mean / {max(full_tokens):4d} max   "
+          f"compact {compact_mean:6.1f} mean / {max(compact_tokens):4d} max   "
+          f"-{1 - compact_mean / full_mean:.1%}")
+    print(f"[COMPACT] decode at {args.ms_per_token:.0f} ms/token  full {full_mean * args.ms_per_token:7.0f} ms   "
+          f"compact {compact_mean * args.ms_per_token:6.0f} ms   "
+          f"saves {(full_mean - compact_mean) * args.ms_per_token:.0f} ms per request")
+    print(f"[COMPACT] server-side parse+validate  full {statistics.mean(full_us):6.1f} us   "
+          f"compact (expand + simulate + validate) {statistics.mean(compact_us):6.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+共享配置项 - 与具体语言模型无关的常量
+（模型相关的生成参数见 profiles.py）
+"""
+
+import os
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # 轻量级embedding模型
+KNOWLEDGE_BASE_DIR = "replan_rag_knowledge_base"
+TOP_K_RETRIEVAL = 5  # 检索前K个最相关的规则
+
+# 查询 embedding 磁盘缓存（REPLAN_QUERY_CACHE 可覆盖路径，设为空字符串则只用内存缓存）
+QUERY_CACHE_PATH = os.environ.get("REPLAN_QUERY_CACHE", "~/.cache/replan_core/query_embeddings.npz")
+QUERY_CACHE_MAX_ENTRIES = 4096
+
+# 近似最近邻规则索引（"ivf" / "hnsw"，REPLAN_ANN_INDEX 设置）；规则数低于阈值时仍用精确检索
+ANN_INDEX = os.environ.get("REPLAN_ANN_INDEX") or None
+ANN_MIN_RULES = 5000
+ANN_NPROBE = 8
+
+# 规则检索方式："hybrid"（稠密 + BM25，RRF 融合）或 "dense"（仅 embedding），REPLAN_RETRIEVAL 可覆盖
+RETRIEVAL_MODE = os.environ.get("REPLAN_RETRIEVAL", "hybrid")
+HYBRID_CANDIDATES = 20  # 每一路参与融合的候选数
+RRF_K = 60
+
+# 执行前去除验证通过计划中的多余动作（plan_optimizer），REPLAN_OPTIMIZE_PLANS=0 关闭
+OPTIMIZE_PLANS = os.environ.get("REPLAN_OPTIMIZE_PLANS", "1") != "0"
+
+# 目标关系注册了支撑图时由 graph_planner 直接构造计划、不调用语言模型，REPLAN_SYMBOLIC_PLANNING=0 关闭
+SYMBOLIC_PLANNING = os.environ.get("REPLAN_SYMBOLIC_PLANNING", "1") != "0"
+
+# 预定义Buffer槽位：两列网格（x 180/280，每行 y +40mm），REPLAN_BUFFER_SLOTS 设置槽位数（默认 B1/B2/B3）
+# 槽位数不随 MAX_STACK_HEIGHT 变化：N 层塔整塔倒序要暂放全部 N 个对象，默认三个槽位下四层及以上的倒序
+# 贪心参考规划（scenario_corpus）无解；plan_search 把多出的对象暂放到散落区，高塔提示词同样提示散落区
+BUFFER_SLOT_COUNT = int(os.environ.get("REPLAN_BUFFER_SLOTS", "3"))
+BUFFER_SLOTS = {f"B{i + 1}": [180 + 100 * (i % 2), 300 + 40 * (i // 2), 150] for i in range(BUFFER_SLOT_COUNT)}
+
+# 线性堆栈的最大层数（层标签见 stack_layers），REPLAN_MAX_STACK_HEIGHT 可覆盖
+MAX_STACK_HEIGHT = int(os.environ.get("REPLAN_MAX_STACK_HEIGHT", "10"))
+
+# 工作区锚点（与 BUFFER_SLOTS 同一坐标系，mm），用于估算机械臂移动距离与执行时间（travel_cost）
+STACK_ANCHOR = [230, 200, 150]  # 线性堆栈底层；单物体堆栈位于对应的排列位置
+ARRANGEMENT_ANCHORS = {
+    "left": [130, 200, 150],
+    "middle": [230, 200, 150],
+    "right": [330, 200, 150],
+    "front": [230, 140, 150],
+    "back": [230, 260, 150],
+    "bottom": [230, 140, 150],
+    "top": [230, 260, 150],
+}
+PYRAMID_ANCHORS = {
+    "bottom left": [205, 200, 150],
+    "bottom right": [255, 200, 150],
+    "top": [230, 200, 190],
+}
+SCATTERED_ANCHOR = [230, 80, 150]  # 散落区（取放对象的平均位置）
+HOME_POSITION = [230, 300, 300]
+CUBE_HEIGHT_MM = 40
+ARM_SPEED_MM_S = 200.0
+GRASP_SECONDS = 1.5  # 每次抓取或放下的固定耗时
+
+# 支持的关系类型
+SUPPORTED_RELATIONSHIPS = [
+    "stacked",
+    "stacked_left",
+    "stacked_middle",
+    "stacked_right",
+    "separated_left_right",
+    "separated_front_back",
+    "separate_horizontal",
+    "separate_vertical",
+    "stacked_and_separated_left",
+    "stacked_and_separated_right",
+    "pyramid",
+    "none"  # 无结构状态
+]
+
+# 涉及堆栈的关系类型（替换复杂度分析与堆栈规则注入）
+STACKING_RELATIONSHIPS = frozenset({
+    "stacked_left", "stacked_middle", "stacked_right",
+    "stacked", "stacked_and_separated_left", "stacked_and_separated_right"
+})
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+查询 embedding 缓存
+场景分类与规则检索的查询来自一小组重复出现的短语，按查询字符串缓存其 embedding：
+- 内存中按 LRU 淘汰，条目数上限 max_entries
+- 持久化为 .npz（keys + float32 矩阵 + embedding 模型名），原子替换写入
+- 只有缓存未命中时才调用 encoder（从而才加载 embedding 模型）
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional, Sequence
+
+import numpy as np
+
+from .config import EMBEDDING_MODEL
+
+
+class QueryEmbeddingCache:
+    """按查询字符串缓存 embedding 的 LRU 缓存，可持久化到磁盘。"""
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 4096, model_name: str = EMBEDDING_MODEL):
+        self.path = Path(path).expanduser() if path else None
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> None:
+        """读取持久化缓存；文件缺失、损坏或模型不一致时从空缓存开始。"""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model_name:
+                    print(f"[CACHE] Ignoring {self.path}: built with {data['model']}, current model is {self.model_name}")
+                    return
+                keys, vectors = data["keys"], data["vectors"]
+        except Exception as e:
+            print(f"[CACHE] Ignoring unreadable query cache {self.path}: {e}")
+            return
+        with self._lock:
+            # 文件按最久未用 -> 最近使用的顺序保存
+            for key, vector in zip(keys.tolist()[-self.max_entries:], vectors[-self.max_entries:]):
+                self._entries[key] = vector
+
+    def save(self) -> bool:
+        """有新条目时写回磁盘，返回是否写入。"""
+        if self.path is None or not self._dirty:
+            return False
+        with self._lock:
+            keys = list(self._entries.keys())
+            vectors = np.vstack(list(self._entries.values())) if keys else np.zeros((0, 0), dtype=np.float32)
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=np.array(keys, dtype=str), vectors=vectors.astype(np.float32),
+                     model=np.array(self.model_name))
+        tmp.replace(self.path)
+        return True
+
+    def encode(self, texts: Sequence[str], encoder: Callable[[List[str]], Any]) -> np.ndarray:
+        """返回与 texts 对齐的 embedding 矩阵；未命中的文本合并成一次 encoder 调用。"""
+        rows: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for text in texts:
+                vector = self._entries.get(text)
+                if vector is not None:
+                    self._entries.move_to_end(text)
+                    rows[text] = vector
+                    self.hits += 1
+                elif text not in rows and text not in missing:
+                    missing.append(text)
+                    self.misses += 1
+
+        if missing:
+            encoded = np.asarray(encoder(missing), dtype=np.float32)
+            with self._lock:
+                for text, vector in zip(missing, encoded):
+                    rows[text] = vector
+                    self._entries[text] = vector
+                    self._entries.move_to_end(text)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._dirty = True
+
+        return np.vstack([rows[text] for text in texts])
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
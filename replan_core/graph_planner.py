@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Graph Planner - 按关系注册表的支撑图直接构造坐标无关计划（不需要语言模型）
+- 节点：堆栈层 ("stack", 层序号)、排列位置 ("cell", position)、支撑图位置 ("graph", position)；
+  堆栈层按层序号对应同一物理位置，每层压在下一层上，其余支撑边来自 relationships.support_graph
+- 保留：对象正确且支撑它的节点全部保留的节点；其余对象在没有对象压在上面时自上而下取走：
+  目标不需要的对象移到散落区，目标节点已可放置时直接放入，否则放入第一个空闲缓冲槽
+- 放置：支撑节点全部就位的目标节点依次放入目标对象（自底向上）
+- 输出与 scenario_corpus.build_reference_output 相同格式，返回前用 plan_simulator 回放确认；
+  调用方（planner / router）与语言模型输出一样再经 plan_optimizer 去除多余动作
+目标关系没有支撑图（RelationshipSpec.supports 为 None，例如有专用提示词的 stacked 与两位置排列）
+或缓冲槽不够时抛出 GraphPlanningError，由语言模型处理。
+
+有支撑图的关系上的计划长度（优化前后与 A* 最短计划对比）与耗时
+（在仓库根目录；--pairs 可指定 scene_enumerator 的分片）：
+  python -m replan_core.graph_planner
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+from .plan_simulator import DEFAULT_BUFFER_SLOTS, simulate_plan, split_structure
+from .relationships import RELATIONSHIPS, support_graph
+from .stack_layers import layer_labels
+
+Node = Tuple[str, Any]
+
+
+class GraphPlanningError(ValueError):
+    """目标关系没有支撑图，或在支撑图上构造不出可执行的计划。"""
+
+
+def has_support_graph(relationship: Optional[str]) -> bool:
+    spec = RELATIONSHIPS.get(relationship)
+    return spec is not None and spec.supports is not None
+
+
+class _Layout:
+    """一个结构（target_structure）的节点 -> 对象、节点 -> 支撑节点、节点 -> 动作端点。"""
+
+    def __init__(self, structure: Dict[str, Any]):
+        parts = split_structure(structure or {})
+        self.site = parts["site"]
+        self.objects: Dict[Node, str] = {}
+        self.supports: Dict[Node, Tuple[Node, ...]] = {}
+        self.endpoints: Dict[Node, Dict[str, Any]] = {}
+        labels = parts["stack_labels"] or layer_labels(len(parts["stack"]))
+        for index, (label, obj) in enumerate(zip(labels, parts["stack"])):
+            node = ("stack", index)
+            self.objects[node] = obj
+            self.supports[node] = (("stack", index - 1),) if index else ()
+            self.endpoints[node] = {"type": "stack", "position": label}
+        for pos, obj in parts["cells"].items():
+            self.objects[("cell", pos)] = obj
+            self.supports[("cell", pos)] = ()
+            self.endpoints[("cell", pos)] = {"type": "arrangement", "position": pos}
+        graph = support_graph(parts["relationship"], parts["pyramid"]) or {}
+        for pos, obj in parts["pyramid"].items():
+            self.objects[("graph", pos)] = obj
+            self.supports[("graph", pos)] = tuple(("graph", below) for below in graph.get(pos, ()))
+            self.endpoints[("graph", pos)] = {"type": "stack", "position": pos}
+
+
+def plan_from_graph(target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                    buffer_slots=DEFAULT_BUFFER_SLOTS) -> Dict[str, Any]:
+    """按目标关系的支撑图构造可执行的计划，返回 {status, plan, final_expected}；不能构造时抛出 GraphPlanningError。"""
+    target_structure = (target_spec or {}).get("target_structure", {}) or {}
+    relationship = target_structure.get("relationship")
+    if not has_support_graph(relationship):
+        raise GraphPlanningError(f"Relationship '{relationship}' has no support graph")
+
+    target = _Layout(target_structure)
+    current = _Layout((current_state or {}).get("target_structure", {}) or {})
+    supports = {**current.supports, **target.supports}
+    needed = {obj: node for node, obj in target.objects.items()}
+    # 单物体堆栈换到另一个桌面位置时，原有堆栈层都不能保留
+    site_moves = bool(target.site and current.site != target.site)
+
+    occupied: Dict[Node, str] = dict(current.objects)
+    buffer: Dict[str, Optional[str]] = {slot: None for slot in buffer_slots}
+    kept: Dict[Node, bool] = {}
+
+    def is_kept(node: Node) -> bool:
+        if node not in kept:
+            kept[node] = (occupied.get(node) is not None and occupied[node] == target.objects.get(node)
+                          and not (site_moves and node[0] == "stack")
+                          and all(is_kept(below) for below in supports.get(node, ())))
+        return kept[node]
+
+    def placeable(node: Node) -> bool:
+        return node not in occupied and all(kept.get(below) for below in supports.get(node, ()))
+
+    plan: List[Dict[str, Any]] = []
+
+    def emit(obj: str, source: Dict[str, Any], to: Dict[str, Any], reason: str) -> None:
+        if to.get("type") == "buffer":
+            name = "move_to_buffer"
+        elif source.get("type") == "buffer":
+            name = "move_from_buffer"
+        else:
+            name = "move_to_position"
+        plan.append({"step": len(plan) + 1, "action": name, "object": obj, "from": copy.deepcopy(source),
+                     "to": copy.deepcopy(to), "reason": reason})
+
+    for node in list(occupied):
+        is_kept(node)
+
+    # 1. 自上而下取走未保留的对象（没有对象压在上面的节点才能取走）
+    while True:
+        resting = {below for node in occupied for below in supports.get(node, ())}
+        removable = sorted((node for node in occupied if not kept.get(node) and node not in resting), key=str)
+        if not removable:
+            break
+        node = removable[0]
+        obj = occupied.pop(node)
+        source = current.endpoints[node]
+        destination = needed.get(obj)
+        if obj not in needed:
+            emit(obj, source, {"type": "scattered"}, "Remove object not in target")
+        elif destination != node and placeable(destination):
+            occupied[destination] = obj
+            kept[destination] = True
+            emit(obj, source, target.endpoints[destination], "Move directly to target position")
+        else:
+            free = next((slot for slot, held in buffer.items() if held is None), None)
+            if free is None:
+                raise GraphPlanningError(f"No free buffer slot for '{obj}'")
+            buffer[free] = obj
+            emit(obj, source, {"type": "buffer", "slot": free}, "Temporarily store object needed later")
+    if any(not kept.get(node) for node in occupied):
+        raise GraphPlanningError("Support graph has a cycle")
+
+    # 2. 自底向上放置：支撑节点全部就位的目标节点
+    pending = [node for node in target.objects if not kept.get(node)]
+    while pending:
+        ready = [node for node in pending if placeable(node)]
+        if not ready:
+            raise GraphPlanningError(f"Unsupported target positions: {pending}")
+        for node in ready:
+            obj = target.objects[node]
+            slot = next((slot for slot, held in buffer.items() if held == obj), None)
+            source = {"type": "buffer", "slot": slot} if slot else {"type": "scattered"}
+            if slot:
+                buffer[slot] = None
+            occupied[node] = obj
+            kept[node] = True
+            reason = "Place object at stack position" if node[0] != "cell" else "Place object at arrangement position"
+            emit(obj, source, target.endpoints[node], reason)
+        pending = [node for node in pending if node not in ready]
+
+    simulation = simulate_plan(plan, current_state, target_spec, buffer_slots)
+    if not simulation["ok"]:
+        raise GraphPlanningError(f"Graph plan does not execute: {simulation['errors'][0]}")
+    return {"status": "success", "plan": plan, "final_expected": json.loads(json.dumps(target_spec))}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Coverage, plan length and latency of the support-graph planner")
+    parser.add_argument("--pairs", nargs="+", help="scene_enumerator shard JSONL files (default: scenario corpus)")
+    args = parser.parse_args()
+
+    from .plan_optimizer import optimize_plan
+    from .plan_search import search_plan
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = [case for path in args.pairs for case in load_corpus(path)] if args.pairs else generate_corpus()
+    cases = [case for case in cases if has_support_graph(case["target_spec"]["target_structure"]["relationship"])]
+    rows: Dict[str, List[Tuple[int, int, int, float]]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+    for case in cases:
+        relationship = case["target_spec"]["target_structure"]["relationship"]
+        start = time.perf_counter()
+        try:
+            output = plan_from_graph(case["target_spec"], case["current_state"])
+        except GraphPlanningError as e:
+            failures[relationship] += 1
+            print(f"[GRAPH] {case['case_id']}: {e}")
+            continue
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        optimized = len(optimize_plan(output["plan"], case["current_state"], case["target_spec"])["plan"])
+        optimum = len(search_plan(case["current_state"], case["target_spec"])["plan"])
+        rows[relationship].append((len(output["plan"]), optimized, optimum, elapsed_us))
+
+    print(f"[GRAPH] {len(cases)} cases with a support graph, {sum(failures.values())} without a graph plan")
+    print(f"[GRAPH] {'relationship':<28s} {'cases':>5s} {'actions':>8s} {'optimized':>9s} {'optimal':>8s} "
+          f"{'at optimum':>10s} {'us':>8s}")
+    for relationship, values in sorted(rows.items()):
+        print(f"[GRAPH] {relationship:<28s} {len(values):5d} {statistics.mean(v[0] for v in values):8.2f} "
+              f"{statistics.mean(v[1] for v in values):9.2f} {statistics.mean(v[2] for v in values):8.2f} "
+              f"{sum(v[1] == v[2] for v in values) / len(values):10.1%} {statistics.mean(v[3] for v in values):8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
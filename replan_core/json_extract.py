@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型输出的 JSON 提取与修复
+- extract_json：整段是 JSON 时直接解析（安装了 orjson 时使用 orjson）；否则跳过 <think> 块，
+  从第一个 '{'（或 '['）处用 JSONDecoder.raw_decode 原位解码第一个完整值，
+  markdown 代码块、前后说明文字与多余的第二个对象都不需要先剥离或复制
+- repair_json：原位解码失败时的有界修复（最多 MAX_REPAIR_CHARS 字符，一遍扫描）：
+  尾随逗号、单引号字符串、Python 字面量（True/False/None）、字符串中的换行、截断输出
+  （补齐字符串与括号；悬空的键或值回退到上一个逗号，最多回退 MAX_TRUNCATION_BACKTRACK 次）
+- 截断输出补齐后可能是一个更短但仍可执行的计划，extract_json 默认把它当作解析失败
+  （TruncatedOutputError，带修复列表），allow_truncated=True 时才返回补齐结果
+
+对比旧解析器（在仓库根目录；--outputs 可指定 RecordingBackend 录制的真实输出 JSONL）：
+  python -m replan_core.json_extract
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+MAX_REPAIR_CHARS = 65536
+MAX_CANDIDATES = 3
+MAX_TRUNCATION_BACKTRACK = 8
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class TruncatedOutputError(ValueError):
+    """模型输出在第一个 JSON 值结束前被截断（修复只能补齐括号，内容不完整）。"""
+
+    def __init__(self, fixes: List[str]):
+        super().__init__(f"Model output is truncated (repairs: {', '.join(fixes)})")
+        self.fixes = fixes
+
+
+def _loads_whole(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _next_start(text: str, pos: int, openers: str) -> int:
+    """pos 之后、<think> 块之外的第一个 JSON 起始位置（不复制文本），没有时返回 -1。"""
+    while pos < len(text):
+        starts = [i for i in (text.find(ch, pos) for ch in openers) if i != -1]
+        start = min(starts) if starts else -1
+        think = text.find("<think>", pos, start if start != -1 else len(text))
+        if think == -1:
+            return start
+        end = text.find("</think>", think)
+        # 未闭合的 <think>：只跳过标签本身
+        pos = end + len("</think>") if end != -1 else think + len("<think>")
+    return -1
+
+
+def extract_json(text: str, allow_array: bool = False, allow_truncated: bool = False) -> Any:
+    """从模型输出中取出第一个完整的 JSON 对象（allow_array 时也接受数组），必要时修复。
+
+    候选起点依次原位解码；失败时修复该候选，仍失败则从它的结束位置之后继续寻找
+    （说明文字中的 "{...}" 不会挡住后面的 JSON，也不会把对象内部的子对象当作结果）。
+    需要补齐截断才能解析时抛出 TruncatedOutputError，除非 allow_truncated。
+    """
+    accepted = (dict, list) if allow_array else dict
+    try:
+        value = _loads_whole(text)
+    except ValueError:
+        pass
+    else:
+        # 整段是其他类型的 JSON 值（数组、数字、字符串）时按候选起点继续寻找对象
+        if isinstance(value, accepted):
+            return value
+
+    openers = "{[" if allow_array else "{"
+    error: Optional[ValueError] = None
+    pos = 0
+    for _ in range(MAX_CANDIDATES):
+        start = _next_start(text, pos, openers)
+        if start == -1:
+            break
+        try:
+            return _DECODER.raw_decode(text, start)[0]
+        except json.JSONDecodeError:
+            pass
+        repaired, fixes, consumed = _repair(text[start:start + MAX_REPAIR_CHARS])
+        try:
+            value = _DECODER.raw_decode(repaired)[0]
+        except json.JSONDecodeError as e:
+            error = e
+        else:
+            if allow_truncated or "truncated" not in fixes:
+                return value
+            error = TruncatedOutputError(fixes)
+        pos = start + consumed
+    if error is None:
+        raise ValueError("No JSON object found in model output")
+    raise error
+
+
+def repair_json(fragment: str) -> Tuple[str, List[str]]:
+    """修复从 '{' / '[' 开始的近似 JSON 文本，返回 (修复后的文本, 应用的修复列表)。
+
+    只处理第一个顶层值，之后的内容丢弃；修复后仍不能解析时由调用方的 json 解码报错。
+    """
+    repaired, fixes, _ = _repair(fragment)
+    return repaired, fixes
+
+
+def _repair(fragment: str) -> Tuple[str, List[str], int]:
+    """repair_json 的实现，另外返回第一个顶层值在 fragment 中的结束位置。"""
+    out: List[str] = []
+    fixes = set()
+    stack: List[str] = []
+    # 每个结构逗号之前的输出长度与当时的括号栈（截断回退点）
+    commas: List[Tuple[int, Tuple[str, ...]]] = []
+    quote = None
+    i, n = 0, len(fragment)
+
+    while i < n:
+        ch = fragment[i]
+        if quote is not None:
+            if ch == "\\" and i + 1 < n:
+                nxt = fragment[i + 1]
+                if quote == "'" and nxt == "'":
+                    out.append("'")
+                else:
+                    out.append(ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+                fixes.add("newline_in_string")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"' or ch == "'":
+            if ch == "'":
+                fixes.add("single_quotes")
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), sorted(fixes), i + 1
+        elif ch == ",":
+            j = i + 1
+            while j < n and fragment[j] in " \t\r\n":
+                j += 1
+            if j < n and fragment[j] in "}]":
+                fixes.add("trailing_comma")
+            else:
+                commas.append((len(out), tuple(stack)))
+                out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (fragment[j].isalnum() or fragment[j] == "_"):
+                j += 1
+            word = fragment[i:j]
+            if word in _PYTHON_LITERALS:
+                out.append(_PYTHON_LITERALS[word])
+                fixes.add("python_literal")
+            else:
+                out.append(word)
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # 截断：补齐字符串与括号；仍不可解析时回退到上一个逗号
+    fixes.add("truncated")
+    if quote is not None:
+        out.append('"')
+    text = "".join(out).rstrip().rstrip(",:")
+    candidate = text + "".join(_CLOSERS[ch] for ch in reversed(stack))
+    for _ in range(MAX_TRUNCATION_BACKTRACK):
+        try:
+            json.loads(candidate)
+            break
+        except ValueError:
+            if not commas:
+                break
+            cut, cut_stack = commas.pop()
+            candidate = text[:cut] + "".join(_CLOSERS[ch] for ch in reversed(cut_stack))
+    return candidate, sorted(fixes), n
+
+
+# =============== 基准 ===============
+
+def _legacy_extract(text: str) -> str:
+    """替换前的提取方式（正则去除 <think>、剥离代码块、逐字符匹配括号），仅作基准对比。"""
+    t = re.sub(r'<think>.*?</think>', '', text.strip(), flags=re.DOTALL).strip()
+    if t.startswith("```json") and t.endswith("```"):
+        t = t[7:-3].strip()
+    elif t.startswith("```") and t.endswith("```"):
+        t = t[3:-3].strip()
+    start = t.find('{')
+    if start == -1:
+        return t
+    in_str = escape = False
+    depth = 0
+    for i in range(start, len(t)):
+        ch = t[i]
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return t[start:i + 1]
+    last_brace = t.rfind('}')
+    return t[start:last_brace + 1] if last_brace > start else t
+
+
+def _legacy_parse(text: str) -> Any:
+    t = text.strip()
+    try:
+        return json.loads(t)
+    except Exception:
+        return json.loads(_legacy_extract(t))
+
+
+def malformed_variants(output: str) -> Iterator[Tuple[str, str]]:
+    """由一个正确输出生成模型常见的格式错误变体 (类别, 文本)。"""
+    yield "clean", output
+    yield "think_block", "<think>\nPlace the {bottom} first, then the rest.\n</think>\n" + output
+    yield "fenced", "```json\n" + output + "\n```"
+    yield "prose", "Here is the plan:\n" + output + "\nThe plan keeps the buffer empty at the end."
+    yield "two_objects", output + "\n" + output
+    yield "trailing_commas", output.replace("}]", "},]")[:-1] + ",}"
+    yield "single_quotes", output.replace('"', "'")
+    yield "python_literals", output[:-1] + ', "complete": True, "notes": None}'
+    yield "truncated", output[:int(len(output) * 0.8)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Parse success rate and speed: legacy vs raw_decode + repair")
+    parser.add_argument("--outputs", help="recorded outputs JSONL ({key, output}) to parse as-is")
+    parser.add_argument("--corpus", help="scenario corpus JSONL for generated malformed variants")
+    parser.add_argument("--rounds", type=int, default=20, help="timed rounds per output")
+    args = parser.parse_args()
+
+    from .validation import validate_output_data
+
+    samples: List[Tuple[str, str]] = []
+    if args.outputs:
+        with open(args.outputs, "r", encoding="utf-8") as f:
+            samples = [("recorded", json.loads(line)["output"]) for line in f if line.strip()]
+    else:
+        from .scenario_corpus import generate_corpus, load_corpus
+        cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+        samples = [variant for case in cases for variant in malformed_variants(case["reference_output"])]
+
+    def outcome(fn, text: str) -> Tuple[bool, bool]:
+        try:
+            data = fn(text)
+        except ValueError:
+            return False, False
+        try:
+            validate_output_data(data)
+            return True, True
+        except ValueError:
+            return True, False
+
+    parsers = {"legacy": _legacy_parse, "raw_decode+repair": extract_json}
+    print(f"[JSON] {len(samples)} outputs, orjson {'enabled' if orjson is not None else 'not installed'}")
+    for name, fn in parsers.items():
+        by_kind: Dict[str, List[Tuple[bool, bool, float]]] = defaultdict(list)
+        for kind, text in samples:
+            parsed, valid = outcome(fn, text)
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                try:
+                    fn(text)
+                except ValueError:
+                    pass
+            by_kind[kind].append((parsed, valid, (time.perf_counter() - start) / args.rounds * 1e6))
+
+        results = [r for rows in by_kind.values() for r in rows]
+        timings = [us for _, _, us in results]
+        print(f"[JSON] {name:<18s} parsed {sum(r[0] for r in results) / len(results):6.1%}  "
+              f"valid {sum(r[1] for r in results) / len(results):6.1%}  "
+              f"{statistics.mean(timings):7.1f} us mean  {statistics.median(timings):6.1f} us p50 per parse")
+        for kind, rows in by_kind.items():
+            print(f"         {kind:<16s} parsed {sum(r[0] for r in rows):4d}/{len(rows):<4d} "
+                  f"{statistics.mean(us for _, _, us in rows):7.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+知识库预编译包（KB bundle）
+把解析后的规则、提示词模板行、路径索引、token 计数与 float32 embeddings 写入单个二进制文件，
+启动时 mmap 读取，无需遍历目录、解析 Markdown 或加载 embedding 模型。
+
+文件布局（小端）：
+  magic(8) | format_version(u32) | header_len(u64) | header JSON | 0 填充至 64 字节对齐 | float32[count, dim]
+
+用法（在仓库根目录）：
+  python -m replan_core.kb_bundle compile
+  python -m replan_core.kb_bundle compile --tokenizer Qwen/Qwen3-4B-Instruct-2507-FP8 --tokenizer HuggingFaceTB/SmolLM3-3B
+  python -m replan_core.kb_bundle info
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import mmap
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from .config import EMBEDDING_MODEL, KNOWLEDGE_BASE_DIR
+from .knowledge_base import KnowledgeBaseSnapshot, scan_fingerprints
+from .lexical_index import BM25Index
+
+BUNDLE_MAGIC = b"RPKBNDL\0"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_SUFFIX = ".rpkb"
+_PREAMBLE = struct.Struct("<8sIQ")
+_ALIGNMENT = 64
+
+
+class BundleError(ValueError):
+    """包格式错误或与当前配置不兼容。"""
+
+
+def default_bundle_path(kb_path: Path) -> Path:
+    """replan_rag_knowledge_base -> replan_rag_knowledge_base.rpkb（同级目录）。"""
+    return kb_path.with_name(kb_path.name + BUNDLE_SUFFIX)
+
+
+def _relative(path: str, kb_path: Path) -> str:
+    return Path(path).relative_to(kb_path).as_posix()
+
+
+def count_tokens(snapshot: KnowledgeBaseSnapshot, tokenizer_names: List[str]) -> Dict[str, Dict[str, int]]:
+    """用各模型的 tokenizer 统计每条规则 rule_content 的 token 数；tokenizer 不可用时跳过。"""
+    counts: Dict[str, Dict[str, int]] = {}
+    if not tokenizer_names:
+        return counts
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        print("[KB] transformers not installed, skipping token counts")
+        return counts
+
+    for name in tokenizer_names:
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(name)
+        except Exception as e:
+            print(f"[KB] Tokenizer {name} unavailable, skipping token counts: {e}")
+            continue
+        counts[name] = {
+            rule["file_path"]: len(tokenizer.encode(rule["rule_content"], add_special_tokens=False))
+            for rule in snapshot.rules
+        }
+    return counts
+
+
+def write_bundle(snapshot: KnowledgeBaseSnapshot, kb_path: Path, output: Path,
+                 token_counts: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
+    """把快照写成 bundle，返回头部信息。"""
+    embeddings = np.ascontiguousarray(snapshot.rule_embeddings, dtype="<f4")
+    count, dim = embeddings.shape if embeddings.ndim == 2 else (0, 0)
+    header = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": EMBEDDING_MODEL,
+        "count": int(count),
+        "dim": int(dim),
+        "rules": [
+            {
+                "path": _relative(rule["file_path"], kb_path),
+                "title": rule["title"],
+                "query_intent": rule["query_intent"],
+                "rule_content": rule["rule_content"],
+                "searchable_content": rule["searchable_content"],
+            }
+            for rule in snapshot.rules
+        ],
+        "prompt_templates": snapshot.prompt_templates,
+        "fingerprints": {_relative(p, kb_path): list(fp) for p, fp in snapshot.fingerprints.items()},
+        "digests": {_relative(p, kb_path): d for p, d in snapshot.digests.items()},
+        "token_counts": {
+            name: {_relative(p, kb_path): n for p, n in per_rule.items()}
+            for name, per_rule in (token_counts or {}).items()
+        },
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix_len = _PREAMBLE.size + len(header_bytes)
+    padding = (-prefix_len) % _ALIGNMENT
+
+    output = Path(output)
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * padding)
+        f.write(embeddings.tobytes())
+    # 原子替换，正在 mmap 旧文件的进程不受影响
+    tmp.replace(output)
+    return header
+
+
+def read_bundle_header(path: Path) -> Dict[str, Any]:
+    """只读取头部 JSON（不含 embeddings）。"""
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"Not a knowledge base bundle: {path}")
+        if version != BUNDLE_FORMAT_VERSION:
+            raise BundleError(f"Unsupported bundle format {version} (expected {BUNDLE_FORMAT_VERSION})")
+        return json.loads(f.read(header_len).decode("utf-8"))
+
+
+def load_bundle(path: Path, kb_path: Path) -> KnowledgeBaseSnapshot:
+    """mmap 读取 bundle 并构建快照；规则路径以 kb_path 为根恢复为绝对路径。"""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_len = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != BUNDLE_MAGIC:
+        raise BundleError(f"Not a knowledge base bundle: {path}")
+    if version != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format {version} (expected {BUNDLE_FORMAT_VERSION})")
+    header = json.loads(buffer[_PREAMBLE.size:_PREAMBLE.size + header_len].decode("utf-8"))
+    if header["embedding_model"] != EMBEDDING_MODEL:
+        raise BundleError(f"Bundle was built with {header['embedding_model']}, current model is {EMBEDDING_MODEL}")
+
+    prefix_len = _PREAMBLE.size + header_len
+    offset = prefix_len + (-prefix_len) % _ALIGNMENT
+    count, dim = header["count"], header["dim"]
+    # 只读视图，直接引用 mmap 页面
+    embeddings = np.frombuffer(buffer, dtype="<f4", count=count * dim, offset=offset).reshape(count, dim) if count else None
+
+    def absolute(relative_path: str) -> str:
+        return str(kb_path / relative_path)
+
+    rules = [
+        {
+            "file_path": absolute(entry["path"]),
+            "title": entry["title"],
+            "query_intent": entry["query_intent"],
+            "rule_content": entry["rule_content"],
+            "searchable_content": entry["searchable_content"],
+        }
+        for entry in header["rules"]
+    ]
+    return KnowledgeBaseSnapshot(
+        version=1,
+        rules=rules,
+        rule_embeddings=embeddings,
+        rule_lookup={rule["file_path"]: rule for rule in rules},
+        prompt_templates=header["prompt_templates"],
+        fingerprints={absolute(p): tuple(fp) for p, fp in header["fingerprints"].items()},
+        digests={absolute(p): d for p, d in header["digests"].items()},
+        row_index={rule["file_path"]: i for i, rule in enumerate(rules)},
+        token_counts={
+            name: {absolute(p): n for p, n in per_rule.items()}
+            for name, per_rule in header["token_counts"].items()
+        },
+        lexical_index=BM25Index.from_rules(rules),
+    )
+
+
+def stale_files(snapshot: KnowledgeBaseSnapshot, kb_path: Path) -> List[str]:
+    """bundle 编译后在目录中新增 / 修改 / 删除的文件（只做 stat）。"""
+    if not kb_path.exists():
+        return []
+    changes = snapshot.changes_against(scan_fingerprints(kb_path))
+    return changes["added"] + changes["changed"] + changes["deleted"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile the replan knowledge base into a single bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = sub.add_parser("compile", help="parse, embed and write the bundle")
+    compile_parser.add_argument("--kb-path", help="knowledge base directory (default: replan_core/replan_rag_knowledge_base)")
+    compile_parser.add_argument("--output", help="bundle path (default: <kb-path>.rpkb)")
+    compile_parser.add_argument("--tokenizer", action="append", default=[],
+                                help="HuggingFace tokenizer to record per-rule token counts for (repeatable)")
+
+    info_parser = sub.add_parser("info", help="print bundle header summary")
+    info_parser.add_argument("bundle", nargs="?", help="bundle path (default: replan_core/replan_rag_knowledge_base.rpkb)")
+
+    args = parser.parse_args()
+    default_kb = Path(__file__).parent / KNOWLEDGE_BASE_DIR
+
+    if args.command == "info":
+        header = read_bundle_header(Path(args.bundle) if args.bundle else default_bundle_path(default_kb))
+        print(f"[KB] format v{header['format_version']} built {header['created']} with {header['embedding_model']}")
+        print(f"[KB] {header['count']} rules x {header['dim']} dims, {len(header['prompt_templates'])} prompt templates")
+        for name, per_rule in header["token_counts"].items():
+            print(f"[KB] {name}: {sum(per_rule.values())} rule tokens")
+        return 0
+
+    from .rag_system import ReplanRAGSystem
+
+    kb_path = Path(args.kb_path) if args.kb_path else default_kb
+    output = Path(args.output) if args.output else default_bundle_path(kb_path)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag_system = ReplanRAGSystem(kb_path=kb_path, bundle_path=False)
+    snapshot = rag_system.snapshot
+    header = write_bundle(snapshot, kb_path, output, count_tokens(snapshot, args.tokenizer))
+    elapsed = (time.perf_counter() - start) * 1000.0
+    print(f"[KB] Wrote {output} ({output.stat().st_size} bytes, {header['count']} rules x {header['dim']} dims, "
+          f"{len(header['prompt_templates'])} prompt templates) in {elapsed:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+知识库快照与热加载
+- KnowledgeBaseSnapshot：某一时刻的规则、embedding 矩阵、BM25 索引、路径索引与提示词模板（只读）
+- scan_fingerprints：按 (mtime_ns, size) 记录每个 .md 文件，只需 stat，不读内容
+- KnowledgeBaseWatcher：轮询指纹变化，触发增量重建并原子替换快照
+正在处理的请求通过 ReplanRAGSystem.pinned_snapshot() 固定旧快照，不受替换影响。
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .lexical_index import BM25Index
+
+# 替换类型 -> prompts/ 下的模板文件名
+PROMPT_TEMPLATE_FILES = {
+    "top_only": "stack_replacement_top_only.md",
+    "middle_only": "stack_replacement_middle_only.md",
+    "bottom_only": "stack_replacement_bottom_only.md",
+    "extension": "stack_extension.md",
+    "multiple": "stack_replacement_multiple.md"
+}
+
+Fingerprint = Tuple[int, int]
+
+
+def scan_fingerprints(kb_path: Path) -> Dict[str, Fingerprint]:
+    """按 rglob 顺序返回 {文件路径: (mtime_ns, size)}。"""
+    fingerprints: Dict[str, Fingerprint] = {}
+    for md_file in kb_path.rglob("*.md"):
+        try:
+            stat = md_file.stat()
+        except FileNotFoundError:
+            # 扫描过程中被删除
+            continue
+        fingerprints[str(md_file)] = (stat.st_mtime_ns, stat.st_size)
+    return fingerprints
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class KnowledgeBaseSnapshot:
+    """一次完整加载的知识库；替换时整体换新对象，不原地修改。"""
+    version: int
+    rules: List[Dict[str, Any]]
+    rule_embeddings: Optional[np.ndarray]
+    rule_lookup: Dict[str, Dict[str, Any]]
+    prompt_templates: Dict[str, List[str]]
+    fingerprints: Dict[str, Fingerprint] = field(default_factory=dict)
+    # 文件路径 -> 内容摘要，用于识别仅 mtime 变化（内容未变）的文件
+    digests: Dict[str, str] = field(default_factory=dict)
+    # 文件路径 -> rules / rule_embeddings 中的行号
+    row_index: Dict[str, int] = field(default_factory=dict)
+    # tokenizer 名 -> {文件路径: rule_content 的 token 数}（来自 kb_bundle 编译）
+    token_counts: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # 规则的 BM25 倒排索引（行号与 rules 一致）
+    lexical_index: Optional["BM25Index"] = None
+
+    def embedding_for(self, path: str) -> Optional[np.ndarray]:
+        row = self.row_index.get(path)
+        if row is None or self.rule_embeddings is None:
+            return None
+        return self.rule_embeddings[row]
+
+    def changes_against(self, fingerprints: Dict[str, Fingerprint]) -> Dict[str, List[str]]:
+        """与新扫描的指纹比较，返回 {added, changed, deleted}。"""
+        return {
+            "added": [p for p in fingerprints if p not in self.fingerprints],
+            "changed": [p for p, fp in fingerprints.items() if p in self.fingerprints and self.fingerprints[p] != fp],
+            "deleted": [p for p in self.fingerprints if p not in fingerprints],
+        }
+
+
+class KnowledgeBaseWatcher:
+    """轮询知识库目录，发现新增 / 修改 / 删除的 .md 文件后增量重建快照。
+
+    只做 stat，不依赖 inotify；~30 个文件的轮询开销可以忽略。
+    """
+
+    def __init__(self, rag_system, interval: float = 1.0):
+        self.rag_system = rag_system
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> bool:
+        """检查一次；有变化时重建并返回 True。"""
+        fingerprints = scan_fingerprints(self.rag_system.kb_path)
+        if fingerprints == self.rag_system.snapshot.fingerprints:
+            return False
+        self.rag_system.reload_knowledge_base(fingerprints)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # 编辑中的文件可能暂时不可读，保留旧快照，下次轮询重试
+                print(f"[KB] Reload failed, keeping snapshot v{self.rag_system.snapshot.version}: {e}")
+
+    def start(self) -> "KnowledgeBaseWatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则的 BM25 倒排索引与倒数排名融合（RRF）
+检索查询中包含精确标记（`missing stack positions top`、`bottom wrong object`、
+`stacked_and_separated_left` 等），稠密 embedding 对这些标记不敏感；
+BM25 直接按词项命中打分，不需要调用 embedding 模型。
+- BM25Index：知识库加载时构建，每个词项的 BM25 权重预先算好，查询时只做累加
+- reciprocal_rank_fusion：融合稠密排序与词法排序
+
+对比今天的稠密检索与混合检索（在仓库根目录，需要 embedding 模型）：
+  python -m replan_core.lexical_index
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or that the this to with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """小写词项；下划线复合词（stacked_and_separated_left）同时保留整体与各部分。"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part not in STOPWORDS)
+    return tokens
+
+
+def rule_document(rule: Dict[str, Any]) -> str:
+    """规则的词法文档：所在目录与文件名 + 标题 + 查询意图 + 全文。"""
+    path = Path(rule["file_path"])
+    return " ".join([path.parent.name, path.stem, rule["title"], rule["query_intent"], rule["rule_content"]])
+
+
+class BM25Index:
+    """Okapi BM25；postings[词项] = (文档行号, 预计算权重)。"""
+
+    def __init__(self, documents: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        term_counts = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_count = len(term_counts)
+        lengths = np.array([sum(c.values()) for c in term_counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.doc_count and lengths.mean() > 0 else 1.0
+        norms = k1 * (1.0 - b + b * lengths / avg_length)
+
+        rows: Dict[str, List[int]] = defaultdict(list)
+        freqs: Dict[str, List[int]] = defaultdict(list)
+        for row, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                rows[term].append(row)
+                freqs[term].append(tf)
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, term_rows in rows.items():
+            ids = np.array(term_rows, dtype=np.int64)
+            tf = np.array(freqs[term], dtype=np.float32)
+            df = len(term_rows)
+            idf = math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+            self.postings[term] = (ids, idf * tf * (k1 + 1.0) / (tf + norms[ids]))
+
+    @classmethod
+    def from_rules(cls, rules: Sequence[Dict[str, Any]], **kwargs) -> "BM25Index":
+        return cls((rule_document(rule) for rule in rules), **kwargs)
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += weights
+        return scores
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回得分最高的 k 条规则 (行号, 分数)，不含零分规则。"""
+        scores = self.scores(query)
+        order = np.argsort(-scores, kind="stable")[:k]
+        order = order[scores[order] > 0]
+        return order, scores[order]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """RRF：score(d) = Σ 1 / (k + rank)，rank 从 1 开始；按融合分数降序返回 [(行号, 分数)]。"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[int(row)] += 1.0 / (k + rank)
+    # 同分时保持首次出现的顺序（稠密排序在前）
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare dense and hybrid (BM25 + RRF) rule retrieval")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    parser.add_argument("--rounds", type=int, default=20, help="timed retrieval rounds per case")
+    args = parser.parse_args()
+
+    from .config import TOP_K_RETRIEVAL
+    from .rag_system import ReplanRAGSystem
+    from .scenario_corpus import generate_corpus, load_corpus
+    from .scene import SceneDiff
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag_system = ReplanRAGSystem(query_cache_path=None)
+        requests = []
+        for case in cases:
+            scene_diff = SceneDiff.from_request(case["target_spec"], case["current_state"])
+            scenario = rag_system.classify_scenario_by_embedding(case["target_spec"], case["current_state"], scene_diff)
+            query = rag_system._retrieval_query(scene_diff, scenario)
+            mandatory = rag_system._enforced_rule_keywords(case["target_spec"], case["current_state"], scene_diff)
+            requests.append((query, mandatory))
+
+    # 始终注入的通用规则之外，按场景决定的规则（关系规则、替换/扩展规则）
+    always = set.intersection(*(set(mandatory) for _, mandatory in requests)) if requests else set()
+    k = TOP_K_RETRIEVAL + 2
+    snapshot = rag_system.snapshot
+
+    def retrieve(mode: str, query: str) -> List[str]:
+        if mode == "bm25":
+            rows, _ = snapshot.lexical_index.search(query, k)
+            return [snapshot.rules[row]["file_path"] for row in rows]
+        rag_system.retrieval_mode = mode
+        return [rule["file_path"] for rule in rag_system.retrieve_relevant_rules(query, k)]
+
+    print(f"[RETRIEVAL] {len(cases)} cases, {len(snapshot.rules)} rules, top_k={k}")
+    for mode in ("dense", "bm25", "hybrid"):
+        hits = total = specific_hits = specific_total = 0
+        for query, mandatory in requests:
+            paths = retrieve(mode, query)
+            for keyword in mandatory:
+                found = any(keyword in path for path in paths)
+                hits += found
+                total += 1
+                if keyword not in always:
+                    specific_hits += found
+                    specific_total += 1
+        misses_before = rag_system.query_cache.misses
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for query, _ in requests:
+                retrieve(mode, query)
+        elapsed_us = (time.perf_counter() - start) / (args.rounds * len(requests)) * 1e6
+        encodes = rag_system.query_cache.misses - misses_before
+        print(f"[RETRIEVAL] {mode:6s} mandatory-rule hit rate {hits / total:.1%} ({hits}/{total}), "
+              f"scenario-specific {specific_hits / specific_total:.1%} ({specific_hits}/{specific_total}), "
+              f"{elapsed_us:.0f} us per query (warm query cache, {encodes} extra encodes)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
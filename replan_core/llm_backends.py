@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM Backends - 可替换的生成后端
+- ReplayLLMBackend：按 user prompt 回放已记录的模型输出（无需 GPU / 网络）
+- RecordingBackend：包装真实后端，把每次输出追加写入 JSONL，供之后回放
+所有后端只需实现 generate(system_prompt, user_prompt, max_new_tokens=None) -> str
+（max_new_tokens 为本次请求的生成上限，来自提示词预算报告；回放后端忽略它）
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional
+
+
+def prompt_key(user_prompt: str) -> str:
+    """回放记录的键：user prompt 的 sha256（user prompt 只由 target_spec/current_state 决定）。"""
+    return hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()
+
+
+class ReplayLLMBackend:
+    """回放后端：查表返回记录的原始输出。"""
+
+    name = "replay"
+
+    def __init__(self, records: Dict[str, str], default_output: Optional[str] = None):
+        self.records = dict(records)
+        self.default_output = default_output
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_jsonl(cls, path: str, default_output: Optional[str] = None) -> "ReplayLLMBackend":
+        """从 RecordingBackend 写出的 JSONL（key/output）加载。"""
+        records: Dict[str, str] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    records[entry["key"]] = entry["output"]
+        return cls(records, default_output=default_output)
+
+    def add(self, user_prompt: str, output: str) -> None:
+        self.records[prompt_key(user_prompt)] = output
+
+    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None) -> str:
+        key = prompt_key(user_prompt)
+        if key in self.records:
+            self.hits += 1
+            return self.records[key]
+        self.misses += 1
+        if self.default_output is None:
+            raise KeyError(f"No replay record for prompt key {key[:12]}")
+        return self.default_output
+
+
+class RecordingBackend:
+    """记录后端：转发给内部后端并记录输出。"""
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = f"recording:{getattr(inner, 'name', type(inner).__name__)}"
+
+    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None) -> str:
+        output = self.inner.generate(system_prompt, user_prompt, max_new_tokens)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": prompt_key(user_prompt), "output": output}, ensure_ascii=False) + "\n")
+        return output
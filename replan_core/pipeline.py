@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线规划执行器
+模型解码请求 i 时，请求 i+1 的 CPU 工作（场景分析、embedding 查询、规则过滤、提示词组装、
+聊天模板与分词）原本处于空闲等待。PipelinedPlanner 把这些工作放到线程池中提前完成：
+
+  请求 → [准备: 线程池 build_rag_prompt + prepare_inputs] → 有界队列 → [生成: 单线程，按提交顺序] → 解析验证
+
+- 队列深度 queue_depth 限制提前准备的请求数（背压），避免负载高峰时提示词无限堆积
+- 后端若提供 prepare_inputs / generate_from_inputs（TransformersChatBackend），分词也在准备阶段完成；
+  否则准备阶段只构建提示词，生成阶段调用 generate
+- 线程池中不要使用 contextlib.redirect_stdout（进程级替换 sys.stdout，线程间不安全）
+
+吞吐对比（在仓库根目录，持续负载下顺序执行 vs 流水线）：
+  python -m replan_core.pipeline --prepare-workers 2 --queue-depth 4
+"""
+
+import argparse
+import contextlib
+import io
+import queue
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Any
+
+from .profiles import ModelProfile, DEFAULT_PROFILE
+from .worker_pool import check_output
+
+_DONE = object()
+
+
+class PipelinedPlanner:
+    """准备阶段（线程池）与生成阶段（调用方线程）重叠执行的规划器。"""
+
+    def __init__(self, rag_system, backend, profile: ModelProfile = DEFAULT_PROFILE,
+                 prepare_workers: int = 2, queue_depth: int = 4):
+        self.rag_system = rag_system
+        self.backend = backend
+        self.profile = profile
+        self.prepare_workers = prepare_workers
+        self.queue_depth = max(1, queue_depth)
+        self._split_backend = hasattr(backend, "prepare_inputs") and hasattr(backend, "generate_from_inputs")
+
+    def _prepare(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """准备阶段：检索 + 提示词组装 (+ 分词)。"""
+        start = time.perf_counter()
+        system_prompt, user_prompt = self.rag_system.build_rag_prompt(
+            request["target_spec"], request["current_state"], profile=self.profile
+        )
+        # 预算报告是线程局部的，需在同一线程中 build_rag_prompt 之后立即读取
+        budget = getattr(self.rag_system, "last_prompt_report", None)
+        prepared = {"system_prompt": system_prompt, "user_prompt": user_prompt, "prompt_budget": budget,
+                    "max_new_tokens": budget and budget["max_new_tokens"]}
+        if self._split_backend:
+            prepared["inputs"] = self.backend.prepare_inputs(system_prompt, user_prompt)
+        prepared["prepare_ms"] = (time.perf_counter() - start) * 1000.0
+        return prepared
+
+    def _generate(self, prepared: Dict[str, Any]) -> str:
+        if self._split_backend:
+            return self.backend.generate_from_inputs(prepared["inputs"], prepared["max_new_tokens"])
+        return self.backend.generate(prepared["system_prompt"], prepared["user_prompt"], prepared["max_new_tokens"])
+
+    def _feed(self, requests: Iterable[Dict[str, Any]], executor: ThreadPoolExecutor,
+              pending: "queue.Queue", stop: threading.Event) -> None:
+        """按顺序提交准备任务；队列满时阻塞，从而限制提前准备的请求数。"""
+        try:
+            for request in requests:
+                if stop.is_set():
+                    break
+                submitted = time.perf_counter()
+                pending.put((request, submitted, executor.submit(self._prepare, request)))
+        except Exception as e:
+            failed: Future = Future()
+            failed.set_exception(e)
+            pending.put(({}, time.perf_counter(), failed))
+        finally:
+            pending.put(_DONE)
+
+    def run(self, requests: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """处理请求（{case_id?, target_spec, current_state}），按提交顺序逐个返回
+        {case_id, result, consistent, error?, prompt_budget, prepare_ms, generate_ms, latency_ms}。"""
+        if self.prepare_workers <= 0:
+            yield from self._run_sequential(requests)
+            return
+
+        pending: "queue.Queue" = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        with ThreadPoolExecutor(self.prepare_workers, thread_name_prefix="replan-prepare") as executor:
+            feeder = threading.Thread(target=self._feed, args=(requests, executor, pending, stop),
+                                      name="replan-feeder", daemon=True)
+            feeder.start()
+            try:
+                while True:
+                    item = pending.get()
+                    if item is _DONE:
+                        break
+                    request, submitted, future = item
+                    yield self._finish(request, submitted, future)
+            finally:
+                stop.set()
+                # 调用方提前结束迭代时排空队列，让 feeder 退出
+                while feeder.is_alive():
+                    try:
+                        pending.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                feeder.join()
+
+    def _run_sequential(self, requests: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """不使用流水线的基线：逐个请求准备后立即生成。"""
+        for request in requests:
+            submitted = time.perf_counter()
+            future: Future = Future()
+            try:
+                future.set_result(self._prepare(request))
+            except Exception as e:
+                future.set_exception(e)
+            yield self._finish(request, submitted, future)
+
+    def _finish(self, request: Dict[str, Any], submitted: float, future: Future) -> Dict[str, Any]:
+        """生成阶段 + 解析验证。"""
+        outcome: Dict[str, Any] = {"case_id": request.get("case_id"), "result": None}
+        try:
+            prepared = future.result()
+            outcome["prepare_ms"] = round(prepared["prepare_ms"], 4)
+            outcome["prompt_budget"] = prepared["prompt_budget"]
+            start = time.perf_counter()
+            raw = self._generate(prepared)
+            outcome["generate_ms"] = round((time.perf_counter() - start) * 1000.0, 4)
+            outcome.update(check_output(raw, request["target_spec"], request["current_state"],
+                                        self.profile.output_format))
+        except Exception as e:
+            outcome["error"] = f"{type(e).__name__}: {e}"
+        outcome["latency_ms"] = round((time.perf_counter() - submitted) * 1000.0, 4)
+        return outcome
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Throughput of pipelined vs sequential planning under sustained load")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    parser.add_argument("--repeat", type=int, default=3, help="run the corpus N times")
+    parser.add_argument("--prepare-workers", type=int, default=2, help="threads for retrieval and prompt build")
+    parser.add_argument("--queue-depth", type=int, default=4, help="max prepared requests waiting for generation")
+    parser.add_argument("--decode-ms", type=float, default=20.0,
+                        help="stand-in decode time per request; the CPU is idle meanwhile, as with GPU decoding")
+    parser.add_argument("--cpu-decode", action="store_true",
+                        help="decode with the numpy stand-in model on the CPU instead of sleeping")
+    args = parser.parse_args()
+
+    from .llm_backends import ReplayLLMBackend, prompt_key
+    from .rag_system import ReplanRAGSystem, build_user_prompt
+    from .scenario_corpus import generate_corpus, load_corpus
+    from .worker_pool import StandInModelBackend
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    requests = [
+        {"case_id": c["case_id"], "target_spec": c["target_spec"], "current_state": c["current_state"]}
+        for c in cases
+    ] * args.repeat
+    outputs = ReplayLLMBackend({
+        prompt_key(build_user_prompt(c["target_spec"], c["current_state"])): c["reference_output"] for c in cases
+    })
+    new_tokens = 16
+    backend = StandInModelBackend(outputs, new_tokens=new_tokens,
+                                  seconds_per_token=None if args.cpu_decode else args.decode_ms / 1000.0 / new_tokens)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag_system = ReplanRAGSystem()
+        # 预热查询缓存与场景表
+        for request in requests[:len(cases)]:
+            rag_system.build_rag_prompt(request["target_spec"], request["current_state"])
+
+    decode = "numpy stand-in on CPU" if args.cpu_decode else f"{args.decode_ms:.0f} ms idle-CPU decode"
+    print(f"[PIPELINE] {len(requests)} requests, {decode}")
+    baseline = None
+    for workers in (0, args.prepare_workers):
+        planner = PipelinedPlanner(rag_system, backend, prepare_workers=workers, queue_depth=args.queue_depth)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            outcomes: List[Dict[str, Any]] = list(planner.run(requests))
+            elapsed = time.perf_counter() - start
+        rps = len(outcomes) / elapsed
+        baseline = baseline or rps
+        failures = sum(1 for o in outcomes if o["result"] is None)
+        label = "sequential" if workers == 0 else f"pipelined ({workers} prepare threads, depth {args.queue_depth})"
+        print(f"[PIPELINE] {label:<42s} {rps:7.1f} req/s  x{rps / baseline:4.2f}  "
+              f"prepare p50 {statistics.median(o['prepare_ms'] for o in outcomes):6.2f} ms  "
+              f"latency p50 {statistics.median(o['latency_ms'] for o in outcomes):7.2f} ms  failures {failures}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plan Optimizer - 执行前去除计划中的多余动作
+在 parse_and_validate / 目标一致性验证之后运行，只处理能执行并到达目标结构的计划：
+- 去除 from 与 to 相同的空动作
+- 同一对象的相邻两次移动合并为一次（缓冲区往返、放下后又被移走）；起点与终点相同时两步都去掉
+  （合并后的动作放在前一步或后一步的位置，以能执行者为准，例如从未挡路的对象直接放到目标位置）
+- 缓冲槽按移动距离重新分配，独立动作按距离调整顺序（travel_cost.minimize_travel），step 重新编号
+每次改写后都重新模拟整条计划，最终结构与原计划相同。
+
+语料上的动作节省（在仓库根目录）：
+  python -m replan_core.plan_optimizer
+"""
+
+import argparse
+import copy
+import json
+import statistics
+from collections import defaultdict
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from .plan_simulator import DEFAULT_BUFFER_SLOTS, simulate_plan
+from .travel_cost import TravelCostModel, minimize_travel
+from .validation import plan_errors
+
+
+def _same_place(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return a.get("type") == b.get("type") and a.get("position") == b.get("position") and a.get("slot") == b.get("slot")
+
+
+def _action_name(source: Dict[str, Any], target: Dict[str, Any]) -> str:
+    if target.get("type") == "buffer":
+        return "move_to_buffer"
+    if source.get("type") == "buffer":
+        return "move_from_buffer"
+    return "move_to_position"
+
+
+def _merge(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """同一对象的两次移动合并为一次：first 的起点，second 的终点与原因。"""
+    merged = dict(second)
+    merged["from"] = copy.deepcopy(first.get("from") or {})
+    merged["to"] = copy.deepcopy(second.get("to") or {})
+    merged["action"] = _action_name(merged["from"], merged["to"])
+    return merged
+
+
+def _executes(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+              buffer_slots=DEFAULT_BUFFER_SLOTS) -> bool:
+    return simulate_plan(plan, current_state, target_spec, buffer_slots)["ok"] \
+        and not plan_errors(plan, normalize=False, buffer_slots=buffer_slots)
+
+
+def _candidates(plan: List[Dict[str, Any]]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """按顺序给出单步改写后的候选计划 (类别, 计划)。"""
+    for i, action in enumerate(plan):
+        if _same_place(action.get("from") or {}, action.get("to") or {}):
+            yield "noop", plan[:i] + plan[i + 1:]
+    for i, action in enumerate(plan):
+        j = next((k for k in range(i + 1, len(plan)) if plan[k].get("object") == action.get("object")), None)
+        if j is None:
+            continue
+        if _same_place(action.get("from") or {}, plan[j].get("to") or {}):
+            yield "cancelled_pair", plan[:i] + plan[i + 1:j] + plan[j + 1:]
+            continue
+        merged = _merge(action, plan[j])
+        yield "merged", plan[:i] + [merged] + plan[i + 1:j] + plan[j + 1:]
+        yield "merged", plan[:i] + plan[i + 1:j] + [merged] + plan[j + 1:]
+
+
+def reassign_buffer_slots(plan: List[Dict[str, Any]], buffer_slots=DEFAULT_BUFFER_SLOTS) -> List[Dict[str, Any]]:
+    """按使用顺序重新分配缓冲槽（每次放入取第一个空闲槽），返回新计划。"""
+    free = list(buffer_slots)
+    held: Dict[str, str] = {}
+    result = []
+    for action in plan:
+        action = copy.deepcopy(action)
+        obj = action.get("object")
+        if (action.get("from") or {}).get("type") == "buffer" and obj in held:
+            slot = held.pop(obj)
+            action["from"]["slot"] = slot
+            free.append(slot)
+            free.sort(key=list(buffer_slots).index)
+        if (action.get("to") or {}).get("type") == "buffer" and free:
+            slot = free.pop(0)
+            action["to"]["slot"] = slot
+            held[obj] = slot
+        result.append(action)
+    return result
+
+
+def optimize_plan(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+                  buffer_slots=DEFAULT_BUFFER_SLOTS, travel_model: Optional[TravelCostModel] = None) -> Dict[str, Any]:
+    """返回 {plan, original_actions, actions, removed: {类别: 数量}, seconds_before, seconds_after}；
+    计划不能执行时原样返回（skipped 说明原因）。
+    """
+    report: Dict[str, Any] = {"plan": plan, "original_actions": len(plan), "actions": len(plan), "removed": {}}
+    simulation = simulate_plan(plan, current_state, target_spec, buffer_slots)
+    if not simulation["ok"]:
+        report["skipped"] = simulation["errors"][0] if simulation["errors"] else "plan does not execute"
+        return report
+
+    removed: Dict[str, int] = defaultdict(int)
+    current = [copy.deepcopy(action) for action in plan]
+    changed = True
+    while changed:
+        changed = False
+        for kind, candidate in _candidates(current):
+            if _executes(candidate, current_state, target_spec, buffer_slots):
+                removed[kind] += len(current) - len(candidate)
+                current = candidate
+                changed = True
+                break
+
+    slotted = reassign_buffer_slots(current, buffer_slots)
+    if _executes(slotted, current_state, target_spec, buffer_slots):
+        current = slotted
+    for step, action in enumerate(current, start=1):
+        action["step"] = step
+
+    model = travel_model or TravelCostModel()
+    seconds_before = model.plan_cost(plan, current_state, target_spec)["seconds"]
+    travel = minimize_travel(current, current_state, target_spec, model)
+    report.update(plan=travel["plan"], actions=len(travel["plan"]), removed=dict(removed),
+                  seconds_before=seconds_before, seconds_after=travel["after"]["seconds"])
+    return report
+
+
+def optimize_output(result: Dict[str, Any], current_state: Dict[str, Any], target_spec: Dict[str, Any]) -> Dict[str, Any]:
+    """对验证通过的输出做计划优化，返回新的输出（blocked 或不能执行的计划原样返回）。"""
+    if not isinstance(result, dict) or result.get("status") != "success" or not result.get("plan"):
+        return result
+    report = optimize_plan(result["plan"], current_state, target_spec)
+    if "skipped" in report:
+        return result
+    return dict(result, plan=report["plan"])
+
+
+# =============== 基准 ===============
+
+def wasteful_variants(output: Dict[str, Any], current_state: Dict[str, Any],
+                      target_spec: Dict[str, Any]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """由参考计划生成模型常见的浪费变体（只保留能执行的）：缓冲区往返、不必要的暂存、放下后又移走。"""
+    plan = output["plan"]
+    if not plan:
+        return
+    first = plan[0]
+    obj = first["object"]
+    variants = []
+
+    # 第一步之后把该对象移到缓冲区再放回原处
+    park = {"action": "move_to_buffer", "object": obj, "from": copy.deepcopy(first["to"]),
+            "to": {"type": "buffer", "slot": "B3"}, "reason": "Temporarily store object"}
+    back = {"action": "move_from_buffer", "object": obj, "from": {"type": "buffer", "slot": "B3"},
+            "to": copy.deepcopy(first["to"]), "reason": "Return object"}
+    if first["to"].get("type") != "buffer":
+        variants.append(("round_trip", [first, park, back] + plan[1:]))
+
+    # 不挡路的对象先暂存再放到目标位置
+    if first["to"].get("type") != "buffer" and first["from"].get("type") != "buffer":
+        staged = [dict(first, action="move_to_buffer", to={"type": "buffer", "slot": "B2"}),
+                  dict(first, action="move_from_buffer", **{"from": {"type": "buffer", "slot": "B2"}})]
+        variants.append(("needless_park", staged + plan[1:]))
+
+    # 最后一步放下的对象被移到缓冲区后再放回
+    last = plan[-1]
+    if last["to"].get("type") in ("stack", "arrangement"):
+        displaced = [dict(last, action="move_to_buffer", **{"from": copy.deepcopy(last["to"])},
+                          to={"type": "buffer", "slot": "B1"}),
+                     dict(last, action="move_from_buffer", **{"from": {"type": "buffer", "slot": "B1"}})]
+        variants.append(("placed_then_displaced", plan + displaced))
+
+    for kind, variant in variants:
+        variant = [dict(copy.deepcopy(action), step=step) for step, action in enumerate(variant, start=1)]
+        if simulate_plan(variant, current_state, target_spec)["ok"]:
+            yield kind, variant
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mean action count saved by the plan optimizer on the scenario corpus")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generated corpus)")
+    args = parser.parse_args()
+
+    from .plan_search import search_plan
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    rows: Dict[str, List[Tuple[int, int, int]]] = defaultdict(list)
+    for case in cases:
+        output = json.loads(case["reference_output"])
+        if output.get("status") != "success":
+            continue
+        optimum = len(search_plan(case["current_state"], case["target_spec"])["plan"])
+        samples = [("reference", output["plan"])]
+        samples += list(wasteful_variants(output, case["current_state"], case["target_spec"]))
+        for kind, plan in samples:
+            report = optimize_plan(plan, case["current_state"], case["target_spec"])
+            assert simulate_plan(report["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+            rows[kind].append((report["original_actions"], report["actions"], optimum))
+
+    print(f"[OPTIMIZE] {len(cases)} corpus cases")
+    print(f"[OPTIMIZE] {'plans':<22s} {'count':>5s} {'before':>7s} {'after':>7s} {'saved':>6s} {'optimal':>8s}")
+    for kind, values in rows.items():
+        before = statistics.mean(v[0] for v in values)
+        after = statistics.mean(v[1] for v in values)
+        print(f"[OPTIMIZE] {kind:<22s} {len(values):5d} {before:7.2f} {after:7.2f} {before - after:6.2f} "
+              f"{statistics.mean(v[2] for v in values):8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
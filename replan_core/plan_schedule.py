@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plan Schedule - 把线性计划转成动作依赖 DAG，并为 K 个机械臂排程
+- 依赖边来自资源冲突（回放计划得到每个动作读写的资源，写-写 / 写-读 / 读-写保持原顺序）：
+  - 对象本身：同一对象的动作按顺序
+  - 占用：堆栈各层、排列位置、金字塔位置、缓冲槽；放入前必须等上一个占用者移走
+  - 支撑：放到第 k 层要读第 k-1 层（middle 需要 bottom），移走第 k 层要读第 k+1 层为空；
+    金字塔 top 读两个底座，移走底座读 top
+  任何保持这些边的拓扑序都得到与原计划相同的中间状态与最终结构
+- 动作耗时：travel_cost 的取件 → 放置移动时间 + 两次抓放（不计机械臂回程与机械臂之间的避让）
+- 排程：动作数不多时分支定界求最小 makespan，否则列表调度（每次取最早能开始的动作，相同时取关键路径更长者）；
+  同时给出下界 max(关键路径, 总耗时 / K)
+
+makespan 随 K 的变化（在仓库根目录；--pairs 可指定 scene_enumerator 的分片）：
+  python -m replan_core.plan_schedule --arms 1 2 3 4
+"""
+
+import argparse
+import json
+import math
+import statistics
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from .plan_simulator import CubeWorld, split_structure, simulate_plan
+from .travel_cost import TravelCostModel
+
+# 动作数不超过该值时用分支定界求最小 makespan
+MAX_EXACT_ACTIONS = 10
+
+Resource = Tuple[str, Any]
+
+
+def _place_of(world: CubeWorld, obj: str) -> Optional[Resource]:
+    """对象当前占用的位置资源；散落返回 None。"""
+    if obj in world.stack:
+        return ("stack", world.stack.index(obj))
+    for pos, held in world.cells.items():
+        if held == obj:
+            return ("cell", pos)
+    for pos, held in world.pyramid.items():
+        if held == obj:
+            return ("pyramid", pos)
+    for slot, held in world.buffer.items():
+        if held == obj:
+            return ("buffer", slot)
+    return None
+
+
+def _support_reads(place: Optional[Resource], taking: bool) -> List[Resource]:
+    """取走 / 放入 place 时需要读取的支撑资源。"""
+    if place is None:
+        return []
+    kind, key = place
+    if kind == "stack":
+        return [("stack", key + 1)] if taking else ([("stack", key - 1)] if key > 0 else [])
+    if kind == "pyramid":
+        if taking:
+            return [("pyramid", "top")] if key != "top" else []
+        return [("pyramid", "bottom left"), ("pyramid", "bottom right")] if key == "top" else []
+    return []
+
+
+def build_dependency_graph(plan: List[Dict[str, Any]], current_state: Dict[str, Any],
+                           target_spec: Dict[str, Any]) -> List[Set[int]]:
+    """返回每个动作（按计划下标）的前驱集合；计划不能执行时抛出 SimulationError。"""
+    target = split_structure((target_spec or {}).get("target_structure", {}) or {})
+    world = CubeWorld(current_state, target_site=target["site"])
+    pyramid_mode = target["relationship"] == "pyramid"
+    last_writer: Dict[Resource, int] = {}
+    readers: Dict[Resource, List[int]] = {}
+    predecessors: List[Set[int]] = []
+
+    for index, action in enumerate(plan):
+        obj = action.get("object")
+        source = _place_of(world, obj)
+        world.apply(action, pyramid_mode=pyramid_mode)
+        target_place = _place_of(world, obj)
+
+        writes = [("object", obj)] + [place for place in (source, target_place) if place is not None]
+        reads = _support_reads(source, taking=True) + _support_reads(target_place, taking=False)
+        preds: Set[int] = set()
+        for resource in reads:
+            if resource in last_writer:
+                preds.add(last_writer[resource])
+            readers.setdefault(resource, []).append(index)
+        for resource in writes:
+            if resource in last_writer:
+                preds.add(last_writer[resource])
+            preds.update(readers.pop(resource, []))
+            last_writer[resource] = index
+        preds.discard(index)
+        predecessors.append(preds)
+    return predecessors
+
+
+def action_durations(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+                     model: Optional[TravelCostModel] = None) -> List[float]:
+    """每个动作的耗时（秒）：取件 → 放置的移动时间 + 抓取与放下。"""
+    model = model or TravelCostModel()
+    target = split_structure((target_spec or {}).get("target_structure", {}) or {})
+    world = CubeWorld(current_state, buffer_slots=tuple(model.buffer_slots), target_site=target["site"])
+    durations = []
+    for action in plan:
+        pick = model.locate(world, action.get("object"))
+        world.apply(action, pyramid_mode=target["relationship"] == "pyramid")
+        place = model.locate(world, action.get("object"))
+        durations.append(math.dist(pick, place) / model.speed + 2 * model.grasp_seconds)
+    return durations
+
+
+def _bottom_levels(predecessors: List[Set[int]], durations: List[float]) -> List[float]:
+    """每个动作到终点的最长路径（含自身耗时）。"""
+    successors: List[List[int]] = [[] for _ in predecessors]
+    for index, preds in enumerate(predecessors):
+        for pred in preds:
+            successors[pred].append(index)
+    levels = [0.0] * len(durations)
+    for index in reversed(range(len(durations))):
+        levels[index] = durations[index] + max((levels[s] for s in successors[index]), default=0.0)
+    return levels
+
+
+def _list_schedule(order: List[int], predecessors: List[Set[int]], durations: List[float],
+                   arms: int) -> Tuple[Dict[int, Tuple[int, float]], float]:
+    """按 order 依次把动作放到最早空闲的机械臂上，尽早开始；返回 ({下标: (arm, start)}, makespan)。"""
+    finish: Dict[int, float] = {}
+    arm_free = [0.0] * arms
+    placed: Dict[int, Tuple[int, float]] = {}
+    for index in order:
+        arm = min(range(arms), key=lambda a: arm_free[a])
+        start = max([arm_free[arm]] + [finish[p] for p in predecessors[index]])
+        finish[index] = arm_free[arm] = start + durations[index]
+        placed[index] = (arm, start)
+    return placed, max(finish.values(), default=0.0)
+
+
+def _greedy_order(predecessors: List[Set[int]], durations: List[float], levels: List[float], arms: int) -> List[int]:
+    """列表调度的顺序：每次取最早能开始的就绪动作，相同时取关键路径更长者。"""
+    finish: Dict[int, float] = {}
+    arm_free = [0.0] * arms
+    order: List[int] = []
+    remaining = set(range(len(durations)))
+    while remaining:
+        arm = min(range(arms), key=lambda a: arm_free[a])
+        ready = [i for i in remaining if predecessors[i] <= finish.keys()]
+        index = min(ready, key=lambda i: (max([arm_free[arm]] + [finish[p] for p in predecessors[i]]), -levels[i], i))
+        finish[index] = arm_free[arm] = max([arm_free[arm]] + [finish[p] for p in predecessors[index]]) + durations[index]
+        remaining.discard(index)
+        order.append(index)
+    return order
+
+
+def _exact_order(predecessors: List[Set[int]], durations: List[float], levels: List[float], arms: int,
+                 best_order: List[int], best: float, lower_bound: float) -> Tuple[List[int], float]:
+    """分支定界枚举拓扑序（按开始时间的列表调度覆盖一个最优排程），返回 (顺序, makespan)。"""
+
+    def search(order: List[int], finish: Dict[int, float], arm_free: List[float]) -> None:
+        nonlocal best_order, best
+        if best <= lower_bound + 1e-9:
+            return
+        if len(order) == len(durations):
+            makespan = max(finish.values(), default=0.0)
+            if makespan < best - 1e-9:
+                best_order, best = list(order), makespan
+            return
+        earliest = min(arm_free)
+        ready = [i for i in range(len(durations)) if i not in finish and predecessors[i] <= finish.keys()]
+        remaining = sum(durations[i] for i in range(len(durations)) if i not in finish)
+        bound = max([max(finish.values(), default=0.0), (sum(arm_free) + remaining) / arms]
+                    + [max([earliest] + [finish[p] for p in predecessors[i]]) + levels[i] for i in ready])
+        if bound >= best - 1e-9:
+            return
+        arm = arm_free.index(earliest)
+        for index in sorted(ready, key=lambda i: -levels[i]):
+            start = max([earliest] + [finish[p] for p in predecessors[index]])
+            next_free = list(arm_free)
+            next_free[arm] = start + durations[index]
+            search(order + [index], {**finish, index: start + durations[index]}, next_free)
+
+    search([], {}, [0.0] * arms)
+    return best_order, best
+
+
+def schedule_plan(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+                  arms: int = 2, model: Optional[TravelCostModel] = None) -> Dict[str, Any]:
+    """为 arms 个机械臂排程，返回 {schedule: [{step, index, arm, start, end}], makespan, lower_bound, optimal, ...}。
+
+    动作数不超过 MAX_EXACT_ACTIONS 时用分支定界求最小 makespan，否则用列表调度。
+    """
+    predecessors = build_dependency_graph(plan, current_state, target_spec)
+    durations = action_durations(plan, current_state, target_spec, model)
+    levels = _bottom_levels(predecessors, durations)
+    total = sum(durations)
+    lower_bound = max(max(levels, default=0.0), total / arms)
+
+    order = _greedy_order(predecessors, durations, levels, arms)
+    _, makespan = _list_schedule(order, predecessors, durations, arms)
+    exact = len(plan) <= MAX_EXACT_ACTIONS
+    if exact:
+        order, makespan = _exact_order(predecessors, durations, levels, arms, order, makespan, lower_bound)
+    placed, makespan = _list_schedule(order, predecessors, durations, arms)
+
+    schedule = [{"step": plan[index].get("step", index + 1), "index": index, "arm": arm + 1,
+                 "start": start, "end": start + durations[index]} for index, (arm, start) in placed.items()]
+    schedule.sort(key=lambda item: (item["start"], item["index"]))
+    return {
+        "schedule": schedule,
+        "makespan": makespan,
+        "lower_bound": lower_bound,
+        "optimal": exact or makespan <= lower_bound + 1e-9,
+        "sequential": total,
+        "edges": sum(len(preds) for preds in predecessors),
+    }
+
+
+def scheduled_order(plan: List[Dict[str, Any]], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """按开始时间排列的动作（一个与 DAG 相容的线性顺序），用于回放验证。"""
+    return [plan[item["index"]] for item in result["schedule"]]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Makespan versus number of arms for dependency-DAG schedules")
+    parser.add_argument("--arms", type=int, nargs="+", default=[1, 2, 3, 4], help="arm counts to compare")
+    parser.add_argument("--pairs", nargs="+", help="scene_enumerator shard JSONL files (default: scenario corpus)")
+    args = parser.parse_args()
+
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = [case for path in args.pairs for case in load_corpus(path)] if args.pairs else generate_corpus()
+    plans = []
+    for case in cases:
+        output = json.loads(case["reference_output"]) if case.get("reference_output") else {}
+        if output.get("status") == "success" and output.get("plan"):
+            plans.append((case, output["plan"]))
+
+    print(f"[SCHEDULE] {len(plans)} non-empty plans, {statistics.mean(len(p) for _, p in plans):.2f} actions mean")
+    print(f"[SCHEDULE] {'arms':>4s} {'makespan s':>11s} {'sequential s':>13s} {'speedup':>8s} {'at bound':>9s} "
+          f"{'optimal':>8s} {'ms/plan':>8s}")
+    for arms in args.arms:
+        makespans, sequential, at_bound, optimal = [], [], 0, 0
+        start = time.perf_counter()
+        for case, plan in plans:
+            result = schedule_plan(plan, case["current_state"], case["target_spec"], arms)
+            # 按开始时间回放必须仍能到达目标
+            replay = simulate_plan(scheduled_order(plan, result), case["current_state"], case["target_spec"])
+            assert replay["ok"], f"{case['case_id']}: {replay['errors']}"
+            makespans.append(result["makespan"])
+            sequential.append(result["sequential"])
+            at_bound += result["makespan"] <= result["lower_bound"] + 1e-9
+            optimal += result["optimal"]
+        elapsed_ms = (time.perf_counter() - start) * 1000.0 / len(plans)
+        print(f"[SCHEDULE] {arms:4d} {statistics.mean(makespans):11.2f} {statistics.mean(sequential):13.2f} "
+              f"{sum(sequential) / sum(makespans):7.2f}x {at_bound / len(plans):9.1%} {optimal / len(plans):8.1%} "
+              f"{elapsed_ms:8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
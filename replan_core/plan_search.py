@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plan Search - 符号状态空间上的最短计划搜索
+- 状态：堆栈（自底向上）与桌面位置、排列位置、金字塔位置、缓冲槽；未出现的对象视为散落
+- 动作只做有意义的移动：目标中需要的对象放到目标位置、空闲缓冲槽或散落区（暂放，不限数量），
+  不需要的对象移到散落区；因此缓冲槽用完时仍能找到计划（例如默认三个槽位下倒序的四层塔）
+- 每个动作代价为 1：A*（启发式 = 仍需移动的对象数，可采纳）返回动作数最少的计划，按现有动作 JSON 格式输出；
+  置换表以紧凑的字节串状态编码为键。广度优先搜索保留作对照
+
+各场景类别的扩展状态数与耗时（在仓库根目录；--pairs 可指定 scene_enumerator 的分片）：
+  python -m replan_core.plan_search
+"""
+
+import argparse
+import heapq
+import json
+import statistics
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Any, Optional, Tuple
+
+from .plan_simulator import DEFAULT_BUFFER_SLOTS, MAX_STACK_HEIGHT, PYRAMID_SUPPORT, split_structure
+from .stack_layers import layer_labels
+
+MAX_SEARCH_STATES = 200000
+
+# 状态：(stack, site, cells, pyramid, buffer)；cells / pyramid 为排序后的 (position, object) 元组
+State = Tuple[Tuple[str, ...], Optional[str], Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...], Tuple[Optional[str], ...]]
+# 移动：(object, from 端点, to 端点, reason)
+Move = Tuple[str, Dict[str, Any], Dict[str, Any], str]
+
+
+class PlanSearchError(ValueError):
+    """找不到到达目标的计划：状态空间已搜索完（目标不可达），或达到 max_states 上限。"""
+
+
+class _Problem:
+    """一个 (current_state, target_spec) 对的搜索问题。"""
+
+    def __init__(self, current_state: Dict[str, Any], target_spec: Dict[str, Any], buffer_slots=DEFAULT_BUFFER_SLOTS):
+        current = split_structure((current_state or {}).get("target_structure", {}) or {})
+        target = split_structure((target_spec or {}).get("target_structure", {}) or {})
+        self.slots = tuple(buffer_slots)
+        self.target_stack = tuple(target["stack"])
+        self.target_site = target["site"]
+        self.target_cells = dict(target["cells"])
+        self.target_pyramid = dict(target["pyramid"])
+        self.pyramid_mode = target["relationship"] == "pyramid"
+        self.needed = set(self.target_stack) | set(self.target_cells.values()) | set(self.target_pyramid.values())
+        self.initial_stack = tuple(current["stack"])
+        self.initial_labels = tuple(current["stack_labels"])
+        self.target_labels = layer_labels(len(self.target_stack))
+        self.start: State = (self.initial_stack, current["site"], tuple(sorted(current["cells"].items())),
+                             tuple(sorted(current["pyramid"].items())), (None,) * len(self.slots))
+        self.goal: State = (self.target_stack, None, tuple(sorted(self.target_cells.items())),
+                            tuple(sorted(self.target_pyramid.items())), (None,) * len(self.slots))
+
+        # 状态编码表：对象 -> 字节下标（从 1 开始），位置 -> 位置码（1..MAX_STACK_HEIGHT 为堆栈层）
+        objects = sorted(self.needed | set(self.initial_stack) | set(current["cells"].values())
+                         | set(current["pyramid"].values()))
+        self.objects = {obj: index for index, obj in enumerate(objects, start=1)}
+        places = [("cell", pos) for pos in sorted(set(current["cells"]) | set(self.target_cells))]
+        places += [("pyramid", pos) for pos in sorted(set(current["pyramid"]) | set(self.target_pyramid))]
+        places += [("buffer", slot) for slot in self.slots]
+        self.codes = {place: code for code, place in enumerate(places, start=MAX_STACK_HEIGHT + 1)}
+        for code, site in enumerate(sorted({current["site"], self.target_site} - {None}), start=1):
+            self.codes[("site", site)] = code
+
+    def is_goal(self, state: State) -> bool:
+        stack, site, cells, pyramid, buffer = state
+        if stack != self.target_stack or cells != self.goal[2] or pyramid != self.goal[3] or any(buffer):
+            return False
+        return not (self.target_site and stack) or site == self.target_site
+
+    def encode(self, state: State) -> bytes:
+        """置换表键：每个对象一个位置码（0 为散落）加堆栈桌面位置码，字节串长度 = 对象数 + 1。"""
+        stack, site, cells, pyramid, buffer = state
+        code = bytearray(len(self.objects) + 1)
+        code[0] = self.codes.get(("site", site), 0)
+        for index, obj in enumerate(stack):
+            code[self.objects[obj]] = 1 + index
+        for pos, obj in cells:
+            code[self.objects[obj]] = self.codes[("cell", pos)]
+        for pos, obj in pyramid:
+            code[self.objects[obj]] = self.codes[("pyramid", pos)]
+        for slot, obj in zip(self.slots, buffer):
+            if obj:
+                code[self.objects[obj]] = self.codes[("buffer", slot)]
+        return bytes(code)
+
+    def heuristic(self, state: State) -> int:
+        """仍需至少移动一次的对象数（可采纳：每个动作只移动一个对象）。
+
+        计入：正确堆栈前缀之上的全部层（阻塞深度，含标签碰巧正确但被压在错误层之上的对象）、
+        位置错误的排列对象、错误的金字塔位置（底座错误时 top 也要移走）、缓冲区中的对象、尚未放置的目标对象。
+        """
+        stack, site, cells, pyramid, buffer = state
+        prefix = 0
+        if not (self.target_site and stack and site != self.target_site):
+            limit = min(len(stack), len(self.target_stack))
+            while prefix < limit and stack[prefix] == self.target_stack[prefix]:
+                prefix += 1
+        count = len(stack) - prefix
+        placed = set(stack)
+        for pos, obj in cells:
+            placed.add(obj)
+            count += self.target_cells.get(pos) != obj
+        held = dict(pyramid)
+        wrong_base = any(held.get(pos) != self.target_pyramid.get(pos) for pos in PYRAMID_SUPPORT["top"] if pos in held)
+        for pos, obj in pyramid:
+            placed.add(obj)
+            count += self.target_pyramid.get(pos) != obj or (pos == "top" and wrong_base)
+        for obj in buffer:
+            if obj:
+                placed.add(obj)
+                count += 1
+        return count + len(self.needed - placed)
+
+    def _stack_label(self, index: int, stack: Tuple[str, ...]) -> str:
+        """堆栈第 index 层的标签：仍是初始堆栈的一部分时沿用初始标签，否则用目标堆栈标签。"""
+        if stack[:index + 1] == self.initial_stack[:index + 1] and index < len(self.initial_labels):
+            return self.initial_labels[index]
+        return self.target_labels[index]
+
+    def _sources(self, state: State) -> List[Tuple[str, Dict[str, Any], State]]:
+        """当前可以拿起的对象、from 端点，以及拿起之后的状态。"""
+        stack, site, cells, pyramid, buffer = state
+        sources: List[Tuple[str, Dict[str, Any], State]] = []
+        if stack:
+            # 空栈不保留桌面位置（下一次建栈采用目标位置），避免重复状态
+            sources.append((stack[-1], {"type": "stack", "position": self._stack_label(len(stack) - 1, stack)},
+                            (stack[:-1], site if len(stack) > 1 else None, cells, pyramid, buffer)))
+        for pos, obj in cells:
+            rest = tuple(item for item in cells if item[0] != pos)
+            sources.append((obj, {"type": "arrangement", "position": pos}, (stack, site, rest, pyramid, buffer)))
+        held = dict(pyramid)
+        for pos, obj in pyramid:
+            # 有 top 时底层被压住
+            if pos == "top" or "top" not in held:
+                rest = tuple(item for item in pyramid if item[0] != pos)
+                sources.append((obj, {"type": "stack", "position": pos}, (stack, site, cells, rest, buffer)))
+        for index, (slot, obj) in enumerate(zip(self.slots, buffer)):
+            if obj:
+                rest = buffer[:index] + (None,) + buffer[index + 1:]
+                sources.append((obj, {"type": "buffer", "slot": slot}, (stack, site, cells, pyramid, rest)))
+        placed = set(stack) | set(dict(cells).values()) | set(held.values()) | set(buffer)
+        sources.extend((obj, {"type": "scattered"}, state) for obj in sorted(self.needed - placed))
+        return sources
+
+    def successors(self, state: State) -> List[Tuple[State, Move]]:
+        result: List[Tuple[State, Move]] = []
+        for obj, source, lifted in self._sources(state):
+            for target, reason, moved in self._destinations(obj, lifted):
+                if target == source:
+                    continue
+                result.append((moved, (obj, source, target, reason)))
+        return result
+
+    def _destinations(self, obj: str, state: State) -> List[Tuple[Dict[str, Any], str, State]]:
+        """对象被拿起后（state 已不含它）可以放下的位置。"""
+        stack, site, cells, pyramid, buffer = state
+        if obj not in self.needed:
+            return [({"type": "scattered"}, "Remove object not in target", state)]
+
+        options = []
+        depth = len(stack)
+        # 只在正确的堆栈前缀（且桌面位置正确）上放下一层目标对象；空栈重新建栈时采用目标位置
+        if depth < min(len(self.target_stack), MAX_STACK_HEIGHT) and self.target_stack[depth] == obj \
+                and stack == self.target_stack[:depth] and not (depth and self.target_site and site != self.target_site):
+            options.append(({"type": "stack", "position": self.target_labels[depth]}, "Place object at stack position",
+                             (stack + (obj,), site if depth else self.target_site, cells, pyramid, buffer)))
+        occupied = dict(cells)
+        for pos, wanted in self.target_cells.items():
+            if wanted == obj and pos not in occupied:
+                options.append(({"type": "arrangement", "position": pos}, "Place object at arrangement position",
+                                (stack, site, tuple(sorted(cells + ((pos, obj),))), pyramid, buffer)))
+        if self.pyramid_mode:
+            held = dict(pyramid)
+            for pos, wanted in self.target_pyramid.items():
+                if wanted == obj and pos not in held and all(p in held for p in PYRAMID_SUPPORT.get(pos, ())):
+                    options.append(({"type": "stack", "position": pos}, "Place object at pyramid position",
+                                    (stack, site, cells, tuple(sorted(pyramid + ((pos, obj),))), buffer)))
+        # 缓冲槽彼此等价：只使用第一个空闲槽
+        for index, held in enumerate(buffer):
+            if held is None:
+                parked = buffer[:index] + (obj,) + buffer[index + 1:]
+                options.append(({"type": "buffer", "slot": self.slots[index]}, "Temporarily store object needed later",
+                                (stack, site, cells, pyramid, parked)))
+                break
+        # 散落区不限数量，缓冲槽用完时也能暂放（代价相同时 A* 按入队顺序优先缓冲槽）
+        options.append(({"type": "scattered"}, "Set object aside until its position is free", state))
+        return options
+
+
+def search_plan(current_state: Dict[str, Any], target_spec: Dict[str, Any], buffer_slots=DEFAULT_BUFFER_SLOTS,
+                max_states: int = MAX_SEARCH_STATES, algorithm: str = "astar") -> Dict[str, Any]:
+    """搜索最短计划，返回 {plan, expanded}；目标不可达或超出 max_states 仍未找到时抛出 PlanSearchError。
+
+    algorithm: "astar"（可采纳启发式 + 置换表）或 "bfs"（广度优先，作为对照）；两者都返回最短计划。
+    """
+    problem = _Problem(current_state, target_spec, buffer_slots)
+    if algorithm == "bfs":
+        return _bfs(problem, max_states)
+    if algorithm == "astar":
+        return _astar(problem, max_states)
+    raise ValueError(f"Unknown search algorithm: {algorithm}")
+
+
+def _bfs(problem: _Problem, max_states: int) -> Dict[str, Any]:
+    start = problem.encode(problem.start)
+    parents: Dict[bytes, Optional[Tuple[bytes, Move]]] = {start: None}
+    frontier = deque([problem.start])
+    expanded = 0
+    while frontier:
+        state = frontier.popleft()
+        if problem.is_goal(state):
+            return {"plan": _to_actions(_path(parents, problem.encode(state))), "expanded": expanded}
+        expanded += 1
+        if expanded > max_states:
+            raise _limit_error(max_states)
+        key = problem.encode(state)
+        for successor, move in problem.successors(state):
+            successor_key = problem.encode(successor)
+            if successor_key not in parents:
+                parents[successor_key] = (key, move)
+                frontier.append(successor)
+    raise _exhausted_error(problem, expanded)
+
+
+def _astar(problem: _Problem, max_states: int) -> Dict[str, Any]:
+    """A*：f = g + h，h 可采纳；置换表记录每个状态编码的最小 g，g 变小时重新入队（保证最优）。"""
+    start = problem.encode(problem.start)
+    best_g: Dict[bytes, int] = {start: 0}
+    parents: Dict[bytes, Optional[Tuple[bytes, Move]]] = {start: None}
+    # (f, h, 序号, g, key, state)：f 相同时优先 h 小（更接近目标）的状态
+    heap = [(problem.heuristic(problem.start), problem.heuristic(problem.start), 0, 0, start, problem.start)]
+    counter = 1
+    expanded = 0
+    while heap:
+        _, _, _, g, key, state = heapq.heappop(heap)
+        if g > best_g[key]:
+            continue  # 过期条目
+        if problem.is_goal(state):
+            return {"plan": _to_actions(_path(parents, key)), "expanded": expanded}
+        expanded += 1
+        if expanded > max_states:
+            raise _limit_error(max_states)
+        for successor, move in problem.successors(state):
+            successor_key = problem.encode(successor)
+            if best_g.get(successor_key, g + 2) <= g + 1:
+                continue
+            best_g[successor_key] = g + 1
+            parents[successor_key] = (key, move)
+            h = problem.heuristic(successor)
+            heapq.heappush(heap, (g + 1 + h, h, counter, g + 1, successor_key, successor))
+            counter += 1
+    raise _exhausted_error(problem, expanded)
+
+
+def _limit_error(max_states: int) -> PlanSearchError:
+    return PlanSearchError(f"Search stopped at the state limit ({max_states} states) without reaching the target")
+
+
+def _exhausted_error(problem: _Problem, expanded: int) -> PlanSearchError:
+    return PlanSearchError(f"Target is unreachable: all {expanded} reachable states searched "
+                           f"(buffer slots {list(problem.slots)})")
+
+
+def _path(parents: Dict[bytes, Optional[Tuple[bytes, Move]]], key: bytes) -> List[Move]:
+    moves: List[Move] = []
+    while parents[key] is not None:
+        key, move = parents[key]
+        moves.append(move)
+    moves.reverse()
+    return moves
+
+
+def _to_actions(moves: List[Move]) -> List[Dict[str, Any]]:
+    plan = []
+    for step, (obj, source, target, reason) in enumerate(moves, start=1):
+        if target["type"] == "buffer":
+            name = "move_to_buffer"
+        elif source["type"] == "buffer":
+            name = "move_from_buffer"
+        else:
+            name = "move_to_position"
+        plan.append({"step": step, "action": name, "object": obj, "from": dict(source), "to": dict(target),
+                     "reason": reason})
+    return plan
+
+
+def build_optimal_output(target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                         buffer_slots=DEFAULT_BUFFER_SLOTS) -> Dict[str, Any]:
+    """与 build_reference_output 相同格式的输出，计划为最短计划。"""
+    plan = search_plan(current_state, target_spec, buffer_slots)["plan"]
+    return {"status": "success", "plan": plan, "final_expected": json.loads(json.dumps(target_spec))}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="States expanded and time per scenario class: A* vs breadth-first search")
+    parser.add_argument("--pairs", nargs="+", help="scene_enumerator shard JSONL files (default: scenario corpus)")
+    parser.add_argument("--rounds", type=int, default=3, help="timed rounds per case")
+    args = parser.parse_args()
+
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = [case for path in args.pairs for case in load_corpus(path)] if args.pairs else generate_corpus()
+    rows: Dict[str, Dict[str, List[Tuple[int, int, float]]]] = defaultdict(lambda: defaultdict(list))
+    mismatches = 0
+    for case in cases:
+        lengths = set()
+        for algorithm in ("bfs", "astar"):
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                result = search_plan(case["current_state"], case["target_spec"], algorithm=algorithm)
+            elapsed = (time.perf_counter() - start) / args.rounds * 1e6
+            lengths.add(len(result["plan"]))
+            rows[case["category"]][algorithm].append((len(result["plan"]), result["expanded"], elapsed))
+        mismatches += len(lengths) > 1
+
+    print(f"[SEARCH] {len(cases)} cases, plan length mismatches between A* and BFS: {mismatches}")
+    print(f"[SEARCH] {'class':<20s} {'cases':>5s} {'moves':>5s}  {'BFS states':>10s} {'BFS us':>8s}  "
+          f"{'A* states':>9s} {'A* us':>8s}")
+    for category, by_algorithm in sorted(rows.items()):
+        bfs, astar = by_algorithm["bfs"], by_algorithm["astar"]
+        print(f"[SEARCH] {category:<20s} {len(bfs):5d} {statistics.mean(r[0] for r in bfs):5.1f}  "
+              f"{statistics.mean(r[1] for r in bfs):10.1f} {statistics.mean(r[2] for r in bfs):8.0f}  "
+              f"{statistics.mean(r[1] for r in astar):9.1f} {statistics.mean(r[2] for r in astar):8.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plan Simulator - 坐标无关动作计划的符号化执行器
+- 线性堆栈：bottom→top 列表，最多 MAX_STACK_HEIGHT 层，层标签见 stack_layers（bottom / layer k / middle 需要正好 k-1 层在下方），
+  "top" 表示放到当前栈顶（扩展语义）
+- 排列位置：left/right/front/back/middle 等独立位置
+- 金字塔：top 需要 bottom left 与 bottom right 同时支撑
+- 缓冲槽：config.BUFFER_SLOTS（默认 B1/B2/B3，可配置数量），每个槽同一时刻只能放一个对象
+- 未出现在任何位置的对象视为散落在桌面（scattered）
+"""
+
+from typing import Dict, List, Any, Optional
+
+from .config import BUFFER_SLOTS, MAX_STACK_HEIGHT
+from .relationships import RELATIONSHIPS
+from .stack_layers import is_stack_position, layer_index, layer_labels, ordered_layers
+
+# 线性堆栈高度 -> 各层标签（自底向上）
+STACK_LABELS = {height: layer_labels(height) for height in range(1, MAX_STACK_HEIGHT + 1)}
+
+# 单物体关系 -> 堆栈所在桌面位置
+SINGLE_STACK_SITES = {"stacked_left": "left", "stacked_middle": "middle", "stacked_right": "right"}
+# 金字塔的支撑关系来自关系注册表的支撑图
+PYRAMID_SUPPORT = dict(RELATIONSHIPS["pyramid"].supports)
+DEFAULT_BUFFER_SLOTS = tuple(BUFFER_SLOTS)
+
+
+def _object_of(placement: Dict[str, Any]) -> Optional[str]:
+    """提取 placement 中的对象描述（object / object 1 / object 2 ...）。"""
+    if not isinstance(placement, dict):
+        return None
+    if placement.get("object"):
+        return placement["object"]
+    for key in sorted(k for k in placement if k.startswith("object")):
+        if placement.get(key):
+            return placement[key]
+    return None
+
+
+def stack_positions_for(relationship: str) -> set:
+    """返回关系中属于线性堆栈的位置集合（其余位置按排列位置处理）。"""
+    if relationship == "stacked":
+        return {label for labels in STACK_LABELS.values() for label in labels}
+    if relationship in {"stacked_and_separated_left", "stacked_and_separated_right"}:
+        return {"bottom", "top"}
+    return set()
+
+
+def split_structure(structure: Dict[str, Any]) -> Dict[str, Any]:
+    """将 target_structure 拆分为 stack 列表、arrangement 映射与 pyramid 映射。"""
+    relationship = (structure or {}).get("relationship") or "none"
+    placements = (structure or {}).get("placements") or []
+
+    stack_map: Dict[str, str] = {}
+    cells: Dict[str, str] = {}
+    pyramid: Dict[str, str] = {}
+    loose: List[str] = []
+
+    for placement in placements:
+        obj = _object_of(placement)
+        if not obj:
+            continue
+        pos = placement.get("position")
+        if relationship in SINGLE_STACK_SITES:
+            stack_map["bottom"] = obj
+        elif not pos:
+            loose.append(obj)
+        elif relationship == "pyramid":
+            pyramid[pos] = obj
+        elif is_stack_position(relationship, pos):
+            stack_map[pos] = obj
+        else:
+            cells[pos] = obj
+
+    # stack_map 中只有堆栈层（单物体关系记为 bottom），统一按 stacked 的层序号排序
+    stack_labels = [pos for pos, _ in ordered_layers("stacked", stack_map)]
+    return {
+        "relationship": relationship,
+        "stack": [stack_map[p] for p in stack_labels],
+        "stack_labels": stack_labels,
+        "site": SINGLE_STACK_SITES.get(relationship),
+        "cells": cells,
+        "pyramid": pyramid,
+        "loose": loose,
+    }
+
+
+class SimulationError(ValueError):
+    """动作在当前世界状态下不可执行。"""
+
+
+class CubeWorld:
+    """可变的符号世界状态，按动作逐步执行并检查物理约束。"""
+
+    def __init__(self, current_state: Dict[str, Any], buffer_slots=DEFAULT_BUFFER_SLOTS, target_site: Optional[str] = None,
+                 max_height: int = MAX_STACK_HEIGHT):
+        structure = (current_state or {}).get("target_structure", {}) or {}
+        parts = split_structure(structure)
+        self.stack: List[str] = list(parts["stack"])
+        # 单物体关系的堆栈有桌面位置（left/middle/right）；重新建栈时采用目标位置
+        self.site: Optional[str] = parts["site"]
+        self.target_site = target_site
+        self.cells: Dict[str, str] = dict(parts["cells"])
+        self.pyramid: Dict[str, str] = dict(parts["pyramid"])
+        self.buffer: Dict[str, Optional[str]] = {slot: None for slot in buffer_slots}
+        self.max_height = max_height
+
+    # ----- 查询 -----
+    def locate(self, obj: str) -> Optional[str]:
+        """返回对象所在区域（stack/arrangement/pyramid/buffer），散落返回 None。"""
+        if obj in self.stack:
+            return "stack"
+        if obj in self.cells.values():
+            return "arrangement"
+        if obj in self.pyramid.values():
+            return "pyramid"
+        if obj in self.buffer.values():
+            return "buffer"
+        return None
+
+    # ----- 执行 -----
+    def apply(self, action: Dict[str, Any], pyramid_mode: bool = False) -> None:
+        obj = action.get("object")
+        if not obj:
+            raise SimulationError("Action missing 'object'")
+        self._take(obj, action.get("from") or {})
+        self._put(obj, action.get("to") or {}, pyramid_mode)
+
+    def _take(self, obj: str, source: Dict[str, Any]) -> None:
+        kind = source.get("type")
+        if kind in ("scattered", "supply", None):
+            if self.locate(obj) is not None:
+                raise SimulationError(f"'{obj}' is not scattered (currently in {self.locate(obj)})")
+            return
+        if kind == "buffer":
+            slot = source.get("slot")
+            if self.buffer.get(slot) != obj:
+                raise SimulationError(f"Buffer slot {slot} does not hold '{obj}'")
+            self.buffer[slot] = None
+            return
+        if kind == "stack" and source.get("position") in self.pyramid:
+            pos = source.get("position")
+            if self.pyramid.get(pos) != obj:
+                raise SimulationError(f"Pyramid position '{pos}' does not hold '{obj}'")
+            resting = [p for p, below in PYRAMID_SUPPORT.items() if pos in below and self.pyramid.get(p)]
+            if resting:
+                raise SimulationError(f"Cannot remove '{obj}' from '{pos}': pyramid {resting[0]} is still supported by it")
+            del self.pyramid[pos]
+            return
+        if kind == "stack":
+            if not self.stack or obj not in self.stack:
+                raise SimulationError(f"'{obj}' is not in the stack")
+            if self.stack[-1] != obj:
+                raise SimulationError(f"'{obj}' is blocked by {self.stack[self.stack.index(obj) + 1:]}")
+            self.stack.pop()
+            return
+        if kind == "arrangement":
+            pos = source.get("position")
+            if self.cells.get(pos) != obj:
+                raise SimulationError(f"Arrangement position '{pos}' does not hold '{obj}'")
+            del self.cells[pos]
+            return
+        raise SimulationError(f"Unknown source type: {kind}")
+
+    def _put(self, obj: str, target: Dict[str, Any], pyramid_mode: bool) -> None:
+        kind = target.get("type")
+        if kind == "scattered":
+            return
+        if kind == "buffer":
+            slot = target.get("slot")
+            if slot not in self.buffer:
+                raise SimulationError(f"Invalid buffer slot: {slot}")
+            if self.buffer[slot] is not None:
+                raise SimulationError(f"Buffer slot {slot} already holds '{self.buffer[slot]}'")
+            self.buffer[slot] = obj
+            return
+        if kind == "stack" and pyramid_mode:
+            pos = target.get("position")
+            if self.pyramid.get(pos):
+                raise SimulationError(f"Pyramid position '{pos}' is occupied by '{self.pyramid[pos]}'")
+            missing = [p for p in PYRAMID_SUPPORT.get(pos, ()) if not self.pyramid.get(p)]
+            if missing:
+                raise SimulationError(f"Pyramid position '{pos}' lacks support at {missing}")
+            self.pyramid[pos] = obj
+            return
+        if kind == "stack":
+            pos = target.get("position")
+            index = layer_index(pos)
+            if pos == "bottom" and self.stack:
+                raise SimulationError(f"Stack bottom is occupied by '{self.stack[0]}'")
+            elif index is not None and index != len(self.stack):
+                raise SimulationError(f"Stack {pos} requires exactly {index} layer(s) below, found {len(self.stack)}")
+            if pos != "top" and index is None:
+                raise SimulationError(f"Unknown stack position: {pos}")
+            if len(self.stack) >= self.max_height:
+                raise SimulationError(f"Stack is full ({len(self.stack)} layers), cannot place '{obj}' on top")
+            if not self.stack:
+                self.site = self.target_site
+            self.stack.append(obj)
+            return
+        if kind == "arrangement":
+            pos = target.get("position")
+            if not pos:
+                raise SimulationError("Arrangement placement missing position")
+            if self.cells.get(pos):
+                raise SimulationError(f"Arrangement position '{pos}' is occupied by '{self.cells[pos]}'")
+            self.cells[pos] = obj
+            return
+        raise SimulationError(f"Unknown target type: {kind}")
+
+    # ----- 导出 -----
+    def to_structure(self, relationship: str) -> Dict[str, Any]:
+        """把当前世界状态写成 relationship 下的 target_structure（缓冲区与散落对象不计入）。"""
+        if relationship in SINGLE_STACK_SITES:
+            return {"relationship": relationship, "placements": [{"object": obj} for obj in self.stack]}
+        located = [(pos, self.pyramid[pos]) for pos in ("bottom left", "bottom right", "top") if pos in self.pyramid]
+        located += list(zip(layer_labels(len(self.stack)), self.stack))
+        located += list(self.cells.items())
+        placements = [{"position": pos, f"object {i}": obj} for i, (pos, obj) in enumerate(located, start=1)]
+        return {"relationship": relationship, "placements": placements}
+
+    # ----- 比较 -----
+    def diff_against(self, target_structure: Dict[str, Any]) -> List[str]:
+        """返回当前世界与目标结构的差异描述（空列表表示完全一致）。"""
+        expected = split_structure(target_structure)
+        problems: List[str] = []
+        if self.stack != expected["stack"]:
+            problems.append(f"stack {self.stack} != expected {expected['stack']}")
+        elif expected["site"] and self.site != expected["site"]:
+            problems.append(f"stack site {self.site} != expected {expected['site']}")
+        if self.cells != expected["cells"]:
+            problems.append(f"arrangement {self.cells} != expected {expected['cells']}")
+        if self.pyramid != expected["pyramid"]:
+            problems.append(f"pyramid {self.pyramid} != expected {expected['pyramid']}")
+        occupied = {slot: obj for slot, obj in self.buffer.items() if obj}
+        if occupied:
+            problems.append(f"buffer not empty: {occupied}")
+        return problems
+
+
+def simulate_plan(plan: List[Dict[str, Any]], current_state: Dict[str, Any],
+                  target_spec: Dict[str, Any], buffer_slots=DEFAULT_BUFFER_SLOTS) -> Dict[str, Any]:
+    """执行计划并与目标结构比较，返回 {ok, errors, failed_step}。"""
+    target_structure = (target_spec or {}).get("target_structure", {}) or {}
+    pyramid_mode = target_structure.get("relationship") == "pyramid"
+    world = CubeWorld(current_state, buffer_slots, target_site=split_structure(target_structure)["site"])
+
+    for index, action in enumerate(plan or []):
+        try:
+            world.apply(action, pyramid_mode=pyramid_mode)
+        except SimulationError as e:
+            return {"ok": False, "errors": [str(e)], "failed_step": action.get("step", index + 1)}
+
+    problems = world.diff_against(target_structure)
+    return {"ok": not problems, "errors": problems, "failed_step": None}
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+端到端 replan 入口：检索 → 提示词 → 生成 → 解析验证 → 目标一致性验证 → 计划优化
+（目标关系注册了支撑图时先由 graph_planner 直接构造计划，不加载模型）
+"""
+
+import json
+from typing import Dict, Any, Tuple
+
+from .compact_output import parse_model_output
+from .config import OPTIMIZE_PLANS, SYMBOLIC_PLANNING
+from .graph_planner import GraphPlanningError, has_support_graph, plan_from_graph
+from .plan_optimizer import optimize_plan
+from .profiles import ModelProfile, DEFAULT_PROFILE
+from .rag_system import ReplanRAGSystem
+from .validation import validate_target_consistency
+
+
+def generate_replan(target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                    profile: ModelProfile = DEFAULT_PROFILE, rag_system: ReplanRAGSystem = None, backend=None):
+    """使用真正的RAG生成replan结果
+
+    rag_system / backend 可复用传入（例如基准测试中的 ReplayLLMBackend），缺省时按配置档现场加载。
+    """
+    relationship = target_spec.get("target_structure", {}).get("relationship")
+    if SYMBOLIC_PLANNING and has_support_graph(relationship):
+        try:
+            result = plan_from_graph(target_spec, current_state)
+        except GraphPlanningError as e:
+            print(f"[GRAPH] Falling back to the language model: {e}")
+        else:
+            print(f"[GRAPH] {relationship}: {len(result['plan'])} actions from the support graph")
+            if OPTIMIZE_PLANS:
+                report = optimize_plan(result["plan"], current_state, target_spec)
+                if "skipped" not in report:
+                    print(f"[OPTIMIZE] {report['original_actions']} -> {report['actions']} actions {report['removed']}")
+                    result = dict(result, plan=report["plan"])
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+            return result
+
+    # 初始化RAG系统
+    if rag_system is None:
+        rag_system = ReplanRAGSystem(profile)
+
+    # 加载语言模型
+    if backend is None:
+        from .transformers_backend import TransformersChatBackend
+        backend = TransformersChatBackend(profile)
+
+    # 用已加载模型的 tokenizer 计算提示词 token 预算
+    tokenizer = getattr(backend, "tokenizer", None)
+    if tokenizer is not None:
+        rag_system.use_tokenizer(profile.model_name, tokenizer)
+
+    def _generate_once(system_prompt: str, user_prompt: str) -> Tuple[Dict[str, Any], str]:
+        """执行一次生成（max_new_tokens 按预算报告设置）"""
+        budget = rag_system.last_prompt_report
+        raw = backend.generate(system_prompt, user_prompt, budget and budget["max_new_tokens"])
+
+        try:
+            result = parse_model_output(raw, target_spec, current_state, profile.output_format)
+            return result, raw
+        except Exception as e:
+            print(f"Parse error: {e}")
+            return None, raw
+
+    # 生成
+    system_prompt, user_prompt = rag_system.build_rag_prompt(target_spec, current_state, profile=profile)
+    result, raw = _generate_once(system_prompt, user_prompt)
+
+    if result is None:
+        print(f"Generation failed. Full Raw: {repr(raw)}")
+        return None
+
+    # 目标一致性验证
+    if not validate_target_consistency(result, target_spec):
+        print("Target consistency validation failed. Attempting retry...")
+        # 可以在这里添加重试逻辑，暂时先输出警告
+        print("Warning: Generated result does not match target specification")
+    elif OPTIMIZE_PLANS and result.get("status") == "success":
+        report = optimize_plan(result.get("plan", []), current_state, target_spec)
+        if "skipped" not in report:
+            print(f"[OPTIMIZE] {report['original_actions']} -> {report['actions']} actions {report['removed']}, "
+                  f"estimated execution {report['seconds_before']:.1f} s -> {report['seconds_after']:.1f} s")
+            result = dict(result, plan=report["plan"])
+
+    # 美化输出
+    formatted = json.dumps(result, indent=2, ensure_ascii=False)
+    print(formatted)
+    return result
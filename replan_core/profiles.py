@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+模型配置档（Model Profiles）
+每个语言模型一份：模型名、chat template 参数、提示词风格、生成参数。
+知识库、embedding 索引、缓存与验证器在所有配置档之间共享。
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """单个语言模型的推理与提示词配置。"""
+    name: str
+    model_name: str
+    # 提示词风格：
+    # - "layered": 按替换复杂度选择分层系统提示词，规则按物理约束优先级分组
+    # - "flat": 单一 stacked 系统提示词，规则按检索顺序平铺
+    prompt_style: str = "layered"
+    chat_template_kwargs: Dict[str, Any] = field(default_factory=dict, hash=False)
+    # 生成参数（max_new_tokens 为上限，实际值按场景的预期计划长度设置，见 prompt_budget）
+    max_new_tokens: int = 4096
+    temperature: float = 0.3  # 降低温度提高一致性
+    top_p: float = 0.9
+    do_sample: bool = True
+    # 系统提示词 + 用户提示词 + max_new_tokens 的总 token 预算，超出时删除可选规则
+    context_budget: int = 16384
+    # 输出格式："full"（完整 JSON）或 "compact"（紧凑动作列表，服务端展开，见 compact_output）
+    output_format: str = "full"
+    # 加载参数
+    torch_dtype: str = "float16"
+    device_map: str = "auto"
+    sdpa_backend: str = "FLASH_ATTENTION"
+    # CPU 推理：对 nn.Linear 做动态 int8 量化（需 float32 权重），线程数为 None 时沿用 torch 默认
+    quantize_int8: bool = False
+    num_threads: Optional[int] = None
+    num_interop_threads: Optional[int] = None
+
+    def generation_kwargs(self, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "max_new_tokens": min(max_new_tokens, self.max_new_tokens) if max_new_tokens else self.max_new_tokens,
+            "do_sample": self.do_sample,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+
+
+QWEN3_4B_FP8 = ModelProfile(
+    name="qwen3-4b-fp8",
+    model_name="Qwen/Qwen3-4B-Instruct-2507-FP8",
+    prompt_style="layered",
+)
+
+SMOLLM3_3B = ModelProfile(
+    name="smollm3",
+    model_name="HuggingFaceTB/SmolLM3-3B",
+    prompt_style="flat",
+)
+
+# 无 GPU 的边缘机：FP8 权重只能在 GPU 上运行，CPU 配置档改用原始权重，
+# float32 加载后动态 int8 量化线性层；MATH 是 CPU 上可用的 SDPA 后端
+QWEN3_4B_CPU = ModelProfile(
+    name="qwen3-4b-cpu",
+    model_name="Qwen/Qwen3-4B-Instruct-2507",
+    prompt_style="layered",
+    torch_dtype="float32",
+    device_map="cpu",
+    sdpa_backend="MATH",
+    quantize_int8=True,
+    num_threads=os.cpu_count(),
+    num_interop_threads=1,
+)
+
+SMOLLM3_3B_CPU = ModelProfile(
+    name="smollm3-cpu",
+    model_name="HuggingFaceTB/SmolLM3-3B",
+    prompt_style="flat",
+    torch_dtype="float32",
+    device_map="cpu",
+    sdpa_backend="MATH",
+    quantize_int8=True,
+    num_threads=os.cpu_count(),
+    num_interop_threads=1,
+)
+
+PROFILES: Dict[str, ModelProfile] = {
+    QWEN3_4B_FP8.name: QWEN3_4B_FP8,
+    SMOLLM3_3B.name: SMOLLM3_3B,
+    QWEN3_4B_CPU.name: QWEN3_4B_CPU,
+    SMOLLM3_3B_CPU.name: SMOLLM3_3B_CPU,
+}
+
+DEFAULT_PROFILE = QWEN3_4B_FP8
+
+
+def get_profile(name: str) -> ModelProfile:
+    """按名称获取配置档。"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown model profile: {name}. Must be one of {list(PROFILES.keys())}")
+    return PROFILES[name]
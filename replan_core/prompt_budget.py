@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+提示词 token 预算
+- TokenCounter：用模型的 tokenizer 计数（只读取本地缓存，不联网）；不可用时按字符数估算
+- expected_actions / output_token_limit：按场景的预期计划长度设置 max_new_tokens
+- fit_rules_to_budget：超出上下文预算时按优先级从低到高删除可选规则，强制规则永不删除
+规则正文的 token 数缓存在知识库快照的 token_counts 中（与 kb_bundle 编译的计数共用），
+热加载时未变化规则的计数随快照保留。
+"""
+
+import threading
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+# 字符数估算（tokenizer 不可用时）：英文规则文本约 3.5 字符 / token
+CHARS_PER_TOKEN = 3.5
+# 每条规则的分隔标题行（"--- PRIORITY Rule 1: ... ---"）
+RULE_HEADER_TOKENS = 16
+
+# 输出长度模型：约 60 token / 动作，final_expected 每个位置约 24 token
+OUTPUT_BASE_TOKENS = 96
+TOKENS_PER_ACTION = 64
+TOKENS_PER_PLACEMENT = 24
+OUTPUT_SAFETY_FACTOR = 2.0
+MIN_NEW_TOKENS = 256
+# 紧凑输出（compact_output）：每个动作约 15 token，没有 final_expected
+COMPACT_BASE_TOKENS = 8
+COMPACT_TOKENS_PER_ACTION = 20
+MIN_COMPACT_NEW_TOKENS = 64
+
+# 预期动作数：堆栈替换类型优先，其次场景标签（取语料中该类的最大计划长度）
+EXPECTED_ACTIONS_BY_REPLACEMENT = {
+    "top_only": 2,
+    "middle_only": 4,
+    "bottom_only": 6,
+    "multiple": 6,
+    "extension": 2,
+}
+EXPECTED_ACTIONS_BY_SCENARIO = {
+    "already_correct": 2,
+    "separated_arrangement": 4,
+    "object_reordering": 6,
+    "stacked_building": 6,
+}
+
+
+class TokenCounter:
+    """按模型 tokenizer 计数；tokenizer 为 None 时按字符数估算。"""
+
+    def __init__(self, name: str, tokenizer=None):
+        self.name = name
+        self.tokenizer = tokenizer
+        self._memo: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    @classmethod
+    def for_model(cls, model_name: str) -> "TokenCounter":
+        """从本地 HuggingFace 缓存加载 tokenizer；缺失时退回字符数估算。"""
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+        except Exception as e:
+            print(f"[BUDGET] Tokenizer {model_name} unavailable locally, estimating tokens from characters: {e}")
+            tokenizer = None
+        return cls(model_name, tokenizer)
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return int(len(text) / CHARS_PER_TOKEN) + 1
+        # fast tokenizer 不支持多线程并发调用
+        with self._lock:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def count_memoized(self, text: str, max_entries: int = 256) -> int:
+        """重复出现的文本（系统提示词头部）只计数一次。"""
+        n = self._memo.get(text)
+        if n is None:
+            n = self.count(text)
+            if len(self._memo) >= max_entries:
+                self._memo.clear()
+            self._memo[text] = n
+        return n
+
+
+def expected_actions(replacement_type: Optional[str], scenario: Optional[str], placement_count: int) -> int:
+    """预期计划长度（动作数）。"""
+    if replacement_type in EXPECTED_ACTIONS_BY_REPLACEMENT:
+        actions = EXPECTED_ACTIONS_BY_REPLACEMENT[replacement_type]
+        # 表中数值按三层堆栈估计；更高的堆栈中清除与重建的层数随层数增加（仅换顶层除外）
+        if replacement_type != "top_only" and placement_count > 3:
+            actions = actions * placement_count // 3
+        return actions
+    if scenario in EXPECTED_ACTIONS_BY_SCENARIO:
+        return EXPECTED_ACTIONS_BY_SCENARIO[scenario]
+    # 未知场景：每个目标位置最多移入缓冲区再放回
+    return max(2, 2 * placement_count)
+
+
+def output_token_limit(actions: int, placement_count: int, ceiling: int, output_format: str = "full") -> int:
+    """按预期动作数给出 max_new_tokens（含安全系数），不超过配置档上限。"""
+    if output_format == "compact":
+        estimate = COMPACT_BASE_TOKENS + COMPACT_TOKENS_PER_ACTION * actions
+        return min(ceiling, max(MIN_COMPACT_NEW_TOKENS, int(estimate * OUTPUT_SAFETY_FACTOR)))
+    estimate = OUTPUT_BASE_TOKENS + TOKENS_PER_ACTION * actions + TOKENS_PER_PLACEMENT * placement_count
+    return min(ceiling, max(MIN_NEW_TOKENS, int(estimate * OUTPUT_SAFETY_FACTOR)))
+
+
+def fit_rules_to_budget(rules: List[Dict[str, Any]], rule_tokens: Callable[[Dict[str, Any]], int],
+                        is_enforced: Callable[[Dict[str, Any]], bool],
+                        fixed_tokens: int, budget: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """保留规则顺序，超出预算时从最后一条（优先级最低）可选规则开始删除。
+
+    返回 (保留的规则, 删除的规则, 总 token 数)；只剩强制规则时即使超出预算也不再删除。
+    """
+    costs = [rule_tokens(rule) + RULE_HEADER_TOKENS for rule in rules]
+    total = fixed_tokens + sum(costs)
+    dropped_rows = set()
+    for row in range(len(rules) - 1, -1, -1):
+        if total <= budget:
+            break
+        if not is_enforced(rules[row]):
+            dropped_rows.add(row)
+            total -= costs[row]
+    kept = [rule for row, rule in enumerate(rules) if row not in dropped_rows]
+    dropped = [rule for row, rule in enumerate(rules) if row in dropped_rows]
+    return kept, dropped, total
@@ -0,0 +1,1330 @@
+# -*- coding: utf-8 -*-
+"""
+Replan RAG System - 基于真正的RAG实现的立方体重新规划器（模型无关核心）
+- 外部知识库：规则存储在replan_rag_knowledge_base中
+- 语义检索：使用embedding相似度匹配相关规则
+- 自然语言理解：理解replan任务的current state和target spec
+- 动态组合：根据查询场景动态组合相关规则
+- 提示词风格由 ModelProfile 决定，知识库与embedding索引在各模型间共享
+"""
+
+import atexit
+import json
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Any, Tuple
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from .ann_index import build_index
+from .config import (
+    ANN_INDEX,
+    ANN_MIN_RULES,
+    ANN_NPROBE,
+    BUFFER_SLOTS,
+    EMBEDDING_MODEL,
+    HYBRID_CANDIDATES,
+    KNOWLEDGE_BASE_DIR,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_PATH,
+    RETRIEVAL_MODE,
+    RRF_K,
+    STACKING_RELATIONSHIPS,
+    TOP_K_RETRIEVAL,
+)
+from .compact_output import COMPACT_OUTPUT_PROMPT
+from .embedding_cache import QueryEmbeddingCache
+from .kb_bundle import BundleError, default_bundle_path, load_bundle, stale_files
+from .knowledge_base import PROMPT_TEMPLATE_FILES, KnowledgeBaseSnapshot, content_digest, scan_fingerprints
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .profiles import ModelProfile, DEFAULT_PROFILE
+from .prompt_budget import TokenCounter, expected_actions, fit_rules_to_budget, output_token_limit
+from .scenario_table import ScenarioDecisionTable
+from .scene import SceneDiff
+from .stack_layers import layer_labels
+
+
+class ReplanRAGSystem:
+    def __init__(self, profile: ModelProfile = DEFAULT_PROFILE, kb_path: Path = None, bundle_path=None,
+                 query_cache_path=QUERY_CACHE_PATH):
+        """bundle_path: 预编译知识库包；None 时使用 <kb_path>.rpkb（存在时），False 强制从目录加载
+        query_cache_path: 查询 embedding 缓存文件；为空时只在内存中缓存"""
+        # 默认配置档；build_rag_prompt 可按请求传入其他配置档，共享同一知识库与embedding索引
+        self.profile = profile
+        # embedding 模型在首次缓存未命中时才加载
+        self._embedding_model = None
+        self._model_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(query_cache_path or None, max_entries=QUERY_CACHE_MAX_ENTRIES)
+        # 大知识库的近似最近邻索引（按快照构建）；ann_index 为 None 时始终精确检索
+        self.ann_index = ANN_INDEX
+        self._rule_index = (None, None)
+        # "hybrid" 时稠密排序与 BM25 排序按 RRF 融合
+        self.retrieval_mode = RETRIEVAL_MODE
+        # 提示词 token 计数（按模型名）与每个线程最近一次的预算报告
+        self._token_counters: Dict[str, TokenCounter] = {}
+        self._prompt_report = threading.local()
+        # 确定性场景分类：已知关系由规则表给出标签，设为 None 时始终使用embedding分类
+        self.scenario_table = ScenarioDecisionTable()
+        # 输出 token 预算只需要场景的粗略估计；scenario_table 设为 None 时仍用规则表估计
+        self._budget_scenarios = self.scenario_table
+        if self.query_cache.path is not None:
+            atexit.register(self.query_cache.save)
+        self.kb_path = Path(kb_path) if kb_path else Path(__file__).parent / KNOWLEDGE_BASE_DIR
+        # 当前知识库快照；热加载时整体替换，请求内通过 pinned_snapshot() 固定
+        self._pinned = threading.local()
+        self._reload_lock = threading.Lock()
+        self._snapshot = self._load_bundle(bundle_path) or self._load_knowledge_base()
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, model) -> None:
+        self._embedding_model = model
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        """通过查询缓存编码短文本（场景模板、检索查询）"""
+        return self.query_cache.encode(texts, lambda missing: self.embedding_model.encode(missing))
+
+    def _load_bundle(self, bundle_path) -> KnowledgeBaseSnapshot:
+        """从预编译包 mmap 加载快照；包不存在或不兼容时返回 None 回退到目录加载"""
+        if bundle_path is False:
+            return None
+        path = Path(bundle_path) if bundle_path else default_bundle_path(self.kb_path)
+        if not path.exists():
+            if bundle_path:
+                raise FileNotFoundError(f"Knowledge base bundle not found: {path}")
+            return None
+        try:
+            snapshot = load_bundle(path, self.kb_path)
+        except BundleError as e:
+            print(f"[KB] Ignoring bundle {path}: {e}")
+            return None
+
+        print(f"Loaded {len(snapshot.rules)} rules from knowledge base bundle {path.name}")
+        stale = stale_files(snapshot, self.kb_path)
+        if stale:
+            print(f"[KB] Warning: {len(stale)} knowledge base files changed since the bundle was compiled; "
+                  f"rerun `python -m replan_core.kb_bundle compile` or start a KnowledgeBaseWatcher")
+        return snapshot
+
+    @property
+    def snapshot(self) -> KnowledgeBaseSnapshot:
+        pinned = getattr(self._pinned, "snapshot", None)
+        return pinned if pinned is not None else self._snapshot
+
+    @property
+    def knowledge_base(self) -> List[Dict[str, Any]]:
+        return self.snapshot.rules
+
+    @property
+    def rule_embeddings(self):
+        return self.snapshot.rule_embeddings
+
+    @property
+    def _rule_lookup(self) -> Dict[str, Dict[str, Any]]:
+        return self.snapshot.rule_lookup
+
+    @property
+    def prompt_templates(self) -> Dict[str, List[str]]:
+        return self.snapshot.prompt_templates
+
+    @contextmanager
+    def pinned_snapshot(self):
+        """在当前线程内固定知识库快照，期间的热加载不影响本次请求。"""
+        if getattr(self._pinned, "snapshot", None) is not None:
+            yield self._pinned.snapshot
+            return
+        self._pinned.snapshot = self._snapshot
+        try:
+            yield self._pinned.snapshot
+        finally:
+            self._pinned.snapshot = None
+
+    def reload_knowledge_base(self, fingerprints: Dict[str, Tuple[int, int]] = None) -> KnowledgeBaseSnapshot:
+        """增量重建知识库：只重新解析和embedding变化的文件，然后原子替换快照。"""
+        with self._reload_lock:
+            previous = self._snapshot
+            snapshot = self._load_knowledge_base(previous, fingerprints)
+            changes = previous.changes_against(snapshot.fingerprints)
+            self._snapshot = snapshot
+        print(f"[KB] Snapshot v{snapshot.version}: +{len(changes['added'])} ~{len(changes['changed'])} "
+              f"-{len(changes['deleted'])} files, {len(snapshot.rules)} rules")
+        return snapshot
+
+    def classify_scenario_by_embedding(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                       scene_diff: SceneDiff = None) -> str:
+        """场景分类：已知关系走确定性决策表（scenario_table），未知关系使用embedding相似度"""
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+        if self.scenario_table is not None:
+            replacement_type = self._analyze_replacement_complexity(target_spec, current_state, scene_diff)
+            label = self.scenario_table.classify(scene_diff, replacement_type)
+            if label is not None:
+                print(f"[SCENARIO] Classified as '{label}' (decision table, replacement_type: {replacement_type})")
+                return label
+        return self._classify_scenario_with_embeddings(target_spec, current_state, scene_diff)
+
+    def _classify_scenario_with_embeddings(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                           scene_diff: SceneDiff = None) -> str:
+        """基于embedding相似度进行场景分类"""
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+        target, current = scene_diff.target, scene_diff.current
+
+        # 构建查询描述
+        target_relationship = target.relationship
+        current_relationship = current.relationship or "none"
+
+        target_objects = list(target.objects)
+        current_objects = list(current.objects)
+
+        query_parts: List[str] = []
+
+        # 记录基础描述
+        if target_relationship:
+            query_parts.append(f"target relationship {target_relationship}")
+        if target_objects:
+            query_parts.append(f"target objects {' '.join(target_objects)}")
+        query_parts.append(f"current relationship {current_relationship}")
+        if current_objects:
+            query_parts.append(f"current objects {' '.join(current_objects)}")
+
+        # 基于目标关系类型构建分析
+        if target_relationship == "stacked":
+            query_parts.append("stacked arrangement vertical tower building")
+
+            if current_relationship == "stacked":
+                # 堆栈按层序号比较（stack_layers），支持任意层数
+                missing = scene_diff.missing_layers
+                if missing:
+                    query_parts.append(f"missing stack positions {' '.join(missing)}")
+                else:
+                    mismatches = []
+                    mismatch_details = []
+                    for index in scene_diff.layer_mismatches:
+                        pos, current_obj = current.stack_layers[index]
+                        if index < len(target.stack_layers):
+                            pos, target_obj = target.stack_layers[index]
+                            mismatch_details.append(f"{pos} has {current_obj} needs {target_obj}")
+                        mismatches.append(f"{pos} wrong object")
+
+                    if mismatches:
+                        query_parts.extend(mismatches)
+                        query_parts.extend(mismatch_details)
+
+                        # 强调替换场景特征
+                        if "middle" in scene_diff.stack_mismatches:
+                            query_parts.append("middle layer replacement physical access constraint")
+                            query_parts.append("clear top to access middle blocked position")
+                        if "bottom" in scene_diff.stack_mismatches:
+                            query_parts.append("bottom layer replacement clear entire stack")
+
+                        # 强调对象生命周期
+                        wrong_objects = [current.stack_layers[index][1] for index in scene_diff.layer_mismatches]
+                        target_objects = [obj for _, obj in target.stack_layers]
+
+                        for wrong_obj in wrong_objects:
+                            if wrong_obj not in target_objects:
+                                query_parts.append(f"{wrong_obj} not in target permanent removal")
+                    else:
+                        query_parts.append("correct stack arrangement")
+            else:
+                query_parts.append("different relationship need stacking")
+
+        elif target_relationship in {"stacked_left", "stacked_middle", "stacked_right"}:
+            query_parts.append("single object stack placement")
+            target_obj = target_objects[0] if target_objects else None
+            current_obj = current_objects[0] if current_objects else None
+            if current_relationship == target_relationship and target_obj == current_obj:
+                query_parts.append("single object already correct")
+            else:
+                query_parts.append("single object needs update")
+
+        elif target_relationship in {
+            "separated_left_right",
+            "separated_front_back",
+            "separate_horizontal",
+            "separate_vertical",
+            "stacked_and_separated_left",
+            "stacked_and_separated_right"
+        }:
+            query_parts.append(f"{target_relationship} arrangement analysis")
+
+            if current_relationship == target_relationship:
+                if scene_diff.missing:
+                    query_parts.append(f"missing positions {' '.join(scene_diff.missing)}")
+                else:
+                    mismatches = [f"{pos} wrong object" for pos in scene_diff.mismatched]
+                    if mismatches:
+                        query_parts.extend(mismatches)
+                    else:
+                        query_parts.append("correct separation arrangement")
+            else:
+                query_parts.append("different relationship need separation")
+
+        elif target_relationship == "pyramid":
+            query_parts.append("pyramid arrangement bottom pair top single")
+        else:
+            query_parts.append("general object reordering")
+
+        query = " ".join(filter(None, query_parts)) + " object reordering planning"
+
+        # 预定义的场景模板 - 按复杂度分层
+        templates = {
+            "stack_replacement_top": [
+                "top layer wrong object replacement",
+                "incorrect top object simple replacement",
+                "wrong object at top position direct access",
+                "top layer object mismatch direct replacement",
+                "replace top object no blocking layers",
+                "simple top layer correction"
+            ],
+            "stack_replacement_middle": [
+                "middle layer wrong object replacement",
+                "incorrect middle object blocked access",
+                "wrong object at middle position clear above first",
+                "middle layer object mismatch physical constraint",
+                "replace middle object clear top first",
+                "blocked middle layer access constraint"
+            ],
+            "stack_replacement_bottom": [
+                "bottom layer wrong object replacement",
+                "incorrect bottom object clear entire stack",
+                "wrong object at bottom position full reconstruction",
+                "bottom layer object mismatch clear all above",
+                "replace bottom object clear entire stack",
+                "foundation layer replacement complete rebuild"
+            ],
+            "stack_replacement_multiple": [
+                "multiple layers wrong objects replacement",
+                "complex multi-position object correction",
+                "several wrong objects stack reconstruction",
+                "multiple layer mismatch complete rebuild"
+            ],
+            "stacked_building": [
+                "stacked arrangement vertical tower building",
+                "all objects scattered need stacking bottom up",
+                "partial stack need completion",
+                "different relationship need stacking",
+                "bottom middle top stacking sequence",
+                "stack extension add new layer"
+            ],
+            "separated_arrangement": [
+                "separated_left_right arrangement horizontal separation",
+                "separated_front_back arrangement horizontal separation",
+                "all objects scattered need separation",
+                "partial separation need completion",
+                "different relationship need separation"
+            ],
+            "object_reordering": [
+                "wrong object replacement correction",
+                "object mismatch position needs fixing",
+                "incorrect object needs replacement",
+                "object mismatch clear and rebuild"
+            ],
+            "buffer_management": [
+                "buffer storage temporary object placement",
+                "temporary storage during reconstruction",
+                "buffer slots for object rearrangement"
+            ],
+            "legacy_format": [
+                "legacy format object reordering",
+                "coordinate based cube planning",
+                "all cubes scattered on table",
+                "only bottom layer present",
+                "multiple layers present"
+            ],
+            "already_correct": [
+                "correct arrangement no changes",
+                "target already achieved no action",
+                "perfect configuration complete"
+            ]
+        }
+
+        # 分析替换复杂度以增强查询描述
+        replacement_type = self._analyze_replacement_complexity(target_spec, current_state, scene_diff)
+        if replacement_type != "none":
+            if replacement_type == "top_only":
+                query += " top layer simple replacement direct access"
+            elif replacement_type == "middle_only":
+                query += " middle layer blocked replacement clear above first"
+            elif replacement_type == "bottom_only":
+                query += " bottom layer complex replacement clear entire stack"
+            elif replacement_type == "extension":
+                query += " stack extension add new layer"
+            elif replacement_type == "multiple":
+                query += " multiple layer replacement complex rebuild"
+
+        # 对查询进行embedding
+        query_embedding = self._encode_queries([query])
+
+        max_similarity = -1
+        best_scenario = "stacked_building"  # 默认场景
+
+        # 与每个场景类别的模板进行相似度比较
+        for scenario, template_list in templates.items():
+            template_embeddings = self._encode_queries(template_list)
+            similarities = cosine_similarity(query_embedding, template_embeddings).flatten()
+            max_sim_for_scenario = similarities.max()
+
+            if max_sim_for_scenario > max_similarity:
+                max_similarity = max_sim_for_scenario
+                best_scenario = scenario
+
+        # 如果是替换场景但相似度不高，强制使用相应的替换分类
+        if replacement_type != "none" and max_similarity < 0.7:
+            if replacement_type == "top_only":
+                best_scenario = "stack_replacement_top"
+            elif replacement_type == "middle_only":
+                best_scenario = "stack_replacement_middle"
+            elif replacement_type == "bottom_only":
+                best_scenario = "stack_replacement_bottom"
+            elif replacement_type == "multiple":
+                best_scenario = "stack_replacement_multiple"
+
+        print(f"[SCENARIO] Classified as '{best_scenario}' (similarity: {max_similarity:.3f}, replacement_type: {replacement_type})")
+        return best_scenario
+
+    def _retrieval_query(self, scene_diff: SceneDiff, scenario: str) -> str:
+        """由场景标签与场景差异构建检索查询字符串"""
+        target, current = scene_diff.target, scene_diff.current
+        target_relationship = target.relationship
+        current_relationship = current.relationship or "none"
+
+        target_desc = target.query_desc
+        current_desc = current.query_desc
+
+        query_parts = [f"scenario: {scenario}"]
+
+        if target_relationship:
+            query_parts.append(f"target_relationship: {target_relationship}")
+            if target_desc:
+                query_parts.append(f"target_desc: {target_desc}")
+            query_parts.append(f"current_relationship: {current_relationship}")
+            if current_desc:
+                query_parts.append(f"current_desc: {current_desc}")
+            query_parts.append(f"target_objects: {target.placement_count} current_objects: {current.placement_count}")
+
+            if target_relationship == "stacked":
+                missing = scene_diff.missing_layers
+                if missing:
+                    query_parts.append(f"missing stack positions {' '.join(missing)}")
+                elif current_relationship == "stacked":
+                    mismatches = [f"{current.stack_layers[index][0]} wrong object" for index in scene_diff.layer_mismatches]
+                    if mismatches:
+                        query_parts.extend(mismatches)
+                    else:
+                        query_parts.append("stack alignment already correct")
+                else:
+                    query_parts.append("different relationship need stacking")
+
+            elif target_relationship in {"stacked_left", "stacked_middle", "stacked_right"}:
+                target_obj = target_desc or ""
+                query_parts.append(f"target_single_object: {target_obj}")
+                if current_relationship != target_relationship:
+                    query_parts.append("current relationship differs from single stack target")
+
+            elif target_relationship in {
+                "separated_left_right",
+                "separated_front_back",
+                "separate_horizontal",
+                "separate_vertical",
+                "stacked_and_separated_left",
+                "stacked_and_separated_right"
+            }:
+                missing_positions = sorted(scene_diff.missing)
+                if missing_positions:
+                    query_parts.append(f"missing positions {' '.join(missing_positions)}")
+                elif current_relationship != target_relationship:
+                    query_parts.append("current relationship differs from target separation")
+                else:
+                    mismatches = [f"{pos} wrong object" for pos in scene_diff.mismatched]
+                    if mismatches:
+                        query_parts.extend(mismatches)
+
+            elif target_relationship == "pyramid":
+                if current_relationship != "pyramid":
+                    query_parts.append("current relationship differs from pyramid target")
+        else:
+            query_parts.append("legacy format state detected")
+
+        return " ".join(filter(None, query_parts))
+
+    def _enforced_rule_keywords(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                scene_diff: SceneDiff) -> List[str]:
+        """无论检索结果如何都必须注入的规则（文件路径关键字）"""
+        target, current = scene_diff.target, scene_diff.current
+        enforced_keywords = [
+            'core_rules/coordinate_free_actions.md',
+            'core_rules/execution_order.md',
+            'pattern_rules/bottom_up_building.md',
+            'core_rules/unified_output_format.md',
+            'output_format/json_structure.md'
+        ]
+
+        # Inject stacking extension rules if any stacking relationship is involved
+        if (target.relationship in STACKING_RELATIONSHIPS or
+            current.relationship in STACKING_RELATIONSHIPS):
+            enforced_keywords.append('core_rules/stacking_extension.md')
+            enforced_keywords.append('scenario_rules/stacking_extension_examples.md')
+
+        # Inject stack replacement rules if replacement scenario detected
+        if self._detect_stack_replacement_scenario(target_spec, current_state, scene_diff):
+            mismatches = self._get_stack_mismatch_positions(target_spec, current_state, scene_diff)
+            # Put position-specific docs first to increase salience
+            if "middle" in mismatches:
+                enforced_keywords.insert(0, 'pattern_rules/stack_replacement_middle.md')
+            if "bottom" in mismatches:
+                enforced_keywords.insert(0, 'pattern_rules/stack_replacement_bottom.md')
+            enforced_keywords.append('pattern_rules/stack_replacement.md')
+
+        relationship_keyword = None
+        target_relationship = target.relationship
+        if target_relationship:
+            if target_relationship in {"stacked_left", "stacked_middle", "stacked_right"}:
+                relationship_keyword = 'relationship_rules/stacked.md'
+            else:
+                relationship_keyword = f'relationship_rules/{target_relationship}.md'
+        if relationship_keyword:
+            enforced_keywords.append(relationship_keyword)
+
+        return enforced_keywords
+
+    def retrieve_and_filter_rules(self, target_spec: Dict[str, Any], current_state: Dict[str, Any], top_k: int = TOP_K_RETRIEVAL,
+                                  scene_diff: SceneDiff = None) -> List[Dict[str, Any]]:
+        """基于场景和embedding检索相关规则"""
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+        target = scene_diff.target
+
+        # 1. 场景分类（记入当前线程的 last_prompt_report）
+        scenario = self.classify_scenario_by_embedding(target_spec, current_state, scene_diff)
+        self._prompt_report.scenario = scenario
+
+        # 2. 构建查询字符串
+        query = self._retrieval_query(scene_diff, scenario)
+
+        # 3. RAG检索
+        rules = self.retrieve_relevant_rules(query, top_k=top_k+2)
+
+        # 4. 基于场景过滤规则并去重
+        target_relationship = target.relationship
+        filtered_rules = []
+        seen_files = set()  # 防止重复规则
+
+        def add_unique_rules(rule_list, max_count=None):
+            """添加唯一规则，避免重复"""
+            added = 0
+            for rule in rule_list:
+                file_path = rule['file_path']
+                if file_path not in seen_files:
+                    filtered_rules.append(rule)
+                    seen_files.add(file_path)
+                    added += 1
+                    if max_count and added >= max_count:
+                        break
+
+        # 必须包含coordinate-free动作规则
+        action_rules = [r for r in rules if 'coordinate_free_actions' in r['file_path']]
+        add_unique_rules(action_rules, 1)
+
+        # 必须包含统一输出格式规则
+        unified_format_rules = [r for r in rules if 'unified_output_format' in r['file_path']]
+        add_unique_rules(unified_format_rules, 1)
+
+        # 基于关系类型过滤规则
+        if target_relationship:
+            if target_relationship == "stacked":
+                # stacked关系专用规则
+                stacked_rules = [r for r in rules if
+                               'stacked' in r['file_path'] and
+                               'separated' not in r['file_path']]  # 防止污染
+                add_unique_rules(stacked_rules, 2)
+
+            elif target_relationship in ["separated_left_right", "separated_front_back"]:
+                # separated关系专用规则
+                separated_rules = [r for r in rules if
+                                 'separated' in r['file_path'] and
+                                 'stacked' not in r['file_path']]  # 防止污染
+                add_unique_rules(separated_rules, 2)
+
+        # 添加执行顺序规则
+        execution_rules = [r for r in rules if 'execution_order' in r['file_path']]
+        add_unique_rules(execution_rules, 1)
+
+        # 如果规则不足，添加其他核心规则
+        if len(filtered_rules) < 3:
+            other_core_rules = [r for r in rules if
+                              'core_rules' in r['file_path'] and
+                              r['file_path'] not in seen_files]
+            add_unique_rules(other_core_rules, 2)
+
+        # 强制注入关键规则
+        enforced_keywords = self._enforced_rule_keywords(target_spec, current_state, scene_diff)
+        for keyword in enforced_keywords:
+            if not any(keyword in rule['file_path'] for rule in filtered_rules):
+                rule = self._get_rule_by_keyword(keyword)
+                if rule:
+                    filtered_rules.append(rule)
+
+        # 保留强制规则并裁剪数量
+        def is_enforced(rule: Dict[str, Any]) -> bool:
+            return any(keyword in rule['file_path'] for keyword in enforced_keywords)
+
+        mandatory_rules = [rule for rule in filtered_rules if is_enforced(rule)]
+        optional_rules = [rule for rule in filtered_rules if not is_enforced(rule)]
+
+        # 去除重复文件
+        unique_rules = []
+        seen_paths = set()
+        for rule in mandatory_rules + optional_rules:
+            path = rule['file_path']
+            if path not in seen_paths:
+                unique_rules.append(rule)
+                seen_paths.add(path)
+
+        if len(unique_rules) <= top_k:
+            return unique_rules
+
+        kept = []
+        kept_paths = set()
+        for rule in mandatory_rules:
+            path = rule['file_path']
+            if path not in kept_paths:
+                kept.append(rule)
+                kept_paths.add(path)
+
+        for rule in optional_rules:
+            if len(kept) >= top_k:
+                break
+            path = rule['file_path']
+            if path not in kept_paths:
+                kept.append(rule)
+                kept_paths.add(path)
+
+        return kept
+
+    def _load_knowledge_base(self, previous: KnowledgeBaseSnapshot = None,
+                             fingerprints: Dict[str, Tuple[int, int]] = None) -> KnowledgeBaseSnapshot:
+        """加载外部知识库文件；传入旧快照时复用未变化文件的解析结果与embedding"""
+        kb_path = self.kb_path
+        if not kb_path.exists():
+            raise FileNotFoundError(f"Knowledge base directory not found: {kb_path}")
+
+        # 遍历所有.md文件
+        if fingerprints is None:
+            fingerprints = scan_fingerprints(kb_path)
+
+        rules: List[Dict[str, Any]] = []
+        rows: List[Any] = []
+        digests: Dict[str, str] = {}
+        pending: List[int] = []
+        for path, fingerprint in fingerprints.items():
+            reused = None
+            if previous is not None and path in previous.row_index:
+                if previous.fingerprints.get(path) == fingerprint:
+                    reused = path
+            if reused is None:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                digests[path] = content_digest(content)
+                # 仅 mtime 变化而内容相同时仍可复用
+                if previous is not None and previous.digests.get(path) == digests[path] and path in previous.row_index:
+                    reused = path
+            else:
+                digests[path] = previous.digests[path]
+
+            if reused is not None:
+                rules.append(previous.rules[previous.row_index[path]])
+                rows.append(previous.embedding_for(path))
+                continue
+
+            # 解析文件内容
+            rule = self._parse_rule_file(content, Path(path))
+            if rule:
+                rules.append(rule)
+                rows.append(None)
+                pending.append(len(rules) - 1)
+
+        # 只为新增/修改的规则生成embeddings
+        if pending:
+            new_rows = self.embedding_model.encode([rules[i]['searchable_content'] for i in pending])
+            for i, row in zip(pending, new_rows):
+                rows[i] = row
+        rule_embeddings = np.vstack(rows) if rows else None
+
+        if previous is None and rules:
+            print(f"Loaded {len(rules)} rules from knowledge base")
+
+        return KnowledgeBaseSnapshot(
+            version=previous.version + 1 if previous is not None else 1,
+            rules=rules,
+            rule_embeddings=rule_embeddings,
+            rule_lookup={rule['file_path']: rule for rule in rules},
+            prompt_templates=self._load_prompt_templates(previous, fingerprints),
+            fingerprints=dict(fingerprints),
+            digests=digests,
+            row_index={rule['file_path']: i for i, rule in enumerate(rules)},
+            token_counts=self._carry_token_counts(previous, rules),
+            lexical_index=BM25Index.from_rules(rules),
+        )
+
+    def _carry_token_counts(self, previous: KnowledgeBaseSnapshot, rules: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+        """保留未变化规则的 token 计数（变化的规则需重新编译 bundle 才有计数）"""
+        if previous is None:
+            return {}
+        unchanged = {rule['file_path'] for rule in rules
+                     if previous.rule_lookup.get(rule['file_path']) is rule}
+        return {
+            name: {path: n for path, n in per_rule.items() if path in unchanged}
+            for name, per_rule in previous.token_counts.items()
+        }
+
+    def _load_prompt_templates(self, previous: KnowledgeBaseSnapshot = None,
+                               fingerprints: Dict[str, Tuple[int, int]] = None) -> Dict[str, List[str]]:
+        """加载提示词模板文件；热加载时只重新提取变化的模板"""
+        prompt_path = self.kb_path / "prompts"
+        templates: Dict[str, List[str]] = {}
+
+        if not prompt_path.exists():
+            print(f"[WARNING] Prompts directory not found: {prompt_path}")
+            print(f"[INFO] Creating prompts directory: {prompt_path}")
+            try:
+                prompt_path.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                print(f"[ERROR] Failed to create prompts directory: {e}")
+            return templates
+
+        # 精确文件名映射
+        template_files = PROMPT_TEMPLATE_FILES
+        fingerprints = fingerprints or {}
+
+        success_count = 0
+        for replacement_type, filename in template_files.items():
+            file_path = prompt_path / filename
+            key = str(file_path)
+            if (previous is not None and replacement_type in previous.prompt_templates
+                    and key in fingerprints and previous.fingerprints.get(key) == fingerprints[key]):
+                templates[replacement_type] = previous.prompt_templates[replacement_type]
+                success_count += 1
+                continue
+            if file_path.exists():
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                    # 提取 "## Specific Prompt Content" 后的内容
+                    specific_content = self._extract_specific_prompt_content(content)
+                    if specific_content:
+                        templates[replacement_type] = specific_content
+                        print(f"[PROMPT] Loaded template for {replacement_type} ({len(specific_content)} lines)")
+                        success_count += 1
+                    else:
+                        print(f"[WARNING] Template {filename} has no content after extraction")
+                except Exception as e:
+                    print(f"[ERROR] Failed to load prompt template {filename}: {e}")
+                    import traceback
+                    print(f"[DEBUG] Full error: {traceback.format_exc()}")
+            else:
+                print(f"[INFO] Template file not found: {file_path} (will use hardcoded fallback)")
+
+        if previous is None:
+            print(f"[PROMPT] Successfully loaded {success_count}/{len(template_files)} prompt templates")
+
+        if success_count < len(template_files):
+            missing = set(template_files.keys()) - set(templates.keys())
+            print(f"[INFO] Missing templates will use hardcoded fallbacks: {missing}")
+        return templates
+
+    def _extract_specific_prompt_content(self, content: str) -> List[str]:
+        """从模板文件中提取具体的提示词内容"""
+        lines = content.split('\n')
+        extracting = False
+        specific_lines = []
+
+        for line in lines:
+            if line.startswith("## Specific Prompt Content"):
+                extracting = True
+                continue
+            elif extracting and line.startswith("##"):
+                # 遇到下一个标题，停止提取
+                break
+            elif extracting:
+                specific_lines.append(line)
+
+        return specific_lines
+
+    def _parse_rule_file(self, content: str, file_path: Path) -> Dict[str, Any]:
+        """解析单个规则文件"""
+        lines = content.split('\n')
+        rule = {
+            'file_path': str(file_path),
+            'title': '',
+            'query_intent': '',
+            'rule_content': content,
+            'searchable_content': ''
+        }
+
+        # 提取标题
+        for line in lines:
+            if line.startswith('# '):
+                rule['title'] = line[2:].strip()
+                break
+
+        # 提取查询意图
+        intent_match = re.search(r'\*\*Query Intent\*\*:\s*(.+)', content)
+        if intent_match:
+            rule['query_intent'] = intent_match.group(1).strip()
+
+        # 构建可搜索内容
+        searchable_parts = [
+            rule['title'],
+            rule['query_intent'],
+            content[:800]  # 前800字符作为上下文
+        ]
+        rule['searchable_content'] = ' '.join(filter(None, searchable_parts))
+
+        return rule
+
+    def _detect_stack_replacement_scenario(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                           scene_diff: SceneDiff = None) -> bool:
+        """
+        检测是否存在堆栈替换场景：
+        - 当前位置有错误对象需要替换
+        - 目标结构中同一位置需要不同对象
+        """
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+
+        # 只检测堆栈相关的关系
+        if scene_diff.target.relationship not in STACKING_RELATIONSHIPS:
+            return False
+
+        # 如果当前状态也是堆栈关系，检查是否有相同位置但不同对象的情况（替换场景）
+        if scene_diff.current.relationship in STACKING_RELATIONSHIPS:
+            return bool(scene_diff.stack_mismatches)
+
+        return False
+
+    def _get_rule_by_keyword(self, keyword: str) -> Dict[str, Any]:
+        """根据文件路径关键字获取规则副本。"""
+        for path, rule in self._rule_lookup.items():
+            if keyword in path:
+                return rule.copy()
+        return None
+
+    def _analyze_replacement_complexity(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                        scene_diff: SceneDiff = None) -> str:
+        """
+        分析替换复杂度，返回具体的替换类型：
+        - top_only: 仅顶层需要替换（最简单）
+        - middle_only: 仅中层需要替换（中等复杂）
+        - bottom_only: 仅底层需要替换（最复杂）
+        - multiple: 多层需要替换（复杂重建）
+        - extension: 堆栈扩展（简单添加）
+        - none: 无需替换
+        """
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+        target, current = scene_diff.target, scene_diff.current
+
+        # 只处理堆栈相关关系
+        if target.relationship not in STACKING_RELATIONSHIPS:
+            return "none"
+
+        # 检测替换场景（堆栈按层序号比较，任意层数；非底层、非顶层的层都归为 middle）
+        mismatches = scene_diff.stack_mismatches
+        stack_positions = {pos for pos, _ in target.stack_layers} | {pos for pos, _ in current.stack_layers}
+
+        # 检测扩展场景（层数增加）：现有层全部正确
+        if (current.relationship in STACKING_RELATIONSHIPS
+                and len(current.position_map) < len(target.position_map)
+                and not mismatches
+                and not [pos for pos in scene_diff.mismatched if pos not in stack_positions]):
+            return "extension"
+
+        if not mismatches:
+            return "none"
+        elif len(mismatches) == 1:
+            return f"{mismatches[0]}_only"
+        else:
+            return "multiple"
+
+    def _get_stack_mismatch_positions(self, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                                      scene_diff: SceneDiff = None) -> List[str]:
+        """Return stack positions where target and current differ (both defined)."""
+        scene_diff = scene_diff or SceneDiff.from_request(target_spec, current_state)
+
+        if scene_diff.target.relationship != "stacked" or scene_diff.current.relationship != "stacked":
+            return []
+
+        return list(scene_diff.stack_mismatches)
+
+    def _build_stacked_system_prompt(self, replacement_type: str, target_spec: Dict[str, Any] = None, current_state: Dict[str, Any] = None) -> List[str]:
+        """
+        根据替换类型构建分层的系统提示词
+        支持未来扩展到其他目标形态
+
+        Args:
+            replacement_type: 替换类型 (top_only, middle_only, bottom_only, etc.)
+            target_spec: 目标规范 (未来扩展用)
+            current_state: 当前状态 (未来扩展用)
+        """
+        # 基础通用提示词（最小化，避免交互影响）
+        base_parts = [
+            "/no_think",
+            "",
+            "You are a precise object reordering planner with access to relevant rules.",
+            "",
+            "🔴 MANDATORY: Output ONLY strict JSON with no additional text, explanations, or <think> tags.",
+            "🔴 CRITICAL: Each action MUST have 'object' field at TOP LEVEL (not inside from/to).",
+            "🔴 CRITICAL: Use pure object names (e.g., 'blue cube') without descriptive prefixes.",
+            "🔴 CRITICAL: Use correct key names: from/to must use 'type' not 'position' for scattered objects.",
+            "",
+        ]
+
+        # 根据替换类型添加特定指导 - 优先从知识库获取
+        specific_parts = self._get_prompt_with_fallback(replacement_type)
+
+        # 通用结束部分
+        ending_parts = [
+            "",
+            "TASK: Generate action plan for stacked arrangement with coordinate-free actions.",
+            "",
+            "🔴 MANDATORY ACTION FORMAT:",
+            "- Every action MUST have: step, action, object, from, to, reason",
+            "- 'object' field MUST be at top level, NOT inside from/to",
+            "- Use 'type': 'scattered' NOT 'position': 'scattered'",
+            "- Use specific action names: move_to_position, move_to_buffer, move_from_buffer",
+            "",
+            "OUTPUT TEMPLATE:",
+            '{"status": "success", "plan": [{"step": 1, "action": "move_to_position", "object": "blue cube", "from": {"type": "scattered"}, "to": {"type": "stack", "position": "bottom"}, "reason": "Place at position"}], "final_expected": {"target_structure": {"relationship": "stacked", "placements": [{"position": "bottom", "object 1": "blue cube"}, {"position": "middle", "object 2": "green cube"}, {"position": "top", "object 3": "red cube"}]}}}',
+            "",
+            "/no_think",
+        ]
+
+        return base_parts + specific_parts + ending_parts
+
+    def _render_rules_by_priority(self, relevant_rules: List[Dict[str, Any]]) -> List[str]:
+        """layered 风格：物理约束规则优先，其余规则作为补充"""
+        parts: List[str] = []
+        # 按优先级重新排序规则：物理约束规则优先
+        priority_rules = []
+        other_rules = []
+
+        for rule in relevant_rules:
+            file_path = rule['file_path']
+            # 高优先级：物理约束和替换相关规则
+            if any(keyword in file_path for keyword in [
+                'stack_replacement', 'stacking_extension', 'physical_constraint',
+                'coordinate_free_actions', 'execution_order'
+            ]):
+                priority_rules.append(rule)
+            else:
+                other_rules.append(rule)
+
+        # 首先添加高优先级规则
+        if priority_rules:
+            parts.append("🔴 === CRITICAL PHYSICAL CONSTRAINT RULES === 🔴")
+            for i, rule in enumerate(priority_rules):
+                parts.append(f"--- PRIORITY Rule {i+1}: {rule.get('title', 'Physical Constraint Rule')} ---")
+                parts.append(rule['rule_content'])
+                parts.append("")
+
+        # 然后添加其他规则
+        if other_rules:
+            parts.append("--- Additional Supporting Rules ---")
+            for i, rule in enumerate(other_rules):
+                parts.append(f"--- Rule {i+1}: {rule.get('title', 'Supporting Rule')} ---")
+                parts.append(rule['rule_content'])
+                parts.append("")
+
+        return parts
+
+    def _render_rules_flat(self, relevant_rules: List[Dict[str, Any]]) -> List[str]:
+        """flat 风格：按检索顺序平铺规则内容"""
+        parts: List[str] = []
+        for i, rule in enumerate(relevant_rules):
+            parts.append(f"--- Retrieved Rule {i+1} ---")
+            parts.append(rule['rule_content'])
+            parts.append("")
+        return parts
+
+    def _tall_stack_lines(self, scene_diff: SceneDiff) -> List[str]:
+        """三层以上的目标堆栈：说明序数层标签（stack_layers）；三层及以下不增加提示词。
+
+        整塔倒序需要暂放全部 height 个对象；超过缓冲槽数时提示把仍需要的对象暂放到散落区。
+        """
+        height = len(scene_diff.target.stack_layers)
+        if height <= 3:
+            return []
+        lines = [f"🔴 TALL STACK: {height} layers bottom→top: {', '.join(layer_labels(height))}. "
+                 f"'layer k' needs exactly k-1 layers below; 'top' places on the current top."]
+        if height > len(BUFFER_SLOTS):
+            lines.append(f"🔴 BUFFER LIMIT: only {len(BUFFER_SLOTS)} buffer slots; when all are occupied, "
+                         f"move objects still needed to scattered and place them from scattered later.")
+        return lines
+
+    def _build_flat_stacked_system_prompt(self) -> List[str]:
+        """flat 风格的 stacked 系统提示词（单一提示词覆盖扩展与替换）"""
+        return [
+            "/no_think",
+            "",
+            "You are a precise object reordering planner with access to relevant rules.",
+            "",
+            "🔴 MANDATORY: Output ONLY strict JSON with no additional text, explanations, or <think> tags.",
+            "🔴 CRITICAL: Each action MUST have 'object' field at TOP LEVEL (not inside from/to).",
+            "🔴 CRITICAL: Use pure object names (e.g., 'blue cube') without descriptive prefixes.",
+            "🔴 CRITICAL: Use correct key names: from/to must use 'type' not 'position' for scattered objects.",
+            f"🔴 REQUIRED: Follow bottom-up building order and use buffer slots {'/'.join(BUFFER_SLOTS)} when needed.",
+            f"🔴 BUFFER: Use predefined buffer slots {', '.join(BUFFER_SLOTS)} for temporary storage (coordinates handled internally).",
+            "🔴 FINAL EXPECTED: Success outputs MUST include final_expected.target_structure matching target_spec.",
+            "🔴 STACKING EXTENSION: When extending stack height (e.g., 2→3 layers), place new object on 'top' - existing layers naturally adjust.",
+            "🔴 NO OVERWRITE: Only clear existing objects to buffer when they are WRONG objects, not when extending stack height.",
+            "🔴 EXTENSION vs REPLACEMENT: Extension = adding layers above correct objects. Replacement = fixing wrong objects.",
+            "",
+            "TASK: Generate action plan for stacked arrangement with coordinate-free actions.",
+            "",
+            "🔴 MANDATORY ACTION FORMAT:",
+            "- Every action MUST have: step, action, object, from, to, reason",
+            "- 'object' field MUST be at top level, NOT inside from/to",
+            "- Use 'type': 'scattered' NOT 'position': 'scattered'",
+            "- Use specific action names: move_to_position, move_to_buffer, move_from_buffer",
+            "- Only address layers that need changes; correctly positioned layers automatically adjust during extension",
+            "",
+            "OUTPUT TEMPLATE:",
+            '{"status": "success", "plan": [{"step": 1, "action": "move_to_position", "object": "blue cube", "from": {"type": "scattered"}, "to": {"type": "stack", "position": "bottom"}, "reason": "Place object at bottom"}], "final_expected": {"target_structure": {"relationship": "stacked", "placements": [{"position": "bottom", "object 1": "blue cube"}, {"position": "middle", "object 2": "green cube"}, {"position": "top", "object 3": "red cube"}]}}}',
+            "",
+            "/no_think",
+        ]
+
+    def _get_prompt_with_fallback(self, replacement_type: str) -> List[str]:
+        """从知识库获取提示词，支持降级到硬编码版本"""
+        try:
+            # 首先尝试从知识库获取
+            if replacement_type in self.prompt_templates:
+                kb_prompt = self.prompt_templates[replacement_type]
+                if isinstance(kb_prompt, list) and kb_prompt:
+                    print(f"[PROMPT] Using knowledge base template for {replacement_type} ({len(kb_prompt)} lines)")
+                    return kb_prompt
+                else:
+                    print(f"[WARNING] Knowledge base template for {replacement_type} is empty or invalid")
+        except Exception as e:
+            print(f"[ERROR] Failed to load KB prompt for {replacement_type}: {e}")
+
+        # 降级到硬编码版本
+        fallback_reason = "template not found" if replacement_type not in self.prompt_templates else "template invalid"
+        print(f"[FALLBACK] Using hardcoded prompt for {replacement_type} (reason: {fallback_reason})")
+
+        try:
+            hardcoded_prompt = self._get_hardcoded_prompt(replacement_type)
+            print(f"[FALLBACK] Hardcoded prompt loaded: {len(hardcoded_prompt)} lines")
+            return hardcoded_prompt
+        except Exception as e:
+            print(f"[CRITICAL] Hardcoded prompt also failed for {replacement_type}: {e}")
+            # 最后的保底
+            return [
+                "🔴 === EMERGENCY FALLBACK === 🔴",
+                f"✅ SCENARIO: {replacement_type} prompt system failure",
+                "✅ INSTRUCTION: Generate appropriate action plan based on physical constraints",
+                "✅ REQUIREMENT: Follow coordinate-free action format",
+            ]
+
+    def _get_hardcoded_prompt(self, replacement_type: str) -> List[str]:
+        """硬编码版本的提示词（降级选项）"""
+        if replacement_type == "top_only":
+            return [
+                "🔴 === TOP LAYER REPLACEMENT (SIMPLE) === 🔴",
+                "✅ SCENARIO: Only top layer needs correction - SIMPLEST case",
+                "✅ PATTERN: Remove-then-Place (exactly 2 steps)",
+                "✅ NO BLOCKING: Top layer is directly accessible",
+                "",
+                "🔴 REPLACEMENT SEQUENCE (MANDATORY ORDER):",
+                "  1. move_to_position: wrong_top_object → scattered (FIRST: remove current occupant)",
+                "  2. move_to_position: correct_top_object → top (SECOND: place target object)",
+            ]
+        elif replacement_type == "middle_only":
+            return [
+                "🔴 === MIDDLE LAYER REPLACEMENT (COMPLEX) === 🔴",
+                "⚠️ SCENARIO: Middle layer blocked by top layer",
+                "⚠️ PATTERN: Clear-Replace-Restore (4 steps)",
+                "⚠️ BLOCKING: Must clear top to access middle",
+                "",
+                "🔴 REPLACEMENT SEQUENCE:",
+                "  1. move_to_buffer: correct_top_object → B1 (clear blocking layer)",
+                "  2. move_to_position: wrong_middle_object → scattered (remove unwanted)",
+                "  3. move_to_position: correct_middle_object → middle (place target)",
+                "  4. move_from_buffer: correct_top_object → top (restore needed layer)",
+            ]
+        else:
+            return [
+                "🔴 === GENERAL STACK OPERATION === 🔴",
+                "✅ SCENARIO: Standard stack arrangement",
+                "✅ FOLLOW: Bottom-up building principles",
+            ]
+
+    def _rule_index_for(self, snapshot: KnowledgeBaseSnapshot):
+        """当前快照的 ANN 索引；未启用或规则数不足时返回 None"""
+        if not self.ann_index or snapshot.rule_embeddings is None or len(snapshot.rules) < ANN_MIN_RULES:
+            return None
+        indexed_snapshot, index = self._rule_index
+        if indexed_snapshot is not snapshot:
+            # 热加载后规则行号可能整体变化，按新快照重建
+            options = {"nprobe": ANN_NPROBE} if self.ann_index == "ivf" else {}
+            index = build_index(self.ann_index, snapshot.rule_embeddings, **options)
+            self._rule_index = (snapshot, index)
+        return index
+
+    def _dense_ranking(self, snapshot: KnowledgeBaseSnapshot, query_embedding: np.ndarray,
+                       count: int) -> Tuple[List[int], Dict[int, float]]:
+        """embedding 相似度最高的 count 条规则：(行号列表, {行号: 余弦相似度})"""
+        index = self._rule_index_for(snapshot)
+        if index is not None:
+            top_indices, scores = index.search(query_embedding[0], count)
+            return top_indices.tolist(), dict(zip(top_indices.tolist(), scores.tolist()))
+
+        # 计算余弦相似度
+        similarities = cosine_similarity(query_embedding, snapshot.rule_embeddings).flatten()
+
+        # 获取最相关的规则
+        top_indices = np.argsort(similarities)[-count:][::-1].tolist()
+        return top_indices, {idx: similarities[idx] for idx in top_indices}
+
+    def retrieve_relevant_rules(self, query: str, top_k: int = TOP_K_RETRIEVAL) -> List[Dict[str, Any]]:
+        """基于语义相似度（hybrid 模式下再融合 BM25 词法得分）检索相关规则"""
+        snapshot = self.snapshot
+        if not snapshot.rules or snapshot.rule_embeddings is None:
+            return []
+
+        # 对查询进行embedding
+        query_embedding = self._encode_queries([query])
+
+        lexical_index = snapshot.lexical_index if self.retrieval_mode == "hybrid" else None
+        if lexical_index is None:
+            top_indices, similarities = self._dense_ranking(snapshot, query_embedding, top_k)
+            fused = {}
+        else:
+            depth = max(top_k, HYBRID_CANDIDATES)
+            dense_indices, similarities = self._dense_ranking(snapshot, query_embedding, depth)
+            lexical_indices, _ = lexical_index.search(query, depth)
+            fused = dict(reciprocal_rank_fusion([dense_indices, lexical_indices.tolist()], RRF_K)[:top_k])
+            top_indices = list(fused)
+
+        relevant_rules = []
+        for idx in top_indices:
+            rule = snapshot.rules[idx].copy()
+            if idx not in similarities:
+                # 仅由 BM25 召回的规则（ANN 候选之外）
+                similarities[idx] = float(cosine_similarity(query_embedding, snapshot.rule_embeddings[idx:idx + 1])[0, 0])
+            rule['similarity_score'] = similarities[idx]
+            if idx in fused:
+                rule['fusion_score'] = fused[idx]
+            relevant_rules.append(rule)
+
+        return relevant_rules
+
+    def use_tokenizer(self, model_name: str, tokenizer) -> None:
+        """登记已加载模型的 tokenizer 用于提示词 token 计数（未登记时从本地缓存加载）"""
+        self._token_counters[model_name] = TokenCounter(model_name, tokenizer)
+
+    def _token_counter(self, profile: ModelProfile) -> TokenCounter:
+        counter = self._token_counters.get(profile.model_name)
+        if counter is None:
+            with self._model_lock:
+                counter = self._token_counters.get(profile.model_name)
+                if counter is None:
+                    counter = self._token_counters[profile.model_name] = TokenCounter.for_model(profile.model_name)
+        return counter
+
+    def _rule_token_count(self, snapshot: KnowledgeBaseSnapshot, counter: TokenCounter, rule: Dict[str, Any]) -> int:
+        """规则正文的 token 数；精确计数缓存在快照中（kb_bundle 编译的计数直接复用）"""
+        per_rule = snapshot.token_counts.get(counter.name)
+        if per_rule is not None and rule['file_path'] in per_rule:
+            return per_rule[rule['file_path']]
+        n = counter.count(rule['rule_content'])
+        if counter.exact:
+            snapshot.token_counts.setdefault(counter.name, {})[rule['file_path']] = n
+        return n
+
+    @property
+    def last_prompt_report(self) -> Dict[str, Any]:
+        """当前线程最近一次 build_rag_prompt 的 token 预算报告"""
+        return getattr(self._prompt_report, "value", None)
+
+    def _apply_token_budget(self, relevant_rules: List[Dict[str, Any]], header_parts: List[str], user_prompt: str,
+                            target_spec: Dict[str, Any], current_state: Dict[str, Any], scene_diff: SceneDiff,
+                            profile: ModelProfile) -> List[Dict[str, Any]]:
+        """按上下文预算裁剪可选规则，并按预期计划长度确定 max_new_tokens；报告存入 last_prompt_report"""
+        snapshot = self.snapshot
+        counter = self._token_counter(profile)
+
+        replacement_type = self._analyze_replacement_complexity(target_spec, current_state, scene_diff)
+        scenario = self._budget_scenarios.classify(scene_diff, replacement_type)
+        placement_count = scene_diff.target.placement_count
+        actions = expected_actions(replacement_type, scenario, placement_count)
+        max_new_tokens = output_token_limit(actions, placement_count, profile.max_new_tokens, profile.output_format)
+
+        header_tokens = counter.count_memoized("\n".join(header_parts))
+        user_tokens = counter.count(user_prompt)
+        enforced_keywords = self._enforced_rule_keywords(target_spec, current_state, scene_diff)
+        kept, dropped, total = fit_rules_to_budget(
+            relevant_rules,
+            lambda rule: self._rule_token_count(snapshot, counter, rule),
+            lambda rule: any(keyword in rule['file_path'] for keyword in enforced_keywords),
+            header_tokens + user_tokens + max_new_tokens,
+            profile.context_budget,
+        )
+        if dropped:
+            print(f"[BUDGET] Dropped {len(dropped)} optional rules to fit {profile.context_budget} tokens: "
+                  f"{', '.join(rule.get('title', '') for rule in dropped)}")
+
+        self._prompt_report.value = {
+            "tokenizer": counter.name if counter.exact else "estimate",
+            "context_budget": profile.context_budget,
+            "system_tokens": total - user_tokens - max_new_tokens,
+            "user_tokens": user_tokens,
+            "max_new_tokens": max_new_tokens,
+            "expected_actions": actions,
+            "scenario": getattr(self._prompt_report, "scenario", None),
+            "rules_retrieved": len(relevant_rules),
+            "total_tokens": total,
+            "rules_kept": len(kept),
+            "rules_dropped": [rule.get('title', '') for rule in dropped],
+            "over_budget": total > profile.context_budget,
+        }
+        return kept
+
+    def build_rag_prompt(self, target_spec: Dict[str, Any], current_state: Dict[str, Any], profile: ModelProfile = None) -> Tuple[str, str]:
+        """构建基于RAG的prompt（提示词风格由配置档决定）；整个请求使用同一个知识库快照"""
+        with self.pinned_snapshot():
+            return self._compose_rag_prompt(target_spec, current_state, profile or self.profile)
+
+    def _compose_rag_prompt(self, target_spec: Dict[str, Any], current_state: Dict[str, Any], profile: ModelProfile) -> Tuple[str, str]:
+        """检索规则并按配置档风格组装系统/用户提示词"""
+        # 每个请求只解析一次场景，各分析阶段共享
+        scene_diff = SceneDiff.from_request(target_spec, current_state)
+
+        # 选择相关规则
+        relevant_rules = self.retrieve_and_filter_rules(target_spec, current_state, top_k=TOP_K_RETRIEVAL, scene_diff=scene_diff)
+
+        # 调试输出
+        print(f"Retrieved {len(relevant_rules)} rules:")
+        for i, rule in enumerate(relevant_rules):
+            title = rule.get('title', Path(rule.get('file_path','')).name)
+            print(f"  Rule {i+1}: {title}")
+
+        # 检查输出格式类型
+        target_relationship = scene_diff.target.relationship
+
+        # 构建系统提示词
+        if target_relationship:
+            # 新格式：关系型输出
+            if target_relationship == "stacked" and profile.prompt_style == "flat":
+                system_parts = self._build_flat_stacked_system_prompt() + self._tall_stack_lines(scene_diff)
+            elif target_relationship == "stacked":
+                # 分析替换复杂度以选择合适的提示词
+                replacement_type = self._analyze_replacement_complexity(target_spec, current_state, scene_diff)
+                system_parts = self._build_stacked_system_prompt(replacement_type, target_spec, current_state)
+                system_parts += self._tall_stack_lines(scene_diff)
+            elif target_relationship in ["separated_left_right", "separated_front_back"]:
+                system_parts = [
+                    "/no_think",
+                    "",
+                    "You are a precise object reordering planner with access to relevant rules.",
+                    "",
+                    "🔴 MANDATORY: Output ONLY strict JSON with no additional text, explanations, or <think> tags.",
+                    "🔴 CRITICAL: Each action MUST have 'object' field at TOP LEVEL (not inside from/to).",
+                    "🔴 CRITICAL: Use pure object names (e.g., 'blue cube') without descriptive prefixes.",
+                    "🔴 CRITICAL: Use correct key names: from/to must use 'type' not 'position' for scattered objects.",
+                    f"🔴 REQUIRED: Handle separated arrangements with buffer slots {'/'.join(BUFFER_SLOTS)} when needed.",
+                    f"🔴 BUFFER: Use predefined buffer slots {', '.join(BUFFER_SLOTS)} for temporary storage (coordinates handled internally).",
+                    "🔴 FINAL EXPECTED: Success outputs MUST include final_expected.target_structure with all required positions filled.",
+                    "🔴 UNIQUE PLACEMENT: Do not place the same object into arrangement positions multiple times.",
+                    "",
+                    f"TASK: Generate action plan for {target_relationship} arrangement with coordinate-free actions.",
+                    "",
+                    "🔴 MANDATORY ACTION FORMAT:",
+                    "- Every action MUST have: step, action, object, from, to, reason",
+                    "- 'object' field MUST be at top level, NOT inside from/to",
+                    "- Use 'type': 'scattered' NOT 'position': 'scattered'",
+                    "- Use specific action names: move_to_position, move_to_buffer, move_from_buffer",
+                    "- Ensure each required position (left/right/front/back) is populated exactly once",
+                    "",
+                    "OUTPUT TEMPLATE:",
+                    '{"status": "success", "plan": [{"step": 1, "action": "move_to_position", "object": "blue cube", "from": {"type": "scattered"}, "to": {"type": "arrangement", "position": "left"}, "reason": "Place object at position"}], "final_expected": {"target_structure": {"relationship": "separated_left_right", "placements": [{"position": "left", "object 1": "blue cube"}, {"position": "right", "object 2": "red cube"}]}}}',
+                    "",
+                    "/no_think",
+                ]
+            else:
+                system_parts = [
+                    "/no_think",
+                    "",
+                    "You are a precise object reordering planner with access to relevant rules.",
+                    "",
+                    "🔴 MANDATORY: Output ONLY strict JSON with no additional text, explanations, or <think> tags.",
+                    "🔴 CRITICAL: Use pure object names without descriptive prefixes.",
+                    "🔴 FINAL EXPECTED: Success outputs MUST include final_expected.target_structure matching target_spec.",
+                    "",
+                    f"TASK: Generate action plan for {target_relationship} arrangement.",
+                    "",
+                    "/no_think",
+                ]
+        else:
+            # 旧格式：坐标型输出
+            system_parts = [
+                "/no_think",
+                "",
+                "You are a precise cube reordering planner with access to relevant rules.",
+                "",
+                "🔴 MANDATORY: Output ONLY strict JSON with no additional text, explanations, or <think> tags.",
+                "🔴 CRITICAL: All coordinates must be integers, not expressions.",
+                "🔴 REQUIRED: Follow bottom-up building order (bottom → middle → top).",
+                "🔴 COMPLETE: Must include both 'plan' and 'final_expected' fields for success status.",
+                "",
+                "TASK: Generate action plan to transform current_state into target_spec configuration.",
+                "",
+                "OUTPUT TEMPLATE:",
+                '{"status": "success", "plan": [...], "final_expected": {"bottom": {...}, "middle": {...}, "top": {...}}}',
+                "",
+                "/no_think",
+            ]
+
+        # 构建用户提示词
+        user_prompt = build_user_prompt(target_spec, current_state)
+
+        # 紧凑输出：完整格式的输出规则不再需要，格式说明放在规则之后
+        format_parts = []
+        if profile.output_format == "compact" and target_relationship:
+            relevant_rules = [rule for rule in relevant_rules if 'output_format' not in rule['file_path']]
+            format_parts = COMPACT_OUTPUT_PROMPT
+
+        # token 预算：超出时删除优先级最低的可选规则
+        relevant_rules = self._apply_token_budget(relevant_rules, system_parts + format_parts, user_prompt,
+                                                  target_spec, current_state, scene_diff, profile)
+
+        if profile.prompt_style == "flat":
+            system_parts.extend(self._render_rules_flat(relevant_rules))
+        else:
+            system_parts.extend(self._render_rules_by_priority(relevant_rules))
+        system_parts.extend(format_parts)
+
+        system_prompt = "\n".join(system_parts)
+
+        return system_prompt, user_prompt
+
+
+def build_user_prompt(target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> str:
+    """构建用户提示词（只由 target_spec/current_state 决定，可作为回放键）。"""
+    return (
+        "TARGET_SPEC:\n"
+        f"{json.dumps(target_spec, indent=2)}\n"
+        "\n"
+        "CURRENT_STATE:\n"
+        f"{json.dumps(current_state, indent=2)}\n"
+        "\n"
+        "Generate the JSON action plan to transform current_state into target_spec.\n"
+        "Output ONLY the JSON, no additional text."
+    )
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+目标关系注册表
+每种关系的结构约束（允许的位置组合、placement 数、是否为堆栈关系）与支撑图集中在这里，
+验证器（validation.py）在导入时把它编译成每种关系一个的检查闭包。
+支撑图（position -> 直接支撑它的位置）供 plan_simulator 检查物理约束、graph_planner 直接构造计划；
+注册了支撑图的关系不需要语言模型。新增关系只需在 RELATIONSHIPS 中注册一项。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from .config import MAX_STACK_HEIGHT
+from .stack_layers import is_layer_label, layer_labels, ordered_layers
+
+
+@dataclass(frozen=True)
+class RelationshipSpec:
+    """单个目标关系的结构约束。"""
+    name: str
+    # 允许的位置组合（每个组合对应一种 placement 数）；为空表示 placements 不带 position
+    position_sets: Tuple[Tuple[str, ...], ...] = ()
+    # 允许的 placement 数
+    arity: Tuple[int, ...] = (1,)
+    # 是否涉及线性堆栈（替换复杂度分析与堆栈规则注入）
+    stacking: bool = False
+    # 支撑图：(position, 直接支撑它的位置)；支撑位置都有对象后才能放置，压在上面的对象移走前不能取走。
+    # None 表示尚无图定义（规划交给语言模型），() 表示各位置互不支撑
+    supports: Optional[Tuple[Tuple[str, Tuple[str, ...]], ...]] = None
+    # 堆栈层位置（bottom / middle / layer k / top）按层序号构成线性支撑链，层数可变
+    layered: bool = False
+
+
+def _spec(name: str, *position_sets: Tuple[str, ...], stacking: bool = False,
+          supports: Optional[Tuple[Tuple[str, Tuple[str, ...]], ...]] = None, layered: bool = False) -> RelationshipSpec:
+    return RelationshipSpec(name, position_sets, tuple(len(s) for s in position_sets), stacking, supports, layered)
+
+
+RELATIONSHIPS: Dict[str, RelationshipSpec] = {spec.name: spec for spec in (
+    RelationshipSpec("stacked_left", stacking=True),
+    RelationshipSpec("stacked_middle", stacking=True),
+    RelationshipSpec("stacked_right", stacking=True),
+    # 2..MAX_STACK_HEIGHT 层，每种高度一组层标签（stack_layers.layer_labels）
+    _spec("stacked", *(layer_labels(height) for height in range(2, MAX_STACK_HEIGHT + 1)), stacking=True),
+    _spec("separated_left_right", ("left", "right")),
+    _spec("separated_front_back", ("front", "back")),
+    # 以下关系只有通用提示词，注册支撑图后由 graph_planner 直接规划
+    _spec("separate_horizontal", ("left", "middle", "right"), supports=()),
+    _spec("separate_vertical", ("bottom", "middle", "top"), supports=()),
+    _spec("stacked_and_separated_left", ("bottom", "top", "left"), stacking=True, supports=(), layered=True),
+    _spec("stacked_and_separated_right", ("bottom", "top", "right"), stacking=True, supports=(), layered=True),
+    # top 同时压在两个底座上
+    _spec("pyramid", ("bottom left", "bottom right", "top"), supports=(("top", ("bottom left", "bottom right")),)),
+)}
+
+
+def support_graph(relationship: Optional[str], positions: Iterable[str]) -> Optional[Dict[str, Tuple[str, ...]]]:
+    """relationship 下给定位置的支撑图 {position: 直接支撑它的位置}；关系没有图定义时返回 None。"""
+    spec = RELATIONSHIPS.get(relationship)
+    if spec is None or spec.supports is None:
+        return None
+    graph: Dict[str, Tuple[str, ...]] = {pos: () for pos in positions}
+    if spec.layered:
+        layers = [pos for pos, _ in ordered_layers("stacked", {pos: pos for pos in graph if is_layer_label(pos)})]
+        for lower, upper in zip(layers, layers[1:]):
+            graph[upper] = (lower,)
+    for pos, below in spec.supports:
+        if pos in graph:
+            graph[pos] = tuple(below)
+    return graph
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+多模型路由（Model Router）
+按请求难度在小模型（SmolLM3）与大模型（Qwen3）之间选择：
+- 简单场景（extension / top_only 替换、全部散落物体的分离排列）先走小模型
+- 困难场景直接走大模型
+- 小模型输出解析失败 / 目标不一致 / 模拟执行失败时升级到大模型重试
+每条路由记录成功率与延迟；阈值来自 router_config.json。
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import OPTIMIZE_PLANS
+from .plan_simulator import simulate_plan
+from .profiles import ModelProfile, get_profile
+from .scene import SceneDiff
+from .validation import validate_target_consistency
+
+DEFAULT_ROUTER_CONFIG = Path(__file__).parent / "router_config.json"
+
+
+@dataclass
+class RouterConfig:
+    """路由阈值配置。"""
+    small_profile: str = "smollm3"
+    large_profile: str = "qwen3-4b-fp8"
+    easy_replacement_types: List[str] = field(default_factory=lambda: ["extension", "top_only"])
+    easy_scattered_relationships: List[str] = field(default_factory=lambda: [
+        "separated_left_right", "separated_front_back", "separate_horizontal", "separate_vertical",
+    ])
+    # 额外按 embedding 场景分类视为简单的场景名
+    easy_scenarios: List[str] = field(default_factory=list)
+    max_easy_objects: int = 3
+    escalate_on_parse_failure: bool = True
+    escalate_on_inconsistency: bool = True
+    escalate_on_simulation_failure: bool = True
+    escalate_on_blocked: bool = True
+    # 小模型在某难度类别上的成功率低于阈值（且样本足够）时，该类别直接走大模型
+    min_small_success_rate: float = 0.8
+    min_samples_for_demotion: int = 20
+    # 目标关系注册了支撑图时先用 graph_planner 构造计划（路由 "symbolic"），失败再按难度选模型
+    symbolic_planning: bool = True
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "RouterConfig":
+        """从 JSON 文件加载；缺失字段使用默认值。"""
+        path = Path(path) if path else DEFAULT_ROUTER_CONFIG
+        if not path.exists():
+            return cls()
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        unknown = sorted(set(data) - set(known))
+        if unknown:
+            print(f"[ROUTER] Ignoring unknown config keys: {unknown}")
+        return cls(**known)
+
+
+@dataclass
+class RouteStats:
+    """单条路由的累计统计。"""
+    attempts: int = 0
+    successes: int = 0
+    total_ms: float = 0.0
+
+    def record(self, success: bool, elapsed_ms: float) -> None:
+        self.attempts += 1
+        self.successes += int(success)
+        self.total_ms += elapsed_ms
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "success_rate": round(self.success_rate, 4),
+            "mean_ms": round(self.total_ms / self.attempts, 4) if self.attempts else 0.0,
+        }
+
+
+class ModelRouter:
+    """按难度路由请求，失败时升级到大模型。
+
+    backends: 配置档名 -> 具有 generate(system_prompt, user_prompt) 的后端；
+    缺省的后端在首次使用时按配置档加载 TransformersChatBackend。
+    """
+
+    def __init__(self, rag_system, backends: Optional[Dict[str, Any]] = None,
+                 config: Optional[RouterConfig] = None):
+        self.rag_system = rag_system
+        self.config = config or RouterConfig.load()
+        self.small_profile: ModelProfile = get_profile(self.config.small_profile)
+        self.large_profile: ModelProfile = get_profile(self.config.large_profile)
+        self.backends: Dict[str, Any] = dict(backends or {})
+        # 路由统计：按配置档、按 (难度类别, 配置档) 以及升级次数
+        self.route_stats: Dict[str, RouteStats] = {}
+        self.class_stats: Dict[Tuple[str, str], RouteStats] = {}
+        self.escalations = 0
+
+    def _backend_for(self, profile: ModelProfile):
+        if profile.name not in self.backends:
+            from .transformers_backend import TransformersChatBackend
+            self.backends[profile.name] = TransformersChatBackend(profile)
+        return self.backends[profile.name]
+
+    def assess(self, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> Dict[str, Any]:
+        """判断请求难度，返回 {difficulty, difficulty_class, replacement_type, scenario, reasons}。"""
+        scene_diff = SceneDiff.from_request(target_spec, current_state)
+        replacement_type = self.rag_system._analyze_replacement_complexity(target_spec, current_state, scene_diff)
+        scenario = self.rag_system.classify_scenario_by_embedding(target_spec, current_state, scene_diff)
+        object_count = scene_diff.target.placement_count
+
+        reasons: List[str] = []
+        if replacement_type in self.config.easy_replacement_types:
+            reasons.append(f"replacement_type={replacement_type}")
+        target_rel = scene_diff.target.relationship
+        all_scattered = not scene_diff.current.placement_count
+        if target_rel in self.config.easy_scattered_relationships and all_scattered:
+            reasons.append(f"all objects scattered for {target_rel}")
+        if scenario in self.config.easy_scenarios:
+            reasons.append(f"scenario={scenario}")
+        if reasons and object_count > self.config.max_easy_objects:
+            reasons = []
+
+        if replacement_type != "none":
+            difficulty_class = replacement_type
+        elif all_scattered:
+            difficulty_class = f"{target_rel}:from_scattered"
+        else:
+            difficulty_class = f"{target_rel}:{scenario}"
+
+        return {
+            "difficulty": "easy" if reasons else "hard",
+            "difficulty_class": difficulty_class,
+            "replacement_type": replacement_type,
+            "scenario": scenario,
+            "reasons": reasons,
+        }
+
+    def _small_is_demoted(self, difficulty_class: str) -> bool:
+        """小模型在该类别上的历史成功率是否已低于阈值。"""
+        stats = self.class_stats.get((difficulty_class, self.small_profile.name))
+        return bool(
+            stats
+            and stats.attempts >= self.config.min_samples_for_demotion
+            and stats.success_rate < self.config.min_small_success_rate
+        )
+
+    def _symbolic(self, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按支撑图直接构造计划；目标关系没有支撑图或构造失败时返回 None。"""
+        # 延迟导入：graph_planner 同时是命令行入口，包导入时不加载
+        from .graph_planner import GraphPlanningError, has_support_graph, plan_from_graph
+
+        relationship = target_spec.get("target_structure", {}).get("relationship")
+        if not has_support_graph(relationship):
+            return None
+        start = time.perf_counter()
+        try:
+            result = plan_from_graph(target_spec, current_state)
+        except GraphPlanningError as e:
+            print(f"[ROUTER] Support graph planning failed, routing to a model: {e}")
+            return None
+        if OPTIMIZE_PLANS:
+            # 延迟导入：plan_optimizer 同时是命令行入口，包导入时不加载
+            from .plan_optimizer import optimize_output
+
+            result = optimize_output(result, current_state, target_spec)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        print(f"[ROUTER] {relationship} -> symbolic ({len(result['plan'])} actions)")
+        self.route_stats.setdefault("symbolic", RouteStats()).record(True, elapsed_ms)
+        self.class_stats.setdefault((f"{relationship}:symbolic", "symbolic"), RouteStats()).record(True, elapsed_ms)
+        return {
+            "result": result,
+            "route": "symbolic",
+            "profile": None,
+            "assessment": None,
+            "attempts": [{"profile": "symbolic", "failure": None, "prompt_budget": None,
+                          "elapsed_ms": round(elapsed_ms, 4)}],
+        }
+
+    def _attempt(self, profile: ModelProfile, target_spec: Dict[str, Any],
+                 current_state: Dict[str, Any]) -> Dict[str, Any]:
+        """用指定配置档生成一次并验证，返回 {result, failure, elapsed_ms}。"""
+        start = time.perf_counter()
+        system_prompt, user_prompt = self.rag_system.build_rag_prompt(target_spec, current_state, profile=profile)
+        budget = getattr(self.rag_system, "last_prompt_report", None)
+        raw = self._backend_for(profile).generate(system_prompt, user_prompt, budget and budget["max_new_tokens"])
+
+        # 延迟导入：compact_output 同时是命令行入口，包导入时不加载
+        from .compact_output import parse_model_output
+
+        result, failure = None, None
+        try:
+            result = parse_model_output(raw, target_spec, current_state, profile.output_format)
+        except Exception as e:
+            failure = f"parse: {e}"
+
+        if result is not None:
+            if result.get("status") == "blocked":
+                if self.config.escalate_on_blocked:
+                    failure = f"blocked: {result.get('reason')}"
+            elif not validate_target_consistency(result, target_spec):
+                if self.config.escalate_on_inconsistency:
+                    failure = "inconsistent with target"
+            elif self.config.escalate_on_simulation_failure:
+                simulation = simulate_plan(result.get("plan", []), current_state, target_spec)
+                if not simulation["ok"]:
+                    failure = f"simulation: {simulation['errors'][0]}"
+            if failure is None and OPTIMIZE_PLANS and result.get("status") == "success":
+                # 延迟导入：plan_optimizer 同时是命令行入口，包导入时不加载
+                from .plan_optimizer import optimize_output
+
+                result = optimize_output(result, current_state, target_spec)
+        elif not self.config.escalate_on_parse_failure:
+            failure = None
+
+        return {"result": result, "failure": failure, "prompt_budget": budget,
+                "elapsed_ms": (time.perf_counter() - start) * 1000.0}
+
+    def _record(self, route: str, difficulty_class: str, profile: ModelProfile, attempt: Dict[str, Any]) -> None:
+        success = attempt["result"] is not None and attempt["failure"] is None
+        self.route_stats.setdefault(route, RouteStats()).record(success, attempt["elapsed_ms"])
+        self.class_stats.setdefault((difficulty_class, profile.name), RouteStats()).record(success, attempt["elapsed_ms"])
+
+    def plan(self, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> Dict[str, Any]:
+        """路由并生成计划，返回 {result, route, profile, assessment, attempts}。"""
+        if self.config.symbolic_planning:
+            symbolic = self._symbolic(target_spec, current_state)
+            if symbolic is not None:
+                return symbolic
+
+        assessment = self.assess(target_spec, current_state)
+        difficulty_class = assessment["difficulty_class"]
+
+        use_small = assessment["difficulty"] == "easy" and not self._small_is_demoted(difficulty_class)
+        first_profile = self.small_profile if use_small else self.large_profile
+        route = first_profile.name
+        print(f"[ROUTER] {assessment['difficulty']} ({difficulty_class}) -> {first_profile.name}")
+
+        attempts = []
+        attempt = self._attempt(first_profile, target_spec, current_state)
+        self._record(route, difficulty_class, first_profile, attempt)
+        attempts.append({"profile": first_profile.name, "failure": attempt["failure"],
+                         "prompt_budget": attempt["prompt_budget"], "elapsed_ms": round(attempt["elapsed_ms"], 4)})
+        final_profile = first_profile
+
+        if attempt["failure"] and use_small:
+            print(f"[ROUTER] Escalating to {self.large_profile.name}: {attempt['failure']}")
+            self.escalations += 1
+            route = f"{self.small_profile.name}->{self.large_profile.name}"
+            attempt = self._attempt(self.large_profile, target_spec, current_state)
+            self._record(route, difficulty_class, self.large_profile, attempt)
+            attempts.append({"profile": self.large_profile.name, "failure": attempt["failure"],
+                             "prompt_budget": attempt["prompt_budget"], "elapsed_ms": round(attempt["elapsed_ms"], 4)})
+            final_profile = self.large_profile
+
+        return {
+            "result": attempt["result"],
+            "route": route,
+            "profile": final_profile.name,
+            "assessment": assessment,
+            "attempts": attempts,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """各路由与各难度类别的成功率 / 平均延迟。"""
+        return {
+            "routes": {route: stats.summary() for route, stats in sorted(self.route_stats.items())},
+            "classes": {
+                f"{difficulty_class}@{profile}": stats.summary()
+                for (difficulty_class, profile), stats in sorted(self.class_stats.items())
+            },
+            "escalations": self.escalations,
+        }
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scenario Corpus - 基准测试用的场景语料生成器
+- 覆盖 SUPPORTED_RELATIONSHIPS 中的全部目标关系（含单物体 stacked_left/middle/right）
+- 覆盖全部替换类型：top_only / middle_only / bottom_only / multiple / extension / none
+- 每个用例附带一个可执行的参考输出，供 replay 后端回放（无需 GPU 或网络）
+"""
+
+import argparse
+import json
+from typing import Dict, List, Any, Iterable
+
+from .plan_simulator import CubeWorld, DEFAULT_BUFFER_SLOTS, split_structure
+from .stack_layers import layer_labels
+
+PALETTE = ["blue cube", "green cube", "red cube"]
+DISTRACTORS = ["yellow cube", "purple cube"]
+
+# 目标关系 -> 位置（单物体关系不含 position）
+RELATIONSHIP_POSITIONS = {
+    "stacked": ("bottom", "middle", "top"),
+    "stacked_left": (None,),
+    "stacked_middle": (None,),
+    "stacked_right": (None,),
+    "separated_left_right": ("left", "right"),
+    "separated_front_back": ("front", "back"),
+    "separate_horizontal": ("left", "middle", "right"),
+    "separate_vertical": ("bottom", "middle", "top"),
+    "stacked_and_separated_left": ("bottom", "top", "left"),
+    "stacked_and_separated_right": ("bottom", "top", "right"),
+    "pyramid": ("bottom left", "bottom right", "top"),
+}
+
+# 跨关系转换：当前关系 -> 目标关系
+CROSS_RELATIONSHIP_PAIRS = [
+    ("separate_horizontal", "stacked"),
+    ("stacked", "separate_horizontal"),
+    ("stacked", "pyramid"),
+    ("pyramid", "stacked"),
+    ("separated_left_right", "separated_front_back"),
+    ("stacked_and_separated_left", "stacked_and_separated_right"),
+    ("stacked_left", "stacked_right"),
+]
+
+
+def make_structure(relationship: str, positions: Iterable, objects: Iterable[str]) -> Dict[str, Any]:
+    """按格式总结文档生成 target_structure（单物体只有 object 字段）。"""
+    placements = []
+    for i, (pos, obj) in enumerate(zip(positions, objects), start=1):
+        if pos is None:
+            placements.append({"object": obj})
+        else:
+            placements.append({"position": pos, f"object {i}": obj})
+    return {"target_structure": {"relationship": relationship, "placements": placements}}
+
+
+def _case(case_id: str, category: str, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "case_id": case_id,
+        "category": category,
+        "target_spec": target_spec,
+        "current_state": current_state,
+        "reference_output": json.dumps(build_reference_output(target_spec, current_state), ensure_ascii=False),
+    }
+
+
+def _relationship_cases(relationship: str, positions: tuple) -> List[Dict[str, Any]]:
+    objects = PALETTE[:len(positions)]
+    target = make_structure(relationship, positions, objects)
+    cases = [
+        _case(f"{relationship}/from_scattered", "from_scattered", target,
+              {"target_structure": {"relationship": "none", "placements": []}}),
+        _case(f"{relationship}/already_correct", "already_correct", target,
+              make_structure(relationship, positions, objects)),
+    ]
+
+    if len(positions) > 1:
+        cases.append(_case(f"{relationship}/partial", "partial", target,
+                           make_structure(relationship, positions[:-1], objects[:-1])))
+        swapped = list(objects)
+        swapped[0], swapped[1] = swapped[1], swapped[0]
+        cases.append(_case(f"{relationship}/swapped_first_pair", "swapped", target,
+                           make_structure(relationship, positions, swapped)))
+
+    for index, pos in enumerate(positions):
+        wrong = list(objects)
+        wrong[index] = DISTRACTORS[0]
+        label = pos.replace(" ", "_") if pos else "object"
+        cases.append(_case(f"{relationship}/wrong_{label}", f"wrong_{label}", target,
+                           make_structure(relationship, positions, wrong)))
+    return cases
+
+
+def _stacked_replacement_cases() -> List[Dict[str, Any]]:
+    """补充 stacked 的替换/扩展类型用例（含两层堆栈）。"""
+    three = ("bottom", "middle", "top")
+    two = ("bottom", "top")
+    target3 = make_structure("stacked", three, PALETTE)
+    target2 = make_structure("stacked", two, PALETTE[:2])
+    d0, d1 = DISTRACTORS
+    return [
+        _case("stacked/extension_1_to_3", "extension", target3, make_structure("stacked", ("bottom",), PALETTE[:1])),
+        _case("stacked/extension_2_to_3", "extension", target3, make_structure("stacked", two, PALETTE[:2])),
+        _case("stacked/multiple_top_middle", "multiple", target3,
+              make_structure("stacked", three, [PALETTE[0], d0, d1])),
+        _case("stacked/multiple_all", "multiple", target3,
+              make_structure("stacked", three, [d0, PALETTE[2], PALETTE[1]])),
+        _case("stacked/reversed", "multiple", target3,
+              make_structure("stacked", three, list(reversed(PALETTE)))),
+        _case("stacked/two_layer_wrong_top", "wrong_top", target2,
+              make_structure("stacked", two, [PALETTE[0], d0])),
+        _case("stacked/two_layer_wrong_bottom", "wrong_bottom", target2,
+              make_structure("stacked", two, [d0, PALETTE[1]])),
+        _case("stacked/two_layer_extension", "extension", target2,
+              make_structure("stacked", ("bottom",), PALETTE[:1])),
+    ]
+
+
+def generate_corpus() -> List[Dict[str, Any]]:
+    """生成完整的基准语料（确定性，顺序稳定）。"""
+    cases: List[Dict[str, Any]] = []
+    for relationship, positions in RELATIONSHIP_POSITIONS.items():
+        cases.extend(_relationship_cases(relationship, positions))
+    cases.extend(_stacked_replacement_cases())
+
+    for current_rel, target_rel in CROSS_RELATIONSHIP_PAIRS:
+        target_pos = RELATIONSHIP_POSITIONS[target_rel]
+        current_pos = RELATIONSHIP_POSITIONS[current_rel]
+        target = make_structure(target_rel, target_pos, PALETTE[:len(target_pos)])
+        current = make_structure(current_rel, current_pos, PALETTE[:len(current_pos)])
+        cases.append(_case(f"{target_rel}/from_{current_rel}", "cross_relationship", target, current))
+    return cases
+
+
+# =============== 参考计划 ===============
+
+def build_reference_output(target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                           buffer_slots=DEFAULT_BUFFER_SLOTS) -> Dict[str, Any]:
+    """构造一个可执行的参考输出（贪心：先清除错误位置，再自底向上放置）。"""
+    target_structure = target_spec.get("target_structure", {})
+    target = split_structure(target_structure)
+    pyramid_mode = target["relationship"] == "pyramid"
+    world = CubeWorld(current_state, buffer_slots, target_site=target["site"])
+    initial_labels = split_structure(current_state.get("target_structure", {}))["stack_labels"]
+    needed = set(target["stack"]) | set(target["cells"].values()) | set(target["pyramid"].values())
+    plan: List[Dict[str, Any]] = []
+
+    def endpoint_of(obj: str) -> Dict[str, Any]:
+        if obj in world.stack:
+            return {"type": "stack", "position": initial_labels[world.stack.index(obj)]}
+        for pos, held in world.cells.items():
+            if held == obj:
+                return {"type": "arrangement", "position": pos}
+        for pos, held in world.pyramid.items():
+            if held == obj:
+                return {"type": "stack", "position": pos}
+        for slot, held in world.buffer.items():
+            if held == obj:
+                return {"type": "buffer", "slot": slot}
+        return {"type": "scattered"}
+
+    def emit(obj: str, to: Dict[str, Any], reason: str) -> None:
+        source = endpoint_of(obj)
+        if to.get("type") == "buffer":
+            name = "move_to_buffer"
+        elif source.get("type") == "buffer":
+            name = "move_from_buffer"
+        else:
+            name = "move_to_position"
+        action = {"step": len(plan) + 1, "action": name, "object": obj, "from": source, "to": to, "reason": reason}
+        world.apply(action, pyramid_mode=pyramid_mode)
+        plan.append(action)
+
+    def park(obj: str) -> None:
+        if obj not in needed:
+            emit(obj, {"type": "scattered"}, "Remove object not in target")
+            return
+        for pos, wanted in target["cells"].items():
+            if wanted == obj and pos not in world.cells:
+                emit(obj, {"type": "arrangement", "position": pos}, "Move directly to target position")
+                return
+        free = [slot for slot, held in world.buffer.items() if held is None]
+        if not free:
+            raise ValueError("No free buffer slot for reference plan")
+        emit(obj, {"type": "buffer", "slot": free[0]}, "Temporarily store object needed later")
+
+    # 1. 清除错误的金字塔位置（先顶后底）
+    wrong_base = any(world.pyramid.get(p) != target["pyramid"].get(p)
+                     for p in ("bottom left", "bottom right") if p in world.pyramid)
+    for pos in ("top", "bottom left", "bottom right"):
+        held = world.pyramid.get(pos)
+        if held and (held != target["pyramid"].get(pos) or (pos == "top" and wrong_base)):
+            park(held)
+
+    # 2. 清除错误的排列位置
+    for pos, held in list(world.cells.items()):
+        if target["cells"].get(pos) != held:
+            park(held)
+
+    # 3. 自顶向下清除公共前缀之上的堆栈层
+    keep = 0
+    same_site = not target["site"] or world.site == target["site"]
+    while same_site and keep < min(len(world.stack), len(target["stack"])) and world.stack[keep] == target["stack"][keep]:
+        keep += 1
+    for held in reversed(world.stack[keep:]):
+        park(held)
+
+    # 4. 自底向上补全堆栈
+    labels = layer_labels(len(target["stack"]))
+    for index in range(len(world.stack), len(target["stack"])):
+        emit(target["stack"][index], {"type": "stack", "position": labels[index]}, "Place object at stack position")
+
+    # 5. 补全排列位置与金字塔（先底后顶）
+    for pos, wanted in target["cells"].items():
+        if world.cells.get(pos) != wanted:
+            emit(wanted, {"type": "arrangement", "position": pos}, "Place object at arrangement position")
+    for pos in ("bottom left", "bottom right", "top"):
+        wanted = target["pyramid"].get(pos)
+        if wanted and world.pyramid.get(pos) != wanted:
+            emit(wanted, {"type": "stack", "position": pos}, "Place object at pyramid position")
+
+    return {"status": "success", "plan": plan, "final_expected": json.loads(json.dumps(target_spec))}
+
+
+# =============== 读写 ===============
+
+def write_corpus(path: str, cases: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for case in cases:
+            f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    cases = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                cases.append(json.loads(line))
+    return cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the planner benchmark scenario corpus (JSONL)")
+    parser.add_argument("--output", default="scenario_corpus.jsonl", help="output JSONL path")
+    args = parser.parse_args()
+
+    corpus = generate_corpus()
+    write_corpus(args.output, corpus)
+    print(f"[CORPUS] Wrote {len(corpus)} cases to {args.output}")
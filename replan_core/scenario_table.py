@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scenario Decision Table - 基于场景差异离散特征的确定性场景分类
+classify_scenario_by_embedding 的结果主要由这些离散特征决定：
+目标/当前关系、缺失位置、错位位置、replacement_type。
+已知关系（SUPPORTED_RELATIONSHIPS）由规则表 _decide() 直接给出标签，不调用embedding模型；
+embedding 分类只作为未知关系的回退（ReplanRAGSystem.scenario_table 设为 None 时始终使用embedding分类）。
+
+规则与 embedding 标签的一致性在生成的语料上检查（tests/test_scenario_table.py，需要 embedding 模型）；
+不一致时修改 _decide 的规则，而不是按语料逐条记录例外。
+
+用法（在仓库根目录，verify 需要 embedding 模型）：
+  python -m replan_core.scenario_table verify
+  python -m replan_core.scenario_table bench
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+from .config import EMBEDDING_MODEL, SUPPORTED_RELATIONSHIPS
+from .scene import SceneDiff
+
+KNOWN_RELATIONSHIPS = frozenset(SUPPORTED_RELATIONSHIPS) - {"none"}
+SEPARATED_RELATIONSHIPS = frozenset({
+    "separated_left_right", "separated_front_back", "separate_horizontal", "separate_vertical",
+    "stacked_and_separated_left", "stacked_and_separated_right",
+})
+REPLACEMENT_LABELS = {
+    "top_only": "stack_replacement_top",
+    "middle_only": "stack_replacement_middle",
+    "bottom_only": "stack_replacement_bottom",
+    "multiple": "stack_replacement_multiple",
+}
+
+ScenarioKey = Tuple[Any, ...]
+
+
+def scenario_key(scene_diff: SceneDiff, replacement_type: str) -> ScenarioKey:
+    """分类所依据的离散特征（可哈希，可序列化为 JSON 列表）。"""
+    target, current = scene_diff.target, scene_diff.current
+    target_objects = set(target.objects)
+    return (
+        target.relationship,
+        current.relationship or "none",
+        replacement_type,
+        len(target.position_map),
+        len(current.position_map),
+        scene_diff.missing,
+        scene_diff.mismatched,
+        bool(scene_diff.extra),
+        # 当前结构中有目标不需要的对象（需永久移除）
+        any(obj not in target_objects for obj in current.objects),
+    )
+
+
+def _decide(key: ScenarioKey) -> Optional[str]:
+    """规则表；未知关系返回 None。"""
+    target_rel, current_rel, replacement_type, _, _, missing, mismatched, has_extra, has_foreign = key
+    if target_rel not in KNOWN_RELATIONSHIPS:
+        return None
+    if replacement_type in REPLACEMENT_LABELS:
+        return REPLACEMENT_LABELS[replacement_type]
+    if replacement_type == "extension":
+        return "stacked_building"
+    # 单物体堆栈没有 position，换了对象时位置比较看不出差异，需要同时检查目标以外的对象
+    if current_rel == target_rel and not missing and not mismatched and not has_extra and not has_foreign:
+        return "already_correct"
+    if target_rel in SEPARATED_RELATIONSHIPS or target_rel == "pyramid":
+        if current_rel == target_rel and mismatched:
+            return "object_reordering"
+        return "separated_arrangement" if target_rel in SEPARATED_RELATIONSHIPS else "stacked_building"
+    return "stacked_building"
+
+
+class ScenarioDecisionTable:
+    """规则表 _decide；按 (SceneDiff, replacement_type) 记忆结果。"""
+
+    def __init__(self, memo_size: int = 4096):
+        self.memo_size = memo_size
+        self._memo: Dict[Tuple[SceneDiff, str], Optional[str]] = {}
+
+    def lookup(self, key: ScenarioKey) -> Optional[str]:
+        return _decide(key)
+
+    def classify(self, scene_diff: SceneDiff, replacement_type: str) -> Optional[str]:
+        """返回场景标签；未知关系返回 None（由调用方回退到 embedding 分类）。"""
+        memo_key = (scene_diff, replacement_type)
+        try:
+            return self._memo[memo_key]
+        except KeyError:
+            pass
+        label = self.lookup(scenario_key(scene_diff, replacement_type))
+        if len(self._memo) >= self.memo_size:
+            self._memo.clear()
+        self._memo[memo_key] = label
+        return label
+
+
+def embedding_labels(cases: List[Dict[str, Any]], rag_system=None) -> List[Tuple[ScenarioKey, str, str]]:
+    """用 embedding 分类器给语料打标签，返回 [(特征键, embedding 标签, case_id)]。"""
+    if rag_system is None:
+        from .rag_system import ReplanRAGSystem
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            rag_system = ReplanRAGSystem()
+    labelled = []
+    for case in cases:
+        scene_diff = SceneDiff.from_request(case["target_spec"], case["current_state"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            replacement_type = rag_system._analyze_replacement_complexity(case["target_spec"], case["current_state"], scene_diff)
+            label = rag_system._classify_scenario_with_embeddings(case["target_spec"], case["current_state"], scene_diff)
+        labelled.append((scenario_key(scene_diff, replacement_type), label, case["case_id"]))
+    return labelled
+
+
+def disagreements(labelled: List[Tuple[ScenarioKey, str, str]]) -> List[Tuple[str, Optional[str], str]]:
+    """规则表与 embedding 标签不一致的语料条目：[(case_id, 规则标签, embedding 标签)]。"""
+    return [(case_id, _decide(key), label) for key, label, case_id in labelled if _decide(key) != label]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Deterministic scenario decision table")
+    parser.add_argument("command", choices=["verify", "bench"])
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    args = parser.parse_args()
+
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+
+    if args.command == "bench":
+        table = ScenarioDecisionTable()
+        diffs = [SceneDiff.from_request(c["target_spec"], c["current_state"]) for c in cases]
+        keys = [scenario_key(d, "none") for d in diffs]
+        rounds = 2000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for key in keys:
+                table.lookup(key)
+        lookup_ns = (time.perf_counter() - start) / (rounds * len(keys)) * 1e9
+        for d in diffs:
+            table.classify(d, "none")
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for d in diffs:
+                table.classify(d, "none")
+        memo_ns = (time.perf_counter() - start) / (rounds * len(diffs)) * 1e9
+        print(f"[SCENARIO] table lookup {lookup_ns:.0f} ns, memoized classify {memo_ns:.0f} ns per request")
+        return 0
+
+    labelled = embedding_labels(cases)
+    mismatches = disagreements(labelled)
+    agreement = 1.0 - len(mismatches) / len(labelled) if labelled else 1.0
+    print(f"[SCENARIO] Decision table agrees with {EMBEDDING_MODEL} labels on {agreement:.1%} of {len(labelled)} cases")
+    for case_id, table_label, embedding_label in mismatches:
+        print(f"  {case_id}: table={table_label} embedding={embedding_label}")
+    return 0 if not mismatches else 1
+
+
+if __name__ == "__main__":
+    exit(main())
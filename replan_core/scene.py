@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Scene / SceneDiff - 每个请求只解析一次的不可变场景表示
+- Scene：关系、(position, object) 序列、position->object 映射、对象列表、查询描述
+- SceneDiff：目标场景与当前场景之间的 missing / extra / mismatched 位置；
+  线性堆栈另按层序号比较（stack_layers），两层堆栈的 top 与三层目标的 middle 是同一层
+位置与对象名经过 sys.intern，Scene 与 SceneDiff 均可哈希，可直接用作缓存键。
+"""
+
+import sys
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping, Optional, Tuple
+
+from .stack_layers import layer_role, ordered_layers
+from .structures import extract_object_value
+
+STACK_POSITIONS = ("bottom", "middle", "top")
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Frozen:
+    """禁止在构造完成后修改属性。"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class Scene(_Frozen):
+    """单个 target_structure 的解析结果。"""
+    __slots__ = ("relationship", "placements", "position_map", "objects", "query_desc", "placement_count",
+                 "stack_layers", "_hash")
+
+    def __init__(self, relationship: Optional[str], placements: Tuple[Tuple[Optional[str], Optional[str]], ...],
+                 placement_count: int):
+        # placements: 按原始顺序的 (position, object)，与 structures 模块的读取规则一致
+        position_map: Dict[str, str] = {}
+        objects = []
+        desc_parts = []
+        for position, obj in placements:
+            if obj:
+                objects.append(obj)
+                if position:
+                    position_map[position] = obj
+                    desc_parts.append(f"{position}={obj}")
+                else:
+                    desc_parts.append(f"object={obj}")
+
+        setter = object.__setattr__
+        setter(self, "relationship", _intern(relationship))
+        setter(self, "placements", placements)
+        setter(self, "position_map", MappingProxyType(position_map))
+        setter(self, "objects", tuple(objects))
+        setter(self, "query_desc", " ".join(desc_parts))
+        setter(self, "placement_count", placement_count)
+        # 线性堆栈的 (标签, 对象)，自底向上
+        setter(self, "stack_layers", ordered_layers(self.relationship, position_map))
+        setter(self, "_hash", hash((self.relationship, placements)))
+
+    @classmethod
+    def from_structure(cls, structure: Any) -> "Scene":
+        """从 target_structure 字典构建；非字典视为空场景。"""
+        if not isinstance(structure, dict):
+            return cls(None, (), 0)
+        raw_placements = structure.get("placements", []) or []
+        placements = tuple(
+            (_intern(p.get("position")), _intern(extract_object_value(p)))
+            for p in raw_placements if isinstance(p, dict)
+        )
+        return cls(structure.get("relationship"), placements, len(raw_placements))
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "Scene":
+        """从 target_spec / current_state 顶层字典构建。"""
+        return cls.from_structure((state or {}).get("target_structure", {}))
+
+    def get(self, position: str) -> Optional[str]:
+        return self.position_map.get(position)
+
+    def __eq__(self, other):
+        if not isinstance(other, Scene):
+            return NotImplemented
+        return self.relationship == other.relationship and self.placements == other.placements
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"Scene({self.relationship!r}, {self.query_desc!r})"
+
+
+class SceneDiff(_Frozen):
+    """目标场景与当前场景的位置差异（一次计算，多处复用）。"""
+    __slots__ = ("target", "current", "missing", "extra", "mismatched", "_mismatched_set",
+                 "layer_mismatches", "stack_mismatches", "missing_layers", "_hash")
+
+    def __init__(self, target: Scene, current: Scene):
+        t_map: Mapping[str, str] = target.position_map
+        c_map: Mapping[str, str] = current.position_map
+        mismatched = tuple(pos for pos, obj in t_map.items() if pos in c_map and c_map[pos] != obj)
+
+        setter = object.__setattr__
+        setter(self, "target", target)
+        setter(self, "current", current)
+        setter(self, "missing", tuple(pos for pos in t_map if pos not in c_map))
+        setter(self, "extra", tuple(pos for pos in c_map if pos not in t_map))
+        setter(self, "mismatched", mismatched)
+        setter(self, "_mismatched_set", frozenset(mismatched))
+
+        # 按层序号比较堆栈：当前层与目标同层对象不同，或高于目标堆栈（目标没有堆栈层时不比较）
+        t_layers = [obj for _, obj in target.stack_layers]
+        c_layers = [obj for _, obj in current.stack_layers]
+        layer_mismatches = tuple(i for i, obj in enumerate(c_layers)
+                                 if t_layers and (i >= len(t_layers) or t_layers[i] != obj))
+        roles = (layer_role(i, len(c_layers)) for i in layer_mismatches)
+        setter(self, "layer_mismatches", layer_mismatches)
+        # 不一致层的替换类别（按当前堆栈高度：bottom / middle / top，自底向上去重）
+        setter(self, "stack_mismatches", tuple(dict.fromkeys(roles)))
+        setter(self, "missing_layers", tuple(label for label, _ in target.stack_layers[len(c_layers):]))
+        setter(self, "_hash", hash((target, current)))
+
+    @classmethod
+    def from_request(cls, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> "SceneDiff":
+        return cls(Scene.from_state(target_spec), Scene.from_state(current_state))
+
+    def mismatches_in(self, positions: Iterable[str] = STACK_POSITIONS) -> Tuple[str, ...]:
+        """按给定顺序返回目标与当前都有定义但对象不同的位置。"""
+        return tuple(pos for pos in positions if pos in self._mismatched_set)
+
+    @property
+    def key(self) -> Tuple[Scene, Scene]:
+        """可哈希的请求缓存键。"""
+        return (self.target, self.current)
+
+    def __eq__(self, other):
+        if not isinstance(other, SceneDiff):
+            return NotImplemented
+        return self.target == other.target and self.current == other.current
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return (f"SceneDiff(missing={self.missing}, extra={self.extra}, "
+                f"mismatched={self.mismatched})")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scene Enumerator - 穷举给定对象调色板上的全部 (current_state, target_spec) 场景对
+- 目标：RELATIONSHIP_POSITIONS 中的每个关系（另加两层 stacked），对象取调色板前几个
+- 当前状态：none，以及每个关系的全部物理可行的部分填充（堆栈只能自底向上、金字塔 top 需要两个底座）
+  与全部对象分配（错误层、干扰对象；未放置的对象视为散落）
+- 惰性生成；对象重命名下等价的场景对只生成规范形式：目标对象固定为调色板前几个，
+  其余对象在当前状态中按调色板顺序首次出现（不保存去重键，内存不随输出增长）
+- 每个场景对附带 plan_search 求出的最短参考计划，格式与 scenario_corpus 相同（load_corpus 可直接读取）
+- 求解分 chunk 分发到 ProcessPoolExecutor，结果按生成顺序写入分片 JSONL
+
+用法（在仓库根目录）：
+  python -m replan_core.scene_enumerator --output-dir scene_pairs --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+
+from .plan_search import PlanSearchError, build_optimal_output
+from .plan_simulator import PYRAMID_SUPPORT
+from .scenario_corpus import DISTRACTORS, PALETTE, RELATIONSHIP_POSITIONS, make_structure
+from .stack_layers import is_stack_position, layer_labels
+
+# 目标/当前状态使用的布局：关系 -> 位置（另加两层堆栈）
+LAYOUTS: List[Tuple[str, tuple]] = list(RELATIONSHIP_POSITIONS.items()) + [("stacked", ("bottom", "top"))]
+EMPTY_STATE = {"target_structure": {"relationship": "none", "placements": []}}
+
+
+def _supported(relationship: str, positions: Sequence, filled: Sequence) -> bool:
+    """部分填充是否物理可行：堆栈层必须自底向上连续，金字塔 top 需要两个底座。"""
+    stack_layers = layer_labels(sum(is_stack_position(relationship, pos) for pos in positions))
+    present = set(filled)
+    layers = [pos for pos in stack_layers if pos in present]
+    if layers != list(stack_layers[:len(layers)]):
+        return False
+    if relationship == "pyramid":
+        return all(support in present for pos in present for support in PYRAMID_SUPPORT.get(pos, ()))
+    return True
+
+
+def enumerate_targets(palette: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    for relationship, positions in LAYOUTS:
+        if len(positions) <= len(palette):
+            yield make_structure(relationship, positions, palette[:len(positions)])
+
+
+def _layouts() -> Iterator[Tuple[str, tuple]]:
+    """每个布局的全部可行部分填充 (relationship, filled)。"""
+    seen_layouts = set()
+    for relationship, positions in LAYOUTS:
+        for size in range(1, len(positions) + 1):
+            for filled in itertools.combinations(positions, size):
+                # 3 层 stacked 的 (bottom,) 子集与两层 stacked 布局重复
+                if (relationship, filled) in seen_layouts or not _supported(relationship, positions, filled):
+                    continue
+                seen_layouts.add((relationship, filled))
+                yield relationship, filled
+
+
+def _assignments(palette: Sequence[str], size: int, fixed: int) -> Iterator[Tuple[str, ...]]:
+    """size 个位置上的对象分配：palette[:fixed] 任意排列，其余对象按调色板顺序首次出现。
+
+    顺序与 itertools.permutations(palette, size) 中保留下来的分配一致（fixed = len(palette) 时即全部排列）。
+    """
+    def extend(prefix: Tuple[str, ...], used: frozenset, extra: int) -> Iterator[Tuple[str, ...]]:
+        if len(prefix) == size:
+            yield prefix
+            return
+        for index in range(fixed):
+            if index not in used:
+                yield from extend(prefix + (palette[index],), used | {index}, extra)
+        if fixed + extra < len(palette):
+            yield from extend(prefix + (palette[fixed + extra],), used, extra + 1)
+
+    return extend((), frozenset(), 0)
+
+
+def _assignment_count(objects: int, size: int, fixed: int) -> int:
+    """_assignments 生成的分配数：选出放其余对象的位置数 m，其余位置排列固定对象。"""
+    return sum(math.comb(size, m) * math.perm(fixed, size - m) for m in range(min(size, objects - fixed) + 1))
+
+
+def enumerate_states(palette: Sequence[str], fixed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """全部当前状态：none 与每个布局的每种可行部分填充 × 对象分配。
+
+    fixed 为 None 时生成全部对象分配；否则只有 palette[:fixed] 可任意排列，其余对象互相等价、按调色板顺序出现。
+    """
+    fixed = len(palette) if fixed is None else min(fixed, len(palette))
+    yield EMPTY_STATE
+    for relationship, filled in _layouts():
+        for objects in _assignments(palette, len(filled), fixed):
+            yield make_structure(relationship, filled, objects)
+
+
+def canonical_key(target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> str:
+    """对象按首次出现顺序（先目标后当前）重命名后的场景对文本，用于检查重命名去重。"""
+    names: Dict[str, str] = {}
+
+    def rename(structure: Dict[str, Any]) -> Dict[str, Any]:
+        placements = []
+        for placement in structure["placements"]:
+            renamed = {}
+            for key, value in placement.items():
+                if key.startswith("object"):
+                    value = names.setdefault(value, f"o{len(names)}")
+                renamed[key] = value
+            placements.append(renamed)
+        return {"relationship": structure["relationship"], "placements": placements}
+
+    target = rename(target_spec["target_structure"])
+    current = rename(current_state["target_structure"])
+    return json.dumps([target, current], sort_keys=True)
+
+
+def enumerate_pairs(palette: Sequence[str], stats: Optional[Counter] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """惰性生成重命名下互不等价的 (target_spec, current_state)。stats 记录 generated / duplicates。
+
+    目标使用 palette 的前 k 个对象，且各占不同位置，保持目标不变的重命名只能交换其余对象；
+    因此当前状态里其余对象按调色板顺序首次出现的分配恰好是每个等价类的第一个（不需要保存去重键）。
+    generated / duplicates 按全部对象分配计数，与逐一比较去重键的结果相同。
+    """
+    stats = stats if stats is not None else Counter()
+    for target_spec in enumerate_targets(palette):
+        fixed = len(target_spec["target_structure"]["placements"])
+        stats["generated"] += 1
+        yield target_spec, EMPTY_STATE
+        for relationship, filled in _layouts():
+            total = math.perm(len(palette), len(filled))
+            stats["generated"] += total
+            stats["duplicates"] += total - _assignment_count(len(palette), len(filled), fixed)
+            for objects in _assignments(palette, len(filled), fixed):
+                yield target_spec, make_structure(relationship, filled, objects)
+
+
+def _category(target_spec: Dict[str, Any], current_state: Dict[str, Any], moves: int) -> str:
+    target_rel = target_spec["target_structure"]["relationship"]
+    current_rel = current_state["target_structure"]["relationship"]
+    if moves == 0:
+        return "already_correct"
+    if current_rel == "none":
+        return "from_scattered"
+    if current_rel != target_rel:
+        return "cross_relationship"
+    return "rearrange"
+
+
+def solve_chunk(pairs: List[Tuple[int, Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """worker：为每个场景对求最短参考计划；无解时 reference_output 为 None。"""
+    cases = []
+    for index, target_spec, current_state in pairs:
+        try:
+            output = build_optimal_output(target_spec, current_state)
+        except PlanSearchError:
+            output = None
+        moves = len(output["plan"]) if output else -1
+        target_rel = target_spec["target_structure"]["relationship"]
+        current_rel = current_state["target_structure"]["relationship"]
+        cases.append({
+            "case_id": f"{target_rel}/from_{current_rel}/{index:06d}",
+            "category": _category(target_spec, current_state, moves) if output else "unsolvable",
+            "target_spec": target_spec,
+            "current_state": current_state,
+            "reference_output": json.dumps(output, ensure_ascii=False) if output else None,
+            "optimal_moves": moves,
+        })
+    return cases
+
+
+class ShardWriter:
+    """按条数轮换的分片 JSONL 写入器（<prefix>-00000.jsonl, ...）。"""
+
+    def __init__(self, output_dir: str, shard_size: int, prefix: str = "pairs"):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.paths: List[str] = []
+        self._file = None
+        self._count = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._file is None or self._count >= self.shard_size:
+            self.close()
+            path = os.path.join(self.output_dir, f"{self.prefix}-{len(self.paths):05d}.jsonl")
+            self._file = open(path, "w", encoding="utf-8")
+            self.paths.append(path)
+            self._count = 0
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _chunks(palette: Sequence[str], size: int, limit: Optional[int],
+            stats: Counter) -> Iterator[List[Tuple[int, Dict[str, Any], Dict[str, Any]]]]:
+    pairs = enumerate_pairs(palette, stats)
+    numbered = ((index, target, current) for index, (target, current) in enumerate(pairs))
+    numbered = itertools.islice(numbered, limit)
+    while True:
+        chunk = list(itertools.islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(palette: Sequence[str], writer: ShardWriter, workers: int = 0, chunk_size: int = 64,
+        limit: Optional[int] = None) -> Dict[str, Any]:
+    """生成、求解并按顺序写出全部场景对，返回 {pairs, generated, duplicates, categories, max_moves}。"""
+    stats: Counter = Counter()
+    categories: Counter = Counter()
+    max_moves = 0
+
+    def consume(cases: List[Dict[str, Any]]) -> None:
+        nonlocal max_moves
+        for case in cases:
+            categories[case["category"]] += 1
+            max_moves = max(max_moves, case["optimal_moves"])
+            writer.write(case)
+
+    chunks = _chunks(palette, chunk_size, limit, stats)
+    if workers <= 0:
+        for chunk in chunks:
+            consume(solve_chunk(chunk))
+    else:
+        # 以模块路径引用任务函数：作为 python -m 运行时本文件是 __main__，其中的函数无法按名称 pickle
+        from .scene_enumerator import solve_chunk as task
+
+        with ProcessPoolExecutor(workers) as executor:
+            pending: deque = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(task, chunk))
+                if len(pending) >= 2 * workers:
+                    consume(pending.popleft().result())
+            while pending:
+                consume(pending.popleft().result())
+    return {"pairs": sum(categories.values()), "generated": stats["generated"], "duplicates": stats["duplicates"],
+            "categories": dict(categories), "max_moves": max_moves}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Enumerate all (current_state, target_spec) pairs with optimal reference plans")
+    parser.add_argument("--objects", nargs="+", default=PALETTE + DISTRACTORS, help="object palette")
+    parser.add_argument("--output-dir", default="scene_pairs", help="directory for sharded JSONL output")
+    parser.add_argument("--shard-size", type=int, default=10000, help="records per shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (0: in-process)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="pairs per task sent to a worker")
+    parser.add_argument("--limit", type=int, help="stop after this many unique pairs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ShardWriter(args.output_dir, args.shard_size) as writer:
+        summary = run(args.objects, writer, args.workers, args.chunk_size, args.limit)
+    elapsed = time.perf_counter() - start
+
+    print(f"[ENUM] {summary['generated']} pairs generated, {summary['duplicates']} duplicates under object renaming")
+    print(f"[ENUM] {summary['pairs']} unique pairs over {len(args.objects)} objects in {elapsed:.1f} s "
+          f"({summary['pairs'] / max(elapsed, 1e-9):.0f}/s, {args.workers} workers), "
+          f"longest optimal plan {summary['max_moves']} moves")
+    for category, count in sorted(summary["categories"].items(), key=lambda item: -item[1]):
+        print(f"[ENUM]   {category:<20s} {count}")
+    print(f"[ENUM] Wrote {len(writer.paths)} shard(s) to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+堆栈高度基准：N 层堆栈（stack_layers）上的规划与验证耗时
+场景：从散落建塔、底层错误、整塔倒序（每层都要暂存，需要 N 个缓冲槽）、半塔扩展；缓冲槽池按高度扩大。
+对比贪心参考规划（scenario_corpus）、A* 最短计划（plan_search）、输出验证、模拟执行与场景比较。
+
+用法（在仓库根目录）：
+  python -m replan_core.stack_height_bench --heights 2 3 5 8 10
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from typing import Dict, List, Any, Tuple
+
+from .config import MAX_STACK_HEIGHT
+from .plan_search import search_plan
+from .plan_simulator import simulate_plan
+from .scenario_corpus import build_reference_output
+from .scene import SceneDiff
+from .stack_layers import layer_labels
+from .validation import validate_output_data, validate_target_consistency
+
+
+def tower(objects: List[str], relationship: str = "stacked") -> Dict[str, Any]:
+    """自底向上的 N 层堆栈 target_structure。"""
+    placements = [{"position": pos, f"object {i}": obj}
+                  for i, (pos, obj) in enumerate(zip(layer_labels(len(objects)), objects), start=1)]
+    return {"target_structure": {"relationship": relationship, "placements": placements}}
+
+
+def _tower_cases(height: int) -> List[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    """(类别, target_spec, current_state)：从散落建塔、底层错误、整塔倒序、半塔扩展。"""
+    cubes = [f"cube {i}" for i in range(1, height + 1)]
+    target = tower(cubes)
+    return [
+        ("from_scattered", target, {"target_structure": {"relationship": "none", "placements": []}}),
+        ("wrong_bottom", target, tower(["stray cube"] + cubes[1:])),
+        ("reversed", target, tower(list(reversed(cubes)))),
+        ("extension", target, tower(cubes[:max(1, height // 2)])),
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Planner and validator cost versus stack height")
+    parser.add_argument("--heights", type=int, nargs="+", default=[2, 3, 4, 5, 6, 8, 10], help="tower heights")
+    parser.add_argument("--rounds", type=int, default=20, help="timing repetitions per case")
+    args = parser.parse_args()
+
+    def per_call_us(fn) -> float:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            fn()
+        return (time.perf_counter() - start) * 1e6 / args.rounds
+
+    print(f"[LAYERS] {'height':>6s} {'case':<15s} {'actions':>7s} {'optimal':>7s} {'expanded':>8s} "
+          f"{'greedy us':>10s} {'astar us':>10s} {'validate us':>11s} {'simulate us':>11s} {'diff us':>8s}")
+    for height in args.heights:
+        if height > MAX_STACK_HEIGHT:
+            print(f"[LAYERS] skip height {height}: above MAX_STACK_HEIGHT={MAX_STACK_HEIGHT}")
+            continue
+        # 倒序整塔每层都要暂存
+        slots = tuple(f"B{i}" for i in range(1, max(3, height) + 1))
+        rows = []
+        for category, target, current in _tower_cases(height):
+            output = build_reference_output(target, current, buffer_slots=slots)
+            search = search_plan(current, target, buffer_slots=slots)
+            text = json.dumps(output)
+            assert simulate_plan(output["plan"], current, target, buffer_slots=slots)["ok"], (height, category)
+
+            def validate():
+                data = json.loads(text)
+                validate_output_data(data, buffer_slots=slots)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    validate_target_consistency(data, target)
+
+            rows.append((category, len(output["plan"]), len(search["plan"]), search["expanded"],
+                         per_call_us(lambda: build_reference_output(target, current, buffer_slots=slots)),
+                         per_call_us(lambda: search_plan(current, target, buffer_slots=slots)),
+                         per_call_us(validate),
+                         per_call_us(lambda: simulate_plan(output["plan"], current, target, buffer_slots=slots)),
+                         per_call_us(lambda: SceneDiff.from_request(target, current).stack_mismatches)))
+        for category, actions, optimal, expanded, greedy, astar, validate_us, simulate, diff in rows:
+            print(f"[LAYERS] {height:6d} {category:<15s} {actions:7d} {optimal:7d} {expanded:8d} "
+                  f"{greedy:10.1f} {astar:10.1f} {validate_us:11.1f} {simulate:11.1f} {diff:8.1f}")
+        print(f"[LAYERS] {height:6d} {'mean':<15s} {statistics.mean(r[1] for r in rows):7.2f} "
+              f"{statistics.mean(r[2] for r in rows):7.2f} {statistics.mean(r[3] for r in rows):8.1f} "
+              f"{statistics.mean(r[4] for r in rows):10.1f} {statistics.mean(r[5] for r in rows):10.1f} "
+              f"{statistics.mean(r[6] for r in rows):11.1f} {statistics.mean(r[7] for r in rows):11.1f} "
+              f"{statistics.mean(r[8] for r in rows):8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
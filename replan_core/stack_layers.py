@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Stack Layers - 线性堆栈的序数层模型
+- 层标签（自底向上）：1 层 bottom；2 层 bottom/top；3 层 bottom/middle/top（与原格式一致）；
+  N > 3 层 bottom, layer 2, ..., layer N-1, top
+- 读取时接受序数别名 "layer k"（layer 1 即 bottom），"middle" 即第 2 层；
+  "top" 在结构中是最后一层，在动作中表示当前栈顶（扩展语义）
+- 堆栈比较按层序号而不是标签：两层堆栈的 top 与三层目标的 middle 是同一层
+- 替换类别：bottom / top 之外的层都归为 middle（需要先清除上方各层）
+- 缓冲槽池（config.BUFFER_SLOTS，默认三个）不随高度扩大：整塔倒序超过槽位数时只有 plan_search
+  （暂放到散落区）能求解，贪心参考规划需要调大 REPLAN_BUFFER_SLOTS
+堆栈高度增加时的规划与验证耗时见 stack_height_bench（缓冲槽池按高度扩大）。
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Mapping, Optional, Tuple
+
+_ORDINAL = re.compile(r"^layer (\d+)$")
+
+# stacked_and_separated 的堆栈固定为 bottom/top 两层，其余位置是排列位置
+_TWO_LAYER_RELATIONSHIPS = frozenset({"stacked_and_separated_left", "stacked_and_separated_right"})
+
+
+@lru_cache(maxsize=None)
+def layer_labels(height: int) -> Tuple[str, ...]:
+    """高度为 height 的堆栈各层标签（自底向上）。"""
+    if height <= 0:
+        return ()
+    if height == 1:
+        return ("bottom",)
+    if height == 3:
+        return ("bottom", "middle", "top")
+    return ("bottom",) + tuple(f"layer {k}" for k in range(2, height)) + ("top",)
+
+
+def layer_index(label: Any, height: Optional[int] = None) -> Optional[int]:
+    """标签对应的层下标（0 为 bottom）；top 需要给出 height；不是堆栈标签时返回 None。"""
+    if label == "bottom":
+        return 0
+    if label == "middle":
+        return 1
+    if label == "top":
+        return height - 1 if height else None
+    match = _ORDINAL.match(label) if isinstance(label, str) else None
+    if match and int(match.group(1)) >= 1:
+        return int(match.group(1)) - 1
+    return None
+
+
+def is_layer_label(label: Any) -> bool:
+    return label == "top" or layer_index(label) is not None
+
+
+def is_stack_position(relationship: Optional[str], label: Any) -> bool:
+    """relationship 下 label 是否为线性堆栈的一层（separate_vertical 的 bottom/middle/top 是排列位置）。"""
+    if relationship == "stacked":
+        return is_layer_label(label)
+    if relationship in _TWO_LAYER_RELATIONSHIPS:
+        return label in ("bottom", "top")
+    return False
+
+
+def _order_key(label: str) -> float:
+    index = layer_index(label)
+    return float("inf") if index is None else index
+
+
+def ordered_layers(relationship: Optional[str], position_map: Mapping[str, str]) -> Tuple[Tuple[str, str], ...]:
+    """position_map 中属于堆栈的 (标签, 对象)，按层序号自底向上排列（top 在最后）。"""
+    layers = [(pos, obj) for pos, obj in position_map.items() if is_stack_position(relationship, pos)]
+    return tuple(sorted(layers, key=lambda item: _order_key(item[0])))
+
+
+def layer_role(index: int, height: int) -> str:
+    """高度为 height 的堆栈中第 index 层的替换类别：bottom / top / middle。"""
+    if index == 0:
+        return "bottom"
+    if index == height - 1:
+        return "top"
+    return "middle"
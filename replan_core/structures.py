@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+target_structure / placements 的通用读取工具
+"""
+
+from typing import Dict, List, Any
+
+
+def _object_key_sort_key(key: str) -> int:
+    """提取 object 键的序号以便排序（object、object 1、object 2 ...）。"""
+    suffix = key[len("object"):].strip()
+    if suffix.isdigit():
+        return int(suffix)
+    return 0
+
+
+def extract_object_value(placement: Dict[str, Any]) -> str:
+    """从 placements 条目中提取对象描述，兼容 object / object 1 / object 2 等写法。"""
+    if not isinstance(placement, dict):
+        return None
+    if "object" in placement:
+        return placement.get("object")
+
+    candidates = [key for key in placement.keys() if key.startswith("object")]
+    for key in sorted(candidates, key=_object_key_sort_key):
+        value = placement.get(key)
+        if value:
+            return value
+    return None
+
+
+def build_position_object_map(placements: List[Dict[str, Any]]) -> Dict[str, str]:
+    """将 placements 列表转换为 position->object 的映射，忽略无 position 的条目。"""
+    mapping: Dict[str, str] = {}
+    for placement in placements or []:
+        position = placement.get("position")
+        obj = extract_object_value(placement)
+        if position and obj:
+            mapping[position] = obj
+    return mapping
+
+
+def collect_objects_list(placements: List[Dict[str, Any]]) -> List[str]:
+    """提取 placements 中的对象列表（按顺序），包含无 position 的条目。"""
+    result: List[str] = []
+    for placement in placements or []:
+        obj = extract_object_value(placement)
+        if obj:
+            result.append(obj)
+    return result
+
+
+def format_placements_for_query(placements: List[Dict[str, Any]]) -> str:
+    """将placements格式化为 position=object 文本用于查询描述。"""
+    parts: List[str] = []
+    for placement in placements or []:
+        obj = extract_object_value(placement)
+        pos = placement.get("position")
+        if pos and obj:
+            parts.append(f"{pos}={obj}")
+        elif obj:
+            parts.append(f"object={obj}")
+    return " ".join(parts)
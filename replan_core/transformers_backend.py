@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+HuggingFace transformers 本地推理后端（按 ModelProfile 加载模型与生成参数）
+"""
+
+import threading
+import time
+from typing import Optional
+
+import torch
+from torch.nn.attention import SDPBackend, sdpa_kernel
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from .profiles import ModelProfile, DEFAULT_PROFILE
+
+
+def _configure_threads(profile: ModelProfile) -> None:
+    """按配置档设置 intra-op / inter-op 线程数。"""
+    if profile.num_threads:
+        torch.set_num_threads(profile.num_threads)
+    if profile.num_interop_threads:
+        try:
+            torch.set_num_interop_threads(profile.num_interop_threads)
+        except RuntimeError as e:
+            # inter-op 线程池只能在首次并行计算前设置一次
+            print(f"[CPU] Keeping inter-op threads at {torch.get_num_interop_threads()}: {e}")
+
+
+class TransformersChatBackend:
+    """HuggingFace transformers 本地推理后端"""
+
+    def __init__(self, profile: ModelProfile = DEFAULT_PROFILE):
+        self.profile = profile
+        self.name = f"transformers:{profile.name}"
+        # 最近一次生成的 token 数与耗时，供基准测试计算 tokens/s
+        self.last_generation = None
+        self._tokenizer_lock = threading.Lock()
+        _configure_threads(profile)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(profile.model_name)
+        self.model = AutoModelForCausalLM.from_pretrained(
+            profile.model_name,
+            torch_dtype=getattr(torch, profile.torch_dtype),
+            device_map=profile.device_map
+        )
+
+        if profile.quantize_int8:
+            if profile.torch_dtype != "float32":
+                print(f"[CPU] Dynamic int8 quantization needs float32 weights, skipping for {profile.torch_dtype}")
+            else:
+                self.model = torch.ao.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                print(f"[CPU] Quantized Linear layers to int8 ({torch.get_num_threads()} threads)")
+        self.model.eval()
+
+    def prepare_inputs(self, system_prompt: str, user_prompt: str):
+        """套用聊天模板并分词（可在其他线程中提前完成，见 pipeline.PipelinedPlanner）"""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        # fast tokenizer 不支持多线程并发调用
+        with self._tokenizer_lock:
+            text = self.tokenizer.apply_chat_template(
+                messages,
+                tokenize=False,
+                add_generation_prompt=True,
+                **self.profile.chat_template_kwargs
+            )
+            return self.tokenizer([text], return_tensors="pt").to(self.model.device)
+
+    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None) -> str:
+        return self.generate_from_inputs(self.prepare_inputs(system_prompt, user_prompt), max_new_tokens)
+
+    def generate_from_inputs(self, inputs, max_new_tokens: Optional[int] = None) -> str:
+        """max_new_tokens：本次请求的生成上限（来自提示词预算报告），为空时使用配置档的上限"""
+        start = time.perf_counter()
+        with torch.inference_mode(), sdpa_kernel(getattr(SDPBackend, self.profile.sdpa_backend)):
+            outputs = self.model.generate(**inputs, **self.profile.generation_kwargs(max_new_tokens))
+        elapsed = time.perf_counter() - start
+
+        output_tokens = outputs[0][inputs.input_ids.size(1):]
+        self.last_generation = {"new_tokens": int(output_tokens.shape[0]), "seconds": elapsed}
+        with self._tokenizer_lock:
+            return self.tokenizer.decode(output_tokens, skip_special_tokens=True)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Travel Cost - 按工作区坐标估算计划的机械臂移动距离与执行时间，并据此优化计划
+- 坐标：BUFFER_SLOTS 与 config 中的堆栈/排列/金字塔/散落区锚点（可用 JSON 覆盖），堆栈每层加 CUBE_HEIGHT_MM
+- 代价：从 HOME_POSITION 出发，每个动作 = 移到取件位置 + 移到放置位置，时间 = 距离 / 速度 + 两次抓放耗时
+- minimize_travel：
+  - 缓冲槽按距离分配（缓冲使用次数不多时穷举全部分配，否则逐次取最近的空闲槽）
+  - 相邻的独立动作交换顺序（交换后仍能执行且通过验证）直到总距离不再下降
+
+估算语料计划优化前后的执行时间（在仓库根目录）：
+  python -m replan_core.travel_cost
+  python -m replan_core.travel_cost --layout workcell.json
+"""
+
+import argparse
+import copy
+import json
+import math
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+from .config import (
+    ARM_SPEED_MM_S,
+    ARRANGEMENT_ANCHORS,
+    BUFFER_SLOTS,
+    CUBE_HEIGHT_MM,
+    GRASP_SECONDS,
+    HOME_POSITION,
+    PYRAMID_ANCHORS,
+    SCATTERED_ANCHOR,
+    STACK_ANCHOR,
+)
+from .plan_simulator import CubeWorld, SimulationError, split_structure, simulate_plan
+from .validation import plan_errors
+
+# 缓冲使用次数不超过该值时穷举全部槽分配（3 个槽时最多 3^6 种）
+MAX_EXACT_BUFFER_USES = 6
+MAX_REORDER_PASSES = 8
+
+Point = Tuple[float, float, float]
+
+
+@dataclass
+class TravelCostModel:
+    """工作区布局与机械臂速度参数。"""
+    buffer_slots: Dict[str, List[float]] = field(default_factory=lambda: dict(BUFFER_SLOTS))
+    stack_anchor: List[float] = field(default_factory=lambda: list(STACK_ANCHOR))
+    arrangement_anchors: Dict[str, List[float]] = field(default_factory=lambda: dict(ARRANGEMENT_ANCHORS))
+    pyramid_anchors: Dict[str, List[float]] = field(default_factory=lambda: dict(PYRAMID_ANCHORS))
+    scattered_anchor: List[float] = field(default_factory=lambda: list(SCATTERED_ANCHOR))
+    home: List[float] = field(default_factory=lambda: list(HOME_POSITION))
+    cube_height: float = CUBE_HEIGHT_MM
+    speed: float = ARM_SPEED_MM_S
+    grasp_seconds: float = GRASP_SECONDS
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "TravelCostModel":
+        """从 JSON 文件加载；缺失字段使用默认值。"""
+        if not path:
+            return cls()
+        with Path(path).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        unknown = sorted(set(data) - set(known))
+        if unknown:
+            print(f"[TRAVEL] Ignoring unknown layout keys: {unknown}")
+        return cls(**known)
+
+    def _stack_point(self, world: CubeWorld, index: int) -> Point:
+        x, y, z = self.arrangement_anchors.get(world.site, self.stack_anchor) if world.site else self.stack_anchor
+        return x, y, z + index * self.cube_height
+
+    def locate(self, world: CubeWorld, obj: str) -> Point:
+        """对象在世界状态中的坐标。"""
+        if obj in world.stack:
+            return self._stack_point(world, world.stack.index(obj))
+        for pos, held in world.cells.items():
+            if held == obj:
+                return tuple(self.arrangement_anchors.get(pos, self.stack_anchor))
+        for pos, held in world.pyramid.items():
+            if held == obj:
+                return tuple(self.pyramid_anchors.get(pos, self.stack_anchor))
+        for slot, held in world.buffer.items():
+            if held == obj:
+                return tuple(self.buffer_slots[slot])
+        return tuple(self.scattered_anchor)
+
+    def plan_cost(self, plan: List[Dict[str, Any]], current_state: Dict[str, Any],
+                  target_spec: Dict[str, Any]) -> Dict[str, float]:
+        """返回 {distance_mm, seconds}；计划不能执行时抛出 SimulationError。"""
+        target = split_structure((target_spec or {}).get("target_structure", {}) or {})
+        world = CubeWorld(current_state, buffer_slots=tuple(self.buffer_slots), target_site=target["site"])
+        pyramid_mode = target["relationship"] == "pyramid"
+        arm: Point = tuple(self.home)
+        distance = 0.0
+        for action in plan:
+            pick = self.locate(world, action.get("object"))
+            world.apply(action, pyramid_mode=pyramid_mode)
+            place = self.locate(world, action.get("object"))
+            distance += math.dist(arm, pick) + math.dist(pick, place)
+            arm = place
+        seconds = distance / self.speed + 2 * self.grasp_seconds * len(plan)
+        return {"distance_mm": distance, "seconds": seconds}
+
+
+def _valid(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any]) -> bool:
+    return simulate_plan(plan, current_state, target_spec)["ok"] and not plan_errors(plan, normalize=False)
+
+
+def _cost_or_inf(model: TravelCostModel, plan: List[Dict[str, Any]], current_state: Dict[str, Any],
+                 target_spec: Dict[str, Any]) -> float:
+    try:
+        return model.plan_cost(plan, current_state, target_spec)["distance_mm"]
+    except SimulationError:
+        return math.inf
+
+
+def _with_slots(plan: List[Dict[str, Any]], slots: List[str]) -> List[Dict[str, Any]]:
+    """按顺序给每次放入缓冲区指定槽位，取出动作跟随对象所在槽。"""
+    result = []
+    held: Dict[str, str] = {}
+    choices = iter(slots)
+    for action in plan:
+        action = copy.deepcopy(action)
+        obj = action.get("object")
+        if (action.get("from") or {}).get("type") == "buffer" and obj in held:
+            action["from"]["slot"] = held.pop(obj)
+        if (action.get("to") or {}).get("type") == "buffer":
+            action["to"]["slot"] = held[obj] = next(choices)
+        result.append(action)
+    return result
+
+
+def assign_buffer_slots(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+                        model: Optional[TravelCostModel] = None) -> List[Dict[str, Any]]:
+    """按移动距离分配缓冲槽，返回新计划（不改变动作顺序）。"""
+    model = model or TravelCostModel()
+    slot_names = list(model.buffer_slots)
+    uses = sum(1 for action in plan if (action.get("to") or {}).get("type") == "buffer")
+    if not uses:
+        return plan
+
+    if uses <= MAX_EXACT_BUFFER_USES:
+        best_plan, best_cost = plan, _cost_or_inf(model, plan, current_state, target_spec)
+
+        def search(index: int, occupied: Dict[str, str], chosen: List[str]) -> None:
+            nonlocal best_plan, best_cost
+            if index == len(plan):
+                candidate = _with_slots(plan, chosen)
+                cost = _cost_or_inf(model, candidate, current_state, target_spec)
+                if cost < best_cost:
+                    best_plan, best_cost = candidate, cost
+                return
+            action = plan[index]
+            obj = action.get("object")
+            occupied = dict(occupied)
+            if (action.get("from") or {}).get("type") == "buffer":
+                occupied.pop(obj, None)
+            if (action.get("to") or {}).get("type") == "buffer":
+                for slot in slot_names:
+                    if slot not in occupied.values():
+                        search(index + 1, dict(occupied, **{obj: slot}), chosen + [slot])
+                return
+            search(index + 1, occupied, chosen)
+
+        search(0, {}, [])
+        return best_plan
+
+    # 贪心：每次放入取离取件位置最近的空闲槽
+    target = split_structure((target_spec or {}).get("target_structure", {}) or {})
+    world = CubeWorld(current_state, buffer_slots=tuple(slot_names), target_site=target["site"])
+    result = []
+    held: Dict[str, str] = {}
+    for action in plan:
+        action = copy.deepcopy(action)
+        obj = action.get("object")
+        if (action.get("from") or {}).get("type") == "buffer" and obj in held:
+            action["from"]["slot"] = held.pop(obj)
+        if (action.get("to") or {}).get("type") == "buffer":
+            pick = model.locate(world, obj)
+            free = [slot for slot in slot_names if slot not in held.values()]
+            action["to"]["slot"] = held[obj] = min(free, key=lambda slot: math.dist(pick, model.buffer_slots[slot]))
+        world.apply(action, pyramid_mode=target["relationship"] == "pyramid")
+        result.append(action)
+    return result
+
+
+def minimize_travel(plan: List[Dict[str, Any]], current_state: Dict[str, Any], target_spec: Dict[str, Any],
+                    model: Optional[TravelCostModel] = None) -> Dict[str, Any]:
+    """重新分配缓冲槽并调整独立动作的顺序，返回 {plan, before, after}（before/after 为 plan_cost 结果）。
+
+    计划不能执行时原样返回（skipped 说明原因）。
+    """
+    model = model or TravelCostModel()
+    try:
+        before = model.plan_cost(plan, current_state, target_spec)
+    except SimulationError as e:
+        return {"plan": plan, "before": None, "after": None, "skipped": str(e)}
+
+    best = assign_buffer_slots(plan, current_state, target_spec, model)
+    best_cost = _cost_or_inf(model, best, current_state, target_spec)
+    for _ in range(MAX_REORDER_PASSES):
+        improved = False
+        for i in range(len(best) - 1):
+            if best[i].get("object") == best[i + 1].get("object"):
+                continue
+            swapped = best[:i] + [best[i + 1], best[i]] + best[i + 2:]
+            if not _valid(swapped, current_state, target_spec):
+                continue
+            swapped = assign_buffer_slots(swapped, current_state, target_spec, model)
+            cost = _cost_or_inf(model, swapped, current_state, target_spec)
+            if cost < best_cost - 1e-9:
+                best, best_cost, improved = swapped, cost, True
+        if not improved:
+            break
+
+    if not _valid(best, current_state, target_spec) or best_cost >= before["distance_mm"]:
+        best = [copy.deepcopy(action) for action in plan]
+    for step, action in enumerate(best, start=1):
+        action["step"] = step
+    return {"plan": best, "before": before, "after": model.plan_cost(best, current_state, target_spec)}
+
+
+def _relabel_slots(plan: List[Dict[str, Any]], mapping: Dict[str, str]) -> List[Dict[str, Any]]:
+    """按 mapping 改写缓冲槽名（模拟模型随意选择槽位）。"""
+    result = copy.deepcopy(plan)
+    for action in result:
+        for endpoint in (action.get("from") or {}, action.get("to") or {}):
+            if endpoint.get("type") == "buffer":
+                endpoint["slot"] = mapping.get(endpoint["slot"], endpoint["slot"])
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Estimated execution time of corpus plans before/after travel optimization")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generated corpus)")
+    parser.add_argument("--layout", help="JSON overriding TravelCostModel fields (anchors, speed, ...)")
+    args = parser.parse_args()
+
+    from .plan_optimizer import wasteful_variants
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    model = TravelCostModel.load(args.layout)
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    rows: Dict[str, List[Tuple[float, float, float, float]]] = {}
+    for case in cases:
+        output = json.loads(case["reference_output"])
+        if output.get("status") != "success":
+            continue
+        samples = [("reference", output["plan"])]
+        if any(action["to"].get("type") == "buffer" for action in output["plan"]):
+            samples.append(("arbitrary_slots", _relabel_slots(output["plan"], {"B1": "B3", "B3": "B2", "B2": "B1"})))
+        samples += list(wasteful_variants(output, case["current_state"], case["target_spec"]))
+        for kind, plan in samples:
+            report = minimize_travel(plan, case["current_state"], case["target_spec"], model)
+            before, after = report["before"], report["after"]
+            rows.setdefault(kind, []).append((before["distance_mm"], after["distance_mm"],
+                                              before["seconds"], after["seconds"]))
+
+    print(f"[TRAVEL] {len(cases)} corpus cases, arm speed {model.speed:.0f} mm/s, "
+          f"{model.grasp_seconds:.1f} s per grasp/release")
+    print(f"[TRAVEL] {'plans':<22s} {'count':>5s} {'mm before':>10s} {'mm after':>9s} {'s before':>9s} {'s after':>8s}")
+    for kind, values in rows.items():
+        print(f"[TRAVEL] {kind:<22s} {len(values):5d} {statistics.mean(v[0] for v in values):10.0f} "
+              f"{statistics.mean(v[1] for v in values):9.0f} {statistics.mean(v[2] for v in values):9.2f} "
+              f"{statistics.mean(v[3] for v in values):8.2f}")
+    total_before = sum(v[2] for values in rows.values() for v in values)
+    total_after = sum(v[3] for values in rows.values() for v in values)
+    print(f"[TRAVEL] Estimated execution time: {total_before:.1f} s -> {total_after:.1f} s "
+          f"({(total_before - total_after) / total_before:.1%} less)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+模型输出的解析与验证（与具体语言模型无关）
+- target_structure 格式验证：关系注册表（relationships.RELATIONSHIPS）在导入时编译为每种关系的检查闭包
+- 动作计划：规范化与一致性检查在同一遍扫描中完成，收集全部错误（ValidationError.errors）
+- 鲁棒 JSON 提取与目标一致性验证
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, List, Any, Optional
+
+from .config import BUFFER_SLOTS
+from .relationships import RELATIONSHIPS, RelationshipSpec
+from .stack_layers import layer_index
+from .structures import extract_object_value, build_position_object_map, collect_objects_list
+
+
+class ValidationError(ValueError):
+    """输出验证失败；errors 为一次验证中发现的全部错误。"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = list(errors)
+        super().__init__("; ".join(self.errors))
+
+
+# =============== target_structure ===============
+
+def _compile_structure_validator(spec: Optional[RelationshipSpec]) -> Callable[[List[Any]], List[str]]:
+    """把关系约束编译为 placements -> 错误列表 的闭包。"""
+    if spec is None:
+        # 未注册的关系：只要求 placements 带对象信息
+        return lambda placements: []
+
+    name = spec.name
+    arity = frozenset(spec.arity)
+    arity_text = "exactly 1 placement" if arity == {1} else " or ".join(str(n) for n in sorted(arity)) + " placements"
+    # placement 数 -> (位置集合, 报错用的有序列表)
+    expected_by_count = {len(s): (frozenset(s), list(s)) for s in spec.position_sets}
+    largest = expected_by_count.get(max(expected_by_count)) if expected_by_count else None
+
+    def check(placements: List[Any]) -> List[str]:
+        errors = []
+        count = len(placements)
+        if count not in arity:
+            errors.append(f"{name} requires {arity_text}, found {count}")
+        if largest is not None:
+            expected, ordered = expected_by_count.get(count, largest)
+            positions = [p.get("position") if isinstance(p, dict) else None for p in placements]
+            present = set(positions)
+            present.discard(None)
+            if present != expected or len(present) != count:
+                errors.append(f"Relationship '{name}' requires positions {ordered}, found {positions}")
+        return errors
+
+    return check
+
+
+_STRUCTURE_VALIDATORS: Dict[str, Callable[[List[Any]], List[str]]] = {
+    name: _compile_structure_validator(spec) for name, spec in RELATIONSHIPS.items()
+}
+_UNREGISTERED = _compile_structure_validator(None)
+
+
+def structure_errors(structure: Any) -> List[str]:
+    """返回 target_structure / final_expected.target_structure 的全部格式错误（空列表表示通过）。"""
+    if not isinstance(structure, dict):
+        return ["target_structure must be an object"]
+    errors = []
+    relationship = structure.get("relationship")
+    placements = structure.get("placements")
+    if not relationship:
+        errors.append("Missing 'relationship' key in target_structure")
+    if not isinstance(placements, list) or not placements:
+        errors.append("'placements' must be a non-empty list")
+        return errors
+
+    missing_objects = sum(1 for placement in placements if not extract_object_value(placement))
+    if missing_objects:
+        errors.append(f"Each placement must include an object description (object/object 1/2/3), "
+                      f"{missing_objects} without")
+    if relationship:
+        errors.extend(_STRUCTURE_VALIDATORS.get(relationship, _UNREGISTERED)(placements))
+    return errors
+
+
+def validate_target_structure_payload(structure: Dict[str, Any]) -> None:
+    """验证 target_structure / final_expected.target_structure 的字段是否符合新格式。"""
+    errors = structure_errors(structure)
+    if errors:
+        raise ValidationError(errors)
+
+
+# =============== 动作计划 ===============
+
+def _normalize_action(action: Dict[str, Any]) -> None:
+    """容错规范化：scattered 写法统一为 type，object 从 color / from / to 提升至顶层。"""
+    # 1) 规范化 from/to 的 scattered 表达：禁止 position: scattered，统一为 type: scattered
+    for endpoint_key in ("from", "to"):
+        ep = action.get(endpoint_key)
+        if isinstance(ep, dict) and ep.get("position") == "scattered" and "type" not in ep:
+            ep["type"] = "scattered"
+            del ep["position"]
+
+    # 2) 提升 object 字段：允许从 color 或 from.color/from.object 提升至顶层
+    if "object" in action:
+        return
+    obj = None
+    if action.get("color"):
+        # 缺省物体类型按领域设定为 cube
+        obj = f"{action['color']} cube"
+    else:
+        fr = action.get("from", {}) or {}
+        to = action.get("to", {}) or {}
+        if isinstance(fr, dict):
+            obj = fr.get("object") or (f"{fr.get('color')} cube" if fr.get('color') else None)
+        if obj is None and isinstance(to, dict):
+            obj = to.get("object") or (f"{to.get('color')} cube" if to.get('color') else None)
+
+    if obj:
+        action["object"] = obj
+        # 清理冗余 color 字段，避免二义性
+        action.pop("color", None)
+        for endpoint_key in ("from", "to"):
+            if isinstance(action.get(endpoint_key), dict):
+                action[endpoint_key].pop("color", None)
+                action[endpoint_key].pop("object", None)
+
+
+def _label(action: Dict[str, Any], index: int) -> str:
+    return f"step {action.get('step', index)}"
+
+
+def _compile_plan_checker(buffer_slots) -> Callable[[List[Any], bool], List[str]]:
+    """编译计划检查闭包：一遍扫描完成规范化、字段检查、缓冲槽引用与位置一致性检查。"""
+    slots = frozenset(buffer_slots)
+    slot_names = list(buffer_slots)
+    # 缓冲动作 -> 必须带 slot 的端点
+    buffer_endpoints = {"move_to_buffer": ("to", "target"), "move_from_buffer": ("from", "source")}
+
+    def check(plan: List[Any], normalize: bool) -> List[str]:
+        errors: List[str] = []
+        stack_positions: Dict[Any, str] = {}
+        arrangement_positions: Dict[str, str] = {}
+        object_targets: Dict[tuple, str] = {}
+        top_placed = set()
+        top_duplicates: List[str] = []
+
+        for index, action in enumerate(plan, start=1):
+            if not isinstance(action, dict):
+                errors.append(f"action {index}: Each action must be an object")
+                continue
+            fr = action.get("from")
+            to = action.get("to")
+            if normalize:
+                if "step" not in action or "action" not in action:
+                    errors.append(f"{_label(action, index)}: Each action must have 'step' and 'action' keys")
+                # 只有需要规范化的动作才调用 _normalize_action（大多数动作已是规范格式）
+                if "object" not in action or (isinstance(fr, dict) and "type" not in fr) \
+                        or (isinstance(to, dict) and "type" not in to):
+                    _normalize_action(action)
+                if not action.get("object"):
+                    errors.append(f"{_label(action, index)}: Each action must specify an 'object'")
+                endpoint = buffer_endpoints.get(action.get("action"))
+                if endpoint:
+                    key, role = endpoint
+                    ep = fr if key == "from" else to
+                    if not isinstance(ep, dict) or "slot" not in ep:
+                        errors.append(f"{_label(action, index)}: {action['action']} action must specify {role} buffer slot")
+                    elif ep["slot"] not in slots:
+                        errors.append(f"{_label(action, index)}: Invalid buffer slot: {ep['slot']}. Must be one of {slot_names}")
+
+            obj = action.get("object")
+            if not isinstance(to, dict):
+                continue
+            if isinstance(fr, dict) and fr.get("type") == to.get("type") and fr.get("position") == to.get("position") \
+                    and fr.get("slot") == to.get("slot"):
+                errors.append(f"{_label(action, index)}: Action has identical 'from' and 'to', which is redundant")
+
+            kind = to.get("type")
+            if kind not in ("stack", "arrangement"):
+                continue
+            pos = to.get("position")
+            area = "Stack" if kind == "stack" else "Arrangement"
+            if not pos:
+                errors.append(f"{_label(action, index)}: {area} placement action missing target position")
+                continue
+            previous_target = object_targets.setdefault((kind, obj), pos)
+            if previous_target != pos:
+                errors.append(f"{_label(action, index)}: Object '{obj}' placed into multiple {kind} positions within the same plan")
+
+            if kind == "stack" and pos == "top":
+                # top 是当前栈顶（扩展语义），允许多个对象，但同一对象不能重复放到 top
+                if obj in top_placed:
+                    top_duplicates.append(obj)
+                top_placed.add(obj)
+                continue
+            # 有序号的堆栈层（bottom / middle / layer k，同一层的别名视为同一位置）与排列位置保持唯一
+            assigned = stack_positions if kind == "stack" else arrangement_positions
+            layer = layer_index(pos) if kind == "stack" else None
+            prev = assigned.setdefault(pos if layer is None else layer, obj)
+            if prev != obj:
+                errors.append(f"{_label(action, index)}: {area} position '{pos}' assigned to multiple objects ({prev} vs {obj})")
+
+        if top_duplicates:
+            errors.append(f"Same object(s) placed to top position multiple times: {sorted(set(top_duplicates))}")
+        return errors
+
+    return check
+
+
+_PLAN_CHECKER = _compile_plan_checker(BUFFER_SLOTS)
+
+
+@lru_cache(maxsize=32)
+def _plan_checker_for(buffer_slots: tuple) -> Callable[[List[Any], bool], List[str]]:
+    return _compile_plan_checker(buffer_slots)
+
+
+def plan_errors(plan: List[Any], normalize: bool = True, buffer_slots=None) -> List[str]:
+    """返回计划的全部错误；normalize 时先原地规范化每个动作并检查必需字段与缓冲槽引用。
+
+    buffer_slots 为 None 时使用 config.BUFFER_SLOTS，否则按给定的缓冲槽池检查。
+    """
+    checker = _PLAN_CHECKER if buffer_slots is None else _plan_checker_for(tuple(buffer_slots))
+    return checker(plan, normalize)
+
+
+def enforce_plan_consistency(plan: List[Dict[str, Any]]) -> None:
+    """Enhanced plan consistency validation with support for stacking extensions."""
+    errors = _PLAN_CHECKER(plan, False)
+    if errors:
+        raise ValidationError(errors)
+
+
+# =============== 完整输出 ===============
+
+def parse_and_validate(json_text: str) -> Dict[str, Any]:
+    """解析并验证JSON输出（鲁棒版本：跳过 <think>/代码块/多余文本，修复常见格式错误，见 json_extract）"""
+    # 延迟导入：json_extract 同时是命令行入口，包导入时不加载
+    from .json_extract import extract_json
+    return validate_output_data(extract_json(json_text))
+
+
+def output_errors(data: Any, buffer_slots=None) -> List[str]:
+    """返回已解析输出（完整格式）的全部错误；动作字段会被原地规范化。"""
+    if not isinstance(data, dict):
+        return ["Output must be a JSON object"]
+
+    # 纯关系型输出（只有target_structure）
+    if "target_structure" in data and "status" not in data:
+        return structure_errors(data["target_structure"])
+    if "status" not in data:
+        return ["JSON must contain either 'target_structure' (for relationship output) or 'status' (for action plan output)"]
+
+    status = data["status"]
+    if status == "blocked":
+        return [] if "reason" in data else ["Missing 'reason' key for blocked status"]
+    if status != "success":
+        return [f"Invalid status: {status}"]
+
+    errors: List[str] = []
+    plan = data.get("plan")
+    if "plan" not in data:
+        errors.append("Missing 'plan' key for success status")
+    elif not isinstance(plan, list):
+        errors.append("Plan must be a list of actions")
+    else:
+        errors.extend(plan_errors(plan, True, buffer_slots))
+
+    final_expected = data.get("final_expected")
+    if "final_expected" not in data:
+        errors.append("Success status requires 'final_expected' field")
+    elif isinstance(final_expected, dict) and "target_structure" in final_expected:
+        errors.extend(structure_errors(final_expected["target_structure"]))
+    elif isinstance(final_expected, dict) and "relationship" in final_expected and "placements" in final_expected:
+        # 兼容旧格式
+        errors.extend(structure_errors({
+            "relationship": final_expected["relationship"],
+            "placements": final_expected["placements"],
+        }))
+    return errors
+
+
+def validate_output_data(data: Dict[str, Any], buffer_slots=None) -> Dict[str, Any]:
+    """验证已解析的输出对象（完整格式），原地规范化动作字段后返回；有错误时抛出 ValidationError。"""
+    errors = output_errors(data, buffer_slots)
+    if errors:
+        raise ValidationError(errors)
+    return data
+
+
+def validate_target_consistency(result: Dict[str, Any], target_spec: Dict[str, Any]) -> bool:
+    """验证结果与目标规范的一致性"""
+    if "target_structure" not in target_spec:
+        return True  # 旧格式跳过验证
+
+    target_structure = target_spec["target_structure"]
+    target_relationship = target_structure.get("relationship")
+    target_position_map = build_position_object_map(target_structure.get("placements", []))
+    target_objects = collect_objects_list(target_structure.get("placements", []))
+
+    # 检查final_expected
+    if "final_expected" in result:
+        final_expected = result["final_expected"]
+        if "target_structure" in final_expected:
+            final_structure = final_expected["target_structure"]
+        elif "relationship" in final_expected and "placements" in final_expected:
+            final_structure = final_expected
+        else:
+            final_structure = None
+
+        if final_structure:
+            if final_structure.get("relationship") != target_relationship:
+                print(f"[CONSISTENCY] Relationship mismatch: expected {target_relationship}, got {final_structure.get('relationship')}")
+                return False
+
+            final_position_map = build_position_object_map(final_structure.get("placements", []))
+            final_objects = collect_objects_list(final_structure.get("placements", []))
+
+            if target_position_map:
+                for position, expected_object in target_position_map.items():
+                    if position not in final_position_map:
+                        print(f"[CONSISTENCY] Missing position: {position}")
+                        return False
+                    if final_position_map[position] != expected_object:
+                        print(f"[CONSISTENCY] Object mismatch at {position}: expected {expected_object}, got {final_position_map[position]}")
+                        return False
+            else:
+                if final_objects != target_objects:
+                    print(f"[CONSISTENCY] Object list mismatch: expected {target_objects}, got {final_objects}")
+                    return False
+
+            # 若为 stacked，额外校验计划的自底向上顺序（忽略缓冲动作）：各层首次放置按层序号递增，top 最后
+            if target_relationship == "stacked" and "plan" in result and isinstance(result["plan"], list):
+                height = len(target_position_map)
+                idx: Dict[str, int] = {}
+                for i, act in enumerate(result["plan"]):
+                    to = act.get("to") if isinstance(act, dict) else None
+                    if isinstance(to, dict) and to.get("type") == "stack":
+                        pos = to.get("position")
+                        if layer_index(pos, height) is not None:
+                            idx.setdefault(pos, i)
+                order = sorted(idx, key=idx.get)
+                if order != sorted(order, key=lambda p: layer_index(p, height)):
+                    print(f"[CONSISTENCY] Stacked order invalid: got indices {idx}")
+                    return False
+
+            print("[CONSISTENCY] Target consistency validation passed")
+            return True
+
+    # 检查target_structure输出（纯关系型）
+    elif "target_structure" in result:
+        result_structure = result["target_structure"]
+        if result_structure.get("relationship") != target_relationship:
+            print(f"[CONSISTENCY] Relationship mismatch: expected {target_relationship}, got {result_structure.get('relationship')}")
+            return False
+
+        result_position_map = build_position_object_map(result_structure.get("placements", []))
+        result_objects = collect_objects_list(result_structure.get("placements", []))
+
+        if target_position_map:
+            for position, expected_object in target_position_map.items():
+                if position not in result_position_map:
+                    print(f"[CONSISTENCY] Missing position: {position}")
+                    return False
+                if result_position_map[position] != expected_object:
+                    print(f"[CONSISTENCY] Object mismatch at {position}: expected {expected_object}, got {result_position_map[position]}")
+                    return False
+        else:
+            if result_objects != target_objects:
+                print(f"[CONSISTENCY] Object list mismatch: expected {target_objects}, got {result_objects}")
+                return False
+
+        print("[CONSISTENCY] Target consistency validation passed")
+        return True
+
+    return True
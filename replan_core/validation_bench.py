@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证器微基准：编译后的注册表验证器 vs 引入注册表之前的实现
+基线是冻结在 _baseline_validation 中的旧验证函数（不依赖 git 历史），
+两者在同一批生成的计划上计时，并比较判定是否一致。
+注入错误的输出上基线更快：它在第一处错误处抛出，注册表验证器汇总全部错误（ValidationError.errors）。
+
+语料：每个场景的参考输出，加上插入 N 对缓冲区往返动作的长计划，以及各自注入多处错误的变体。
+
+用法（在仓库根目录）：
+  python -m replan_core.validation_bench --lengths 200 1000
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import time
+from typing import Dict, List, Any, Callable, Iterator, Tuple
+
+from . import _baseline_validation as baseline
+from .validation import ValidationError, validate_output_data
+
+
+def _long_plan(output: Dict[str, Any], pairs: int) -> Dict[str, Any]:
+    """在参考计划前插入 pairs 对缓冲区往返动作（散落对象 → B1 → 散落）。"""
+    detours = []
+    for i in range(pairs):
+        obj = f"gray cube {i}"
+        detours.append({"action": "move_to_buffer", "object": obj, "from": {"type": "scattered"},
+                        "to": {"type": "buffer", "slot": "B1"}, "reason": "Clear the workspace"})
+        detours.append({"action": "move_from_buffer", "object": obj, "from": {"type": "buffer", "slot": "B1"},
+                        "to": {"type": "scattered"}, "reason": "Return object"})
+    result = copy.deepcopy(output)
+    result["plan"] = detours + result["plan"]
+    for step, action in enumerate(result["plan"], start=1):
+        action["step"] = step
+    return result
+
+
+def _broken(output: Dict[str, Any]) -> Dict[str, Any]:
+    """注入多处错误：未知缓冲槽、缺失 object、同一对象两次放到 top、final_expected 缺少位置。"""
+    result = copy.deepcopy(output)
+    plan = result["plan"]
+    plan.append({"step": len(plan) + 1, "action": "move_to_buffer", "object": "gray cube x",
+                 "from": {"type": "scattered"}, "to": {"type": "buffer", "slot": "B9"}})
+    plan.append({"step": len(plan) + 1, "action": "move_to_position",
+                 "from": {"type": "scattered"}, "to": {"type": "arrangement", "position": "left"}})
+    for _ in range(2):
+        plan.append({"step": len(plan) + 1, "action": "move_to_position", "object": "gray cube y",
+                     "from": {"type": "scattered"}, "to": {"type": "stack", "position": "top"}})
+    result["final_expected"]["target_structure"]["placements"].pop()
+    return result
+
+
+def generate_outputs(lengths: List[int]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    from .scenario_corpus import generate_corpus
+
+    for case in generate_corpus():
+        output = json.loads(case["reference_output"])
+        if output.get("status") != "success":
+            continue
+        for length in [0] + list(lengths):
+            variant = _long_plan(output, length // 2) if length else output
+            label = f"plan+{length}" if length else "reference"
+            yield label, variant
+            yield f"{label} broken", _broken(variant)
+
+
+def _verdict(validate: Callable, data: Dict[str, Any]) -> int:
+    """返回报告的错误数（0 表示通过）。"""
+    try:
+        validate(data)
+        return 0
+    except ValidationError as e:
+        return len(e.errors)
+    except ValueError:
+        return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compiled registry validator vs the previous validation functions")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[200, 1000], help="extra actions in long plans")
+    parser.add_argument("--rounds", type=int, default=20, help="timed rounds per output")
+    args = parser.parse_args()
+
+    validators = {"baseline": baseline.validate_output_data, "compiled registry": validate_output_data}
+
+    outputs = list(generate_outputs(args.lengths))
+    # 规范化是原地进行的：先各验证一遍，计时时两者看到相同的（已规范化）对象
+    verdicts = {name: [_verdict(fn, data) for _, data in outputs] for name, fn in validators.items()}
+    print(f"[VALIDATE] {len(outputs)} outputs, plan lengths up to {max(len(d['plan']) for _, d in outputs)} actions")
+
+    labels = list(dict.fromkeys(label for label, _ in outputs))
+    for name, fn in validators.items():
+        by_label: Dict[str, List[float]] = {label: [] for label in labels}
+        for label, data in outputs:
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                try:
+                    fn(data)
+                except ValueError:
+                    pass
+            by_label[label].append((time.perf_counter() - start) / args.rounds * 1e6)
+        errors = [n for n in verdicts[name] if n]
+        print(f"[VALIDATE] {name:<24s} rejected {len(errors)}/{len(outputs)}  "
+              f"errors per rejected output {statistics.mean(errors) if errors else 0:.1f}")
+        for label in labels:
+            print(f"           {label:<16s} {statistics.mean(by_label[label]):9.1f} us")
+
+    old, new = verdicts.values()
+    disagreements = sum(1 for a, b in zip(old, new) if bool(a) != bool(b))
+    print(f"[VALIDATE] accept/reject disagreements: {disagreements}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
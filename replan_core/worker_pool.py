@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程规划 worker 池
+单个进程中所有规划请求都排在 GIL 与同一个 model.generate 之后。
+这里父进程先加载知识库、embedding 矩阵与语言模型权重，再 fork N 个 worker：
+这些页面由各进程写时复制共享，内存不随 worker 数成倍增长；前端进程负责分发请求。
+- PlannerWorkerPool：fork 上下文的 multiprocessing.Pool，请求按提交顺序返回
+- StandInModelBackend：小型 numpy 替身模型（逐 token 做多层 MLP 前向），用于伸缩基准
+
+注意：
+- 需要 fork 启动方式（Linux）
+- 只能用 CPU 上的模型：CUDA 在 fork 出的子进程中不能重新初始化，父进程已加载到 GPU 的模型
+  在 worker 中不可用。默认配置档为 qwen3-4b-cpu；device_map 不是 "cpu" 的配置档或已在 GPU 上的
+  backend 在 fork 前被拒绝（GPU 上请用单进程的 pipeline.PipelinedPlanner）
+- fork 前不要在父进程中调用 generate：torch 的 OpenMP 线程池在 fork 后不可用，
+  worker 启动时按 threads_per_worker 重新设置 torch / BLAS 线程数
+
+伸缩基准（在仓库根目录）：
+  python -m replan_core.worker_pool --workers 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from typing import Dict, Iterable, Iterator, Any, Optional
+
+import numpy as np
+
+from .compact_output import parse_model_output
+from .config import OPTIMIZE_PLANS
+from .llm_backends import ReplayLLMBackend
+from .plan_optimizer import optimize_output
+from .profiles import ModelProfile, QWEN3_4B_CPU
+from .validation import validate_target_consistency
+
+# fork 前由父进程填充，worker 继承（只读使用）
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _check_fork_safe(profile: ModelProfile, backend) -> None:
+    """fork 前确认语言模型在 CPU 上（CUDA 在 fork 出的子进程中不能重新初始化）。"""
+    if backend is None and profile.device_map != "cpu":
+        raise ValueError(f"PlannerWorkerPool forks workers and needs a CPU profile; "
+                         f"'{profile.name}' uses device_map={profile.device_map!r}")
+    device = getattr(getattr(backend, "model", None), "device", None)
+    if device is not None and getattr(device, "type", str(device)) != "cpu":
+        raise ValueError(f"PlannerWorkerPool forks workers; backend model is on {device}, which forked workers cannot use")
+
+
+def _init_worker(threads: Optional[int]) -> None:
+    """worker 启动：限制每个进程的计算线程数，避免 N 个 worker 争用全部核心。"""
+    if not threads:
+        return
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        _WORKER_STATE["thread_limits"] = threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def check_output(raw: str, target_spec: Dict[str, Any], current_state: Dict[str, Any],
+                 output_format: str = "full") -> Dict[str, Any]:
+    """解析验证模型输出并做目标一致性验证（一致时做计划优化），返回 {result, consistent} 或 {result: None, error}。"""
+    try:
+        result = parse_model_output(raw, target_spec, current_state, output_format)
+    except Exception as e:
+        return {"result": None, "error": f"{type(e).__name__}: {e}"}
+    consistent = bool(validate_target_consistency(result, target_spec))
+    if consistent and OPTIMIZE_PLANS:
+        result = optimize_output(result, current_state, target_spec)
+    return {"result": result, "consistent": consistent}
+
+
+def _plan_in_worker(request: Dict[str, Any]) -> Dict[str, Any]:
+    """在 worker 中处理一个请求：提示词 → 生成 → 解析验证 → 目标一致性验证。"""
+    rag_system = _WORKER_STATE["rag_system"]
+    backend = _WORKER_STATE["backend"]
+    profile = _WORKER_STATE["profile"]
+    target_spec = request["target_spec"]
+    current_state = request["current_state"]
+
+    outcome: Dict[str, Any] = {"case_id": request.get("case_id"), "worker": os.getpid(), "result": None}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            system_prompt, user_prompt = rag_system.build_rag_prompt(target_spec, current_state, profile=profile)
+            budget = getattr(rag_system, "last_prompt_report", None)
+            outcome["prompt_budget"] = budget
+            raw = backend.generate(system_prompt, user_prompt, budget and budget["max_new_tokens"])
+            outcome.update(check_output(raw, target_spec, current_state, profile.output_format))
+        except Exception as e:
+            outcome["error"] = f"{type(e).__name__}: {e}"
+    outcome["ms"] = round((time.perf_counter() - start) * 1000.0, 4)
+    return outcome
+
+
+class PlannerWorkerPool:
+    """fork 共享只读状态的规划 worker 池。
+
+    rag_system / backend 缺省时按配置档在父进程中加载；传入的对象同样在 fork 前准备好。
+    配置档与 backend 的模型必须在 CPU 上（见模块说明），否则抛出 ValueError。
+    """
+
+    def __init__(self, workers: int, profile: ModelProfile = QWEN3_4B_CPU, rag_system=None, backend=None,
+                 threads_per_worker: Optional[int] = None):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("PlannerWorkerPool requires the 'fork' start method (Linux)")
+        if _WORKER_STATE:
+            raise RuntimeError("Another PlannerWorkerPool is open in this process; close it first")
+        _check_fork_safe(profile, backend)
+
+        if rag_system is None:
+            from .rag_system import ReplanRAGSystem
+            rag_system = ReplanRAGSystem(profile)
+        if backend is None:
+            from .transformers_backend import TransformersChatBackend
+            backend = TransformersChatBackend(profile)
+
+        # 查询缓存为空时每个 worker 都会各自加载 embedding 模型；在父进程加载一次以便共享
+        query_cache = getattr(rag_system, "query_cache", None)
+        if query_cache is not None and len(query_cache) == 0:
+            rag_system.embedding_model
+
+        self.workers = workers
+        self.profile = profile
+        self.rag_system = rag_system
+        self.backend = backend
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        self.threads_per_worker = threads_per_worker
+
+        _WORKER_STATE.update(rag_system=rag_system, backend=backend, profile=profile)
+        # 冻结现有对象，worker 中的 GC 不再遍历（写入）这些对象头，减少写时复制
+        gc.collect()
+        gc.freeze()
+        try:
+            context = multiprocessing.get_context("fork")
+            self._pool = context.Pool(workers, initializer=_init_worker, initargs=(threads_per_worker,))
+        finally:
+            gc.unfreeze()
+
+    def plan(self, target_spec: Dict[str, Any], current_state: Dict[str, Any]) -> Dict[str, Any]:
+        """同步处理一个请求，返回 {case_id, worker, result, consistent, error?, ms}。"""
+        return self._pool.apply(_plan_in_worker, ({"target_spec": target_spec, "current_state": current_state},))
+
+    def map(self, requests: Iterable[Dict[str, Any]], chunksize: int = 1) -> Iterator[Dict[str, Any]]:
+        """并行处理请求（{case_id?, target_spec, current_state}），按提交顺序逐个返回。"""
+        return self._pool.imap(_plan_in_worker, requests, chunksize)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            _WORKER_STATE.clear()
+
+    def __enter__(self) -> "PlannerWorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class StandInModelBackend:
+    """替身语言模型：持有 layers 个 hidden×hidden 的 float32 权重，每个新 token 做一次前向，
+    最后返回回放后端的输出。权重大小与解码耗时可调，用于测试多进程伸缩与内存共享。
+    seconds_per_token 不为空时改为 sleep（模拟 GPU 解码：CPU 空闲、释放 GIL）。"""
+
+    def __init__(self, outputs: ReplayLLMBackend, hidden: int = 1024, layers: int = 8, new_tokens: int = 16,
+                 seed: int = 0, seconds_per_token: Optional[float] = None):
+        rng = np.random.default_rng(seed)
+        self.outputs = outputs
+        self.new_tokens = new_tokens
+        self.seconds_per_token = seconds_per_token
+        self.weights = [
+            (rng.standard_normal((hidden, hidden), dtype=np.float32) / np.sqrt(hidden)).astype(np.float32)
+            for _ in range(layers)
+        ]
+        self.name = f"stand-in:{layers}x{hidden}"
+        self.last_generation = None
+
+    @property
+    def weight_bytes(self) -> int:
+        return sum(w.nbytes for w in self.weights)
+
+    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None) -> str:
+        start = time.perf_counter()
+        if self.seconds_per_token is not None:
+            time.sleep(self.seconds_per_token * self.new_tokens)
+        else:
+            state = np.full(self.weights[0].shape[0], 1.0 / len(user_prompt), dtype=np.float32)
+            for _ in range(self.new_tokens):
+                for weight in self.weights:
+                    state = np.tanh(weight @ state)
+        self.last_generation = {"new_tokens": self.new_tokens, "seconds": time.perf_counter() - start}
+        return self.outputs.generate(system_prompt, user_prompt)
+
+
+def _private_mb(pid: int) -> Optional[float]:
+    """进程私有（未共享）内存，来自 /proc/<pid>/smaps_rollup；不可用时返回 None。"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    kb = sum(int(fields[key].split()[0]) for key in ("Private_Clean", "Private_Dirty") if key in fields)
+    return kb / 1024.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Requests/second versus worker count for the forked planner pool")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to measure")
+    parser.add_argument("--corpus", help="scenario corpus JSONL (default: generate in memory)")
+    parser.add_argument("--repeat", type=int, default=2, help="run the corpus N times per worker count")
+    parser.add_argument("--hidden", type=int, default=1024, help="stand-in model hidden size")
+    parser.add_argument("--layers", type=int, default=8, help="stand-in model layers")
+    parser.add_argument("--new-tokens", type=int, default=16, help="stand-in decode steps per request")
+    args = parser.parse_args()
+
+    from .rag_system import ReplanRAGSystem, build_user_prompt
+    from .llm_backends import prompt_key
+    from .scenario_corpus import generate_corpus, load_corpus
+
+    cases = load_corpus(args.corpus) if args.corpus else generate_corpus()
+    requests = [
+        {"case_id": c["case_id"], "target_spec": c["target_spec"], "current_state": c["current_state"]}
+        for c in cases
+    ] * args.repeat
+    outputs = ReplayLLMBackend({
+        prompt_key(build_user_prompt(c["target_spec"], c["current_state"])): c["reference_output"] for c in cases
+    })
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag_system = ReplanRAGSystem()
+    backend = StandInModelBackend(outputs, args.hidden, args.layers, args.new_tokens)
+    print(f"[POOL] {len(requests)} requests, {os.cpu_count()} CPUs, stand-in weights "
+          f"{backend.weight_bytes / 2**20:.0f} MB ({backend.name}, {args.new_tokens} tokens/request)")
+
+    baseline = None
+    for workers in args.workers:
+        with PlannerWorkerPool(workers, rag_system=rag_system, backend=backend) as pool:
+            # 预热：每个 worker 先处理一个请求
+            list(pool.map(requests[:workers]))
+            start = time.perf_counter()
+            outcomes = list(pool.map(requests))
+            elapsed = time.perf_counter() - start
+            private = [_private_mb(pid) for pid in sorted({o["worker"] for o in outcomes})]
+
+        failures = sum(1 for o in outcomes if o["result"] is None)
+        rps = len(outcomes) / elapsed
+        baseline = baseline or rps
+        memory = (f", private {statistics.mean(private):.1f} MB/worker"
+                  if private and all(m is not None for m in private) else "")
+        print(f"[POOL] workers={workers:<3d} {rps:8.1f} req/s  speedup {rps / baseline:4.2f}x  "
+              f"p50 {statistics.median(o['ms'] for o in outcomes):7.2f} ms{memory}  failures {failures}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+测试共享的替身编码器：按词哈希的单位向量，代替 sentence_transformers（不需要embedding模型）
+- stand_in_encoder：编码器本身，记录每次调用的文本
+- stand_in_rag：构造使用替身编码器的 ReplanRAGSystem（知识库加载时就不会导入 sentence_transformers）
+"""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+DIMENSIONS = 32
+
+
+class StandInEncoder:
+    """词袋哈希向量（单位长度）；calls 记录每次调用的文本列表。"""
+
+    def __init__(self):
+        self.calls = []
+
+    @property
+    def encoded(self):
+        return [text for call in self.calls for text in call]
+
+    def encode(self, texts, *args, **kwargs):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % DIMENSIONS] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    __call__ = encode
+
+
+@pytest.fixture
+def stand_in_encoder():
+    return StandInEncoder()
+
+
+@pytest.fixture
+def stand_in_rag():
+    """返回 make(**kwargs)：按参数构造 ReplanRAGSystem，embedding_model 为新的 StandInEncoder。"""
+    from replan_core.rag_system import ReplanRAGSystem
+
+    class _StandInEncoderRAG(ReplanRAGSystem):
+        @property
+        def embedding_model(self):
+            if self._embedding_model is None:
+                self._embedding_model = StandInEncoder()
+            return self._embedding_model
+
+    def make(**kwargs):
+        kwargs.setdefault("query_cache_path", None)
+        return _StandInEncoderRAG(**kwargs)
+
+    return make
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试规则向量索引：精确索引与 cosine_similarity 排序一致、IVF 召回率、增量插入与持久化
+不需要语言模型或embedding模型
+"""
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from replan_core.ann_index import ExactIndex, IVFIndex, build_index, recall_at_k, synthetic_chunks
+
+
+def test_exact_matches_cosine_argsort():
+    vectors = synthetic_chunks(300, 16, clusters=10, seed=1)
+    query = synthetic_chunks(1, 16, clusters=10, seed=2)
+    index = build_index("exact", vectors)
+    ids, scores = index.search(query[0], 7)
+    similarities = cosine_similarity(query, vectors).flatten()
+    assert ids.tolist() == np.argsort(similarities)[-7:][::-1].tolist()
+    assert np.allclose(scores, similarities[ids], atol=1e-5)
+
+
+def test_ivf_recall_against_exact():
+    vectors = synthetic_chunks(4000, 32, clusters=40, seed=3)
+    queries = synthetic_chunks(50, 32, clusters=40, seed=4)
+    exact = build_index("exact", vectors)
+    ivf = build_index("ivf", vectors, nprobe=16)
+    assert recall_at_k(ivf, exact, queries, 7) >= 0.9
+    # nprobe 覆盖全部簇时等价于精确检索
+    ids, _ = ivf.search(queries[0], 7, nprobe=ivf.nlist)
+    assert ids.tolist() == exact.search(queries[0], 7)[0].tolist()
+
+
+def test_ivf_incremental_add_and_round_trip(tmp_path):
+    vectors = synthetic_chunks(1200, 16, clusters=12, seed=5)
+    ivf = build_index("ivf", vectors[:1000])
+    ivf.add(vectors[1000:])
+    assert len(ivf) == 1200
+    # 新插入的向量能被检索到（自身相似度最高）
+    ids, _ = ivf.search(vectors[1100], 1, nprobe=ivf.nlist)
+    assert ids.tolist() == [1100]
+
+    path = tmp_path / "rules.ivf.npz"
+    ivf.save(path)
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == 1200
+    for query in vectors[::97]:
+        assert loaded.search(query, 5)[0].tolist() == ivf.search(query, 5)[0].tolist()
+
+    exact = ExactIndex(16)
+    exact.add(vectors)
+    exact.save(tmp_path / "rules.exact.npz")
+    assert ExactIndex.load(tmp_path / "rules.exact.npz").search(vectors[0], 3)[0].tolist() == exact.search(vectors[0], 3)[0].tolist()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_exact_matches_cosine_argsort()
+    test_ivf_recall_against_exact()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_ivf_incremental_add_and_round_trip(Path(tmp))
+    print("ann index tests passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试离线批量重新验证（replan-validate）
+不需要语言模型或embedding模型
+"""
+
+import io
+import json
+
+from replan_core.batch_validate import error_kind, run
+from replan_core.scenario_corpus import generate_corpus
+
+
+def _log_lines():
+    lines = []
+    for case in generate_corpus()[:6]:
+        record = {"id": case["case_id"], "target_spec": case["target_spec"],
+                  "current_state": case["current_state"], "raw_output": case["reference_output"]}
+        lines.append(json.dumps(record))
+        broken = json.loads(case["reference_output"])
+        broken.pop("final_expected", None)
+        lines.append(json.dumps(dict(record, id=f"{case['case_id']}-broken", raw_output=json.dumps(broken))))
+    lines.insert(3, "not json")
+    lines.insert(4, "")
+    return lines
+
+
+def test_verdicts_in_input_order_with_histogram():
+    lines = _log_lines()
+    out = io.StringIO()
+    summary = run(lines, out, workers=0, chunk_size=4)
+    verdicts = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    # 空行跳过，其余每行一条判定，行号指向输入
+    assert [v["line"] for v in verdicts] == [i for i, line in enumerate(lines, start=1) if line]
+    assert summary["records"] == len(verdicts) == 13
+    bad_line = next(v for v in verdicts if v["line"] == 4)
+    assert bad_line["errors"][0]["stage"] == "input" and not bad_line["parsed"]
+
+    references = [v for v in verdicts if v["id"] and not v["id"].endswith("broken")]
+    assert all(v["valid"] and v["consistent"] and v["executable"] for v in references)
+    broken = [v for v in verdicts if v["id"] and v["id"].endswith("broken")]
+    assert all(v["parsed"] and not v["valid"] for v in broken)
+
+    histogram = {(row["stage"], row["error"]): row["count"] for row in summary["histogram"]}
+    assert histogram[("validate", "Success status requires '…' field")] == 6
+    assert summary["valid"] == 6
+
+
+def test_worker_pool_matches_in_process():
+    lines = _log_lines()
+    serial, pooled = io.StringIO(), io.StringIO()
+    run(lines, serial, workers=0, chunk_size=3)
+    summary = run(lines, pooled, workers=2, chunk_size=3, max_in_flight=2)
+    assert pooled.getvalue() == serial.getvalue()
+    assert summary["records"] == 13
+
+
+def test_error_kind_normalizes_names_and_numbers():
+    assert error_kind("step 12: Invalid buffer slot: B9") == "Invalid buffer slot: BN"
+    assert error_kind("Objects placed to top position multiple times: ['gray cube']") == \
+        "Objects placed to top position multiple times: […]"
+    assert error_kind("Object 'red cube' is not in buffer") == "Object '…' is not in buffer"
+
+
+if __name__ == "__main__":
+    test_verdicts_in_input_order_with_histogram()
+    test_worker_pool_matches_in_process()
+    test_error_kind_normalizes_names_and_numbers()
+    print("All batch validation tests passed")
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试基准测试的单用例记录：场景与检索规则数直接取自 last_prompt_report，不依赖日志文本
+使用替身编码器（conftest.stand_in_rag）与回放后端，不需要语言模型或embedding模型
+"""
+
+import contextlib
+import io
+
+from replan_core.benchmark import StageProfiler, run_case
+from replan_core.llm_backends import ReplayLLMBackend
+from replan_core.scenario_corpus import generate_corpus
+
+
+def test_record_reads_scenario_from_prompt_report(stand_in_rag):
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = stand_in_rag(bundle_path=False)
+    case = next(c for c in generate_corpus() if c["case_id"] == "stacked/wrong_middle")
+    record = run_case(rag, ReplayLLMBackend({}, default_output=case["reference_output"]), StageProfiler(), case)
+    report = rag.last_prompt_report
+    assert record["scenario"] == report["scenario"] == "stack_replacement_middle"
+    assert record["rule_count"] == report["rules_retrieved"] >= report["rules_kept"]
+    assert record["parsed"] and record["executable"]
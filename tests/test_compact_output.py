@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试紧凑输出格式：参考输出压缩后再展开，得到可执行、与目标一致的完整格式
+不需要语言模型或embedding模型
+"""
+
+import json
+
+import pytest
+
+from replan_core.compact_output import compact_from_output, expand_compact, parse_compact, parse_model_output
+from replan_core.json_extract import TruncatedOutputError
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus
+from replan_core.validation import validate_target_consistency
+
+
+def test_corpus_round_trip():
+    """每个参考输出压缩 → 展开后动作不变，final_expected 与目标一致"""
+    for case in generate_corpus():
+        full = json.loads(case["reference_output"])
+        compact_raw = json.dumps(compact_from_output(full))
+        assert len(compact_raw) < len(case["reference_output"])
+
+        result = parse_model_output(compact_raw, case["target_spec"], case["current_state"], "compact")
+        strip = lambda plan: [{k: a[k] for k in ("step", "action", "object", "from", "to")} for a in plan]
+        assert strip(result["plan"]) == strip(full["plan"]), case["case_id"]
+        assert simulate_plan(result["plan"], case["current_state"], case["target_spec"])["ok"]
+        assert validate_target_consistency(result, case["target_spec"]), case["case_id"]
+
+
+def test_final_expected_comes_from_simulation():
+    """final_expected 反映实际执行结果：少放一个对象时展开结果不完整，验证失败"""
+    target = {"target_structure": {"relationship": "stacked", "placements": [
+        {"position": "bottom", "object 1": "blue cube"},
+        {"position": "top", "object 2": "red cube"},
+    ]}}
+    current = {"target_structure": {"relationship": "none", "placements": []}}
+    raw = '```json\n[["M", "blue cube", "scattered", "stack:bottom"]]\n```'
+    result = expand_compact(parse_compact(raw), current, target)
+    assert result["final_expected"]["target_structure"]["placements"] == [{"position": "bottom", "object 1": "blue cube"}]
+    with pytest.raises(ValueError):
+        parse_model_output(raw, target, current, "compact")
+
+
+def test_invalid_compact_outputs_are_rejected():
+    current = {"target_structure": {"relationship": "none", "placements": []}}
+    target = {"target_structure": {"relationship": "separated_left_right", "placements": [
+        {"position": "left", "object 1": "blue cube"},
+        {"position": "right", "object 2": "red cube"},
+    ]}}
+    for bad in (
+        [["X", "blue cube", "scattered", "arr:left"]],            # 未知操作码
+        [["B", "blue cube", "scattered", "arr:left"]],            # 操作码与端点不符
+        [["M", "blue cube", "scattered", "shelf:left"]],          # 未知端点
+        [["U", "blue cube", "B1", "arr:left"]],                   # B1 中没有该对象
+        [["M", "blue cube", "scattered"]],                        # 字段缺失
+    ):
+        with pytest.raises(ValueError):
+            expand_compact(bad, current, target)
+
+    blocked = parse_model_output('Sure. {"blocked": "red cube missing"} done', target, current, "compact")
+    assert blocked == {"status": "blocked", "reason": "red cube missing"}
+    assert parse_compact('<think>plan</think> [["M", "a", "scattered", "arr:left"]] trailing') == \
+        [["M", "a", "scattered", "arr:left"]]
+
+    # 截断的动作列表不能补齐成一个更短的可执行计划
+    truncated = '[["M", "blue cube", "scattered", "arr:left"], ["M", "red cube", "scat'
+    with pytest.raises(TruncatedOutputError):
+        parse_model_output(truncated, target, current, "compact")
+
+
+if __name__ == "__main__":
+    test_corpus_round_trip()
+    test_final_expected_comes_from_simulation()
+    test_invalid_compact_outputs_are_rejected()
+    print("All compact output tests passed")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试查询 embedding 缓存：只在未命中时调用 encoder、LRU 淘汰、磁盘持久化
+使用替身编码器（conftest.stand_in_encoder），不需要语言模型或embedding模型
+"""
+
+import numpy as np
+
+from replan_core.embedding_cache import QueryEmbeddingCache
+
+
+def test_encoder_only_sees_misses(stand_in_encoder):
+    cache = QueryEmbeddingCache()
+    encoder = stand_in_encoder
+    first = cache.encode(["a", "bb", "a"], encoder)
+    second = cache.encode(["bb", "ccc"], encoder)
+    assert encoder.calls == [["a", "bb"], ["ccc"]]
+    expected = encoder.encode(["a", "bb", "ccc"])
+    assert np.array_equal(first, expected[[0, 1, 0]])
+    assert np.array_equal(second, expected[[1, 2]])
+
+
+def test_lru_eviction(stand_in_encoder):
+    cache = QueryEmbeddingCache(max_entries=2)
+    encoder = stand_in_encoder
+    cache.encode(["a", "b"], encoder)
+    cache.encode(["a"], encoder)  # a 最近使用
+    cache.encode(["c"], encoder)  # 淘汰 b
+    cache.encode(["a", "b"], encoder)
+    assert encoder.calls[-1] == ["b"]
+
+
+def test_persistence_round_trip(tmp_path, stand_in_encoder):
+    path = tmp_path / "queries.npz"
+    cache = QueryEmbeddingCache(path)
+    original = cache.encode(["stack extension", "pyramid"], stand_in_encoder)
+    assert cache.save()
+    assert not cache.save()
+
+    stand_in_encoder.calls.clear()
+    reloaded = QueryEmbeddingCache(path)
+    vectors = reloaded.encode(["pyramid", "stack extension"], stand_in_encoder)
+    assert stand_in_encoder.calls == []
+    assert np.array_equal(vectors, original[[1, 0]])
+
+    other_model = QueryEmbeddingCache(path, model_name="another-model")
+    assert len(other_model) == 0
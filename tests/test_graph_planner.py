@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试支撑图规划：关系注册表中的支撑边、语料与枚举场景上的计划可执行性与优化后长度，以及没有支撑图时交给语言模型
+不需要语言模型或embedding模型
+"""
+
+import json
+
+import pytest
+
+from replan_core.graph_planner import GraphPlanningError, has_support_graph, plan_from_graph
+from replan_core.plan_optimizer import optimize_plan
+from replan_core.plan_search import search_plan
+from replan_core.plan_simulator import simulate_plan
+from replan_core.relationships import support_graph
+from replan_core.scenario_corpus import generate_corpus, make_structure
+from replan_core.scene_enumerator import enumerate_pairs
+from replan_core.stack_height_bench import tower
+from replan_core.validation import validate_output_data
+
+GRAPH_RELATIONSHIPS = {"pyramid", "stacked_and_separated_left", "stacked_and_separated_right",
+                       "separate_horizontal", "separate_vertical"}
+
+EMPTY = {"target_structure": {"relationship": "none", "placements": []}}
+
+
+def test_support_graphs_from_registry():
+    pyramid = support_graph("pyramid", ["bottom left", "bottom right", "top"])
+    assert pyramid == {"bottom left": (), "bottom right": (), "top": ("bottom left", "bottom right")}
+    stacked = support_graph("stacked_and_separated_left", ["bottom", "top", "left"])
+    assert stacked == {"bottom": (), "top": ("bottom",), "left": ()}
+    assert support_graph("separate_horizontal", ["left", "middle", "right"]) == {"left": (), "middle": (), "right": ()}
+    # 只有通用提示词的关系注册了支撑图；stacked 与两位置排列仍使用专用提示词与语言模型
+    assert {name for name in GRAPH_RELATIONSHIPS | {"stacked", "stacked_left", "separated_left_right",
+                                                    "separated_front_back", "none", "circle"}
+            if has_support_graph(name)} == GRAPH_RELATIONSHIPS
+    assert support_graph("stacked", ["bottom", "top"]) is None
+
+
+def _graph_cases():
+    return [case for case in generate_corpus()
+            if case["target_spec"]["target_structure"]["relationship"] in GRAPH_RELATIONSHIPS]
+
+
+def test_graph_plans_on_corpus():
+    for case in _graph_cases():
+        output = plan_from_graph(case["target_spec"], case["current_state"])
+        assert simulate_plan(output["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+        validate_output_data(json.loads(json.dumps(output)))
+        reference = json.loads(case["reference_output"]).get("plan") or []
+        assert len(output["plan"]) <= len(reference), case["case_id"]
+
+
+def test_graph_plans_on_enumerated_pairs():
+    """枚举场景上计划都可执行；经 plan_optimizer 后与 A* 最短计划的差距不超过一个动作"""
+    for target_spec, current_state in enumerate_pairs(["a", "b", "c"]):
+        if target_spec["target_structure"]["relationship"] not in GRAPH_RELATIONSHIPS:
+            continue
+        output = plan_from_graph(target_spec, current_state)
+        assert simulate_plan(output["plan"], current_state, target_spec)["ok"]
+        optimized = optimize_plan(output["plan"], current_state, target_spec)["plan"]
+        assert len(optimized) <= len(search_plan(current_state, target_spec)["plan"]) + 1
+
+
+def test_pyramid_top_leaves_before_its_supports():
+    target = make_structure("pyramid", ("bottom left", "bottom right", "top"), ["a", "b", "c"])
+    current = make_structure("pyramid", ("bottom left", "bottom right", "top"), ["x", "b", "c"])
+    plan = plan_from_graph(target, current)["plan"]
+    assert [a["object"] for a in plan] == ["c", "x", "a", "c"]
+    assert plan[0]["to"]["type"] == "buffer" and plan[1]["to"]["type"] == "scattered"
+
+
+def test_stacked_and_separated_from_a_stack():
+    """当前是倒序的三层塔：a、b 先暂存到缓冲槽，底层 c 直接放到排列位置，再重建两层堆栈"""
+    target = make_structure("stacked_and_separated_left", ("bottom", "top", "left"), ["a", "b", "c"])
+    current = tower(["c", "b", "a"])
+    plan = plan_from_graph(target, current)["plan"]
+    assert simulate_plan(plan, current, target)["ok"]
+    assert [(a["object"], a["to"].get("position") or a["to"]["type"]) for a in plan] == [
+        ("a", "buffer"), ("b", "buffer"), ("c", "left"), ("a", "bottom"), ("b", "top")]
+
+
+def test_unregistered_relationship_is_left_to_the_model():
+    for relationship in ("circle", "stacked"):
+        target = {"target_structure": {"relationship": relationship, "placements": []}}
+        with pytest.raises(GraphPlanningError):
+            plan_from_graph(target, EMPTY)
+    # 缓冲槽不够时同样交给语言模型
+    target = make_structure("pyramid", ("bottom left", "bottom right", "top"), ["a", "b", "c"])
+    current = make_structure("pyramid", ("bottom left", "bottom right", "top"), ["b", "a", "c"])
+    with pytest.raises(GraphPlanningError):
+        plan_from_graph(target, current, buffer_slots=("B1",))
+
+
+if __name__ == "__main__":
+    test_support_graphs_from_registry()
+    test_graph_plans_on_corpus()
+    test_graph_plans_on_enumerated_pairs()
+    test_pyramid_top_leaves_before_its_supports()
+    test_stacked_and_separated_from_a_stack()
+    test_unregistered_relationship_is_left_to_the_model()
+    print("All graph planner tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试模型输出的 JSON 提取与有界修复
+不需要语言模型或embedding模型
+"""
+
+import json
+
+import pytest
+
+from replan_core.json_extract import TruncatedOutputError, extract_json, malformed_variants, repair_json
+from replan_core.scenario_corpus import generate_corpus
+from replan_core.validation import parse_and_validate
+
+
+def test_wrapped_outputs_decode_in_place():
+    """<think>、代码块、说明文字与多余对象都不影响取出第一个对象"""
+    output = '{"status": "blocked", "reason": "missing {red} cube"}'
+    for text in (
+        output,
+        "<think>\nfirst {draft} plan\n</think>\n" + output,
+        "```json\n" + output + "\n```",
+        "Note {x}: here it is " + output + " and " + '{"status": "success"}',
+    ):
+        assert extract_json(text) == json.loads(output)
+    assert extract_json('ok: [["M", "a", "scattered", "arr:left"]]', allow_array=True) == [["M", "a", "scattered", "arr:left"]]
+    with pytest.raises(ValueError):
+        extract_json("no json here")
+    # 整段可解析但不是对象时不直接返回（数组只在 allow_array 时接受）
+    for text in ("42", '"plan"', "null"):
+        with pytest.raises(ValueError):
+            extract_json(text)
+    assert extract_json('[{"status": "blocked", "reason": "x"}]') == {"status": "blocked", "reason": "x"}
+    assert extract_json('[1, 2]', allow_array=True) == [1, 2]
+
+
+def test_repairs_common_near_misses():
+    text, fixes = repair_json("{'a': True, 'b': [1, 2,], 'c': None,}")
+    assert json.loads(text) == {"a": True, "b": [1, 2], "c": None}
+    assert fixes == ["python_literal", "single_quotes", "trailing_comma"]
+
+    # 截断：悬空的键回退到上一个逗号
+    text, fixes = repair_json('{"plan": [{"step": 1, "object": "blue cube"}, {"step": 2, "obj')
+    assert json.loads(text) == {"plan": [{"step": 1, "object": "blue cube"}, {"step": 2}]}
+    assert "truncated" in fixes
+
+    # extract_json 默认拒绝截断输出，补齐结果只在显式允许时返回
+    truncated = '{"plan": [{"step": 1, "object": "blue cube"}, {"step": 2, "obj'
+    with pytest.raises(TruncatedOutputError) as info:
+        extract_json(truncated)
+    assert "truncated" in info.value.fixes
+    assert extract_json(truncated, allow_truncated=True) == {"plan": [{"step": 1, "object": "blue cube"}, {"step": 2}]}
+
+    # 字符串中的单引号 / 双引号保持原义
+    text, _ = repair_json("{'reason': 'it\\'s the \"top\" cube'}")
+    assert json.loads(text) == {"reason": "it's the \"top\" cube"}
+
+
+def test_malformed_corpus_variants_parse():
+    """语料变体中除截断外都能通过完整验证；截断输出被拒绝"""
+    for case in generate_corpus()[:20]:
+        for kind, text in malformed_variants(case["reference_output"]):
+            if kind == "truncated":
+                with pytest.raises(TruncatedOutputError):
+                    parse_and_validate(text)
+                continue
+            assert parse_and_validate(text)["plan"] == json.loads(case["reference_output"])["plan"], kind
+
+
+if __name__ == "__main__":
+    test_wrapped_outputs_decode_in_place()
+    test_repairs_common_near_misses()
+    test_malformed_corpus_variants_parse()
+    print("All JSON extraction tests passed")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试知识库预编译包的写入 / mmap 读取往返
+不需要语言模型或embedding模型
+"""
+
+import numpy as np
+import pytest
+
+from replan_core.kb_bundle import BundleError, load_bundle, write_bundle
+from replan_core.knowledge_base import KnowledgeBaseSnapshot
+
+
+def _snapshot(kb_path):
+    rules = []
+    for name in ("core_rules/a.md", "prompts/b.md"):
+        path = str(kb_path / name)
+        rules.append({"file_path": path, "title": name, "query_intent": "intent",
+                      "rule_content": f"# {name}\n内容", "searchable_content": name})
+    return KnowledgeBaseSnapshot(
+        version=3,
+        rules=rules,
+        rule_embeddings=np.arange(8, dtype=np.float32).reshape(2, 4),
+        rule_lookup={r["file_path"]: r for r in rules},
+        prompt_templates={"extension": ["line 1", "", "line 3"]},
+        fingerprints={r["file_path"]: (1, 2) for r in rules},
+        digests={r["file_path"]: "abc" for r in rules},
+        row_index={r["file_path"]: i for i, r in enumerate(rules)},
+    )
+
+
+def test_bundle_round_trip(tmp_path):
+    """规则、模板、指纹与 embeddings 往返一致，路径按新的 kb 根目录恢复"""
+    snapshot = _snapshot(tmp_path / "kb")
+    bundle = tmp_path / "kb.rpkb"
+    write_bundle(snapshot, tmp_path / "kb", bundle, {"tok": {snapshot.rules[0]["file_path"]: 7}})
+
+    moved_root = tmp_path / "deployed"
+    loaded = load_bundle(bundle, moved_root)
+    assert [r["file_path"] for r in loaded.rules] == [str(moved_root / "core_rules/a.md"), str(moved_root / "prompts/b.md")]
+    assert [r["rule_content"] for r in loaded.rules] == [r["rule_content"] for r in snapshot.rules]
+    assert loaded.prompt_templates == snapshot.prompt_templates
+    assert np.array_equal(loaded.rule_embeddings, snapshot.rule_embeddings)
+    assert loaded.embedding_for(str(moved_root / "prompts/b.md")).tolist() == [4.0, 5.0, 6.0, 7.0]
+    assert loaded.token_counts == {"tok": {str(moved_root / "core_rules/a.md"): 7}}
+    assert loaded.fingerprints[str(moved_root / "core_rules/a.md")] == (1, 2)
+
+
+def test_rejects_foreign_file(tmp_path):
+    bogus = tmp_path / "bogus.rpkb"
+    bogus.write_bytes(b"\0" * 64)
+    with pytest.raises(BundleError):
+        load_bundle(bogus, tmp_path)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试知识库热加载：只重新embedding变化的文件，进行中的请求保留旧快照
+使用替身编码器（conftest.stand_in_rag），不需要语言模型或embedding模型
+"""
+
+import shutil
+from pathlib import Path
+
+from replan_core.config import KNOWLEDGE_BASE_DIR
+from replan_core.knowledge_base import KnowledgeBaseWatcher
+
+SOURCE_KB = Path(__file__).resolve().parent.parent / "replan_core" / KNOWLEDGE_BASE_DIR
+
+
+def _counting_rag(make, kb_path):
+    rag = make(kb_path=kb_path)
+    rag.embedding_model.calls.clear()
+    return rag, rag.embedding_model
+
+
+def test_reload_reembeds_only_changed_files(tmp_path, stand_in_rag):
+    kb_path = tmp_path / "kb"
+    shutil.copytree(SOURCE_KB, kb_path)
+    rag, encoder = _counting_rag(stand_in_rag, kb_path)
+    watcher = KnowledgeBaseWatcher(rag)
+    rule_count = len(rag.knowledge_base)
+
+    assert not watcher.poll()
+
+    edited = kb_path / "core_rules" / "execution_order.md"
+    edited.write_text(edited.read_text(encoding="utf-8") + "\nEdited for reload.\n", encoding="utf-8")
+    (kb_path / "core_rules" / "new_rule.md").write_text("# New Rule\n\n**Query Intent**: reload test\n", encoding="utf-8")
+    (kb_path / "scenario_rules" / "buffer_management.md").unlink()
+
+    assert watcher.poll()
+    assert len(encoder.encoded) == 2
+    assert len(rag.knowledge_base) == rule_count
+    assert rag.rule_embeddings.shape[0] == rule_count
+    assert "Edited for reload." in rag._get_rule_by_keyword("core_rules/execution_order.md")["rule_content"]
+    assert rag._get_rule_by_keyword("buffer_management.md") is None
+
+
+def test_pinned_snapshot_survives_reload(tmp_path, stand_in_rag):
+    kb_path = tmp_path / "kb"
+    shutil.copytree(SOURCE_KB, kb_path)
+    rag, _ = _counting_rag(stand_in_rag, kb_path)
+
+    with rag.pinned_snapshot() as pinned:
+        (kb_path / "core_rules" / "new_rule.md").write_text("# New Rule\n", encoding="utf-8")
+        rag.reload_knowledge_base()
+        assert rag.snapshot is pinned
+        assert rag._get_rule_by_keyword("new_rule.md") is None
+    assert rag.snapshot.version == pinned.version + 1
+    assert rag._get_rule_by_keyword("new_rule.md") is not None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 BM25 词法索引与 RRF 融合：复合词切分、精确关键字命中、融合排序
+不需要语言模型或embedding模型
+"""
+
+from replan_core.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def _rule(path, title, content):
+    return {"file_path": path, "title": title, "query_intent": "", "rule_content": content, "searchable_content": ""}
+
+
+RULES = [
+    _rule("/kb/relationship_rules/stacked.md", "Stacked", "Build the stack bottom to top."),
+    _rule("/kb/relationship_rules/stacked_and_separated_left.md", "Stacked and separated (left)",
+          "Two objects stacked on the left, one separated on the right."),
+    _rule("/kb/pattern_rules/stack_replacement_bottom.md", "Bottom replacement",
+          "When the bottom holds the wrong object, clear the stack first."),
+    _rule("/kb/core_rules/execution_order.md", "Execution order", "Actions run in order."),
+]
+
+
+def test_tokenize_keeps_compounds_and_parts():
+    tokens = tokenize("target_relationship: stacked_and_separated_left, the TOP")
+    assert "stacked_and_separated_left" in tokens
+    assert {"stacked", "separated", "left", "top"} <= set(tokens)
+    assert "the" not in tokens and "and" not in tokens
+
+
+def test_exact_keyword_rule_ranks_first():
+    index = BM25Index.from_rules(RULES)
+    rows, scores = index.search("target_relationship: stacked_and_separated_left", 3)
+    assert rows[0] == 1
+    assert list(scores) == sorted(scores, reverse=True)
+    rows, _ = index.search("bottom wrong object", 2)
+    assert rows[0] == 2
+    # 无命中词项时不返回零分规则
+    assert len(index.search("pyramid", 3)[0]) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[0, 1, 2], [2, 3]], k=60)
+    assert [row for row, _ in fused] == [2, 0, 1, 3]
+    assert fused[0][1] == 1.0 / 63 + 1.0 / 61
+
+
+if __name__ == "__main__":
+    test_tokenize_keeps_compounds_and_parts()
+    test_exact_keyword_rule_ranks_first()
+    test_reciprocal_rank_fusion()
+    print("All lexical index tests passed")
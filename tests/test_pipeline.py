@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流水线规划执行器：按提交顺序返回、与顺序执行结果一致、有界队列限制提前准备的请求数
+使用轻量的 RAG 替身与回放后端，不需要语言模型或embedding模型
+"""
+
+import threading
+
+from replan_core.llm_backends import ReplayLLMBackend, prompt_key
+from replan_core.pipeline import PipelinedPlanner
+from replan_core.rag_system import build_user_prompt
+from replan_core.scenario_corpus import generate_corpus
+
+
+class _CountingRAG:
+    """只提供 build_rag_prompt 的 RAG 替身，记录已准备的请求数。"""
+
+    def __init__(self):
+        self.prepared = 0
+        self._lock = threading.Lock()
+
+    def build_rag_prompt(self, target_spec, current_state, profile=None):
+        with self._lock:
+            self.prepared += 1
+        return "system", build_user_prompt(target_spec, current_state)
+
+
+class _TrackingBackend(ReplayLLMBackend):
+    """记录生成时已提前准备（尚未生成）的请求数。"""
+
+    def __init__(self, records, rag):
+        super().__init__(records)
+        self.rag = rag
+        self.generated = 0
+        self.max_ahead = 0
+
+    def generate(self, system_prompt, user_prompt, max_new_tokens=None):
+        self.max_ahead = max(self.max_ahead, self.rag.prepared - self.generated)
+        self.generated += 1
+        return super().generate(system_prompt, user_prompt, max_new_tokens)
+
+
+def _requests(cases):
+    return [{"case_id": c["case_id"], "target_spec": c["target_spec"], "current_state": c["current_state"]}
+            for c in cases]
+
+
+def _records(cases):
+    return {prompt_key(build_user_prompt(c["target_spec"], c["current_state"])): c["reference_output"] for c in cases}
+
+
+def test_pipelined_matches_sequential_in_order():
+    cases = generate_corpus()[:20]
+    outcomes = {}
+    for workers in (0, 3):
+        planner = PipelinedPlanner(_CountingRAG(), ReplayLLMBackend(_records(cases)), prepare_workers=workers)
+        outcomes[workers] = list(planner.run(_requests(cases)))
+    assert [o["case_id"] for o in outcomes[3]] == [c["case_id"] for c in cases]
+    assert [o["result"] for o in outcomes[3]] == [o["result"] for o in outcomes[0]]
+    assert all(o["consistent"] for o in outcomes[3])
+
+
+def test_queue_bounds_lookahead():
+    cases = generate_corpus()[:30]
+    rag = _CountingRAG()
+    backend = _TrackingBackend(_records(cases), rag)
+    planner = PipelinedPlanner(rag, backend, prepare_workers=2, queue_depth=2)
+    assert len(list(planner.run(_requests(cases)))) == 30
+    # 队列中 2 个 + feeder 阻塞时手中 1 个 + 正在生成的 1 个
+    assert backend.max_ahead <= 4
+
+
+def test_early_stop_and_errors():
+    cases = generate_corpus()[:10]
+    planner = PipelinedPlanner(_CountingRAG(), ReplayLLMBackend({}, default_output="not json"), queue_depth=1)
+    iterator = planner.run(_requests(cases))
+    first = next(iterator)
+    assert first["result"] is None and "error" in first
+    iterator.close()
+
+
+if __name__ == "__main__":
+    test_pipelined_matches_sequential_in_order()
+    test_queue_bounds_lookahead()
+    test_early_stop_and_errors()
+    print("All pipeline tests passed")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试计划后优化：去除往返、不必要的暂存与放下后又移走的动作，最终结构不变
+不需要语言模型或embedding模型
+"""
+
+import json
+
+from replan_core.plan_optimizer import optimize_output, optimize_plan, reassign_buffer_slots, wasteful_variants
+from replan_core.plan_search import search_plan
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, make_structure
+
+
+def _move(obj, source, target, action="move_to_position"):
+    return {"step": 0, "action": action, "object": obj, "from": source, "to": target, "reason": "test"}
+
+
+def test_wasteful_variants_reduced_to_optimum():
+    for case in generate_corpus():
+        output = json.loads(case["reference_output"])
+        optimum = len(search_plan(case["current_state"], case["target_spec"])["plan"])
+        for kind, plan in wasteful_variants(output, case["current_state"], case["target_spec"]):
+            report = optimize_plan(plan, case["current_state"], case["target_spec"])
+            assert simulate_plan(report["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+            assert report["actions"] == optimum, (case["case_id"], kind)
+            assert [a["step"] for a in report["plan"]] == list(range(1, report["actions"] + 1))
+
+
+def test_needless_park_merged_and_slots_reassigned():
+    current = {"target_structure": {"relationship": "none", "placements": []}}
+    target = make_structure("separated_left_right", ("left", "right"), ["a", "b"])
+    scattered, b3 = {"type": "scattered"}, {"type": "buffer", "slot": "B3"}
+    plan = [
+        _move("a", scattered, b3, "move_to_buffer"),
+        _move("b", scattered, {"type": "arrangement", "position": "right"}),
+        _move("a", b3, {"type": "arrangement", "position": "left"}, "move_from_buffer"),
+    ]
+    report = optimize_plan(plan, current, target)
+    assert report["removed"] == {"merged": 1}
+    assert report["plan"][0]["action"] == "move_to_position"
+    assert report["plan"][0]["from"] == scattered and report["plan"][0]["to"]["position"] == "left"
+
+    # 缓冲槽按使用顺序取第一个空闲槽
+    assert [a["to"].get("slot") for a in reassign_buffer_slots(plan)] == ["B1", None, None]
+    assert reassign_buffer_slots(plan)[2]["from"]["slot"] == "B1"
+
+
+def test_unexecutable_and_blocked_outputs_untouched():
+    case = generate_corpus()[0]
+    blocked = {"status": "blocked", "reason": "missing object"}
+    assert optimize_output(blocked, case["current_state"], case["target_spec"]) is blocked
+
+    output = json.loads(case["reference_output"])
+    broken = dict(output, plan=output["plan"][:-1])
+    report = optimize_plan(broken["plan"], case["current_state"], case["target_spec"])
+    assert "skipped" in report and report["plan"] is broken["plan"]
+
+
+if __name__ == "__main__":
+    test_wasteful_variants_reduced_to_optimum()
+    test_needless_park_merged_and_slots_reassigned()
+    test_unexecutable_and_blocked_outputs_untouched()
+    print("All plan optimizer tests passed")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试动作依赖 DAG 与多机械臂排程：独立动作可并行，依赖动作保持顺序，按开始时间回放仍到达目标
+不需要语言模型或embedding模型
+"""
+
+import itertools
+import json
+
+from replan_core.plan_schedule import build_dependency_graph, schedule_plan, scheduled_order
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, make_structure
+
+EMPTY = {"target_structure": {"relationship": "none", "placements": []}}
+
+
+def _place(obj, kind, position):
+    return {"step": 0, "action": "move_to_position", "object": obj, "from": {"type": "scattered"},
+            "to": {"type": kind, "position": position}, "reason": "test"}
+
+
+def test_independent_placements_run_in_parallel():
+    target = make_structure("separated_left_right", ("left", "right"), ["a", "b"])
+    plan = [_place("a", "arrangement", "left"), _place("b", "arrangement", "right")]
+    assert build_dependency_graph(plan, EMPTY, target) == [set(), set()]
+
+    one, two = schedule_plan(plan, EMPTY, target, arms=1), schedule_plan(plan, EMPTY, target, arms=2)
+    assert abs(one["makespan"] - one["sequential"]) < 1e-9
+    assert two["makespan"] < two["sequential"]
+    assert {item["arm"] for item in two["schedule"]} == {1, 2}
+
+
+def test_stack_layers_depend_on_support():
+    target = make_structure("stacked", ("bottom", "middle", "top"), ["a", "b", "c"])
+    plan = [_place("a", "stack", "bottom"), _place("b", "stack", "middle"), _place("c", "stack", "top")]
+    assert build_dependency_graph(plan, EMPTY, target) == [set(), {0}, {1}]
+    result = schedule_plan(plan, EMPTY, target, arms=3)
+    assert abs(result["makespan"] - result["sequential"]) < 1e-9
+
+
+def test_schedules_replay_on_corpus():
+    for case in generate_corpus():
+        plan = json.loads(case["reference_output"]).get("plan") or []
+        if not plan:
+            continue
+        predecessors = build_dependency_graph(plan, case["current_state"], case["target_spec"])
+        # 任何保持依赖边的顺序都能执行（计划较短，直接枚举全排列）
+        if len(plan) <= 5:
+            for order in itertools.permutations(range(len(plan))):
+                position = {index: rank for rank, index in enumerate(order)}
+                if all(position[p] < position[i] for i in order for p in predecessors[i]):
+                    replay = simulate_plan([plan[i] for i in order], case["current_state"], case["target_spec"])
+                    assert replay["ok"], (case["case_id"], order)
+        for arms in (1, 2, 3):
+            result = schedule_plan(plan, case["current_state"], case["target_spec"], arms)
+            assert result["makespan"] >= result["lower_bound"] - 1e-9
+            assert result["makespan"] <= result["sequential"] + 1e-9
+            replay = simulate_plan(scheduled_order(plan, result), case["current_state"], case["target_spec"])
+            assert replay["ok"], case["case_id"]
+
+
+if __name__ == "__main__":
+    test_independent_placements_run_in_parallel()
+    test_stack_layers_depend_on_support()
+    test_schedules_replay_on_corpus()
+    print("All plan schedule tests passed")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 A* 最短计划搜索：与广度优先搜索等长、启发式可采纳、状态编码紧凑
+不需要语言模型或embedding模型
+"""
+
+import itertools
+
+import pytest
+
+from replan_core.plan_search import PlanSearchError, _Problem, search_plan
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, make_structure
+from replan_core.scene_enumerator import enumerate_pairs
+from replan_core.stack_height_bench import tower
+
+
+def test_astar_matches_bfs_on_corpus():
+    for case in generate_corpus():
+        bfs = search_plan(case["current_state"], case["target_spec"], algorithm="bfs")
+        astar = search_plan(case["current_state"], case["target_spec"], algorithm="astar")
+        assert len(astar["plan"]) == len(bfs["plan"]), case["case_id"]
+        assert astar["expanded"] <= bfs["expanded"], case["case_id"]
+        assert simulate_plan(astar["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+
+
+def test_heuristic_is_admissible():
+    """起始状态的启发值不超过最短计划长度（抽样穷举场景对）"""
+    for target_spec, current_state in itertools.islice(enumerate_pairs(["a", "b", "c", "d"]), 0, None, 7):
+        problem = _Problem(current_state, target_spec)
+        optimal = len(search_plan(current_state, target_spec, algorithm="bfs")["plan"])
+        assert problem.heuristic(problem.start) <= optimal
+
+
+def test_state_encoding_is_compact():
+    current = make_structure("stacked", ("bottom", "middle", "top"), ["x", "b", "a"])
+    target = make_structure("stacked", ("bottom", "middle", "top"), ["a", "b", "c"])
+    problem = _Problem(current, target)
+    keys = {problem.encode(state) for state, _ in problem.successors(problem.start)}
+    assert len(problem.encode(problem.start)) == 5  # 4 个对象 + 桌面位置
+    assert len(keys) == len(problem.successors(problem.start))
+
+    # 底层错误：a 与 b 都要移开，x 移到散落区，再依次放 a b c
+    assert len(search_plan(current, target)["plan"]) == 6
+    with pytest.raises(ValueError):
+        search_plan(current, target, algorithm="dfs")
+
+
+def test_objects_set_aside_when_buffer_slots_run_out():
+    """默认三个缓冲槽下倒序的四层塔：第四个对象暂放到散落区；缓冲槽够用时仍优先缓冲槽"""
+    current, target = tower(["d", "c", "b", "a"]), tower(["a", "b", "c", "d"])
+    plan = search_plan(current, target)["plan"]
+    assert len(plan) == 8
+    assert simulate_plan(plan, current, target)["ok"]
+    assert sum(a["to"]["type"] == "scattered" for a in plan) == 1
+    for case in generate_corpus():
+        plan = search_plan(case["current_state"], case["target_spec"])["plan"]
+        assert not any(a["reason"].startswith("Set object aside") for a in plan), case["case_id"]
+
+
+def test_search_failures_are_distinguished():
+    current, target = tower(["d", "c", "b", "a"]), tower(["a", "b", "c", "d"])
+    with pytest.raises(PlanSearchError, match="state limit"):
+        search_plan(current, target, max_states=2)
+    # 同一对象出现在两个目标位置：可达状态搜索完仍到不了目标
+    for algorithm in ("astar", "bfs"):
+        with pytest.raises(PlanSearchError, match="unreachable"):
+            search_plan(tower(["a"]), tower(["a", "a"]), algorithm=algorithm)
+
+
+if __name__ == "__main__":
+    test_astar_matches_bfs_on_corpus()
+    test_heuristic_is_admissible()
+    test_state_encoding_is_compact()
+    test_objects_set_aside_when_buffer_slots_run_out()
+    test_search_failures_are_distinguished()
+    print("All plan search tests passed")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试计划模拟器与基准语料的参考输出
+不需要语言模型或embedding模型
+"""
+
+import json
+
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, RELATIONSHIP_POSITIONS
+
+
+def test_reference_outputs_are_executable():
+    """每个语料用例的参考计划都必须能执行并到达目标结构"""
+    for case in generate_corpus():
+        output = json.loads(case["reference_output"])
+        result = simulate_plan(output["plan"], case["current_state"], case["target_spec"])
+        assert result["ok"], f"{case['case_id']}: {result['errors']}"
+
+
+def test_corpus_covers_all_target_relationships():
+    """语料覆盖全部目标关系（none 仅作为当前状态）"""
+    relationships = {case["target_spec"]["target_structure"]["relationship"] for case in generate_corpus()}
+    assert relationships == set(RELATIONSHIP_POSITIONS)
+
+
+def test_blocked_middle_access_is_rejected():
+    """中层被顶层遮挡时不能直接移走"""
+    current = {"target_structure": {"relationship": "stacked", "placements": [
+        {"position": "bottom", "object 1": "blue cube"},
+        {"position": "middle", "object 2": "yellow cube"},
+        {"position": "top", "object 3": "red cube"},
+    ]}}
+    target = {"target_structure": {"relationship": "stacked", "placements": [
+        {"position": "bottom", "object 1": "blue cube"},
+        {"position": "middle", "object 2": "green cube"},
+        {"position": "top", "object 3": "red cube"},
+    ]}}
+    plan = [
+        {"step": 1, "action": "move_to_position", "object": "yellow cube",
+         "from": {"type": "stack", "position": "middle"}, "to": {"type": "scattered"}},
+    ]
+    result = simulate_plan(plan, current, target)
+    assert not result["ok"] and result["failed_step"] == 1
+
+
+if __name__ == "__main__":
+    test_reference_outputs_are_executable()
+    test_corpus_covers_all_target_relationships()
+    test_blocked_middle_access_is_rejected()
+    print("✅ plan simulator tests passed")
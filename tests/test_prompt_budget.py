@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试提示词 token 预算：可选规则按优先级从低到高删除、强制规则保留、max_new_tokens 随预期计划长度变化
+不需要语言模型或embedding模型
+"""
+
+from replan_core.profiles import QWEN3_4B_FP8
+from replan_core.prompt_budget import (
+    RULE_HEADER_TOKENS,
+    TokenCounter,
+    expected_actions,
+    fit_rules_to_budget,
+    output_token_limit,
+)
+
+
+def _rules():
+    return [
+        {"file_path": "/kb/core_rules/coordinate_free_actions.md", "tokens": 400},
+        {"file_path": "/kb/relationship_rules/stacked.md", "tokens": 300},
+        {"file_path": "/kb/scenario_rules/buffer_management.md", "tokens": 200},
+        {"file_path": "/kb/pattern_rules/stack_replacement.md", "tokens": 500},
+        {"file_path": "/kb/scenario_rules/stacked_building.md", "tokens": 250},
+    ]
+
+
+def _enforced(rule):
+    return "core_rules" in rule["file_path"] or "stack_replacement" in rule["file_path"]
+
+
+def test_drops_lowest_priority_optional_rules_first():
+    rules = _rules()
+    everything = sum(r["tokens"] + RULE_HEADER_TOKENS for r in rules) + 1000
+    kept, dropped, total = fit_rules_to_budget(rules, lambda r: r["tokens"], _enforced, 1000, everything)
+    assert kept == rules and not dropped and total == everything
+
+    kept, dropped, total = fit_rules_to_budget(rules, lambda r: r["tokens"], _enforced, 1000, everything - 100)
+    assert [r["file_path"] for r in dropped] == ["/kb/scenario_rules/stacked_building.md"]
+    assert total <= everything - 100
+
+    # 预算过小：删除全部可选规则，强制规则保留（报告超出预算）
+    kept, dropped, total = fit_rules_to_budget(rules, lambda r: r["tokens"], _enforced, 1000, 500)
+    assert all(_enforced(r) for r in kept) and len(kept) == 2
+    assert len(dropped) == 3 and total > 500
+
+
+def test_max_new_tokens_follows_plan_length():
+    top = output_token_limit(expected_actions("top_only", "stack_replacement_top", 3), 3, QWEN3_4B_FP8.max_new_tokens)
+    multiple = output_token_limit(expected_actions("multiple", "stack_replacement_multiple", 3), 3,
+                                  QWEN3_4B_FP8.max_new_tokens)
+    assert expected_actions("top_only", None, 3) == 2 and expected_actions("multiple", None, 3) == 6
+    assert top < multiple <= QWEN3_4B_FP8.max_new_tokens
+    assert output_token_limit(100, 3, 1024) == 1024
+    # 未知场景按目标位置数估计
+    assert expected_actions("none", None, 4) == 8
+    assert QWEN3_4B_FP8.generation_kwargs(top)["max_new_tokens"] == top
+    assert QWEN3_4B_FP8.generation_kwargs()["max_new_tokens"] == QWEN3_4B_FP8.max_new_tokens
+
+
+def test_token_counter_estimate_and_tokenizer():
+    estimate = TokenCounter("none")
+    assert not estimate.exact and estimate.count("x" * 35) == 11
+
+    class _Tokenizer:
+        def encode(self, text, add_special_tokens=False):
+            return text.split()
+
+    counter = TokenCounter("words", _Tokenizer())
+    assert counter.exact and counter.count("a b c") == 3
+    assert counter.count_memoized("a b") == 2 and counter.count_memoized("a b") == 2
+
+
+if __name__ == "__main__":
+    test_drops_lowest_priority_optional_rules_first()
+    test_max_new_tokens_follows_plan_length()
+    test_token_counter_estimate_and_tokenizer()
+    print("All prompt budget tests passed")
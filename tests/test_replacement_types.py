@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+测试替换类型分类（_analyze_replacement_complexity）在序数层模型下的回归：
+- 同高度的堆栈之间与原先按位置名比较的分类完全一致
+- 有意的变化：不同高度的堆栈按层序号比较、非堆栈关系的位置名不再当作堆栈层；路由的简单类别随之变化
+不需要语言模型或embedding模型（使用 conftest 的替身编码器）
+"""
+
+import pytest
+
+from replan_core.router import ModelRouter, RouterConfig
+from replan_core.scenario_corpus import generate_corpus, make_structure
+from replan_core.scene_enumerator import enumerate_pairs
+from replan_core.stack_height_bench import tower
+from replan_core.structures import extract_object_value
+
+STACK_POSITIONS = ("bottom", "middle", "top")
+STACKING = {"stacked", "stacked_and_separated_left", "stacked_and_separated_right"}
+
+
+def _by_position_name(target_spec, current_state):
+    """序数层模型之前的分类：按 bottom / middle / top 位置名比较目标与当前。"""
+    def positions(state):
+        structure = state["target_structure"]
+        return structure["relationship"], {p.get("position"): extract_object_value(p) for p in structure["placements"]}
+
+    target_rel, target = positions(target_spec)
+    current_rel, current = positions(current_state)
+    if target_rel not in STACKING:
+        return "none"
+    mismatched = [pos for pos, obj in target.items() if pos in current and current[pos] != obj]
+    if current_rel in STACKING and len(current) < len(target) and not mismatched:
+        return "extension"
+    mismatches = [pos for pos in STACK_POSITIONS if pos in mismatched]
+    if not mismatches:
+        return "none"
+    return f"{mismatches[0]}_only" if len(mismatches) == 1 else "multiple"
+
+
+@pytest.fixture
+def classify(stand_in_rag):
+    rag = stand_in_rag(bundle_path=False)
+    return lambda target_spec, current_state: rag._analyze_replacement_complexity(target_spec, current_state)
+
+
+def test_same_height_stacks_keep_their_classification(classify):
+    """目标与当前是同一布局的堆栈（同高度，或当前只有底层）时与按位置名比较的结果相同"""
+    checked = 0
+    for target_spec, current_state in enumerate_pairs(["a", "b", "c", "d"]):
+        target = target_spec["target_structure"]
+        current = current_state["target_structure"]
+        if target["relationship"] != "stacked" or current["relationship"] != "stacked":
+            continue
+        labels = [p["position"] for p in current["placements"]]
+        positions = [p["position"] for p in target["placements"]]
+        if len(labels) not in (1, len(positions)) or labels != positions[:len(labels)]:
+            continue
+        assert classify(target_spec, current_state) == _by_position_name(target_spec, current_state), current
+        checked += 1
+    assert checked > 30
+
+    for case in generate_corpus():
+        if case["case_id"] != "stacked/extension_2_to_3":
+            expected = _by_position_name(case["target_spec"], case["current_state"])
+            assert classify(case["target_spec"], case["current_state"]) == expected, case["case_id"]
+
+
+def test_intended_reclassifications(classify):
+    """不同高度的堆栈按层序号比较；排列位置的 bottom / middle / top 不是堆栈层"""
+    target = tower(["a", "b", "c"])
+    # 两层堆栈 a, b 的 top 就是三层目标的 middle：扩展（原先按位置名 top 与 top 比较得到 top_only）
+    extension = tower(["a", "b"])
+    assert _by_position_name(target, extension) == "top_only"
+    assert classify(target, extension) == "extension"
+    # 部分搭建的三层堆栈 bottom, middle：错误对象在当前栈顶，可直接取走（原先 middle_only）
+    partial = make_structure("stacked", ("bottom", "middle"), ["a", "x"])
+    assert _by_position_name(target, partial) == "middle_only"
+    assert classify(target, partial) == "top_only"
+    # 纵向排列的 top 不在堆栈上（原先与堆栈 top 比较得到 top_only）
+    column = make_structure("separate_vertical", ("bottom", "middle", "top"), ["a", "b", "x"])
+    assert _by_position_name(target, column) == "top_only"
+    assert classify(target, column) == "none"
+
+
+def test_router_easy_classes_follow_the_reclassification(stand_in_rag):
+    """两层到三层的扩展仍是简单请求（extension 与 top_only 都在简单类别中），按 extension 统计成功率；
+    纵向排列搭成堆栈不再因 top_only 被当作简单请求"""
+    router = ModelRouter(stand_in_rag(bundle_path=False), backends={}, config=RouterConfig())
+    target = tower(["a", "b", "c"])
+    assessment = router.assess(target, tower(["a", "b"]))
+    assert assessment["difficulty"] == "easy" and assessment["difficulty_class"] == "extension"
+    column = make_structure("separate_vertical", ("bottom", "middle", "top"), ["a", "b", "x"])
+    assessment = router.assess(target, column)
+    assert assessment["replacement_type"] == "none" and "replacement_type=top_only" not in assessment["reasons"]
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多模型路由：难度判断、失败升级、小模型降级
+使用轻量的 RAG 替身与回放后端，不需要语言模型或embedding模型
+"""
+
+from replan_core.llm_backends import ReplayLLMBackend
+from replan_core.router import ModelRouter, RouterConfig
+from replan_core.scenario_corpus import generate_corpus
+
+
+class _StandInRAG:
+    """只提供路由所需接口的 RAG 替身。"""
+
+    def __init__(self, replacement_type="none", scenario="general"):
+        self.replacement_type = replacement_type
+        self.scenario = scenario
+
+    def _analyze_replacement_complexity(self, target_spec, current_state, scene_diff=None):
+        return self.replacement_type
+
+    def classify_scenario_by_embedding(self, target_spec, current_state, scene_diff=None):
+        return self.scenario
+
+    def build_rag_prompt(self, target_spec, current_state, profile=None):
+        return "system", "user"
+
+
+def _case(case_id):
+    return next(c for c in generate_corpus() if c["case_id"] == case_id)
+
+
+def _router(rag, small_output, large_output, **overrides):
+    config = RouterConfig(**overrides)
+    backends = {
+        config.small_profile: ReplayLLMBackend({}, default_output=small_output),
+        config.large_profile: ReplayLLMBackend({}, default_output=large_output),
+    }
+    return ModelRouter(rag, backends, config)
+
+
+def test_easy_request_stays_on_small_model():
+    """extension 场景由小模型完成，不升级"""
+    case = _case("stacked/extension_2_to_3")
+    router = _router(_StandInRAG("extension"), case["reference_output"], case["reference_output"])
+    outcome = router.plan(case["target_spec"], case["current_state"])
+    assert outcome["route"] == "smollm3"
+    assert outcome["result"]["status"] == "success"
+    assert router.stats()["escalations"] == 0
+
+
+def test_hard_request_goes_to_large_model():
+    """multiple 替换直接走大模型"""
+    case = _case("stacked/multiple_all")
+    router = _router(_StandInRAG("multiple"), "not json", case["reference_output"])
+    outcome = router.plan(case["target_spec"], case["current_state"])
+    assert outcome["route"] == "qwen3-4b-fp8"
+    assert len(outcome["attempts"]) == 1
+
+
+def test_failed_small_output_escalates():
+    """小模型输出无法解析时升级到大模型"""
+    case = _case("stacked/extension_2_to_3")
+    router = _router(_StandInRAG("extension"), "not json", case["reference_output"])
+    outcome = router.plan(case["target_spec"], case["current_state"])
+    assert outcome["route"] == "smollm3->qwen3-4b-fp8"
+    assert outcome["result"]["status"] == "success"
+    stats = router.stats()
+    assert stats["escalations"] == 1
+    assert stats["routes"]["smollm3"]["success_rate"] == 0.0
+
+
+def test_small_model_demoted_after_low_success_rate():
+    """小模型在某类别上成功率过低后，该类别直接走大模型"""
+    case = _case("stacked/extension_2_to_3")
+    router = _router(_StandInRAG("extension"), "not json", case["reference_output"],
+                     min_samples_for_demotion=2)
+    routes = [router.plan(case["target_spec"], case["current_state"])["route"] for _ in range(3)]
+    assert routes == ["smollm3->qwen3-4b-fp8", "smollm3->qwen3-4b-fp8", "qwen3-4b-fp8"]
+
+
+def test_symbolic_route_skips_models():
+    """注册了支撑图的关系由 graph_planner 直接规划，不调用任何后端"""
+    case = _case("pyramid/wrong_bottom_left")
+    router = ModelRouter(_StandInRAG(), {}, RouterConfig())
+    routed = router.plan(case["target_spec"], case["current_state"])
+    assert routed["route"] == "symbolic" and routed["result"]["status"] == "success"
+    assert router.backends == {} and router.stats()["routes"]["symbolic"]["successes"] == 1
+
+
+if __name__ == "__main__":
+    test_easy_request_stays_on_small_model()
+    test_hard_request_goes_to_large_model()
+    test_failed_small_output_escalates()
+    test_small_model_demoted_after_low_success_rate()
+    test_symbolic_route_skips_models()
+    print("All router tests passed")
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+测试确定性场景决策表：规则、RAG 系统默认使用决策表、未知关系回退，以及与 embedding 标签的一致性
+一致性测试需要 embedding 模型（没有时跳过）；其余测试使用 conftest 的替身编码器
+"""
+
+import json
+
+import pytest
+
+from replan_core.scene import SceneDiff
+from replan_core.scenario_corpus import generate_corpus
+from replan_core.scenario_table import ScenarioDecisionTable, disagreements, embedding_labels
+
+# _classify_scenario_with_embeddings 的场景模板
+SCENARIO_LABELS = {
+    "stack_replacement_top", "stack_replacement_middle", "stack_replacement_bottom", "stack_replacement_multiple",
+    "stacked_building", "separated_arrangement", "object_reordering", "buffer_management", "legacy_format",
+    "already_correct",
+}
+
+
+def _diff(case_id):
+    case = next(c for c in generate_corpus() if c["case_id"] == case_id)
+    return SceneDiff.from_request(case["target_spec"], case["current_state"])
+
+
+def test_rules_follow_replacement_type_and_relationship():
+    table = ScenarioDecisionTable()
+    assert table.classify(_diff("stacked/wrong_middle"), "middle_only") == "stack_replacement_middle"
+    assert table.classify(_diff("stacked/extension_1_to_3"), "extension") == "stacked_building"
+    assert table.classify(_diff("stacked/already_correct"), "none") == "already_correct"
+    assert table.classify(_diff("separated_left_right/from_scattered"), "none") == "separated_arrangement"
+    assert table.classify(_diff("separate_vertical/swapped_first_pair"), "none") == "object_reordering"
+    # 单物体堆栈换了对象不是 already_correct
+    assert table.classify(_diff("stacked_left/wrong_object"), "none") == "stacked_building"
+
+
+def test_unknown_relationship_falls_back():
+    target = {"target_structure": {"relationship": "circle", "placements": [{"position": "north", "object": "red cube"}]}}
+    current = {"target_structure": {"relationship": "none", "placements": []}}
+    assert ScenarioDecisionTable().classify(SceneDiff.from_request(target, current), "none") is None
+
+
+def test_memo_keyed_on_replacement_type():
+    """同一 SceneDiff 按不同 replacement_type 分类时不复用记忆的标签"""
+    table = ScenarioDecisionTable()
+    diff = _diff("stacked/wrong_middle")
+    assert table.classify(diff, "middle_only") == "stack_replacement_middle"
+    assert table.classify(diff, "bottom_only") == "stack_replacement_bottom"
+
+
+def test_known_relationships_never_reach_the_encoder(stand_in_rag):
+    """RAG 系统默认用决策表分类语料中的已知关系：不编码查询，标签都是 embedding 分类器的场景标签"""
+    rag = stand_in_rag(bundle_path=False)
+    encoder = rag.embedding_model
+    calls = len(encoder.calls)
+    table = ScenarioDecisionTable()
+    for case in generate_corpus():
+        diff = SceneDiff.from_request(case["target_spec"], case["current_state"])
+        label = rag.classify_scenario_by_embedding(case["target_spec"], case["current_state"], diff)
+        replacement_type = rag._analyze_replacement_complexity(case["target_spec"], case["current_state"], diff)
+        assert label == table.classify(diff, replacement_type) and label in SCENARIO_LABELS, case["case_id"]
+        # already_correct 恰好是参考计划为空的场景
+        plan = json.loads(case["reference_output"]).get("plan") or []
+        assert (label == "already_correct") == (not plan), case["case_id"]
+    assert len(encoder.calls) == calls
+
+
+def test_rules_agree_with_embedding_labels_on_corpus():
+    """规则表与真实 embedding 分类器在生成语料上的标签一致（需要 sentence_transformers 与 embedding 模型）"""
+    pytest.importorskip("sentence_transformers")
+    from replan_core.rag_system import ReplanRAGSystem
+
+    rag = ReplanRAGSystem(query_cache_path=None)
+    try:
+        rag.embedding_model
+    except OSError as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+    mismatches = disagreements(embedding_labels(generate_corpus(), rag))
+    assert not mismatches, "\n".join(f"{case_id}: table={table} embedding={label}"
+                                      for case_id, table, label in mismatches)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 Scene / SceneDiff 与 structures 读取工具结果一致、不可变且可哈希
+不需要语言模型或embedding模型
+"""
+
+from replan_core.scenario_corpus import generate_corpus
+from replan_core.scene import Scene, SceneDiff
+from replan_core.structures import build_position_object_map, collect_objects_list, format_placements_for_query
+
+
+def test_scene_matches_structure_helpers():
+    """Scene 的映射、对象列表与查询描述与原有工具函数一致"""
+    for case in generate_corpus():
+        for state in (case["target_spec"], case["current_state"]):
+            placements = state["target_structure"].get("placements", [])
+            scene = Scene.from_state(state)
+            assert dict(scene.position_map) == build_position_object_map(placements)
+            assert list(scene.objects) == collect_objects_list(placements)
+            assert scene.query_desc == format_placements_for_query(placements)
+
+
+def test_scene_diff_positions():
+    """missing / extra / mismatched 位置"""
+    target = {"target_structure": {"relationship": "stacked", "placements": [
+        {"position": "bottom", "object 1": "blue cube"},
+        {"position": "middle", "object 2": "green cube"},
+        {"position": "top", "object 3": "red cube"},
+    ]}}
+    current = {"target_structure": {"relationship": "stacked", "placements": [
+        {"position": "bottom", "object 1": "blue cube"},
+        {"position": "top", "object 2": "yellow cube"},
+        {"position": "left", "object 3": "red cube"},
+    ]}}
+    diff = SceneDiff.from_request(target, current)
+    assert diff.missing == ("middle",)
+    assert diff.extra == ("left",)
+    assert diff.mismatched == ("top",)
+    assert diff.mismatches_in(("top", "bottom")) == ("top",)
+
+
+def test_scene_is_hashable_and_immutable():
+    """相同输入得到相等且哈希一致的缓存键；属性不可修改"""
+    case = generate_corpus()[0]
+    first = SceneDiff.from_request(case["target_spec"], case["current_state"])
+    second = SceneDiff.from_request(case["target_spec"], case["current_state"])
+    assert first == second and hash(first.key) == hash(second.key)
+    assert {first.key: 1}[second.key] == 1
+    try:
+        first.target.relationship = "pyramid"
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Scene should be immutable")
+
+
+if __name__ == "__main__":
+    test_scene_matches_structure_helpers()
+    test_scene_diff_positions()
+    test_scene_is_hashable_and_immutable()
+    print("All scene tests passed")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试场景对穷举与最短参考计划
+不需要语言模型或embedding模型
+"""
+
+import json
+
+from replan_core.plan_search import search_plan
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, load_corpus, make_structure
+from replan_core.scene_enumerator import (ShardWriter, canonical_key, enumerate_pairs, enumerate_states, enumerate_targets,
+                                           run)
+from replan_core.validation import validate_output_data
+
+
+def test_search_plans_are_executable_and_never_longer():
+    """最短计划可执行、通过验证，且不长于语料的贪心参考计划"""
+    for case in generate_corpus():
+        plan = search_plan(case["current_state"], case["target_spec"])["plan"]
+        result = simulate_plan(plan, case["current_state"], case["target_spec"])
+        assert result["ok"], f"{case['case_id']}: {result['errors']}"
+        validate_output_data({"status": "success", "plan": plan, "final_expected": case["target_spec"]})
+        assert len(plan) <= len(json.loads(case["reference_output"])["plan"]), case["case_id"]
+
+    # 三个排列位置直接搭成堆栈，不经过缓冲区
+    current = make_structure("separate_horizontal", ("left", "middle", "right"), ["a", "b", "c"])
+    target = make_structure("stacked", ("bottom", "middle", "top"), ["a", "b", "c"])
+    plan = search_plan(current, target)["plan"]
+    assert [action["to"]["position"] for action in plan] == ["bottom", "middle", "top"]
+
+
+def test_states_are_physically_valid():
+    for state in enumerate_states(["a", "b", "c"]):
+        structure = state["target_structure"]
+        positions = {p.get("position") for p in structure["placements"]}
+        if structure["relationship"] == "pyramid" and "top" in positions:
+            assert {"bottom left", "bottom right"} <= positions
+        if structure["relationship"] == "stacked":
+            assert "bottom" in positions and ("top" not in positions or len(positions) == 2 or "middle" in positions)
+    # 两层满堆栈来自两层布局；三层布局缺 middle 的 (bottom, top) 不可行
+    layouts = {tuple(p["position"] for p in state["target_structure"]["placements"])
+               for state in enumerate_states(["a", "b"]) if state["target_structure"]["relationship"] == "stacked"}
+    assert layouts == {("bottom",), ("bottom", "middle"), ("bottom", "top")}
+
+
+def test_pairs_deduplicated_under_renaming():
+    palette = ["a", "b", "c", "d"]
+    pairs = list(enumerate_pairs(palette))
+    keys = [canonical_key(target, current) for target, current in pairs]
+    assert len(keys) == len(set(keys))
+    # 规范形式与在全部对象分配上逐一比较去重键、保留第一个的结果相同（含顺序）
+    seen, expected = set(), []
+    for target in enumerate_targets(palette):
+        for current in enumerate_states(palette):
+            key = canonical_key(target, current)
+            if key not in seen:
+                seen.add(key)
+                expected.append((target, current))
+    assert pairs == expected
+    # 单物体目标 a：当前状态里的 b 与 c、d 等价
+    target = make_structure("stacked_left", (None,), ["a"])
+    assert canonical_key(target, make_structure("stacked_right", (None,), ["b"])) == \
+        canonical_key(target, make_structure("stacked_right", (None,), ["d"]))
+
+
+def test_sharded_output_in_order(tmp_path):
+    palette = ["a", "b", "c", "d"]
+    with ShardWriter(str(tmp_path / "serial"), shard_size=50) as writer:
+        summary = run(palette, writer, workers=0, chunk_size=16, limit=120)
+    assert [p.rsplit("-", 1)[1] for p in writer.paths] == ["00000.jsonl", "00001.jsonl", "00002.jsonl"]
+    cases = [case for path in writer.paths for case in load_corpus(path)]
+    assert summary["pairs"] == len(cases) == 120
+    assert [case["case_id"][-6:] for case in cases] == [f"{i:06d}" for i in range(120)]
+    for case in cases:
+        output = json.loads(case["reference_output"])
+        assert simulate_plan(output["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+        assert len(output["plan"]) == case["optimal_moves"]
+
+    with ShardWriter(str(tmp_path / "pooled"), shard_size=50) as pooled:
+        run(palette, pooled, workers=2, chunk_size=16, limit=120)
+    assert [case for path in pooled.paths for case in load_corpus(path)] == cases
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    test_search_plans_are_executable_and_never_longer()
+    test_states_are_physically_valid()
+    test_pairs_deduplicated_under_renaming()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_sharded_output_in_order(pathlib.Path(tmp))
+    print("All scene enumerator tests passed")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 N 层堆栈的序数层模型：层标签、模拟执行、场景比较、验证与最短计划搜索，以及可配置的缓冲槽池
+不需要语言模型或embedding模型
+"""
+
+import json
+
+from replan_core.config import BUFFER_SLOTS
+from replan_core.plan_search import build_optimal_output
+from replan_core.plan_simulator import SimulationError, CubeWorld, simulate_plan, split_structure
+from replan_core.scenario_corpus import build_reference_output
+from replan_core.scene import SceneDiff
+from replan_core.stack_height_bench import tower
+from replan_core.stack_layers import layer_index, layer_labels
+from replan_core.validation import ValidationError, structure_errors, validate_output_data
+
+CUBES = [f"cube {i}" for i in range(1, 7)]
+EMPTY = {"target_structure": {"relationship": "none", "placements": []}}
+
+
+def test_layer_labels_and_indices():
+    assert layer_labels(2) == ("bottom", "top")
+    assert layer_labels(3) == ("bottom", "middle", "top")
+    assert layer_labels(5) == ("bottom", "layer 2", "layer 3", "layer 4", "top")
+    assert layer_index("middle") == layer_index("layer 2") == 1
+    assert layer_index("layer 1") == 0 and layer_index("top", 5) == 4 and layer_index("left") is None
+    # 标签乱序给出时按层序号排列
+    shuffled = tower(CUBES)["target_structure"]
+    shuffled["placements"].reverse()
+    assert split_structure(shuffled)["stack"] == CUBES
+    assert structure_errors(tower(CUBES)["target_structure"]) == []
+
+
+def test_tall_tower_simulation():
+    target = tower(CUBES)
+    output = build_reference_output(target, EMPTY)
+    assert [a["to"]["position"] for a in output["plan"]] == list(layer_labels(6))
+    assert simulate_plan(output["plan"], EMPTY, target)["ok"]
+
+    world = CubeWorld(tower(CUBES[:2]))
+    world.apply({"object": "cube 3", "from": {"type": "scattered"}, "to": {"type": "stack", "position": "layer 3"}})
+    try:
+        world.apply({"object": "cube 4", "from": {"type": "scattered"}, "to": {"type": "stack", "position": "layer 5"}})
+    except SimulationError:
+        pass
+    else:
+        raise AssertionError("layer 5 needs exactly four layers below")
+
+    short = CubeWorld(tower(CUBES[:2]), max_height=2)
+    try:
+        short.apply({"object": "cube 3", "from": {"type": "scattered"}, "to": {"type": "stack", "position": "top"}})
+    except SimulationError:
+        pass
+    else:
+        raise AssertionError("stack above max_height should be rejected")
+
+
+def test_layers_compared_by_ordinal():
+    """两层当前堆栈的 top 与三层目标的 middle 是同一层：扩展而不是替换"""
+    diff = SceneDiff.from_request(tower(CUBES[:3]), tower(CUBES[:2]))
+    assert diff.stack_mismatches == () and diff.missing_layers == ("top",)
+
+    wrong = list(CUBES)
+    wrong[3] = "stray cube"
+    diff = SceneDiff.from_request(tower(CUBES), tower(wrong))
+    assert diff.layer_mismatches == (3,) and diff.stack_mismatches == ("middle",)
+
+    # 当前堆栈高于目标：多出的层需要移走
+    diff = SceneDiff.from_request(tower(CUBES[:4]), tower(CUBES))
+    assert diff.stack_mismatches == ("middle", "top")
+
+
+def test_reversed_tower_with_larger_buffer_pool():
+    """倒序的六层塔每层都要暂存，需要六个缓冲槽；缓冲槽池之外的槽位被验证拒绝"""
+    slots = tuple(f"B{i}" for i in range(1, 7))
+    target, current = tower(CUBES), tower(list(reversed(CUBES)))
+    output = build_optimal_output(target, current, buffer_slots=slots)
+    assert len(output["plan"]) == 12
+    assert simulate_plan(output["plan"], current, target, buffer_slots=slots)["ok"]
+    validate_output_data(json.loads(json.dumps(output)), buffer_slots=slots)
+    if "B6" not in BUFFER_SLOTS:
+        assert not simulate_plan(output["plan"], current, target)["ok"]
+        try:
+            validate_output_data(json.loads(json.dumps(output)))
+        except ValidationError as e:
+            assert any("B6" in error for error in e.errors)
+        else:
+            raise AssertionError("slot B6 is outside the default buffer pool")
+
+
+def test_reversal_beyond_the_default_buffer_pool():
+    """默认缓冲槽池下四层倒序：贪心参考规划没有空闲槽位，A* 把多出的对象暂放到散落区"""
+    slots = tuple(f"B{i}" for i in range(1, 4))
+    target, current = tower(CUBES[:4]), tower(list(reversed(CUBES[:4])))
+    try:
+        build_reference_output(target, current, buffer_slots=slots)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("greedy reversal of four layers should run out of buffer slots")
+    output = build_optimal_output(target, current, buffer_slots=slots)
+    assert simulate_plan(output["plan"], current, target, buffer_slots=slots)["ok"]
+    assert [a["to"]["type"] for a in output["plan"]].count("scattered") == 1
+
+
+if __name__ == "__main__":
+    test_layer_labels_and_indices()
+    test_tall_tower_simulation()
+    test_layers_compared_by_ordinal()
+    test_reversed_tower_with_larger_buffer_pool()
+    test_reversal_beyond_the_default_buffer_pool()
+    print("All stack layer tests passed")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按工作区坐标估算移动距离，以及缓冲槽分配与动作顺序优化
+不需要语言模型或embedding模型
+"""
+
+import json
+import math
+
+from replan_core.config import BUFFER_SLOTS
+from replan_core.plan_simulator import simulate_plan
+from replan_core.scenario_corpus import generate_corpus, make_structure
+from replan_core.travel_cost import TravelCostModel, assign_buffer_slots, minimize_travel
+
+EMPTY = {"target_structure": {"relationship": "none", "placements": []}}
+
+
+def test_plan_cost_follows_anchors():
+    model = TravelCostModel(home=[0, 0, 0], scattered_anchor=[0, 0, 0], stack_anchor=[0, 100, 0],
+                            cube_height=40, speed=100.0, grasp_seconds=1.0)
+    target = make_structure("stacked", ("bottom", "top"), ["a", "b"])
+    plan = [
+        {"step": 1, "action": "move_to_position", "object": "a", "from": {"type": "scattered"},
+         "to": {"type": "stack", "position": "bottom"}},
+        {"step": 2, "action": "move_to_position", "object": "b", "from": {"type": "scattered"},
+         "to": {"type": "stack", "position": "top"}},
+    ]
+    cost = model.plan_cost(plan, EMPTY, target)
+    # 0 → 散落区 → 底层 (0,100,0) → 散落区 → 第二层 (0,100,40)
+    expected = 0 + 100 + 100 + math.dist((0, 0, 0), (0, 100, 40))
+    assert math.isclose(cost["distance_mm"], expected)
+    assert math.isclose(cost["seconds"], expected / 100.0 + 4 * 1.0)
+
+
+def test_buffer_slot_chosen_by_distance():
+    """离堆栈最近的槽被选中，取出动作跟随"""
+    model = TravelCostModel(buffer_slots={"B1": [0, 900, 0], "B2": [0, 150, 0], "B3": [900, 0, 0]},
+                            stack_anchor=[0, 100, 0], scattered_anchor=[0, 0, 0], home=[0, 100, 0])
+    current = make_structure("stacked", ("bottom", "top"), ["x", "a"])
+    target = make_structure("stacked", ("bottom", "top"), ["a", "x"])
+    plan = [
+        {"step": 1, "action": "move_to_buffer", "object": "a", "from": {"type": "stack", "position": "top"},
+         "to": {"type": "buffer", "slot": "B1"}},
+        {"step": 2, "action": "move_to_buffer", "object": "x", "from": {"type": "stack", "position": "bottom"},
+         "to": {"type": "buffer", "slot": "B3"}},
+        {"step": 3, "action": "move_from_buffer", "object": "a", "from": {"type": "buffer", "slot": "B1"},
+         "to": {"type": "stack", "position": "bottom"}},
+        {"step": 4, "action": "move_from_buffer", "object": "x", "from": {"type": "buffer", "slot": "B3"},
+         "to": {"type": "stack", "position": "top"}},
+    ]
+    assigned = assign_buffer_slots(plan, current, target, model)
+    assert "B3" not in json.dumps(assigned)
+    assert assigned[2]["from"]["slot"] == assigned[0]["to"]["slot"]
+    assert model.plan_cost(assigned, current, target)["distance_mm"] < model.plan_cost(plan, current, target)["distance_mm"]
+
+
+def test_minimize_travel_never_worse_on_corpus():
+    for case in generate_corpus():
+        plan = json.loads(case["reference_output"])["plan"]
+        report = minimize_travel(plan, case["current_state"], case["target_spec"])
+        assert report["after"]["distance_mm"] <= report["before"]["distance_mm"] + 1e-9, case["case_id"]
+        assert simulate_plan(report["plan"], case["current_state"], case["target_spec"])["ok"], case["case_id"]
+        assert len(report["plan"]) == len(plan)
+
+
+def test_layout_loaded_from_json(tmp_path):
+    path = tmp_path / "layout.json"
+    path.write_text(json.dumps({"speed": 400.0, "stack_anchor": [0, 0, 0], "gripper": "soft"}), encoding="utf-8")
+    model = TravelCostModel.load(path)
+    assert model.speed == 400.0 and model.stack_anchor == [0, 0, 0]
+    assert set(model.buffer_slots) == set(BUFFER_SLOTS)
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    test_plan_cost_follows_anchors()
+    test_buffer_slot_chosen_by_distance()
+    test_minimize_travel_never_worse_on_corpus()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_layout_loaded_from_json(pathlib.Path(tmp))
+    print("All travel cost tests passed")
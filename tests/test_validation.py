@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试关系注册表编译出的验证器：一次验证报告全部错误
+不需要语言模型或embedding模型
+"""
+
+import json
+
+import pytest
+
+from replan_core.config import STACKING_RELATIONSHIPS, SUPPORTED_RELATIONSHIPS
+from replan_core.relationships import RELATIONSHIPS
+from replan_core.scenario_corpus import RELATIONSHIP_POSITIONS, generate_corpus, make_structure
+from replan_core.validation import (
+    ValidationError,
+    enforce_plan_consistency,
+    plan_errors,
+    structure_errors,
+    validate_output_data,
+)
+from replan_core.validation_bench import _verdict, baseline, generate_outputs
+
+
+def test_registry_matches_config():
+    assert set(RELATIONSHIPS) == set(SUPPORTED_RELATIONSHIPS) - {"none"}
+    assert {name for name, spec in RELATIONSHIPS.items() if spec.stacking} == STACKING_RELATIONSHIPS
+
+
+def test_structures_checked_against_registry():
+    for relationship, positions in RELATIONSHIP_POSITIONS.items():
+        objects = ["blue cube", "green cube", "red cube"][:len(positions)]
+        structure = make_structure(relationship, positions, objects)["target_structure"]
+        assert structure_errors(structure) == [], relationship
+
+    two_layer = make_structure("stacked", ("bottom", "top"), ["blue cube", "red cube"])["target_structure"]
+    assert structure_errors(two_layer) == []
+    duplicated = make_structure("separated_left_right", ("left", "left"), ["blue cube", "red cube"])["target_structure"]
+    assert len(structure_errors(duplicated)) == 1
+    too_many = make_structure("stacked_left", (None, None), ["blue cube", "red cube"])["target_structure"]
+    assert structure_errors(too_many) == ["stacked_left requires exactly 1 placement, found 2"]
+    # 未注册的关系只检查对象信息
+    assert structure_errors({"relationship": "circle", "placements": [{"position": "north"}]})[0].startswith("Each placement")
+
+
+def test_all_plan_errors_reported():
+    output = json.loads(generate_corpus()[0]["reference_output"])
+    plan = output["plan"]
+    plan.append({"step": 90, "action": "move_to_buffer", "object": "gray cube",
+                 "from": {"type": "scattered"}, "to": {"type": "buffer", "slot": "B9"}})
+    plan.append({"step": 91, "action": "move_to_position", "from": {"type": "scattered"},
+                 "to": {"type": "arrangement", "position": "left"}})
+    plan.extend({"step": 92 + i, "action": "move_to_position", "object": "gray cube",
+                 "from": {"type": "scattered"}, "to": {"type": "stack", "position": "top"}} for i in range(2))
+    output["final_expected"]["target_structure"]["placements"].pop()
+
+    with pytest.raises(ValidationError) as info:
+        validate_output_data(output)
+    errors = info.value.errors
+    assert any("step 90: Invalid buffer slot: B9" in e for e in errors)
+    assert any("step 91: Each action must specify an 'object'" in e for e in errors)
+    assert any("placed to top position multiple times: ['gray cube']" in e for e in errors)
+    assert any("requires positions" in e for e in errors)
+    assert isinstance(info.value, ValueError)
+
+
+def test_color_alias_normalized_and_consistency_checked():
+    plan = [
+        {"step": 1, "action": "move_to_position", "color": "blue",
+         "from": {"position": "scattered"}, "to": {"type": "stack", "position": "bottom"}},
+        {"step": 2, "action": "move_to_position", "object": "red cube",
+         "from": {"type": "scattered"}, "to": {"type": "stack", "position": "bottom"}},
+    ]
+    with pytest.raises(ValidationError) as info:
+        validate_output_data({"status": "success", "plan": plan})
+    assert plan[0]["object"] == "blue cube" and plan[0]["from"] == {"type": "scattered"}
+    assert info.value.errors == [
+        "step 2: Stack position 'bottom' assigned to multiple objects (blue cube vs red cube)",
+        "Success status requires 'final_expected' field",
+    ]
+    with pytest.raises(ValueError):
+        enforce_plan_consistency(plan)
+
+
+def test_layer_alias_conflict_reports_action_position():
+    """同一层的别名冲突按动作序号报告（缺少 step 时不能报成层序号）"""
+    plan = [
+        {"step": 1, "action": "move_to_position", "object": "a", "from": {"type": "scattered"},
+         "to": {"type": "stack", "position": "bottom"}},
+        {"step": 2, "action": "move_to_position", "object": "b", "from": {"type": "scattered"},
+         "to": {"type": "stack", "position": "middle"}},
+        {"action": "move_to_position", "object": "c", "from": {"type": "scattered"},
+         "to": {"type": "stack", "position": "layer 2"}},
+    ]
+    errors = plan_errors(plan, True)
+    assert "step 3: Stack position 'layer 2' assigned to multiple objects (b vs c)" in errors
+
+
+def test_same_verdicts_as_the_frozen_baseline():
+    """validation_bench 的冻结基线与注册表验证器在基准语料上的接受/拒绝一致；基线只报告第一处错误"""
+    for label, data in generate_outputs([20]):
+        old = _verdict(baseline.validate_output_data, json.loads(json.dumps(data)))
+        new = _verdict(validate_output_data, data)
+        assert bool(old) == bool(new), label
+        assert old <= 1 and new >= old, label
+
+
+if __name__ == "__main__":
+    test_registry_matches_config()
+    test_structures_checked_against_registry()
+    test_all_plan_errors_reported()
+    test_color_alias_normalized_and_consistency_checked()
+    test_layer_alias_conflict_reports_action_position()
+    test_same_verdicts_as_the_frozen_baseline()
+    print("All validation tests passed")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程规划 worker 池：请求按提交顺序返回、由多个进程处理、结果可解析
+使用轻量的 RAG 替身与替身模型，不需要语言模型或embedding模型
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from replan_core.llm_backends import ReplayLLMBackend, prompt_key
+from replan_core.profiles import QWEN3_4B_FP8
+from replan_core.rag_system import build_user_prompt
+from replan_core.scenario_corpus import generate_corpus
+from replan_core.worker_pool import PlannerWorkerPool, StandInModelBackend
+
+
+class _StandInRAG:
+    """只提供 build_rag_prompt 的 RAG 替身。"""
+
+    def build_rag_prompt(self, target_spec, current_state, profile=None):
+        return "system", build_user_prompt(target_spec, current_state)
+
+
+def test_pool_plans_in_forked_workers():
+    cases = generate_corpus()[:12]
+    outputs = ReplayLLMBackend({
+        prompt_key(build_user_prompt(c["target_spec"], c["current_state"])): c["reference_output"] for c in cases
+    })
+    backend = StandInModelBackend(outputs, hidden=64, layers=2, new_tokens=2)
+    requests = [{"case_id": c["case_id"], "target_spec": c["target_spec"], "current_state": c["current_state"]}
+                for c in cases]
+
+    with PlannerWorkerPool(2, rag_system=_StandInRAG(), backend=backend) as pool:
+        outcomes = list(pool.map(requests))
+        single = pool.plan(cases[0]["target_spec"], cases[0]["current_state"])
+
+    assert [o["case_id"] for o in outcomes] == [c["case_id"] for c in cases]
+    assert all(o["result"] is not None and o["consistent"] for o in outcomes)
+    assert os.getpid() not in {o["worker"] for o in outcomes}
+    assert single["result"] == outcomes[0]["result"]
+
+
+def test_pool_reports_errors_without_failing():
+    backend = ReplayLLMBackend({}, default_output="not json")
+    case = generate_corpus()[0]
+    with PlannerWorkerPool(1, rag_system=_StandInRAG(), backend=backend) as pool:
+        outcome = pool.plan(case["target_spec"], case["current_state"])
+    assert outcome["result"] is None
+    assert "error" in outcome
+
+
+def test_gpu_models_rejected_before_fork():
+    """CUDA 在 fork 出的 worker 中不能重新初始化：GPU 配置档与已在 GPU 上的模型在 fork 前被拒绝"""
+    with pytest.raises(ValueError, match="CPU profile"):
+        PlannerWorkerPool(1, profile=QWEN3_4B_FP8, rag_system=_StandInRAG())
+    on_gpu = SimpleNamespace(model=SimpleNamespace(device=SimpleNamespace(type="cuda")))
+    with pytest.raises(ValueError, match="cuda"):
+        PlannerWorkerPool(1, rag_system=_StandInRAG(), backend=on_gpu)
+
+
+if __name__ == "__main__":
+    test_pool_plans_in_forked_workers()
+    test_pool_reports_errors_without_failing()
+    test_gpu_models_rejected_before_fork()
+    print("All worker pool tests passed")